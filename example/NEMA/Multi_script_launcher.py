@@ -1,11 +1,25 @@
-from subprocess import Popen
+import os
+import subprocess
+import sys
+
+from openalea.fspmwheat import batch
+
+#: the directories of the scenarios, each one with its main.py
+SCENARIOS_DIRECTORIES = ['NEMA_H0', 'NEMA_H3', 'NEMA_H15']
+
+#: the file of the queue of the scenarios: an interrupted batch is resumed from it, without running again the completed scenarios
+QUEUE_FILEPATH = 'NEMA_queue.sqlite'
+
+
+def run_scenario(scenario_directory):
+    subprocess.check_call([sys.executable, 'main.py'], cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), scenario_directory))
 
 
 def multi_script_launcher():
-    commands = ['cd NEMA_H0 && python main.py', 'cd NEMA_H3 && python main.py', 'cd NEMA_H15 && python main.py']
-    processes = [Popen(cmd, shell=True) for cmd in commands]
-    for p in processes:
-        p.wait()
+    # main.py re-raises the exceptions of the simulation in a batch job, so that check_call raises when a scenario fails
+    counts = batch.run_batch(QUEUE_FILEPATH, run_scenario, SCENARIOS_DIRECTORIES, nb_workers=len(SCENARIOS_DIRECTORIES),
+                             timeout=batch.DEFAULT_TIMEOUT, memory_limit=batch.DEFAULT_MEMORY_LIMIT)
+    print('Scenarios: {}'.format(counts))
 
 
 if __name__ == '__main__':
@@ -13,7 +13,8 @@ import pandas as pd
 
 from openalea.adel.adel_dynamic import AdelDyn
 from openalea.cnwheat import tools as cnwheat_tools
-from openalea.fspmwheat import cnwheat_facade, farquharwheat_facade, senescwheat_facade, growthwheat_facade, caribu_facade, elongwheat_facade
+from openalea.fspmwheat import batch, cnwheat_facade, farquharwheat_facade, senescwheat_facade, growthwheat_facade, caribu_facade, elongwheat_facade
+from openalea.fspmwheat.meteo import Meteo
 
 """
     main
@@ -148,7 +149,7 @@ def calculate_PARa_from_df(g, Eabs_df, PARi, multiple_sources=False, ratio_diffu
 
 def main(stop_time, run_simu=True, make_graphs=True):
     if run_simu:
-        meteo = pd.read_csv(METEO_FILEPATH, index_col='t')
+        meteo = Meteo.from_csv(METEO_FILEPATH)
         Eabs_df = pd.read_csv(CARIBU_FILEPATH)
 
         # define the time step in hours for each simulator
@@ -283,7 +284,7 @@ def main(stop_time, run_simu=True, make_graphs=True):
             for t_elongwheat in range(start_time, stop_time, elongwheat_ts):  # Only to compute temperature related variable
 
                 # run ElongWheat
-                Tair, Tsoil = meteo.loc[t_elongwheat, ['air_temperature', 'air_temperature']]
+                Tair, Tsoil = meteo.values(['air_temperature', 'air_temperature'], t_elongwheat)
                 elongwheat_facade_.run(Tair, Tsoil, option_static=True)
 
                 for t_senescwheat in range(t_elongwheat, t_elongwheat + elongwheat_ts, senescwheat_ts):
@@ -301,7 +302,7 @@ def main(stop_time, run_simu=True, make_graphs=True):
 
                         for t_farquharwheat in range(t_growthwheat, t_growthwheat + growthwheat_ts, farquharwheat_ts):
                             # get the meteo of the current step
-                            Tair, ambient_CO2, RH, Ur, PARi = meteo.loc[t_farquharwheat, ['air_temperature', 'ambient_CO2', 'humidity', 'Wind', 'PARi']]
+                            Tair, ambient_CO2, RH, Ur, PARi = meteo.values(['air_temperature', 'ambient_CO2', 'humidity', 'Wind', 'PARi'], t_farquharwheat)
                             # get PARa for current step
                             aggregated_PARa = calculate_PARa_from_df(g, Eabs_df, PARi, multiple_sources=False)
                             caribu_facade_.update_shared_MTG({'PARa': aggregated_PARa})
@@ -310,7 +311,7 @@ def main(stop_time, run_simu=True, make_graphs=True):
                             farquharwheat_facade_.run(Tair, ambient_CO2, RH, Ur)
 
                             for t_cnwheat in range(t_farquharwheat, t_farquharwheat + senescwheat_ts, cnwheat_ts):
-                                Tair, Tsoil = meteo.loc[t_cnwheat, ['air_temperature', 'air_temperature']]
+                                Tair, Tsoil = meteo.values(['air_temperature', 'air_temperature'], t_cnwheat)
                                 # run CNWheat
                                 print('t cnwheat is {}'.format(t_cnwheat))
                                 cnwheat_facade_.run(Tair=Tair, Tsoil=Tsoil)
@@ -331,6 +332,8 @@ def main(stop_time, run_simu=True, make_graphs=True):
             template = "An exception of type {0} occurred. Arguments:\n{1!r}"
             message = template.format(type(ex).__name__, ex.args)
             print(message, fname, exc_tb.tb_lineno)
+            if batch.is_batch_job():
+                raise  # the outputs are written below, then the batch records the failure of the scenario
 
         finally:
             execution_time = int(time.time() - current_time_of_the_system)
@@ -5,19 +5,21 @@ import random
 import warnings
 import sys
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from openalea.adel.Stand import AgronomicStand
 from openalea.adel.adel_dynamic import AdelDyn
 from openalea.adel.echap_leaf import echap_leaves
+from openalea.fspmwheat import batch
 from openalea.fspmwheat import caribu_facade
 from openalea.fspmwheat import cnwheat_facade
 from openalea.fspmwheat import elongwheat_facade
 from openalea.fspmwheat import farquharwheat_facade
 from openalea.fspmwheat import fspmwheat_facade
+from openalea.fspmwheat import geometry
 from openalea.fspmwheat import growthwheat_facade
 from openalea.fspmwheat import senescwheat_facade
+from openalea.fspmwheat.meteo import Meteo
 
 """
     main
@@ -63,8 +65,8 @@ def save_df_to_csv(df, outputs_filepath, precision):
 
 
 def main(simulation_length=2000, forced_start_time=0, run_simu=True, run_postprocessing=True, generate_graphs=True, run_from_outputs=False, stored_times=None,
-         option_static=False, show_3Dplant=True, tillers_replications=None, heterogeneous_canopy=True,
-         N_fertilizations=None, PLANT_DENSITY=None, INTER_ROW=0.15, update_parameters_all_models=None,
+         option_static=False, show_3Dplant=True, lazy_geometry=True, tillers_replications=None, heterogeneous_canopy=True,
+         N_fertilizations=None, PLANT_DENSITY=None, INTER_ROW=0.15, update_parameters_all_models=None, postprocessing_accumulators=None,
          INPUTS_PLANTSOIL_DIRPATH='inputs', INPUT_METEO_DIRPATH='inputs', METEO_FILENAME='meteo.csv', OUTPUTS_DIRPATH='outputs', POSTPROCESSING_DIRPATH='postprocessing', GRAPHS_DIRPATH='graphs'):
     """
     Run a simulation of fspmwheat with coupling to several models
@@ -78,6 +80,7 @@ def main(simulation_length=2000, forced_start_time=0, run_simu=True, run_postpro
     :param str or list stored_times: can be 'all', a list or an empty list
     :param bool option_static: Whether the model should be run for a static plant architecture
     :param bool show_3Dplant: whether to plot the scene in pgl viewer
+    :param bool lazy_geometry: whether to update the geometry only when it is read by Caribu or FarquharWheat, instead of after each run of ElongWheat
     :param dict [str, float] tillers_replications: a dictionary with tiller id as key, and weight of replication as value.
     :param bool heterogeneous_canopy: Whether to create a duplicated heterogeneous canopy from the initial mtg.
     :param dict [int, float] or [str, float] N_fertilizations: a dictionary for N fertilisation regime {date: N_input}, with date in hour and N_input in mol N nitrates
@@ -90,6 +93,9 @@ def main(simulation_length=2000, forced_start_time=0, run_simu=True, run_postpro
                                                          },
                                               'elongwheat': {'param1': 'val1', 'param2': 'val2'}
                                              }
+    :param openalea.fspmwheat.accumulators.PostprocessingAccumulators postprocessing_accumulators: if not None, the accumulators updated with the outputs
+                                             of each stored time step, to compute the tables of fspmwheat_postprocessing during the simulation.
+                                             The post-processing of CN-Wheat is then taken from the accumulators instead of being recomputed from the outputs CSV files.
     :param str INPUTS_PLANTSOIL_DIRPATH: the path directory with plant and soil inputs
     :param str INPUT_METEO_DIRPATH: the path directory of meteo inputs
     :param str METEO_FILENAME: the name of the file with meteo data
@@ -197,7 +203,7 @@ def main(simulation_length=2000, forced_start_time=0, run_simu=True, run_postpro
     START_TIME = max(0, new_start_time)
 
     # Name of the CSV files which contains the meteo data
-    meteo = pd.read_csv(os.path.join(INPUT_METEO_DIRPATH, METEO_FILENAME), index_col='t')
+    meteo = Meteo.from_csv(os.path.join(INPUT_METEO_DIRPATH, METEO_FILENAME))
 
     # -- OUTPUTS CONFIGURATION --
 
@@ -222,6 +228,8 @@ def main(simulation_length=2000, forced_start_time=0, run_simu=True, run_postpro
     hiddenzones_all_data_list = []
     elements_all_data_list = []
     soils_all_data_list = []
+    postprocessing_all_data_lists = {'axes_postprocessing': [], 'organs_postprocessing': [], 'hiddenzones_postprocessing': [],
+                                     'elements_postprocessing': [], 'soils_postprocessing': []}  # filled only with postprocessing_accumulators
 
     all_simulation_steps = []  # to store the steps of the simulation
 
@@ -436,7 +444,7 @@ def main(simulation_length=2000, forced_start_time=0, run_simu=True, run_postpro
     fspmwheat_facade_ = fspmwheat_facade.FSPMWheatFacade(g)
 
     # Update geometry
-    adel_wheat.update_geometry(g)
+    geometry.update_geometry(g, force=True)
     if show_3Dplant:
         adel_wheat.plot(g)
 
@@ -449,10 +457,8 @@ def main(simulation_length=2000, forced_start_time=0, run_simu=True, run_postpro
         try:
             for t_caribu in range(START_TIME, SIMULATION_LENGTH, SENESCWHEAT_TIMESTEP):
                 # run Caribu
-                PARi = meteo.loc[t_caribu, ['PARi']].iloc[0]
-                DOY = meteo.loc[t_caribu, ['DOY']].iloc[0]
-                hour = meteo.loc[t_caribu, ['hour']].iloc[0]
-                PARi_next_hours = meteo.loc[range(t_caribu, t_caribu + CARIBU_TIMESTEP), ['PARi']].sum().values[0]
+                PARi, DOY, hour = meteo.values(['PARi', 'DOY', 'hour'], t_caribu)
+                PARi_next_hours = meteo.rolling_sum('PARi', t_caribu, CARIBU_TIMESTEP)
 
                 if (t_caribu % CARIBU_TIMESTEP == 0) and (PARi_next_hours > 0):
                     run_caribu = True
@@ -468,18 +474,19 @@ def main(simulation_length=2000, forced_start_time=0, run_simu=True, run_postpro
 
                     for t_farquharwheat in range(t_senescwheat, t_senescwheat + SENESCWHEAT_TIMESTEP, FARQUHARWHEAT_TIMESTEP):
                         # get the meteo of the current step
-                        Ta, ambient_CO2, RH, Ur = meteo.loc[t_farquharwheat, ['air_temperature', 'ambient_CO2', 'humidity', 'Wind']]
+                        Ta, ambient_CO2, RH, Ur = meteo.values(['air_temperature', 'ambient_CO2', 'humidity', 'Wind'], t_farquharwheat)
 
-                        # run FarquharWheat
-                        farquharwheat_facade_.run(Ta, ambient_CO2, RH, Ur)
+                        # run FarquharWheat, with its fast path at night
+                        farquharwheat_facade_.run(Ta, ambient_CO2, RH, Ur, dark_period=(PARi == 0))
 
                         for t_elongwheat in range(t_farquharwheat, t_farquharwheat + FARQUHARWHEAT_TIMESTEP, ELONGWHEAT_TIMESTEP):
                             # run ElongWheat
-                            Tair, Tsoil = meteo.loc[t_elongwheat, ['air_temperature', 'soil_temperature']]
+                            Tair, Tsoil = meteo.values(['air_temperature', 'soil_temperature'], t_elongwheat)
                             elongwheat_facade_.run(Tair, Tsoil, option_static=option_static)
 
-                            # Update geometry
-                            adel_wheat.update_geometry(g)
+                            # Update geometry. With lazy_geometry, the geometry is updated only when it is read, i.e. by Caribu, FarquharWheat or the 3D plot
+                            if not lazy_geometry or show_3Dplant:
+                                geometry.update_geometry(g, force=not lazy_geometry)
                             if show_3Dplant:
                                 adel_wheat.plot(g)
 
@@ -497,8 +504,7 @@ def main(simulation_length=2000, forced_start_time=0, run_simu=True, run_postpro
 
                                     if t_cnwheat > 0:
                                         # run CNWheat
-                                        Tair = meteo.loc[t_elongwheat, 'air_temperature']
-                                        Tsoil = meteo.loc[t_elongwheat, 'soil_temperature']
+                                        Tair, Tsoil = meteo.values(['air_temperature', 'soil_temperature'], t_elongwheat)
                                         cnwheat_facade_.run(Tair, Tsoil, tillers_replications)
 
                                     # append outputs at current step to global lists
@@ -512,6 +518,13 @@ def main(simulation_length=2000, forced_start_time=0, run_simu=True, run_postpro
                                         elements_all_data_list.append(elements_outputs)
                                         soils_all_data_list.append(soils_outputs)
 
+                                        if postprocessing_accumulators is not None:
+                                            step_postprocessing = postprocessing_accumulators.update_from_outputs(t_cnwheat, axes_outputs, organs_outputs, hiddenzones_outputs,
+                                                                                                                  elements_outputs, soils_outputs,
+                                                                                                                  CNWHEAT_TIMESTEP * HOUR_TO_SECOND_CONVERSION_FACTOR)
+                                            for postprocessing_file_basename, postprocessing_df in step_postprocessing.items():
+                                                postprocessing_all_data_lists[postprocessing_file_basename].append(postprocessing_df)
+
                                         # Test for dead plant: if the whole shoot is senesced or if conc_sucrose_phloem < threshold
                                         # TODO: adapt in case of multiple plants
                                         # TODO: create a function with parameters (where ?)
@@ -551,6 +564,8 @@ def main(simulation_length=2000, forced_start_time=0, run_simu=True, run_postpro
             template = "An exception of type {0} occurred. Arguments:\n{1!r}"
             message = template.format(type(ex).__name__, ex.args)
             print(message, fname, exc_tb.tb_lineno)
+            if batch.is_batch_job():
+                raise  # the outputs are written below, then the batch records the failure of the scenario
 
         finally:
             # convert list of outputs into dataframes
@@ -576,7 +591,21 @@ def main(simulation_length=2000, forced_start_time=0, run_simu=True, run_postpro
     # ---------      POST-PROCESSING      ---------
     # ---------------------------------------------
 
-    if run_postprocessing:
+    if run_postprocessing and run_simu and postprocessing_accumulators is not None:
+        # The accumulators already computed the post-processing at each stored time step
+        postprocessing_df_dict = {}
+        for postprocessing_filename in (AXES_POSTPROCESSING_FILENAME,
+                                        HIDDENZONES_POSTPROCESSING_FILENAME,
+                                        ORGANS_POSTPROCESSING_FILENAME,
+                                        ELEMENTS_POSTPROCESSING_FILENAME,
+                                        SOILS_POSTPROCESSING_FILENAME):
+            postprocessing_file_basename = postprocessing_filename.split('.')[0]
+            postprocessing_df = pd.concat(postprocessing_all_data_lists[postprocessing_file_basename], ignore_index=True, sort=False)
+            postprocessing_filepath = os.path.join(POSTPROCESSING_DIRPATH, postprocessing_filename)
+            postprocessing_df.to_csv(postprocessing_filepath, na_rep='NA', index=False, float_format='%.{}f'.format(OUTPUTS_PRECISION))
+            postprocessing_df_dict[postprocessing_file_basename] = postprocessing_df
+
+    elif run_postprocessing:
         # Retrieve outputs dataframes from precedent simulation run
         if not run_simu:
             outputs_df_dict = {}
@@ -657,6 +686,7 @@ def main(simulation_length=2000, forced_start_time=0, run_simu=True, run_postpro
         soils_postprocessing_file_basename = SOILS_POSTPROCESSING_FILENAME.split('.')[0]
 
         # --- Generate graphs from postprocessing files
+        import matplotlib.pyplot as plt
         plt.ioff()
         df_elt = postprocessing_df_dict[elements_postprocessing_file_basename]
         df_SAM = pd.read_csv(os.path.join(OUTPUTS_DIRPATH, AXES_OUTPUTS_FILENAME))
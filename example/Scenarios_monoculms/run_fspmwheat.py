@@ -9,7 +9,9 @@ import getopt
 import pandas as pd
 from math import exp
 
-from openalea.fspmwheat import fspmwheat_postprocessing
+from openalea.fspmwheat import batch, fspmwheat_postprocessing
+from openalea.fspmwheat.accumulators import PostprocessingAccumulators
+from openalea.fspmwheat.meteo import Meteo
 
 from example.example_fspmwheat.Scenarios_monoculms import main
 from example.example_fspmwheat.Scenarios_monoculms import tools
@@ -117,6 +119,12 @@ def run_fspmwheat(scenario_id=1, inputs_dir_path=None, outputs_dir_path='outputs
 
         # -- RUN main fspmwheat --
         try:
+            # Compute the postprocessing tables during the simulation, unless the simulation restarts from previous outputs
+            postprocessing_accumulators = None
+            if RUN_SIMU and RUN_POSTPROCESSING and not RUN_FROM_OUTPUTS:
+                postprocessing_accumulators = PostprocessingAccumulators(Meteo.from_csv(os.path.join(INPUTS_DIRPATH, scenario.get('METEO_FILENAME'))),
+                                                                         scenario.get('Plant_Density', 250.))
+
             main.main(simulation_length=SIMULATION_LENGTH, forced_start_time=0,
                       run_simu=RUN_SIMU, run_postprocessing=RUN_POSTPROCESSING,
                       generate_graphs=GENERATE_GRAPHS, run_from_outputs=RUN_FROM_OUTPUTS,
@@ -130,12 +138,15 @@ def run_fspmwheat(scenario_id=1, inputs_dir_path=None, outputs_dir_path='outputs
                       GRAPHS_DIRPATH=scenario_graphs_dirpath,
                       OUTPUTS_DIRPATH=scenario_outputs_dirpath,
                       POSTPROCESSING_DIRPATH=scenario_postprocessing_dirpath,
-                      update_parameters_all_models=scenario_parameters)
+                      update_parameters_all_models=scenario_parameters,
+                      postprocessing_accumulators=postprocessing_accumulators)
             if GENERATE_GRAPHS:
                 additional_graphs.graph_summary(scenario_id, scenario_graphs_dirpath,
                                                 graph_list=['LAI', 'sum_dry_mass_axis', 'shoot_roots_ratio_axis', 'N_content_shoot_axis', 'Conc_Amino_acids_phloem', 'Conc_Sucrose_phloem', 'leaf_Lmax',
                                                             'green_area_blade'])
-            if RUN_POSTPROCESSING:
+            if postprocessing_accumulators is not None:
+                postprocessing_accumulators.save(scenario_postprocessing_dirpath)
+            elif RUN_POSTPROCESSING:
                 fspmwheat_postprocessing.leaf_traits(scenario_outputs_dirpath, scenario_postprocessing_dirpath)
                 fspmwheat_postprocessing.table_C_usages(scenario_postprocessing_dirpath)
                 fspmwheat_postprocessing.calculate_performance_indices(scenario_outputs_dirpath, scenario_postprocessing_dirpath, os.path.join(INPUTS_DIRPATH, scenario.get('METEO_FILENAME')),
@@ -149,6 +160,8 @@ def run_fspmwheat(scenario_id=1, inputs_dir_path=None, outputs_dir_path='outputs
             template = "An exception of type {0} occurred. Arguments:\n{1!r}"
             message = template.format(type(ex).__name__, ex.args)
             print(message, fname, exc_tb.tb_lineno)
+            if batch.is_batch_job():
+                raise  # the batch records the failure of the scenario
 
 
 if __name__ == '__main__':
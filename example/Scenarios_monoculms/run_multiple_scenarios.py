@@ -1,8 +1,8 @@
-import multiprocessing as mp
 import os
 import time
 
 import pandas as pd
+from openalea.fspmwheat import batch
 from example.Scenarios_monoculms import rearrange_graphs
 from example.Scenarios_monoculms import rearrange_postprocessing
 from example.Scenarios_monoculms import run_fspmwheat
@@ -11,14 +11,16 @@ scenarios_df = pd.read_csv(os.path.join('inputs', 'scenarios_list.csv'), index_c
 scenarios_df['Scenario'] = scenarios_df.index
 scenarios = scenarios_df.Scenario
 
+#: the file of the queue of the scenarios: an interrupted batch is resumed from it, without running again the completed scenarios
+QUEUE_FILEPATH = 'scenarios_queue.sqlite'
+
 if __name__ == '__main__':
     tstart = time.time()
-    num_processes = mp.cpu_count()
-    p = mp.Pool(num_processes)
 
-    mp_solutions = p.map(run_fspmwheat.run_fspmwheat, list(scenarios))
-    p.terminate()
-    p.join()
+    # each scenario is run in its own process, a scenario which fails, hangs or exceeds the memory cap does not stop the others
+    counts = batch.run_batch(QUEUE_FILEPATH, run_fspmwheat.run_fspmwheat, [int(scenario) for scenario in scenarios],
+                             timeout=batch.DEFAULT_TIMEOUT, memory_limit=batch.DEFAULT_MEMORY_LIMIT)
+    print('Scenarios: {}'.format(counts))
 
     if 'Generate_Graphs' in scenarios_df.columns and any(scenarios_df.Generate_Graphs):
         rearrange_graphs.rearrange_graphs(scenarios=list(scenarios))
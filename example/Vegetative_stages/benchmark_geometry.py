@@ -0,0 +1,74 @@
+# -*- coding: latin-1 -*-
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from openalea.adel.adel_dynamic import AdelDyn
+
+import main
+
+"""
+    benchmark_geometry
+    ~~~~~~~~~~~~~~~~~~
+
+    Compare the update of the geometry after each run of Elong-Wheat to the lazy update of the geometry,
+    i.e. only when it is read by Caribu or Farquhar-Wheat (see :mod:`fspmwheat.geometry`), on a vegetative run of 2000 hours.
+    Print the number and the duration of the updates of the geometry and the total duration of the simulations,
+    and check that the light interception at the end of the simulations is the same.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+SIMULATION_LENGTH = 2000
+
+OUTPUTS_DIRPATHS = {False: os.path.join('outputs', 'benchmark_eager_geometry'),
+                    True: os.path.join('outputs', 'benchmark_lazy_geometry')}
+
+#: the number and the cumulated duration of the updates of the geometry
+geometry_updates = {'number': 0, 'duration': 0.}
+
+update_geometry = AdelDyn.update_geometry
+
+
+def timed_update_geometry(self, *args, **kwargs):
+    start = time.time()
+    try:
+        return update_geometry(self, *args, **kwargs)
+    finally:
+        geometry_updates['number'] += 1
+        geometry_updates['duration'] += time.time() - start
+
+
+AdelDyn.update_geometry = timed_update_geometry
+
+
+if __name__ == '__main__':
+    results = {}
+    for lazy_geometry in (False, True):
+        outputs_dirpath = OUTPUTS_DIRPATHS[lazy_geometry]
+        if not os.path.exists(outputs_dirpath):
+            os.makedirs(outputs_dirpath)
+        geometry_updates.update({'number': 0, 'duration': 0.})
+        start = time.time()
+        main.main(SIMULATION_LENGTH, forced_start_time=0, run_simu=True, run_postprocessing=False, generate_graphs=False, run_from_outputs=False, stored_times='all',
+                  show_3Dplant=False, lazy_geometry=lazy_geometry,
+                  option_static=False, tillers_replications={'T1': 0.5, 'T2': 0.5, 'T3': 0.5, 'T4': 0.5},
+                  heterogeneous_canopy=True, N_fertilizations={1440: 357143, 2520: 1000000},
+                  PLANT_DENSITY={1: 250}, METEO_FILENAME='meteo_Ljutovac2002.csv', OUTPUTS_DIRPATH=outputs_dirpath)
+        results[lazy_geometry] = dict(geometry_updates, total_duration=time.time() - start)
+
+    for lazy_geometry, label in ((False, 'eager'), (True, 'lazy')):
+        print('{} geometry: {number} updates in {duration:.1f} s, simulation run in {total_duration:.1f} s'.format(label, **results[lazy_geometry]))
+
+    # the light interception at the end of the simulations must be the same
+    final_light_interception = []
+    for lazy_geometry in (False, True):
+        elements_outputs_df = pd.read_csv(os.path.join(OUTPUTS_DIRPATHS[lazy_geometry], 'elements_outputs.csv'))
+        last_step_df = elements_outputs_df[elements_outputs_df['t'] == elements_outputs_df['t'].max()]
+        final_light_interception.append(last_step_df.set_index(['plant', 'axis', 'metamer', 'organ', 'element'])['PARa'].sort_index())
+    np.testing.assert_allclose(final_light_interception[0].values, final_light_interception[1].values)
+    print('Same light interception at t={}'.format(SIMULATION_LENGTH - 1))
@@ -6,11 +6,8 @@ import random
 import time
 import warnings
 
-import matplotlib.pyplot as plt
-import matplotlib.ticker as mtick
 import numpy as np
 import pandas as pd
-import statsmodels.api as sm
 from openalea.adel.adel_dynamic import AdelDyn
 from openalea.adel.echap_leaf import echap_leaves
 from openalea.elongwheat import parameters as elongwheat_parameters
@@ -19,8 +16,10 @@ from openalea.fspmwheat import cnwheat_facade
 from openalea.fspmwheat import elongwheat_facade
 from openalea.fspmwheat import farquharwheat_facade
 from openalea.fspmwheat import fspmwheat_facade
+from openalea.fspmwheat import geometry
 from openalea.fspmwheat import growthwheat_facade
 from openalea.fspmwheat import senescwheat_facade
+from openalea.fspmwheat.meteo import Meteo
 
 """
     main
@@ -59,7 +58,7 @@ def save_df_to_csv(df, outputs_filepath, precision):
 
 
 def main(simulation_length, forced_start_time=0, run_simu=True, run_postprocessing=True, generate_graphs=True, run_from_outputs=False, stored_times=None,
-         option_static=False, show_3Dplant=True, tillers_replications=None, heterogeneous_canopy=True,
+         option_static=False, show_3Dplant=True, lazy_geometry=True, tillers_replications=None, heterogeneous_canopy=True,
          N_fertilizations=None, PLANT_DENSITY=None, update_parameters_all_models=None,
          INPUTS_DIRPATH='inputs', METEO_FILENAME='meteo.csv',
          OUTPUTS_DIRPATH='outputs', POSTPROCESSING_DIRPATH='postprocessing', GRAPHS_DIRPATH='graphs'):
@@ -75,6 +74,7 @@ def main(simulation_length, forced_start_time=0, run_simu=True, run_postprocessi
     :param str or list stored_times: Time steps when are stored the model outputs. Can be either 'all', a list or an empty list. Default to 'all'
     :param bool option_static: Whether the model should be run for a static plant architecture
     :param bool show_3Dplant: whether to plot the scene in pgl viewer
+    :param bool lazy_geometry: whether to update the geometry only when it is read by Caribu or FarquharWheat, instead of after each run of ElongWheat
     :param dict [str, float] tillers_replications: a dictionary with tiller id as key, and weight of replication as value.
     :param bool heterogeneous_canopy: Whether to create a duplicated heterogeneous canopy from the initial mtg.
     :param dict [int, float] or [str, float] N_fertilizations: a dictionary for N fertilisation regime {date: N_input}, with date in hour and N_input in mol N nitrates
@@ -192,7 +192,7 @@ def main(simulation_length, forced_start_time=0, run_simu=True, run_postprocessi
     START_TIME = max(0, new_start_time)
 
     # Name of the CSV files which contains the meteo data
-    meteo = pd.read_csv(os.path.join(INPUTS_DIRPATH, METEO_FILENAME), index_col='t')
+    meteo = Meteo.from_csv(os.path.join(INPUTS_DIRPATH, METEO_FILENAME))
 
     # -- OUTPUTS CONFIGURATION --
 
@@ -414,7 +414,7 @@ def main(simulation_length, forced_start_time=0, run_simu=True, run_postprocessi
     fspmwheat_facade_ = fspmwheat_facade.FSPMWheatFacade(g)
 
     # Update geometry
-    adel_wheat.update_geometry(g)
+    geometry.update_geometry(g, force=True)
     if show_3Dplant:
         adel_wheat.plot(g)
 
@@ -428,10 +428,8 @@ def main(simulation_length, forced_start_time=0, run_simu=True, run_postprocessi
             current_time_of_the_system = time.time()
             for t_caribu in range(START_TIME, SIMULATION_LENGTH, SENESCWHEAT_TIMESTEP):
                 # run Caribu
-                PARi = meteo.loc[t_caribu, ['PARi']].iloc[0]
-                DOY = meteo.loc[t_caribu, ['DOY']].iloc[0]
-                hour = meteo.loc[t_caribu, ['hour']].iloc[0]
-                PARi_next_hours = meteo.loc[range(t_caribu, t_caribu + CARIBU_TIMESTEP), ['PARi']].sum().values[0]
+                PARi, DOY, hour = meteo.values(['PARi', 'DOY', 'hour'], t_caribu)
+                PARi_next_hours = meteo.rolling_sum('PARi', t_caribu, CARIBU_TIMESTEP)
 
                 if (t_caribu % CARIBU_TIMESTEP == 0) and (PARi_next_hours > 0):
                     run_caribu = True
@@ -459,18 +457,19 @@ def main(simulation_length, forced_start_time=0, run_simu=True, run_postprocessi
                     # Run the rest of the model if the plant is alive
                     for t_farquharwheat in range(t_senescwheat, t_senescwheat + SENESCWHEAT_TIMESTEP, FARQUHARWHEAT_TIMESTEP):
                         # get the meteo of the current step
-                        Ta, ambient_CO2, RH, Ur = meteo.loc[t_farquharwheat, ['air_temperature', 'ambient_CO2', 'humidity', 'Wind']]
+                        Ta, ambient_CO2, RH, Ur = meteo.values(['air_temperature', 'ambient_CO2', 'humidity', 'Wind'], t_farquharwheat)
 
-                        # run FarquharWheat
-                        farquharwheat_facade_.run(Ta, ambient_CO2, RH, Ur)
+                        # run FarquharWheat, with its fast path at night
+                        farquharwheat_facade_.run(Ta, ambient_CO2, RH, Ur, dark_period=(PARi == 0))
 
                         for t_elongwheat in range(t_farquharwheat, t_farquharwheat + FARQUHARWHEAT_TIMESTEP, ELONGWHEAT_TIMESTEP):
                             # run ElongWheat
-                            Tair, Tsoil = meteo.loc[t_elongwheat, ['air_temperature', 'soil_temperature']]
+                            Tair, Tsoil = meteo.values(['air_temperature', 'soil_temperature'], t_elongwheat)
                             elongwheat_facade_.run(Tair, Tsoil, option_static=option_static)
 
-                            # Update geometry
-                            adel_wheat.update_geometry(g)
+                            # Update geometry. With lazy_geometry, the geometry is updated only when it is read, i.e. by Caribu, FarquharWheat or the 3D plot
+                            if not lazy_geometry or show_3Dplant:
+                                geometry.update_geometry(g, force=not lazy_geometry)
                             if show_3Dplant:
                                 adel_wheat.plot(g)
 
@@ -488,8 +487,7 @@ def main(simulation_length, forced_start_time=0, run_simu=True, run_postprocessi
 
                                     if t_cnwheat > 0:
                                         # run CNWheat
-                                        Tair = meteo.loc[t_elongwheat, 'air_temperature']
-                                        Tsoil = meteo.loc[t_elongwheat, 'soil_temperature']
+                                        Tair, Tsoil = meteo.values(['air_temperature', 'soil_temperature'], t_elongwheat)
                                         cnwheat_facade_.run(Tair, Tsoil, tillers_replications)
 
                                     # append outputs at current step to global lists
@@ -617,6 +615,9 @@ def main(simulation_length, forced_start_time=0, run_simu=True, run_postprocessi
         soils_postprocessing_file_basename = SOILS_POSTPROCESSING_FILENAME.split('.')[0]
 
         # --- Generate graphs from postprocessing files
+        import matplotlib.pyplot as plt
+        import matplotlib.ticker as mtick
+        import statsmodels.api as sm
         plt.ioff()
         df_elt = postprocessing_df_dict[elements_postprocessing_file_basename]
         df_SAM = pd.read_csv(os.path.join(OUTPUTS_DIRPATH, AXES_OUTPUTS_FILENAME))
@@ -104,8 +104,8 @@ def from_dataframes(organs_inputs=None, hiddenzones_inputs=None, elements_inputs
                         organ_attributes_names = [state_var_name for state_var_name in simulation.Simulation.ORGANS_STATE if hasattr(organ, state_var_name)]
                         organ_row = organ_inputs.loc[organ_inputs.first_valid_index()]
                         organ_attributes_values = organ_row[organ_attributes_names].tolist()
-                        organ_attributes = dict(zip(organ_attributes_names, organ_attributes_values))
-                        organ.__dict__.update(organ_attributes)
+                        for organ_attribute_name, organ_attribute_value in zip(organ_attributes_names, organ_attributes_values):
+                            setattr(organ, organ_attribute_name, organ_attribute_value)
                         # Update parameters if specified
                         if organ_label in update_parameters:
                             organ.PARAMETERS.__dict__.update(update_parameters[organ_label])
@@ -5,6 +5,7 @@ import numpy as np
 from math import exp
 
 from openalea.cnwheat import parameters
+from openalea.wheatfspm.temperature import RESPONSES
 
 """
     cnwheat.model
@@ -23,6 +24,20 @@ from openalea.cnwheat import parameters
 """
 
 
+def _generate_slots(variables_names, other_attributes_names=(), excluded_names=()):
+    """Generate the names of the slots of a model class from the names of the variables computed for its instances (see :mod:`cnwheat.simulation`),
+    so that the instances store their attributes in slots instead of a `__dict__`.
+
+    :param list [str] variables_names: the names of the variables of the class
+    :param tuple [str] other_attributes_names: the names of the other attributes of the class, e.g. its label or its components
+    :param tuple [str] excluded_names: the names which must not be slots, i.e. the names of the properties of the class and of the slots of its base classes
+
+    :return: the names of the slots
+    :rtype: tuple [str]
+    """
+    return tuple(sorted((set(variables_names) | set(other_attributes_names)) - set(excluded_names)))
+
+
 class EcophysiologicalConstants:
     """
     Ecophysiological constants.
@@ -262,6 +277,23 @@ class Organ(object):
     :class:`Organ` is the base class of all organs. DO NOT INSTANTIATE IT.
     """
 
+    #: the parameters which define the state of the roots, the phloem and the grains
+    STATE_PARAMETERS = ['mstruct', 'Nstruct', 'senesced_mstruct']
+    #: the names of the compartments of the roots, the phloem and the grains
+    COMPARTMENTS_NAMES = ['age_from_flowering', 'amino_acids', 'cytokinins', 'nitrates', 'proteins', 'starch', 'structure', 'sucrose']
+    #: the variables that we need to compute in order to compute fluxes and/or compartments values of the roots, the phloem and the grains
+    INTERMEDIATE_VARIABLES = ['C_exudation', 'HATS_LATS', 'N_exudation', 'RGR_Structure', 'R_Nnit_red', 'R_Nnit_upt', 'Respi_growth',
+                              'R_grain_growth_starch', 'R_grain_growth_struct', 'R_residual', 'regul_transpiration', 'sum_respi']
+    #: the fluxes exchanged between the compartments of the roots, the phloem and the grains
+    FLUXES = ['Export_Amino_Acids', 'Export_Nitrates', 'Export_cytokinins', 'S_Amino_Acids', 'S_cytokinins', 'S_grain_starch',
+              'S_grain_structure', 'S_Proteins', 'Unloading_Amino_Acids', 'Unloading_Sucrose', 'Uptake_Nitrates']
+    #: the variables computed by integrating values of the components parameters/variables recursively
+    INTEGRATIVE_VARIABLES = ['Total_Organic_Nitrogen']
+    #: all the variables computed during a run step of the simulation for the roots, the phloem and the grains
+    RUN_VARIABLES = STATE_PARAMETERS + COMPARTMENTS_NAMES + INTERMEDIATE_VARIABLES + FLUXES + INTEGRATIVE_VARIABLES
+
+    __slots__ = ('label',)
+
     def __init__(self, label):
         self.label = label  #: the label of the organ
 
@@ -284,6 +316,22 @@ class HiddenZone(Organ):
     PARAMETERS = parameters.HIDDEN_ZONE_PARAMETERS  #: the internal parameters of the hidden zone
     INIT_COMPARTMENTS = parameters.HIDDEN_ZONE_INIT_COMPARTMENTS  #: the initial values of compartments and state parameters
 
+    #: the parameters which define the state of the hidden zone
+    STATE_PARAMETERS = ['Nstruct', 'mstruct', 'ratio_DZ']
+    #: the names of the compartments of the hidden zone
+    COMPARTMENTS_NAMES = ['amino_acids', 'fructan', 'proteins', 'sucrose']
+    #: the variables that we need to compute in order to compute fluxes and/or compartments values of the hidden zone
+    INTERMEDIATE_VARIABLES = ['nb_replications']
+    #: the fluxes exchanged between the compartments of the hidden zone
+    FLUXES = ['D_Fructan', 'D_Proteins', 'S_Fructan', 'S_Proteins', 'Unloading_Amino_Acids', 'Unloading_Sucrose']
+    #: the variables computed by integrating values of the components parameters/variables recursively
+    INTEGRATIVE_VARIABLES = []
+    #: all the variables computed during a run step of the simulation for the hidden zone
+    RUN_VARIABLES = STATE_PARAMETERS + COMPARTMENTS_NAMES + INTERMEDIATE_VARIABLES + FLUXES + INTEGRATIVE_VARIABLES
+
+    __slots__ = _generate_slots(RUN_VARIABLES, other_attributes_names=('cohorts', 'cohorts_replications', 'index', 'R_residual', 'Total_Organic_Nitrogen'),
+                                excluded_names=Organ.__slots__ + ('nb_replications',))
+
     def __init__(self, label='hiddenzone', mstruct=INIT_COMPARTMENTS.mstruct, Nstruct=INIT_COMPARTMENTS.Nstruct,
                  sucrose=INIT_COMPARTMENTS.sucrose, fructan=INIT_COMPARTMENTS.fructan, amino_acids=INIT_COMPARTMENTS.amino_acids, proteins=INIT_COMPARTMENTS.proteins,
                  ratio_DZ=INIT_COMPARTMENTS.ratio_DZ, cohorts=None, cohorts_replications=None, index=None):
@@ -516,6 +564,8 @@ class Phloem(Organ):
     PARAMETERS = parameters.PHLOEM_PARAMETERS  #: the internal parameters of the phloem
     INIT_COMPARTMENTS = parameters.PHLOEM_INIT_COMPARTMENTS  #: the initial values of compartments and state parameters
 
+    __slots__ = ('amino_acids', 'sucrose')
+
     def __init__(self, label='phloem', sucrose=INIT_COMPARTMENTS.sucrose, amino_acids=INIT_COMPARTMENTS.amino_acids):
 
         super(Phloem, self).__init__(label)
@@ -581,6 +631,8 @@ class Grains(Organ):
     PARAMETERS = parameters.GRAINS_PARAMETERS  #: the internal parameters of the grains
     INIT_COMPARTMENTS = parameters.GRAINS_INIT_COMPARTMENTS  #: the initial values of compartments and state parameters
 
+    __slots__ = _generate_slots(Organ.RUN_VARIABLES, other_attributes_names=('structural_dry_mass',), excluded_names=Organ.__slots__)
+
     def __init__(self, label='grains', age_from_flowering=INIT_COMPARTMENTS.age_from_flowering, starch=INIT_COMPARTMENTS.starch, structure=INIT_COMPARTMENTS.structure,
                  proteins=INIT_COMPARTMENTS.proteins):
 
@@ -652,7 +704,8 @@ class Grains(Organ):
 
         return res
 
-    def calculate_temperature_effect_on_growth(self, Tair):
+    @staticmethod
+    def calculate_temperature_effect_on_growth(Tair):
         """Effect of the temperature on elongation.
         Return value of equation from Johnson and Lewin (1946) for temperature. The equation is modified to return zero below zero degree.
         Identical to modified_Arrhenius_equation in ElongWheat.
@@ -663,7 +716,7 @@ class Grains(Organ):
         :return: Correction to apply to RGR Structure of the grains (dimensionless)
         :rtype: float
         """
-        return self.modified_Arrhenius_equation(Tair) / Grains.PARAMETERS.Arrhenius_ref
+        return Grains.modified_Arrhenius_equation(Tair) / Grains.PARAMETERS.Arrhenius_ref
 
     @staticmethod
     def calculate_RGR_Structure(sucrose_phloem, mstruct_axis, T_effect_growth):
@@ -784,6 +837,8 @@ class Roots(Organ):
     PARAMETERS = parameters.ROOTS_PARAMETERS  #: the internal parameters of the roots
     INIT_COMPARTMENTS = parameters.ROOTS_INIT_COMPARTMENTS  #: the initial values of compartments and state parameters
 
+    __slots__ = _generate_slots(Organ.RUN_VARIABLES, excluded_names=Organ.__slots__)
+
     def __init__(self, label='roots', mstruct=INIT_COMPARTMENTS.mstruct, senesced_mstruct=INIT_COMPARTMENTS.senesced_mstruct, Nstruct=INIT_COMPARTMENTS.Nstruct, sucrose=INIT_COMPARTMENTS.sucrose,
                  nitrates=INIT_COMPARTMENTS.nitrates, amino_acids=INIT_COMPARTMENTS.amino_acids, cytokinins=INIT_COMPARTMENTS.cytokinins):
 
@@ -1117,6 +1172,8 @@ class PhotosyntheticOrgan(Organ):
 
     PARAMETERS = parameters.PHOTOSYNTHETIC_ORGAN_PARAMETERS  #: the internal parameters of the photosynthetic organs
 
+    __slots__ = ('enclosed_element', 'exposed_element', 'mstruct', 'nitrates', 'senesced_mstruct')
+
     def __init__(self, label, exposed_element, enclosed_element):
 
         super(PhotosyntheticOrgan, self).__init__(label)
@@ -1146,6 +1203,8 @@ class Chaff(PhotosyntheticOrgan):
 
     PARAMETERS = parameters.CHAFF_PARAMETERS  #: the internal parameters of the chaffs
 
+    __slots__ = ()
+
     def __init__(self, label=None, exposed_element=None, enclosed_element=None):
         super(Chaff, self).__init__(label, exposed_element, enclosed_element)
 
@@ -1157,6 +1216,8 @@ class Lamina(PhotosyntheticOrgan):
 
     PARAMETERS = parameters.LAMINA_PARAMETERS  #: the internal parameters of the laminae
 
+    __slots__ = ()
+
     def __init__(self, label=None, exposed_element=None, enclosed_element=None):
         super(Lamina, self).__init__(label, exposed_element, enclosed_element)
 
@@ -1168,6 +1229,8 @@ class Internode(PhotosyntheticOrgan):
 
     PARAMETERS = parameters.INTERNODE_PARAMETERS  #: the internal parameters of the internodes
 
+    __slots__ = ()
+
     def __init__(self, label=None, exposed_element=None, enclosed_element=None):
         super(Internode, self).__init__(label, exposed_element, enclosed_element)
 
@@ -1179,6 +1242,8 @@ class Peduncle(PhotosyntheticOrgan):
 
     PARAMETERS = parameters.PEDUNCLE_PARAMETERS  #: the internal parameters of the peduncles
 
+    __slots__ = ()
+
     def __init__(self, label=None, exposed_element=None, enclosed_element=None):
         super(Peduncle, self).__init__(label, exposed_element, enclosed_element)
 
@@ -1190,6 +1255,8 @@ class Sheath(PhotosyntheticOrgan):
 
     PARAMETERS = parameters.SHEATH_PARAMETERS  #: the internal parameters of the sheaths
 
+    __slots__ = ()
+
     def __init__(self, label=None, exposed_element=None, enclosed_element=None):
         super(Sheath, self).__init__(label, exposed_element, enclosed_element)
 
@@ -1206,6 +1273,23 @@ class PhotosyntheticOrganElement(object):
     PARAMETERS = parameters.PHOTOSYNTHETIC_ORGAN_ELEMENT_PARAMETERS  #: the internal parameters of the photosynthetic organs elements
     INIT_COMPARTMENTS = parameters.PHOTOSYNTHETIC_ORGAN_ELEMENT_INIT_COMPARTMENTS  #: the initial values of compartments and state parameters
 
+    #: the parameters which define the state of the element
+    STATE_PARAMETERS = ['Ag', 'Nstruct', 'Tr', 'Ts', 'green_area', 'is_growing', 'mstruct', 'senesced_mstruct']
+    #: the names of the compartments of the element
+    COMPARTMENTS_NAMES = ['amino_acids', 'cytokinins', 'fructan', 'nitrates', 'proteins', 'starch', 'sucrose', 'triosesP']
+    #: the variables that we need to compute in order to compute fluxes and/or compartments values of the element
+    INTERMEDIATE_VARIABLES = ['Photosynthesis', 'R_Nnit_red', 'R_phloem_loading', 'R_residual', 'Transpiration', 'sum_respi', 'nb_replications']
+    #: the fluxes exchanged between the compartments of the element
+    FLUXES = ['Amino_Acids_import', 'D_Fructan', 'D_Proteins', 'D_Starch', 'D_cytokinins', 'Loading_Amino_Acids', 'Loading_Sucrose',
+              'Nitrates_import', 'Regul_S_Fructan', 'S_Fructan', 'S_Starch', 'S_Sucrose', 'S_Amino_Acids', 'S_Proteins',
+              'cytokinins_import']
+    #: the variables computed by integrating values of the components parameters/variables recursively
+    INTEGRATIVE_VARIABLES = ['Total_Organic_Nitrogen']
+    #: all the variables computed during a run step of the simulation for the element
+    RUN_VARIABLES = STATE_PARAMETERS + COMPARTMENTS_NAMES + INTERMEDIATE_VARIABLES + FLUXES + INTEGRATIVE_VARIABLES
+
+    __slots__ = _generate_slots(RUN_VARIABLES, other_attributes_names=('label', 'cohorts', 'cohorts_replications', 'index'), excluded_names=('nb_replications',))
+
     def __init__(self, label=None, green_area=INIT_COMPARTMENTS.green_area, mstruct=INIT_COMPARTMENTS.mstruct, senesced_mstruct=INIT_COMPARTMENTS.senesced_mstruct, Nstruct=INIT_COMPARTMENTS.Nstruct,
                  triosesP=INIT_COMPARTMENTS.triosesP, starch=INIT_COMPARTMENTS.starch, sucrose=INIT_COMPARTMENTS.sucrose, fructan=INIT_COMPARTMENTS.fructan,
                  nitrates=INIT_COMPARTMENTS.nitrates, amino_acids=INIT_COMPARTMENTS.amino_acids, proteins=INIT_COMPARTMENTS.proteins, cytokinins=INIT_COMPARTMENTS.cytokinins,
@@ -1738,6 +1822,8 @@ class ChaffElement(PhotosyntheticOrganElement):
 
     PARAMETERS = parameters.CHAFF_ELEMENT_PARAMETERS  #: the internal parameters of the chaffs elements
 
+    __slots__ = ()
+
 
 class LaminaElement(PhotosyntheticOrganElement):
     """
@@ -1746,6 +1832,8 @@ class LaminaElement(PhotosyntheticOrganElement):
 
     PARAMETERS = parameters.LAMINA_ELEMENT_PARAMETERS  #: the internal parameters of the laminae elements
 
+    __slots__ = ()
+
 
 class InternodeElement(PhotosyntheticOrganElement):
     """
@@ -1754,6 +1842,8 @@ class InternodeElement(PhotosyntheticOrganElement):
 
     PARAMETERS = parameters.INTERNODE_ELEMENT_PARAMETERS  #: the internal parameters of the internodes elements
 
+    __slots__ = ()
+
 
 class PeduncleElement(PhotosyntheticOrganElement):
     """
@@ -1762,6 +1852,8 @@ class PeduncleElement(PhotosyntheticOrganElement):
 
     PARAMETERS = parameters.PEDUNCLE_ELEMENT_PARAMETERS  #: the internal parameters of the peduncles elements
 
+    __slots__ = ()
+
 
 class SheathElement(PhotosyntheticOrganElement):
     """
@@ -1770,6 +1862,8 @@ class SheathElement(PhotosyntheticOrganElement):
 
     PARAMETERS = parameters.SHEATH_ELEMENT_PARAMETERS  #: the internal parameters of the sheaths elements
 
+    __slots__ = ()
+
 
 class Soil(object):
     """
@@ -1875,3 +1969,17 @@ class Soil(object):
                 Uptake_Nitrates += root_uptake * culm_density[plant_id]  # TODO: temporary, will be removed in next version
             delta_Nitrates = mineralisation - Uptake_Nitrates
         return delta_Nitrates
+
+
+def register_temperature_responses():
+    """Register the temperature responses of the model in :data:`wheatfspm.temperature.RESPONSES`,
+    from which :class:`cnwheat.simulation.Simulation` reads the effects of the temperature at each time step.
+    """
+    RESPONSES.register('cnwheat.plant.conductivity', Plant.calculate_temperature_effect_on_conductivity)
+    RESPONSES.register('cnwheat.plant.Vmax', Plant.calculate_temperature_effect_on_Vmax)
+    RESPONSES.register('cnwheat.grains.modified_Arrhenius_equation', Grains.modified_Arrhenius_equation)
+    RESPONSES.register('cnwheat.soil.Vmax', Soil.calculate_temperature_effect_on_Vmax)
+    RESPONSES.register('cnwheat.soil.conductivity', Soil.calculate_temperature_effect_on_conductivity)
+
+
+register_temperature_responses()
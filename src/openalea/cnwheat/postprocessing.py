@@ -5,7 +5,6 @@ import os
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 
 from openalea.cnwheat import simulation as cnwheat_simulation, model as cnwheat_model, parameters as cnwheat_parameters, tools as cnwheat_tools
 from openalea.respiwheat import model as respiwheat_model
@@ -863,9 +862,8 @@ def postprocessing(plants_df=None, axes_df=None, metamers_df=None, hiddenzones_d
         pp_organs_df.loc[pp_organs_df.organ == 'roots', 'Conc_Sucrose'] = Roots.calculate_conc_sucrose(roots_df['sucrose'], roots_df['mstruct'])
         pp_organs_df.loc[pp_organs_df.organ == 'roots', 'Conc_cytokinins'] = Roots.calculate_conc_cytokinins(roots_df['cytokinins'], roots_df['mstruct'])
         pp_organs_df.loc[pp_organs_df.organ == 'roots', 'Conc_cytokinins'] = Roots.calculate_conc_cytokinins(roots_df['cytokinins'], roots_df['mstruct'])
-        R_residual = np.array(
-            list(map(respiwheat_model.RespirationModel.R_residual, roots_df['sucrose'], roots_df['mstruct'] * cnwheat_model.Roots.PARAMETERS.ALPHA, roots_df['Total_Organic_Nitrogen'],
-                     soils_df['Tsoil'])))
+        R_residual = respiwheat_model.RespirationModel.R_residual_vectorized(roots_df['sucrose'], roots_df['mstruct'] * cnwheat_model.Roots.PARAMETERS.ALPHA, roots_df['Total_Organic_Nitrogen'],
+                                                                             soils_df['Tsoil'])
         pp_organs_df.loc[pp_organs_df.organ == 'roots', 'R_residual'] = R_residual
 
         # phloem
@@ -964,8 +962,8 @@ def postprocessing(plants_df=None, axes_df=None, metamers_df=None, hiddenzones_d
                 continue
             curr_organ_elements_df = elements_df.loc[group.index]
             pp_curr_organ_elements_df = pp_elements_df.loc[group.index]
-            R_residual = np.vectorize(respiwheat_model.RespirationModel.R_residual)(curr_organ_elements_df['sucrose'], curr_organ_elements_df['mstruct'] * parameters_class.ALPHA,
-                                                                                    curr_organ_elements_df['Total_Organic_Nitrogen'], curr_organ_elements_df['Ts'])
+            R_residual = respiwheat_model.RespirationModel.R_residual_vectorized(curr_organ_elements_df['sucrose'], curr_organ_elements_df['mstruct'] * parameters_class.ALPHA,
+                                                                                 curr_organ_elements_df['Total_Organic_Nitrogen'], curr_organ_elements_df['Ts'])
             pp_curr_organ_elements_df.loc[:, 'R_residual'] = R_residual
         pp_elements_df = pp_elements_df.reindex(columns=ELEMENTS_RUN_POSTPROCESSING_VARIABLES, copy=False)
         pp_elements_df[['plant', 'metamer']] = pp_elements_df[['plant', 'metamer']].astype(int)
@@ -1241,6 +1239,7 @@ def generate_graphs(axes_df=None, hiddenzones_df=None, organs_df=None, elements_
     :param pandas.DataFrame soils_df: CN-Wheat outputs at soil scale (see :attr:`SOILS_RUN_POSTPROCESSING_VARIABLES`)
     :param str graphs_dirpath: the path of the directory to save the generated graphs in
     """
+    import matplotlib.pyplot as plt
 
     x_name = 't'
     x_label = 'Time (Hour)'
@@ -9,6 +9,8 @@ from scipy import interpolate
 
 from openalea.cnwheat import model
 from openalea.cnwheat import tools
+from openalea.wheatfspm.temperature import RESPONSES
+from openalea.wheatfspm.watchdog import SolverHealthError
 
 """
     cnwheat.simulation
@@ -59,6 +61,23 @@ class SimulationRunError(SimulationError):
     pass
 
 
+def _pools_exhaustion_event(t, y):
+    """Event function of :func:`scipy.integrate.solve_ivp`, which is null when a compartment goes below the opposite of
+    :attr:`Simulation.POOLS_EXHAUSTION_TOLERANCE`, i.e. when the solver overshoots the exhaustion of a pool.
+
+    :param float t: the current t
+    :param numpy.ndarray y: the current values of the compartments
+
+    :return: the distance of the lowest compartment to the threshold of exhaustion
+    :rtype: float
+    """
+    return y.min() + Simulation.POOLS_EXHAUSTION_TOLERANCE
+
+
+_pools_exhaustion_event.terminal = True
+_pools_exhaustion_event.direction = -1
+
+
 class Simulation(object):
     """
     The Simulation class permits to initialize and run the model.
@@ -136,6 +155,8 @@ class Simulation(object):
           If the user sets `interpolate_forcings` to `True`, then he/she must also set `photosynthesis_forcings_delta_t` to an integer value greater or equal to `delta_t`.
           For example, if `interpolate_forcings` is `True` and `delta_t==3600`, then `photosynthesis_forcings_delta_t` must be greater or equal to `3600`, that is for example `7200`.
 
+    :param bool preserve_positivity: if True (default), keep the compartments non-negative during the integration (see :meth:`run`).
+
     """
 
     #: the name of the compartments attributes in the model, for objects of types
@@ -145,16 +166,26 @@ class Simulation(object):
     MODEL_COMPARTMENTS_NAMES = {model.Plant: [],
                                 model.Axis: ['C_exudated', 'sum_respi_shoot', 'sum_respi_roots'],
                                 model.Phytomer: [],
-                                model.Organ: ['age_from_flowering', 'amino_acids', 'cytokinins',
-                                              'nitrates', 'proteins', 'starch', 'structure', 'sucrose'],
-                                model.HiddenZone: ['amino_acids', 'fructan', 'proteins', 'sucrose'],
-                                model.PhotosyntheticOrganElement: ['amino_acids', 'cytokinins', 'fructan',
-                                                                   'nitrates', 'proteins', 'starch', 'sucrose', 'triosesP'],
+                                model.Organ: model.Organ.COMPARTMENTS_NAMES,
+                                model.HiddenZone: model.HiddenZone.COMPARTMENTS_NAMES,
+                                model.PhotosyntheticOrganElement: model.PhotosyntheticOrganElement.COMPARTMENTS_NAMES,
                                 model.Soil: ['nitrates']}
 
     #: the time index
     T_INDEX = ['t']
 
+    #: the tolerance on the negative values of the compartments (same units as the compartments) ; below its opposite,
+    #: the integration is stopped and restarted with the compartments set to their non-negative part (see :meth:`run`).
+    #: With the default tolerances of the solver, the pools of triose phosphates overshoot their exhaustion by up to about 1E-4 at night.
+    POOLS_EXHAUSTION_TOLERANCE = 1E-4
+    #: the maximal number of restarts of the integration on the exhaustion of a pool during a run
+    MAX_POOLS_EXHAUSTION_EVENTS = 10
+    #: the maximal ratio between the quantity added to the compartments to keep them non-negative and the total quantity in the compartments,
+    #: above which a warning is logged at the end of a run
+    MASS_BALANCE_TOLERANCE = 1E-6
+    #: the options of :func:`scipy.integrate.solve_ivp`
+    SOLVER_OPTIONS = {'method': 'BDF'}
+
     # ---------------------------------------------------------------------------
     # ---------- DEFINITION OF THE PARAMETERS AND COMPUTED VARIABLES ------------
     # ---------------------------------------------------------------------------
@@ -229,19 +260,17 @@ class Simulation(object):
     #: concatenation of :attr:`T_INDEX` and :attr:`ORGANS_INDEXES`
     ORGANS_T_INDEXES = T_INDEX + ORGANS_INDEXES
     #: the parameters which define the state of the modeled system at organ scale
-    ORGANS_STATE_PARAMETERS = ['mstruct', 'Nstruct', 'senesced_mstruct']
+    ORGANS_STATE_PARAMETERS = model.Organ.STATE_PARAMETERS
     #: the variables which define the state of the modeled system at organ scale,
     #: formed be the concatenation of :attr:`ORGANS_STATE_PARAMETERS` and the names
     #: of the compartments associated to each organ (see :attr:`MODEL_COMPARTMENTS_NAMES`)
     ORGANS_STATE = ORGANS_STATE_PARAMETERS + MODEL_COMPARTMENTS_NAMES.get(model.Organ, [])
     #: the variables that we need to compute in order to compute fluxes and/or compartments values at organ scale
-    ORGANS_INTERMEDIATE_VARIABLES = ['C_exudation', 'HATS_LATS', 'N_exudation', 'RGR_Structure', 'R_Nnit_red', 'R_Nnit_upt', 'Respi_growth',
-                                     'R_grain_growth_starch', 'R_grain_growth_struct', 'R_residual', 'regul_transpiration', 'sum_respi']
+    ORGANS_INTERMEDIATE_VARIABLES = model.Organ.INTERMEDIATE_VARIABLES
     #: the fluxes exchanged between the compartments at organ scale
-    ORGANS_FLUXES = ['Export_Amino_Acids', 'Export_Nitrates', 'Export_cytokinins', 'S_Amino_Acids', 'S_cytokinins', 'S_grain_starch',
-                     'S_grain_structure', 'S_Proteins', 'Unloading_Amino_Acids', 'Unloading_Sucrose', 'Uptake_Nitrates']
+    ORGANS_FLUXES = model.Organ.FLUXES
     #: the variables computed by integrating values of organ components parameters/variables recursively
-    ORGANS_INTEGRATIVE_VARIABLES = ['Total_Organic_Nitrogen']
+    ORGANS_INTEGRATIVE_VARIABLES = model.Organ.INTEGRATIVE_VARIABLES
     #: all the variables computed during a run step of the simulation at organ scale
     ORGANS_RUN_VARIABLES = ORGANS_STATE + ORGANS_INTERMEDIATE_VARIABLES + ORGANS_FLUXES + ORGANS_INTEGRATIVE_VARIABLES
 
@@ -252,17 +281,17 @@ class Simulation(object):
     #: concatenation of :attr:`T_INDEX` and :attr:`HIDDENZONE_INDEXES`
     HIDDENZONE_T_INDEXES = T_INDEX + HIDDENZONE_INDEXES
     #: the parameters which define the state of the modeled system at hidden zone scale
-    HIDDENZONE_STATE_PARAMETERS = ['Nstruct', 'mstruct', 'ratio_DZ']
+    HIDDENZONE_STATE_PARAMETERS = model.HiddenZone.STATE_PARAMETERS
     #: the variables which define the state of the modeled system at hidden zone scale,
     #: formed be the concatenation of :attr:`HIDDENZONE_STATE_PARAMETERS` and the names
     #: of the compartments associated to each hidden zone (see :attr:`MODEL_COMPARTMENTS_NAMES`)
     HIDDENZONE_STATE = HIDDENZONE_STATE_PARAMETERS + MODEL_COMPARTMENTS_NAMES.get(model.HiddenZone, [])
     #: the variables that we need to compute in order to compute fluxes and/or compartments values at hidden zone scale
-    HIDDENZONE_INTERMEDIATE_VARIABLES = ['nb_replications']
+    HIDDENZONE_INTERMEDIATE_VARIABLES = model.HiddenZone.INTERMEDIATE_VARIABLES
     #: the fluxes exchanged between the compartments at hidden zone scale
-    HIDDENZONE_FLUXES = ['D_Fructan', 'D_Proteins', 'S_Fructan', 'S_Proteins', 'Unloading_Amino_Acids', 'Unloading_Sucrose']
+    HIDDENZONE_FLUXES = model.HiddenZone.FLUXES
     #: the variables computed by integrating values of hidden zone components parameters/variables recursively
-    HIDDENZONE_INTEGRATIVE_VARIABLES = []
+    HIDDENZONE_INTEGRATIVE_VARIABLES = model.HiddenZone.INTEGRATIVE_VARIABLES
     #: all the variables computed during a run step of the simulation at plnat scale
     HIDDENZONE_RUN_VARIABLES = HIDDENZONE_STATE + HIDDENZONE_INTERMEDIATE_VARIABLES + HIDDENZONE_FLUXES + HIDDENZONE_INTEGRATIVE_VARIABLES
 
@@ -273,19 +302,17 @@ class Simulation(object):
     #: concatenation of :attr:`T_INDEX` and :attr:`ELEMENTS_INDEXES`
     ELEMENTS_T_INDEXES = T_INDEX + ELEMENTS_INDEXES
     #: the parameters which define the state of the modeled system at element scale
-    ELEMENTS_STATE_PARAMETERS = ['Ag', 'Nstruct', 'Tr', 'Ts', 'green_area', 'is_growing', 'mstruct', 'senesced_mstruct']
+    ELEMENTS_STATE_PARAMETERS = model.PhotosyntheticOrganElement.STATE_PARAMETERS
     #: the variables which define the state of the modeled system at element scale,
     #: formed be the concatenation of :attr:`ELEMENTS_STATE_PARAMETERS` and the names
     #: of the compartments associated to each element (see :attr:`MODEL_COMPARTMENTS_NAMES`)
     ELEMENTS_STATE = ELEMENTS_STATE_PARAMETERS + MODEL_COMPARTMENTS_NAMES.get(model.PhotosyntheticOrganElement, [])
     #: the variables that we need to compute in order to compute fluxes and/or compartments values at element scale
-    ELEMENTS_INTERMEDIATE_VARIABLES = ['Photosynthesis', 'R_Nnit_red', 'R_phloem_loading', 'R_residual', 'Transpiration', 'sum_respi', 'nb_replications']
+    ELEMENTS_INTERMEDIATE_VARIABLES = model.PhotosyntheticOrganElement.INTERMEDIATE_VARIABLES
     #: the fluxes exchanged between the compartments at element scale
-    ELEMENTS_FLUXES = ['Amino_Acids_import', 'D_Fructan', 'D_Proteins', 'D_Starch', 'D_cytokinins', 'Loading_Amino_Acids', 'Loading_Sucrose',
-                       'Nitrates_import', 'Regul_S_Fructan', 'S_Fructan', 'S_Starch', 'S_Sucrose', 'S_Amino_Acids', 'S_Proteins',
-                       'cytokinins_import']
+    ELEMENTS_FLUXES = model.PhotosyntheticOrganElement.FLUXES
     #: the variables computed by integrating values of element components parameters/variables recursively
-    ELEMENTS_INTEGRATIVE_VARIABLES = ['Total_Organic_Nitrogen']
+    ELEMENTS_INTEGRATIVE_VARIABLES = model.PhotosyntheticOrganElement.INTEGRATIVE_VARIABLES
     #: all the variables computed during a run step of the simulation at element scale
     ELEMENTS_RUN_VARIABLES = ELEMENTS_STATE + ELEMENTS_INTERMEDIATE_VARIABLES + ELEMENTS_FLUXES + ELEMENTS_INTEGRATIVE_VARIABLES
 
@@ -344,7 +371,8 @@ class Simulation(object):
                                      model.PhotosyntheticOrganElement: 'cnwheat.derivatives.elements',
                                      model.Soil: 'cnwheat.derivatives.soils'}}
 
-    def __init__(self, respiration_model, delta_t=1, culm_density=None, interpolate_forcings=False, senescence_forcings_delta_t=None, photosynthesis_forcings_delta_t=None):
+    def __init__(self, respiration_model, delta_t=1, culm_density=None, interpolate_forcings=False, senescence_forcings_delta_t=None, photosynthesis_forcings_delta_t=None,
+                 preserve_positivity=True, watchdog=None):
 
         self.respiration_model = respiration_model  #: the model of respiration to use
 
@@ -444,6 +472,18 @@ class Simulation(object):
 
         self.nfev_total = 0  #: cumulative number of RHS function evaluations
 
+        self.preserve_positivity = preserve_positivity  #: a boolean flag which indicates if the compartments are kept non-negative during the integration
+        self.nb_events_total = 0  #: cumulative number of restarts of the integration on the exhaustion of a pool
+        #: The quantities added to the compartments to keep them non-negative during the last run, i.e. the error on the mass balance:
+        #:     {(model_object, compartment_name): quantity, ...}
+        self.positivity_corrections = {}
+        self._last_y = None  #: the values of the compartments at the last evaluation of the derivatives, before their non-negative part is taken
+
+        #: The watchdog which monitors the health of the solver (see :class:`wheatfspm.watchdog.SolverWatchdog`), or None.
+        #: If the watchdog raises a :class:`wheatfspm.watchdog.SolverHealthError` with fallback, the time step is run again
+        #: with :attr:`wheatfspm.watchdog.SolverWatchdog.fallback_solver_options`.
+        self.watchdog = watchdog
+
     def initialize(self, population, soils, Tair=12, Tsoil=12):
         """
         Initialize:
@@ -623,6 +663,15 @@ class Simulation(object):
         """
         Compute CN exchanges which occurred in :attr:`population` and :attr:`soils` over :attr:`delta_t`.
 
+        If :attr:`preserve_positivity` is True, the fluxes are computed from the non-negative part of the compartments, so that the fluxes
+        from the exhausted pools are switched off even when the solver overshoots their exhaustion. If a compartment goes below
+        the opposite of :attr:`POOLS_EXHAUSTION_TOLERANCE`, the integration stops on a terminal event of :func:`scipy.integrate.solve_ivp`
+        and restarts from the event with the compartments set to their non-negative part, at most :attr:`MAX_POOLS_EXHAUSTION_EVENTS` times.
+        The quantities added to the compartments are stored in :attr:`positivity_corrections`, and checked against the total quantity in the compartments.
+
+        If :attr:`watchdog` is set, the health of the solver is checked at each evaluation of the derivatives ; if the watchdog falls back,
+        the integration is done again from the start of the time step with the fallback configuration of the solver.
+
         :param bool show_progressbar: True: show the progress bar of the solver ; False: do not show the progress bar (default).
         """
         logger = logging.getLogger(__name__)
@@ -639,24 +688,33 @@ class Simulation(object):
 
         self._update_initial_conditions()
 
+        if not self.interpolate_forcings:
+            # the forcings are constant over the time step: compute the variables which depend only on them once, before the solver
+            self._calculate_step_invariants()
+
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug("Run the solver with delta_t = %s", self.time_step)
 
-        # call :func:`scipy.integrate.solve_ivp` to integrate the system during 1 time step ;
-        # :func:`scipy.integrate.solve_ivp` computes the derivatives of each function by calling :meth:`_calculate_all_derivatives`
-        sol = solve_ivp(fun=self._calculate_all_derivatives, t_span=self.time_grid, y0=self.initial_conditions,
-                        method='BDF', t_eval=np.array([self.time_step]), dense_output=False)
-
-        self.nfev_total += sol.nfev
+        if self.watchdog is None:
+            self._integrate(Simulation.SOLVER_OPTIONS)
+        else:
+            t_span = (self.time_grid[0], self.time_grid[1])
+            self.watchdog.start_run('cnwheat', t_span, self._compartments_labels)
+            try:
+                self._integrate(Simulation.SOLVER_OPTIONS)
+            except SolverHealthError as error:
+                if not error.fallback:
+                    raise
+                self.watchdog.start_run('cnwheat', t_span, self._compartments_labels, fallback=True)
+                self._integrate(self.watchdog.fallback_solver_options)
 
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug("Run of the solver DONE")
 
-        # check the integration ; raise an exception if the integration failed
-        if not sol.success:
-            message = "Integration failed: {}".format(sol.message)
-            logger.exception(message)
-            raise SimulationRunError(message)
+        if self.preserve_positivity:
+            # the model objects hold the non-negative part of the compartments at the last evaluation of the derivatives
+            self._correct_negative_compartments(self._last_y)
+            self._check_mass_balance()
 
         # Re-compute integrative variables
         self.population.calculate_aggregated_variables()
@@ -666,6 +724,116 @@ class Simulation(object):
 
         logger.info('Run of CN-Wheat DONE')
 
+    def _integrate(self, solver_options):
+        """
+        Integrate the system over the time step, from :attr:`initial_conditions`.
+
+        :param dict solver_options: the options of :func:`scipy.integrate.solve_ivp`, e.g. the method of integration
+        """
+        logger = logging.getLogger(__name__)
+        t_start, y_start = self.time_grid[0], np.array(self.initial_conditions, dtype=float)
+        self.positivity_corrections.clear()
+        nb_events = 0
+        while True:
+            events = None
+            if self.preserve_positivity:
+                y_start = self._correct_negative_compartments(y_start)
+                if nb_events < Simulation.MAX_POOLS_EXHAUSTION_EVENTS:
+                    events = _pools_exhaustion_event
+
+            # call :func:`scipy.integrate.solve_ivp` to integrate the system until the end of the time step, or until a pool is exhausted ;
+            # :func:`scipy.integrate.solve_ivp` computes the derivatives of each function by calling :meth:`_calculate_all_derivatives`
+            sol = solve_ivp(fun=self._calculate_all_derivatives, t_span=(t_start, self.time_grid[1]), y0=y_start,
+                            t_eval=np.array([self.time_step]), dense_output=False, events=events, **solver_options)
+
+            self.nfev_total += sol.nfev
+
+            # check the integration ; raise an exception if the integration failed
+            if not sol.success:
+                message = "Integration failed: {}".format(sol.message)
+                if self.watchdog is not None:
+                    self.watchdog.report(message)
+                logger.exception(message)
+                raise SimulationRunError(message)
+
+            if sol.status != 1:
+                break
+
+            # a pool is exhausted: restart the integration from the event, with the fluxes computed from the non-negative part of the pools
+            nb_events += 1
+            t_start, y_start = sol.t_events[0][0], sol.y_events[0][0]
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Exhaustion of a pool at t = %s ; restart of the solver", t_start)
+
+        self.nb_events_total += nb_events
+
+    def _correct_negative_compartments(self, y):
+        """Set the negative compartments in `y` to 0, and add the quantities set to the compartments to :attr:`positivity_corrections`.
+
+        :param numpy.ndarray y: the values of the compartments
+
+        :return: the non-negative part of `y`
+        :rtype: numpy.ndarray
+        """
+        negative_indexes = np.flatnonzero(y < 0)
+        if negative_indexes.size == 0:
+            return y
+        compartments = {compartment_index: (model_object, compartment_name)
+                        for model_object, compartments in self.initial_conditions_mapping.items()
+                        for compartment_name, compartment_index in compartments.items()}
+        for compartment_index in negative_indexes:
+            compartment = compartments[compartment_index]
+            self.positivity_corrections[compartment] = self.positivity_corrections.get(compartment, 0.) - y[compartment_index]
+        return np.maximum(y, 0.)
+
+    def _compartments_labels(self):
+        """Return the labels of the compartments in :attr:`initial_conditions`, e.g. '1/MS/3/blade/LeafElement1/sucrose' for the sucrose
+        of the exposed element of the lamina of the phytomer 3 of the main stem of the plant 1.
+
+        :return: the labels of the compartments, in the order of :attr:`initial_conditions`
+        :rtype: list [str]
+        """
+        models_objects_ids = {soil: soil_id for soil_id, soil in self.soils.items()}
+        for plant in self.population.plants:
+            models_objects_ids[plant] = (plant.index,)
+            for axis in plant.axes:
+                axis_id = (plant.index, axis.label)
+                models_objects_ids[axis] = axis_id
+                for organ in (axis.roots, axis.phloem, axis.grains):
+                    if organ is not None:
+                        models_objects_ids[organ] = axis_id + (organ.label,)
+                for phytomer in axis.phytomers:
+                    phytomer_id = axis_id + (phytomer.index,)
+                    models_objects_ids[phytomer] = phytomer_id
+                    for organ in (phytomer.chaff, phytomer.peduncle, phytomer.lamina, phytomer.internode, phytomer.sheath, phytomer.hiddenzone):
+                        if organ is None:
+                            continue
+                        models_objects_ids[organ] = phytomer_id + (organ.label,)
+                        if organ is phytomer.hiddenzone:
+                            continue
+                        for element in (organ.exposed_element, organ.enclosed_element):
+                            if element is not None:
+                                models_objects_ids[element] = phytomer_id + (organ.label, element.label)
+        labels = [None] * len(self.initial_conditions)
+        for model_object, compartments in self.initial_conditions_mapping.items():
+            model_object_label = '/'.join(str(index) for index in models_objects_ids.get(model_object, (model_object.__class__.__name__,)))
+            for compartment_name, compartment_index in compartments.items():
+                labels[compartment_index] = '{}/{}'.format(model_object_label, compartment_name)
+        return labels
+
+    def _check_mass_balance(self):
+        """Check that the quantities added to the compartments to keep them non-negative during the last run are negligible
+        compared to the total quantity in the compartments (see :attr:`MASS_BALANCE_TOLERANCE`) ; log a warning if not.
+        """
+        if not self.positivity_corrections:
+            return
+        total_correction = sum(self.positivity_corrections.values())
+        total_quantity = np.abs(self.initial_conditions).sum()
+        if total_correction > Simulation.MASS_BALANCE_TOLERANCE * total_quantity:
+            logger = logging.getLogger(__name__)
+            logger.warning('Mass balance: %s added to the compartments to keep them non-negative, for a total of %s in the compartments',
+                           total_correction, total_quantity)
+
     def _update_initial_conditions(self):
         """Update the compartments values in :attr:`initial_conditions` from the compartments values of :attr:`population` and :attr:`soils`.
         """
@@ -723,6 +891,58 @@ class Simulation(object):
         self.previous_forcings_values.clear()
         self.previous_forcings_values.update(next_forcings_values)
 
+    def _calculate_step_invariants(self):
+        """Compute the variables which depend only on the forcings and on the state parameters of :attr:`population` and :attr:`soils`,
+        and not on the compartments: the effects of the temperature, the transpiration and the photosynthesis of the elements,
+        the total transpiration of the axes and the regulating factor of root exports.
+
+        These variables are constant over a time step, unless the forcings are interpolated: they are computed once before
+        the solver if :attr:`interpolate_forcings` is False, or at each call to :meth:`_calculate_all_derivatives` otherwise.
+        They are stored in the objects of :attr:`population` and :attr:`soils`, from which :meth:`_calculate_all_derivatives` reads them.
+        The effects of the temperature are read from the responses registered in :data:`wheatfspm.temperature.RESPONSES`.
+        """
+        soil_T_effect_Vmax = RESPONSES['cnwheat.soil.Vmax']
+        soil_T_effect_conductivity = RESPONSES['cnwheat.soil.conductivity']
+        for soil in self.soils.values():
+            soil.T_effect_Vmax = soil_T_effect_Vmax(soil.Tsoil)
+            soil.T_effect_conductivity = soil_T_effect_conductivity(soil.Tsoil)
+
+        plant_T_effect_conductivity = RESPONSES['cnwheat.plant.conductivity']
+        plant_T_effect_Vmax = RESPONSES['cnwheat.plant.Vmax']
+        grains_Arrhenius_equation = RESPONSES['cnwheat.grains.modified_Arrhenius_equation']
+        for plant in self.population.plants:
+
+            plant.T_effect_conductivity = plant_T_effect_conductivity(plant.Tair)
+            plant.T_effect_Vmax = plant_T_effect_Vmax(plant.Tair)
+            plant.T_effect_growth = grains_Arrhenius_equation(plant.Tair) / model.Grains.PARAMETERS.Arrhenius_ref
+
+            for axis in plant.axes:
+
+                # compute total transpiration
+                axis.Total_Transpiration = 0.0  # mmol s-1
+                for phytomer in axis.phytomers:
+                    for organ in (phytomer.chaff, phytomer.peduncle, phytomer.lamina, phytomer.internode, phytomer.sheath):
+                        if organ is not None:
+                            for element in (organ.exposed_element, organ.enclosed_element):
+                                if element is not None and element.green_area > 0:
+                                    element.Transpiration = element.calculate_Total_Transpiration(element.Tr, element.green_area)
+                                    axis.Total_Transpiration += (element.Transpiration * element.nb_replications)
+
+                # Compute the regulating factor of root exports by shoot transpiration
+                axis.roots.regul_transpiration = axis.roots.calculate_regul_transpiration(axis.Total_Transpiration)
+
+                # compute the photosynthesis of the elements which are computed in :meth:`_calculate_all_derivatives`
+                for phytomer in axis.phytomers:
+                    if phytomer.hiddenzone is not None and phytomer.hiddenzone.mstruct == 0:
+                        continue
+                    for organ in (phytomer.chaff, phytomer.peduncle, phytomer.lamina, phytomer.internode, phytomer.sheath):
+                        if organ is None:
+                            continue
+                        for element in (organ.exposed_element, organ.enclosed_element):
+                            if element is None or element.green_area <= 0.25E-6 or element.mstruct <= 0.0:
+                                continue
+                            element.Photosynthesis = element.calculate_total_Photosynthesis(element.Ag, element.green_area)
+
     def _log_compartments(self, t, y, loggers_names):
         """Log the values in `y` to the loggers in `loggers_names`.
         """
@@ -845,10 +1065,16 @@ class Simulation(object):
             # Compute integrative variables
             self.population.calculate_aggregated_variables()
 
+            # the variables which depend on the forcings change with t
+            self._calculate_step_invariants()
+
         compartments_logger = logging.getLogger('cnwheat.compartments')
         if logger.isEnabledFor(logging.DEBUG) and compartments_logger.isEnabledFor(logging.DEBUG):
             self._log_compartments(t_abs, y, Simulation.LOGGERS_NAMES['compartments'])
 
+        if self.watchdog is not None:
+            self.watchdog.check_evaluation(t, y)
+
         # check that the solver is not crashed
         y_isnan = np.isnan(y)
         if y_isnan.any():
@@ -856,6 +1082,11 @@ class Simulation(object):
             logger.exception(message)
             raise SimulationRunError(message)
 
+        if self.preserve_positivity:
+            # the fluxes are computed from the non-negative part of the pools, i.e. the fluxes from the exhausted pools are switched off
+            self._last_y = y
+            y = np.maximum(y, 0.)
+
         y_derivatives = np.zeros_like(y)
 
         # TODO: TEMP !!!!
@@ -864,14 +1095,9 @@ class Simulation(object):
         soil.nitrates = y[self.initial_conditions_mapping[soil]['nitrates']]
         soil.Conc_Nitrates_Soil = soil.calculate_Conc_Nitrates(soil.nitrates)
 
-        soil.T_effect_Vmax = soil.calculate_temperature_effect_on_Vmax(soil.Tsoil)
-        soil.T_effect_conductivity = soil.calculate_temperature_effect_on_conductivity(soil.Tsoil)
-
+        # the effects of the temperature, the transpiration and the photosynthesis are computed in :meth:`_calculate_step_invariants`
         for plant in self.population.plants:
 
-            plant.T_effect_conductivity = plant.calculate_temperature_effect_on_conductivity(plant.Tair)
-            plant.T_effect_Vmax = plant.calculate_temperature_effect_on_Vmax(plant.Tair)
-
             for axis in plant.axes:
                 sum_respi_shoot = 0.0
                 axis.C_exudated = y[self.initial_conditions_mapping[axis]['C_exudated']]
@@ -889,21 +1115,6 @@ class Simulation(object):
                 axis.roots.cytokinins = y[self.initial_conditions_mapping[axis.roots]['cytokinins']]
                 phloem_contributors.append(axis.roots)
 
-                # compute total transpiration at t_inf
-                axis.Total_Transpiration = 0.0  # mmol s-1
-                total_green_area = 0.0  # m2
-                for phytomer in axis.phytomers:
-                    for organ in (phytomer.chaff, phytomer.peduncle, phytomer.lamina, phytomer.internode, phytomer.sheath):
-                        if organ is not None:
-                            for element in (organ.exposed_element, organ.enclosed_element):
-                                if element is not None and element.green_area > 0:
-                                    element.Transpiration = element.calculate_Total_Transpiration(element.Tr, element.green_area)
-                                    axis.Total_Transpiration += (element.Transpiration * element.nb_replications)
-                                    total_green_area += (element.green_area * element.nb_replications)
-
-                # Compute the regulating factor of root exports by shoot transpiration
-                axis.roots.regul_transpiration = axis.roots.calculate_regul_transpiration(axis.Total_Transpiration)
-
                 # compute the flows from/to the roots to/from photosynthetic organs
                 axis.roots.Uptake_Nitrates, axis.roots.HATS_LATS = axis.roots.calculate_Uptake_Nitrates(soil.Conc_Nitrates_Soil, axis.roots.nitrates, axis.roots.sucrose,
                                                                                                         soil.T_effect_Vmax)
@@ -945,9 +1156,6 @@ class Simulation(object):
                             element.proteins = y[self.initial_conditions_mapping[element]['proteins']]
                             element.cytokinins = y[self.initial_conditions_mapping[element]['cytokinins']]
 
-                            # intermediate variables
-                            element.Photosynthesis = element.calculate_total_Photosynthesis(element.Ag, element.green_area)
-
                             # flows
                             if element.is_growing:  #: Export of sucrose and amino acids towards the HZ. Several growing elements might export toward the HZ at the same time (leaf and internode)
                                 element.Loading_Sucrose = element.calculate_export_sucrose(element.sucrose, hiddenzone.sucrose, hiddenzone.mstruct, plant.T_effect_conductivity)
@@ -1049,8 +1257,7 @@ class Simulation(object):
                     axis.grains.age_from_flowering = y[self.initial_conditions_mapping[axis.grains]['age_from_flowering']]
 
                     # intermediate variables
-                    T_effect_growth = axis.grains.calculate_temperature_effect_on_growth(plant.Tair)
-                    axis.grains.RGR_Structure = axis.grains.calculate_RGR_Structure(axis.phloem.sucrose, axis.mstruct, T_effect_growth)
+                    axis.grains.RGR_Structure = axis.grains.calculate_RGR_Structure(axis.phloem.sucrose, axis.mstruct, plant.T_effect_growth)
                     axis.grains.structural_dry_mass = axis.grains.calculate_structural_dry_mass(axis.grains.structure)
 
                     # flows
@@ -1069,7 +1276,7 @@ class Simulation(object):
                     y_derivatives[self.initial_conditions_mapping[axis.grains]['structure']] = structure_derivative
                     y_derivatives[self.initial_conditions_mapping[axis.grains]['starch']] = starch_derivative
                     y_derivatives[self.initial_conditions_mapping[axis.grains]['proteins']] = proteins_derivative
-                    y_derivatives[self.initial_conditions_mapping[axis.grains]['age_from_flowering']] += (self.delta_t * T_effect_growth) #TODO: create a function
+                    y_derivatives[self.initial_conditions_mapping[axis.grains]['age_from_flowering']] += (self.delta_t * plant.T_effect_growth) #TODO: create a function
 
                 # compute the derivative of each compartment of roots
                 # flows
@@ -11,8 +11,6 @@ import json
 import numpy as np
 import pandas as pd
 
-import matplotlib.pyplot as plt
-
 """
     cnwheat.tools
     ~~~~~~~~~~~~~
@@ -86,6 +84,7 @@ def plot_cnwheat_ouputs(outputs, x_name, y_name, x_label='', y_label='', x_lim=N
     >>> plot(cnwheat_output_df, x_name = 't', y_name = 'Conc_Sucrose', x_label='Time (Hour)', y_label=u'[Sucrose] (mol g$^{-1}$ mstruct)', title='{} = f({})'.format('Conc_Sucrose', 't'), filters={'plant': 1, 'axis': 'MS', 'organ': 'Lamina', 'element': 1})
 
     """
+    import matplotlib.pyplot as plt  # imported here to keep matplotlib out of the import of the simulation
 
     # finds the scale of `outputs`
     group_keys = [key for key in OUTPUTS_INDEXES if key in outputs and key != x_name and key != y_name]
@@ -37,50 +37,44 @@ def from_dataframes(hiddenzone_inputs, element_inputs, axis_inputs):
     .. seealso:: :attr:`simulation.Simulation.inputs` for the structure of Elong-Wheat inputs.
 
     """
-    all_hiddenzone_dict = {}
-    all_element_dict = {}
-    all_axis_dict = {}
     all_length_dict = {}
     cumulated_internode_length = {}
 
     # -- Convert input dataframe into dictionaries
 
-    hiddenzone_inputs_columns = hiddenzone_inputs.columns.difference(HIDDENZONE_TOPOLOGY_COLUMNS)
-    emerging_element_inputs_columns = element_inputs.columns.difference(ELEMENT_TOPOLOGY_COLUMNS)
-    axis_inputs_columns = axis_inputs.columns.difference(AXIS_TOPOLOGY_COLUMNS)
-
-    for axis_inputs_id, axis_inputs_group in axis_inputs.groupby(AXIS_TOPOLOGY_COLUMNS):
-        # Axis
-        axis_inputs_series = axis_inputs_group.loc[axis_inputs_group.first_valid_index()]
-        axis_inputs_dict = axis_inputs_series[axis_inputs_columns].to_dict()
-        all_axis_dict[axis_inputs_id] = axis_inputs_dict
+    all_axis_dict = _dataframe_to_dict(axis_inputs, AXIS_TOPOLOGY_COLUMNS)
+    for axis_id, axis_inputs_dict in all_axis_dict.items():
         # Complete dict of lengths
-        all_length_dict[axis_inputs_id] = {}
+        all_length_dict[axis_id] = {}
         for i in range(axis_inputs_dict['nb_leaves']):
-            all_length_dict[axis_inputs_id][i+1] = {'sheath': [], 'cumulated_internode': []}
-        cumulated_internode_length[axis_inputs_id] = []
-
-    for element_inputs_id, element_inputs_group in sorted(element_inputs.groupby(ELEMENT_TOPOLOGY_COLUMNS)):
-        # Elements
-        element_inputs_series = element_inputs_group.loc[element_inputs_group.first_valid_index()]
-        element_inputs_dict = element_inputs_series[emerging_element_inputs_columns].to_dict()
-        all_element_dict[element_inputs_id] = element_inputs_dict
-        # Complete dict of lengths
-        axis_id, phytomer_id, organ = element_inputs_id[:2], element_inputs_id[2], element_inputs_id[3]
-        if organ == 'sheath' and not element_inputs_dict['is_growing']:
-            all_length_dict[axis_id][phytomer_id]['sheath'].append(element_inputs_dict['length'])
-        elif organ == 'internode' and not element_inputs_dict['is_growing']:  # WARNING: this algo won't copy previous internode length for a phytomer without internode
-            cumulated_internode_length[axis_id].append(element_inputs_dict['length'])
+            all_length_dict[axis_id][i+1] = {'sheath': [], 'cumulated_internode': []}
+        cumulated_internode_length[axis_id] = []
+
+    element_first_rows = _first_rows(element_inputs, ELEMENT_TOPOLOGY_COLUMNS)
+    all_element_dict = _first_rows_to_dict(element_first_rows, ELEMENT_TOPOLOGY_COLUMNS)
+
+    # Complete dict of lengths with the mature sheaths and internodes, in the order of the elements
+    stem_first_rows = element_first_rows[element_first_rows['organ'].isin(['sheath', 'internode'])]
+    for plant_id, axis_label, phytomer_id, organ, is_growing, length in zip(*[stem_first_rows[column].to_numpy().tolist()
+                                                                             for column in ('plant', 'axis', 'metamer', 'organ', 'is_growing', 'length')]):
+        if is_growing:
+            continue
+        axis_id = (plant_id, axis_label)
+        if organ == 'sheath':
+            all_length_dict[axis_id][phytomer_id]['sheath'].append(length)
+        else:  # WARNING: this algo won't copy previous internode length for a phytomer without internode
+            cumulated_internode_length[axis_id].append(length)
             if not all_length_dict[axis_id][phytomer_id]['cumulated_internode']:  # if list is empty for that phytomer, the list of all phytomer lengths is written
                 all_length_dict[axis_id][phytomer_id]['cumulated_internode'].extend(cumulated_internode_length[axis_id])
             else:  # only the last internode length is written (case of organs with hidden and visible part)
-                all_length_dict[axis_id][phytomer_id]['cumulated_internode'].append(element_inputs_dict['length'])
+                all_length_dict[axis_id][phytomer_id]['cumulated_internode'].append(length)
+
+    # the phytomers with an internode element
+    internode_inputs = element_inputs[element_inputs['organ'] == 'internode']
+    phytomers_with_internode = set(zip(*[internode_inputs[column].to_numpy().tolist() for column in HIDDENZONE_TOPOLOGY_COLUMNS]))
 
-    for hiddenzone_inputs_id, hiddenzone_inputs_group in sorted(hiddenzone_inputs.groupby(HIDDENZONE_TOPOLOGY_COLUMNS)):
-        # hiddenzone
-        hiddenzone_inputs_series = hiddenzone_inputs_group.loc[hiddenzone_inputs_group.first_valid_index()]
-        hiddenzone_inputs_dict = hiddenzone_inputs_series[hiddenzone_inputs_columns].to_dict()
-        all_hiddenzone_dict[hiddenzone_inputs_id] = hiddenzone_inputs_dict
+    all_hiddenzone_dict = _dataframe_to_dict(hiddenzone_inputs, HIDDENZONE_TOPOLOGY_COLUMNS)
+    for hiddenzone_inputs_id, hiddenzone_inputs_dict in all_hiddenzone_dict.items():
         # Complete dict of  length
         axis_id = hiddenzone_inputs_id[:2]
         phytomer_id = hiddenzone_inputs_id[2]
@@ -91,12 +85,56 @@ def from_dataframes(hiddenzone_inputs, element_inputs, axis_inputs):
             cumulated_internode_length[axis_id].append(hiddenzone_inputs_dict['internode_L'])
             all_length_dict[axis_id][phytomer_id]['cumulated_internode'].extend(cumulated_internode_length[axis_id])
 
-        elif not hiddenzone_inputs_dict['internode_is_growing'] and hiddenzone_inputs_id + ('internode',) not in element_inputs.groupby(ELEMENT_TOPOLOGY_COLUMNS[:-1]).groups.keys():
+        elif not hiddenzone_inputs_dict['internode_is_growing'] and hiddenzone_inputs_id not in phytomers_with_internode:
             all_length_dict[axis_id][phytomer_id]['cumulated_internode'].extend(cumulated_internode_length[axis_id])
 
     return {'hiddenzone': all_hiddenzone_dict, 'elements': all_element_dict, 'axes': all_axis_dict, 'sheath_internode_lengths': all_length_dict}
 
 
+def _first_rows(dataframe, topology_columns):
+    """
+    Get the first row of each topological element of a dataframe, sorted by topological element,
+    as done with :meth:`pandas.DataFrame.groupby` on `topology_columns`.
+
+    :param pandas.DataFrame dataframe: the dataframe
+    :param list [str] topology_columns: the columns which define the topology in `dataframe`
+
+    :return: The first row of each topological element.
+    :rtype: pandas.DataFrame
+    """
+    return dataframe.dropna(subset=topology_columns).drop_duplicates(subset=topology_columns).sort_values(topology_columns)
+
+
+def _first_rows_to_dict(first_rows, topology_columns):
+    """
+    Convert the first rows of the topological elements to a dictionary.
+
+    :param pandas.DataFrame first_rows: the first row of each topological element (see :func:`_first_rows`)
+    :param list [str] topology_columns: the columns which define the topology in `first_rows`
+
+    :return: The data of each topological element, by id of topological element.
+    :rtype: dict [tuple, dict [str, object]]
+    """
+    data_columns = first_rows.columns.difference(topology_columns)
+    ids = zip(*[first_rows[column].to_numpy().tolist() for column in topology_columns])
+    data = [first_rows[column].to_numpy().tolist() for column in data_columns]
+    rows = zip(*data) if data else [()] * len(first_rows)
+    return {current_id: dict(zip(data_columns, row)) for current_id, row in zip(ids, rows)}
+
+
+def _dataframe_to_dict(dataframe, topology_columns):
+    """
+    Convert a dataframe to a dictionary with the data of the first row of each topological element.
+
+    :param pandas.DataFrame dataframe: the dataframe to convert
+    :param list [str] topology_columns: the columns which define the topology in `dataframe`
+
+    :return: The data of the first row of each topological element, by id of topological element.
+    :rtype: dict [tuple, dict [str, object]]
+    """
+    return _first_rows_to_dict(_first_rows(dataframe, topology_columns), topology_columns)
+
+
 def to_dataframes(data_dict):
     """
     Convert outputs from Elong-Wheat format to Pandas dataframe.
@@ -1,8 +1,9 @@
 # -*- coding: latin-1 -*-
 
 from __future__ import division  # use "//" to do integer division
-import pandas as pd
+import numpy as np
 from openalea.elongwheat import parameters
+from openalea.wheatfspm.temperature import RESPONSES
 from math import exp, log10
 
 """
@@ -73,7 +74,15 @@ def calculate_time_equivalent_Tref(temperature, time):
     :return: temperature-compensated time (s)
     :rtype: float
     """
-    return time * modified_Arrhenius_equation(temperature) / modified_Arrhenius_equation(parameters.Temp_Tref)
+    response = RESPONSES['modified_Arrhenius_equation']
+    return time * response(temperature) / response(parameters.Temp_Tref)
+
+
+def register_temperature_responses():
+    """ Register the temperature responses of the model in :data:`wheatfspm.temperature.RESPONSES`.
+    Must be called each time the parameters of the model are updated, as the registered responses cache their values.
+    """
+    RESPONSES.register('modified_Arrhenius_equation', modified_Arrhenius_equation)
 
 
 def calculate_cumulated_thermal_time(sum_TT, temperature, delta_teq):
@@ -137,45 +146,62 @@ def calculate_SAM_GA(status, teq_since_primordium):
 # --- Leaves
 # -------------------------------------------------------------------------------------------------------------------
 
-def calculate_ligule_height(sheath_internode_length, all_element_inputs, SAM_id, all_ligule_height_df):
+def calculate_ligule_height(sheath_internode_length, all_element_inputs, SAM_id):
     """ Calculate ligule heights below each phytomer of an axis from lengths of internodes and sheaths.
 
-    The result is formated into a dataframe which is concatenated with a shared dataframe storing all ligule heights
+    The ligule heights are sorted by phytomer and stored with their prefix maxima, i.e. the height of the highest ligule
+    of all the phytomers up to each phytomer, so the highest previous ligule of a phytomer is found by a binary search (see :func:`calculate_top_ligule_height`).
 
     :param dict sheath_internode_length: Dictionary with sheath and internode lengths for a given axis, (m)
     :param dict all_element_inputs: Dictionary of all element inputs
     :param tuple SAM_id: Id of the SAM (plant_id, axis_id)
-    :param pandas.DataFrame all_ligule_height_df: Shared dataframe used to store all ligule heights
 
-    :return: A dataframe with ligule height of a given axis
-    :rtype: pandas.DataFrame
+    :return: The ligulated phytomers of the axis in ascending order, and the height of the highest ligule of the phytomers up to each of them (m)
+    :rtype: (numpy.ndarray, numpy.ndarray)
     """
-
+    ligulated_phytomers = []
+    ligule_heights = []
     for phytomer_id, lengths in sheath_internode_length.items():
         lamina_id = SAM_id + (phytomer_id, 'blade', 'LeafElement1')
 
-        if lamina_id in all_element_inputs.keys() and not all_element_inputs[lamina_id]['is_growing']:
-            ligule_height = sum(lengths['sheath'] + lengths['cumulated_internode'])
-            ligule_height_df = pd.DataFrame([(SAM_id, phytomer_id, ligule_height)], columns=list(all_ligule_height_df))
-            if all_ligule_height_df.empty:
-                all_ligule_height_df = ligule_height_df
-            else:
-                all_ligule_height_df = pd.concat((all_ligule_height_df, ligule_height_df), ignore_index=True)
+        if lamina_id in all_element_inputs and not all_element_inputs[lamina_id]['is_growing']:
+            ligulated_phytomers.append(phytomer_id)
+            ligule_heights.append(sum(lengths['sheath'] + lengths['cumulated_internode']))
+
+    ligulated_phytomers = np.array(ligulated_phytomers)
+    ligule_heights = np.array(ligule_heights, dtype=float)
+    phytomers_order = np.argsort(ligulated_phytomers, kind='stable')
 
-    return all_ligule_height_df
+    return ligulated_phytomers[phytomers_order], np.maximum.accumulate(ligule_heights[phytomers_order])
+
+
+def calculate_top_ligule_height(ligule_heights, phytomer_id):
+    """ Height of the highest ligule of the phytomers below a given phytomer
+
+    :param (numpy.ndarray, numpy.ndarray) ligule_heights: ligulated phytomers of a given axis and prefix maxima of their ligule heights (m), as returned by :func:`calculate_ligule_height`
+    :param int phytomer_id: phytomer number
+
+    :return: Height of the highest previous ligule (m)
+    :rtype: float
+    """
+    ligulated_phytomers, top_ligule_heights = ligule_heights
+    nb_previous_ligules = np.searchsorted(ligulated_phytomers, phytomer_id, side='left')
+    if nb_previous_ligules == 0:
+        raise ValueError('No ligule below phytomer {}'.format(phytomer_id))
+    return top_ligule_heights[nb_previous_ligules - 1]
 
 
 def calculate_leaf_pseudostem_length(ligule_heights, bottom_hiddenzone_height, phytomer_id):
     """ Distance between the bottom of the hidden zone and the highest previous ligule
 
-    :param pandas.DataFrame ligule_heights: height of all ligules of a given axis (m)
+    :param (numpy.ndarray, numpy.ndarray) ligule_heights: ligulated phytomers of a given axis and prefix maxima of their ligule heights (m), as returned by :func:`calculate_ligule_height`
     :param float bottom_hiddenzone_height: height of the bottom of the hidden zone given by the cumulated lengths of below internodes (m)
     :param int phytomer_id: phytomer number
 
     :return: Distance for the leaf to emerge out of the pseudostem (m)
     :rtype: float
     """
-    top_ligule_height = max(ligule_heights[ligule_heights['phytomer'] < phytomer_id]['ligule height'])  # highest previous ligule
+    top_ligule_height = calculate_top_ligule_height(ligule_heights, phytomer_id)  # highest previous ligule
     leaf_pseudostem_length = top_ligule_height - bottom_hiddenzone_height
 
     return max(leaf_pseudostem_length, 0)
@@ -531,7 +557,7 @@ def calculate_cumulated_internode_length(internode_lengths):
 def calculate_internode_distance_to_emerge(ligule_heights, bottom_hiddenzone_height, phytomer_rank, curr_internode_L):
     """ Distance for the internode to be visible given by the pseudostem length.
 
-    :param pandas.DataFrame ligule_heights: height of all ligules of a given axis (m)
+    :param (numpy.ndarray, numpy.ndarray) ligule_heights: ligulated phytomers of a given axis and prefix maxima of their ligule heights (m), as returned by :func:`calculate_ligule_height`
     :param float bottom_hiddenzone_height: height of the bottom of the hidden zone given by the cumulated lengths of below internodes (m)
     :param int phytomer_rank: phytomer rank
     :param float curr_internode_L: Internode length of the current phyomer (m).
@@ -540,7 +566,7 @@ def calculate_internode_distance_to_emerge(ligule_heights, bottom_hiddenzone_hei
     :rtype: float
     """
 
-    top_ligule_height = max(ligule_heights[ligule_heights['phytomer'] < phytomer_rank]['ligule height'])  # highest previous ligule
+    top_ligule_height = calculate_top_ligule_height(ligule_heights, phytomer_rank)  # highest previous ligule
     leaf_pseudostem_length = top_ligule_height - bottom_hiddenzone_height
 
     internode_distance_to_emerge = leaf_pseudostem_length + curr_internode_L
@@ -766,3 +792,6 @@ def calculate_end_internode_elongation(internode_L, internode_Lmax, internode_ps
     if internode_Lmax:
         condition_B = (internode_L >= internode_Lmax)
     return condition_A or condition_B
+
+
+register_temperature_responses()
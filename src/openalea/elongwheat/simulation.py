@@ -3,13 +3,13 @@
 from __future__ import division  # use "//" to do integer division
 
 import warnings
-import copy
 
 import numpy as np
 import pandas as pd
 
 from openalea.elongwheat import model
 from openalea.elongwheat import parameters
+from openalea.wheatfspm.copy_on_write import CopyOnWriteOutputs
 
 """
     elongwheat.simulation
@@ -49,9 +49,6 @@ HIDDENZONE_INPUTS_OUTPUTS = sorted(set(HIDDENZONE_INPUTS + HIDDENZONE_OUTPUTS))
 ELEMENT_INPUTS_OUTPUTS = sorted(set(ELEMENT_INPUTS + ELEMENT_OUTPUTS))
 AXIS_INPUTS_OUTPUTS = sorted(set(AXIS_INPUTS + AXIS_OUTPUTS))
 
-#: topology colums for ligule height dataframe
-LIGULE_TOPOLOGY_COLUMNS = ['axis_id', 'phytomer', 'ligule height']
-
 
 class SimulationError(Exception):
     pass
@@ -87,6 +84,7 @@ class Simulation(object):
         #:
         #: See :TODO?
         #: for more information about the inputs.
+        #: The outputs of each type are a :class:`CopyOnWriteOutputs` initialized from the inputs of the same type.
         self.outputs = {}
 
         #: the delta t of the simulation (in seconds)
@@ -95,6 +93,7 @@ class Simulation(object):
         #: Update parameters if specified
         if update_parameters:
             parameters.__dict__.update(update_parameters)
+        model.register_temperature_responses()
 
     def initialize(self, inputs):
         """
@@ -114,9 +113,9 @@ class Simulation(object):
         :param bool optimal_growth_option: if True the model will assume optimal growth conditions
         """
 
-        # Copy the inputs into the output dict
-        self.outputs.update({inputs_type: copy.deepcopy(all_inputs) for inputs_type, all_inputs in self.inputs.items() if inputs_type in {'hiddenzone', 'elements', 'axes',
-                                                                                                                                          'sheath_internode_lengths'}})
+        # Initialize the outputs from the inputs. The inputs are not copied: only the updated variables are stored in the outputs
+        self.outputs.update({inputs_type: CopyOnWriteOutputs(all_inputs) for inputs_type, all_inputs in self.inputs.items() if inputs_type in {'hiddenzone', 'elements', 'axes',
+                                                                                                                                               'sheath_internode_lengths'}})
 
         # Hidden zones
         all_hiddenzone_inputs = self.inputs['hiddenzone']
@@ -133,8 +132,8 @@ class Simulation(object):
         # sheath and internode lengths
         all_sheath_internode_lengths = self.inputs['sheath_internode_lengths']
 
-        # Ligule heights
-        all_ligule_height_df = pd.DataFrame(columns=LIGULE_TOPOLOGY_COLUMNS)
+        # Ligule heights: {(plant_index, axis_label): (ligulated phytomers, heights of the highest ligules up to each phytomer), ...}
+        all_ligule_heights = {}
 
         # --  Beginning of computations
 
@@ -179,7 +178,7 @@ class Simulation(object):
                 self.outputs['hiddenzone'][hiddenzone_id] = new_hiddenzone
 
             # Ligule height
-            all_ligule_height_df = model.calculate_ligule_height(all_sheath_internode_lengths[axis_id], all_element_inputs, axis_id, all_ligule_height_df)
+            all_ligule_heights[axis_id] = model.calculate_ligule_height(all_sheath_internode_lengths[axis_id], all_element_inputs, axis_id)
 
             self.outputs['axes'][axis_id] = curr_axis_outputs
 
@@ -287,14 +286,14 @@ class Simulation(object):
                 bottom_hiddenzone_height = model.calculate_cumulated_internode_length(below_internode_lengths)
 
                 # Distance between the bottom of the hiddenzone and the highest previous ligule
-                leaf_pseudostem_length = model.calculate_leaf_pseudostem_length(all_ligule_height_df[all_ligule_height_df['axis_id'] == axis_id], bottom_hiddenzone_height, phytomer_id)
+                axis_ligule_heights = all_ligule_heights[axis_id]
+                leaf_pseudostem_length = model.calculate_leaf_pseudostem_length(axis_ligule_heights, bottom_hiddenzone_height, phytomer_id)
                 curr_hiddenzone_outputs['leaf_pseudostem_length'] = leaf_pseudostem_length
                 curr_hiddenzone_outputs['delta_leaf_pseudostem_length'] = leaf_pseudostem_length - hiddenzone_inputs['leaf_pseudostem_length']  # Variable used in growthwheat
 
                 # Calculate the internode pseudostem length
                 curr_internode_L = hiddenzone_inputs['internode_L']
-                internode_distance_to_emerge = model.calculate_internode_distance_to_emerge(all_ligule_height_df[all_ligule_height_df['axis_id'] == axis_id], bottom_hiddenzone_height, phytomer_id,
-                                                                                            curr_internode_L)
+                internode_distance_to_emerge = model.calculate_internode_distance_to_emerge(axis_ligule_heights, bottom_hiddenzone_height, phytomer_id, curr_internode_L)
                 curr_hiddenzone_outputs['internode_distance_to_emerge'] = internode_distance_to_emerge
                 curr_hiddenzone_outputs['delta_internode_distance_to_emerge'] = internode_distance_to_emerge - hiddenzone_inputs['internode_distance_to_emerge']  # Variable used in growthwheat
 
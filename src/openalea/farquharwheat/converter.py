@@ -46,21 +46,27 @@ def from_dataframe(element_inputs, axes_inputs):
     seealso:: see :attr:`simulation.Simulation.inputs` and :attr:`simulation.Simulation.outputs`
        for the structure of Farquhar-Wheat inputs/outputs.
     """
-    all_elements_dict = {}
-    data_columns = element_inputs.columns.difference(ELEMENT_TOPOLOGY_COLUMNS)
-    for current_id, current_group in element_inputs.groupby(ELEMENT_TOPOLOGY_COLUMNS):
-        current_series = current_group.loc[current_group.first_valid_index()]
-        current_dict = current_series[data_columns].to_dict()
-        all_elements_dict[current_id] = current_dict
-
-    all_axes_dict = {}
-    data_columns = axes_inputs.columns.difference(AXIS_TOPOLOGY_COLUMNS)
-    for current_id, current_group in axes_inputs.groupby(AXIS_TOPOLOGY_COLUMNS):
-        current_series = current_group.loc[current_group.first_valid_index()]
-        current_dict = current_series[data_columns].to_dict()
-        all_axes_dict[current_id] = current_dict
-
-    return {'elements': all_elements_dict, 'axes': all_axes_dict}
+    return {'elements': _dataframe_to_dict(element_inputs, ELEMENT_TOPOLOGY_COLUMNS),
+            'axes': _dataframe_to_dict(axes_inputs, AXIS_TOPOLOGY_COLUMNS)}
+
+
+def _dataframe_to_dict(dataframe, topology_columns):
+    """
+    Convert a dataframe to a dictionary with the data of the first row of each topological element,
+    sorted by topological element, as done with :meth:`pandas.DataFrame.groupby` on `topology_columns`.
+
+    :param pandas.DataFrame dataframe: the dataframe to convert
+    :param list [str] topology_columns: the columns which define the topology in `dataframe`
+
+    :return: The data of the first row of each topological element, by id of topological element.
+    :rtype: dict [tuple, dict [str, object]]
+    """
+    data_columns = dataframe.columns.difference(topology_columns)
+    first_rows = dataframe.dropna(subset=topology_columns).drop_duplicates(subset=topology_columns).sort_values(topology_columns)
+    ids = zip(*[first_rows[column].to_numpy().tolist() for column in topology_columns])
+    data = [first_rows[column].to_numpy().tolist() for column in data_columns]
+    rows = zip(*data) if data else [()] * len(first_rows)
+    return {current_id: dict(zip(data_columns, row)) for current_id, row in zip(ids, rows)}
 
 
 def to_dataframe(data_dict):
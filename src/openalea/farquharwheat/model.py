@@ -2,6 +2,9 @@
 
 from __future__ import division  # use '//' to do integer division
 from math import sqrt, log, exp
+
+import numpy as np
+
 from openalea.farquharwheat import parameters
 
 """
@@ -20,6 +23,85 @@ from openalea.farquharwheat import parameters
 
 # TODO: extract all parameters and put them in farqhuar.parameters
 
+
+class SolverStatistics(object):
+    """
+    Statistics of the iterations to find Ci and Ts in :func:`run`, :func:`run_vectorized` and :func:`run_dark`.
+    """
+
+    def __init__(self):
+        self.nb_resolutions = 0  #: the number of elements (or primitives) whose Ci and Ts were found
+        self.nb_iterations = 0  #: the total number of iterations
+        self.failures = []  #: the elements whose iterations did not converge: [(organ_name, variable, previous value, value), ...]
+
+    def record(self, nb_iterations):
+        """
+        Record the number of iterations of some elements.
+
+        :param nb_iterations: the number of iterations of each element
+        :type nb_iterations: int or numpy.ndarray
+        """
+        nb_iterations = np.atleast_1d(nb_iterations)
+        self.nb_resolutions += nb_iterations.size
+        self.nb_iterations += int(nb_iterations.sum())
+
+    def record_failure(self, organ_name, variable, previous_value, value):
+        """
+        Record an element whose iterations did not converge after :attr:`MAX_ITERATIONS <farquharwheat.parameters.MAX_ITERATIONS>` iterations.
+
+        :param str organ_name: the name of the organ to which belongs the element
+        :param str variable: the variable which did not converge: 'Ci' or 'Ts'
+        :param float previous_value: the value of the variable at the previous iteration
+        :param float value: the value of the variable at the last iteration
+        """
+        self.failures.append((organ_name, variable, float(previous_value), float(value)))
+
+    @property
+    def mean_iterations(self):
+        """The mean number of iterations by element, or NaN if no element was recorded."""
+        return self.nb_iterations / self.nb_resolutions if self.nb_resolutions else float('nan')
+
+    def to_dict(self):
+        """
+        :return: the statistics: {'nb_resolutions': ..., 'nb_iterations': ..., 'mean_iterations': ..., 'nb_failures': ...}
+        :rtype: dict
+        """
+        return {'nb_resolutions': self.nb_resolutions, 'nb_iterations': self.nb_iterations,
+                'mean_iterations': self.mean_iterations, 'nb_failures': len(self.failures)}
+
+
+def _anderson_step(Ci, Ts, new_Ci, new_Ts, history):
+    """
+    Next iterate of the iterations to find Ci and Ts, with the Anderson acceleration of depth 1.
+
+    The residuals of the fixed point are relative to the iterates, as in the convergence criterion of :func:`run`.
+    The step falls back to the plain fixed-point iteration (i.e. the next iterate is (new_Ci, new_Ts)) when the residual
+    did not decrease since the previous iteration, or when the accelerated Ci is not positive.
+
+    :param float Ci: Ci at the current iteration (mol mol-1)
+    :param float Ts: Ts at the current iteration (degree C)
+    :param float new_Ci: Ci computed from the current iteration (mol mol-1)
+    :param float new_Ts: Ts computed from the current iteration (degree C)
+    :param tuple history: the residual, the computed Ci and Ts and the norm of the residual at the previous iteration, or None at the first iteration
+
+    :return: Ci and Ts at the next iteration, and the history for the next step
+    :rtype: (float, float, tuple)
+    """
+    residual_Ci = (new_Ci - Ci) / Ci
+    residual_Ts = (new_Ts - Ts) / Ts if Ts != 0 else new_Ts - Ts
+    norm = sqrt(residual_Ci ** 2 + residual_Ts ** 2)
+    new_history = (residual_Ci, residual_Ts, new_Ci, new_Ts, norm)
+    if history is not None:
+        prec_residual_Ci, prec_residual_Ts, prec_new_Ci, prec_new_Ts, prec_norm = history
+        delta_Ci, delta_Ts = residual_Ci - prec_residual_Ci, residual_Ts - prec_residual_Ts
+        delta_norm2 = delta_Ci ** 2 + delta_Ts ** 2
+        if norm < prec_norm and delta_norm2 > 0:
+            gamma = (delta_Ci * residual_Ci + delta_Ts * residual_Ts) / delta_norm2
+            accelerated_Ci = new_Ci - gamma * (new_Ci - prec_new_Ci)
+            if accelerated_Ci > 0:
+                return accelerated_Ci, new_Ts - gamma * (new_Ts - prec_new_Ts), new_history
+    return new_Ci, new_Ts, new_history
+
 def _organ_temperature(w, z, Zh, Ur, PAR, gsw, Ta, Ts, RH, organ_name):
     """
     Energy balance for the estimation of organ temperature
@@ -319,11 +401,16 @@ def calculate_surfacic_WSC(sucrose, starch, fructan, green_area):
     return (sucrose + starch + fructan) / green_area
 
 
-def run(surfacic_nitrogen, NSC_Retroinhibition, surfacic_NSC, width, height, PAR, Ta, ambient_CO2, RH, Ur, organ_name, height_canopy):
+def run(surfacic_nitrogen, NSC_Retroinhibition, surfacic_NSC, width, height, PAR, Ta, ambient_CO2, RH, Ur, organ_name, height_canopy, Ci_init=None, Ts_init=None,
+        statistics=None):
     """
     Computes the photosynthesis of a photosynthetic element. The photosynthesis is computed by using the biochemical FCB model (Farquhar et al., 1980) coupled to the semiempirical
     BWB model of stomatal conductance (Ball, 1987).
 
+    Ci and Ts are found by fixed-point iterations, until their relative variation is lower than :attr:`DELTA_CONVERGENCE <farquharwheat.parameters.DELTA_CONVERGENCE>`,
+    within :attr:`MAX_ITERATIONS <farquharwheat.parameters.MAX_ITERATIONS>` iterations. The iterations are accelerated with the Anderson method
+    if :attr:`ANDERSON_ACCELERATION <farquharwheat.parameters.ANDERSON_ACCELERATION>` (see :func:`_anderson_step`).
+
     :param float surfacic_nitrogen: surfacic nitrogen content of organs (g m-2), could include total N or proteic N only depending on parameter.SurfacicProteins
            Properly speaking, photosynthesis should be related to proteins (RubisCO), but parameters of most Farquhar models are calibrated on total N measurements (DUMAS method).
            We use only non-structural nitrogen to overcome issues in the case of extrem scenarios (high SLN for thick leaves under low nitrogen conditions).
@@ -341,6 +428,9 @@ def run(surfacic_nitrogen, NSC_Retroinhibition, surfacic_NSC, width, height, PAR
            (in the case of wheat, Ur can be approximated as the wind speed at 2m from soil)
     :param str organ_name: name of the organ to which belongs the element (used to distinguish lamina from cylindric organs)
     :param float height_canopy: total canopy height (m)
+    :param float Ci_init: initial value of Ci (mol mol-1), e.g. its value at the previous time step. If None, Ci_init = :attr:`Ci_init_ratio` * ambient_CO2
+    :param float Ts_init: initial value of Ts (C), e.g. its value at the previous time step. If None, Ts_init = Ta
+    :param SolverStatistics statistics: if not None, the number of iterations and the convergence failures are recorded in `statistics`
 
     :return: Ag (mol m-2 s-1), An (mol m-2 s-1), Rd (mol m-2 s-1),
         Tr (mmol m-2 s-1), Ts (C) and  gsw (mol m-2 s-1)
@@ -351,7 +441,9 @@ def run(surfacic_nitrogen, NSC_Retroinhibition, surfacic_NSC, width, height, PAR
         surfacic_nitrogen = parameters.NA_0
 
     # Iterations to find organ temperature and Ci #
-    Ci, Ts = parameters.Ci_init_ratio * ambient_CO2, Ta  # Initial values
+    Ci = parameters.Ci_init_ratio * ambient_CO2 if Ci_init is None else Ci_init  # Initial values
+    Ts = Ta if Ts_init is None else Ts_init
+    history = None  # the previous iteration, for the Anderson acceleration
     count = 0
 
     while True:
@@ -367,14 +459,22 @@ def run(surfacic_nitrogen, NSC_Retroinhibition, surfacic_NSC, width, height, PAR
         Ts, Tr = _organ_temperature(width, height, height_canopy, Ur, PAR, gsw, Ta, Ts, RH, organ_name)
         count += 1
 
-        if count >= 30:  # TODO: test a faire? Semble prendre du tps de calcul
-            if abs((Ci - prec_Ci) / prec_Ci) >= parameters.DELTA_CONVERGENCE:
-                print('{}, Ci cannot converge, prec_Ci= {}, Ci= {}'.format(organ_name, prec_Ci, Ci))
-            if prec_Ts != 0 and abs((Ts - prec_Ts) / prec_Ts) >= parameters.DELTA_CONVERGENCE:
-                print('{}, Ts cannot converge, prec_Ts= {}, Ts= {}'.format(organ_name, prec_Ts, Ts))
+        Ci_converged = abs((Ci - prec_Ci) / prec_Ci) < parameters.DELTA_CONVERGENCE
+        Ts_converged = (prec_Ts == 0 and (Ts - prec_Ts) == 0) or abs((Ts - prec_Ts) / prec_Ts) < parameters.DELTA_CONVERGENCE
+        if Ci_converged and Ts_converged:
             break
-        if abs((Ci - prec_Ci) / prec_Ci) < parameters.DELTA_CONVERGENCE and ((prec_Ts == 0 and (Ts - prec_Ts) == 0) or abs((Ts - prec_Ts) / prec_Ts) < parameters.DELTA_CONVERGENCE):
+        if count >= parameters.MAX_ITERATIONS:
+            if statistics is not None:
+                if not Ci_converged:
+                    statistics.record_failure(organ_name, 'Ci', prec_Ci, Ci)
+                if not Ts_converged:
+                    statistics.record_failure(organ_name, 'Ts', prec_Ts, Ts)
             break
+        if parameters.ANDERSON_ACCELERATION:
+            Ci, Ts, history = _anderson_step(prec_Ci, prec_Ts, Ci, Ts, history)
+
+    if statistics is not None:
+        statistics.record(count)
 
     #: Conversion of Tr from mm s-1 to mmol m-2 s-1 (more suitable for further use of Tr)
     Tr = (Tr * 1E6) / parameters.MM_WATER  # Using 1 mm = 1kg m-2
@@ -382,3 +482,309 @@ def run(surfacic_nitrogen, NSC_Retroinhibition, surfacic_NSC, width, height, PAR
     if organ_name != 'blade':
         Ag = Ag * parameters.EFFICENCY_STEM
     return Ag, An, Rd, Tr, Ts, gsw
+
+
+def run_dark(surfacic_nitrogen, width, height, Ta, ambient_CO2, RH, Ur, organs_names, height_canopy, Ci_init=None, Ts_init=None, statistics=None):
+    """
+    Computes the outputs of a set of photosynthetic elements during the dark period (absorbed PAR equal to 0), vectorized across the elements.
+
+    In the dark, the electron transport rate is null, so that Ag = An = 0 whatever the NSC content of the elements: the outputs are those of
+    :func:`run_vectorized` with PAR = 0 and without inhibition by NSC.
+
+    :param numpy.ndarray surfacic_nitrogen: surfacic nitrogen content of the organs (g m-2). NaN values are replaced by :attr:`NA_0`
+    :param numpy.ndarray width: width of the organs (or diameter for stem organs) (m)
+    :param numpy.ndarray height: height of the organs from soil (m)
+    :param float Ta: air temperature (C)
+    :param float ambient_CO2: air CO2 (mol mol-1)
+    :param float RH: relative humidity (decimal fraction)
+    :param float Ur: wind at the reference height (zr) (m s-1)
+    :param list organs_names: names of the organs to which belong the elements
+    :param numpy.ndarray height_canopy: total canopy height of the axis of each element (m)
+    :param numpy.ndarray Ci_init: initial values of Ci (mol mol-1), see :func:`run_vectorized`
+    :param numpy.ndarray Ts_init: initial values of Ts (C), see :func:`run_vectorized`
+    :param SolverStatistics statistics: if not None, the numbers of iterations and the convergence failures are recorded in `statistics`
+
+    :return: Ag (mol m-2 s-1), An (mol m-2 s-1), Rd (mol m-2 s-1),
+        Tr (mmol m-2 s-1), Ts (C) and  gsw (mol m-2 s-1), one array of each per element
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+    zeros = np.zeros(len(organs_names))
+    return run_vectorized(surfacic_nitrogen, False, zeros, width, height, zeros, Ta, ambient_CO2, RH, Ur, organs_names, height_canopy, Ci_init, Ts_init, statistics)
+
+
+def _f_temperature_vectorized(pname, p25, T):
+    """
+    Photosynthetic parameters relation to temperature. Vectorized version of :func:`_f_temperature`.
+
+    :param str pname: name of parameter
+    :param numpy.ndarray p25: parameter values at 25 degree C
+    :param numpy.ndarray T: organ temperatures (degree C)
+
+    :return: p (parameter values at organ temperatures)
+    :rtype: numpy.ndarray
+    """
+    Tk = T + parameters.KELVIN_DEGREE
+    deltaHa = parameters.PARAM_TEMP['deltaHa'][pname]
+    Tref = parameters.PARAM_TEMP['Tref']
+
+    f_activation = np.exp((deltaHa * (Tk - Tref)) / (parameters.R * 1E-3 * Tref * Tk))
+
+    if pname in ('Vc_max', 'Jmax', 'TPU'):
+        deltaS = parameters.PARAM_TEMP['deltaS'][pname]
+        deltaHd = parameters.PARAM_TEMP['deltaHd'][pname]
+        f_deactivation = (1 + exp((Tref * deltaS - deltaHd) / (Tref * parameters.R * 1E-3))) / (
+                1 + np.exp((Tk * deltaS - deltaHd) / (Tk * parameters.R * 1E-3)))
+    else:
+        f_deactivation = 1
+
+    return p25 * f_activation * f_deactivation
+
+
+def _inhibition_by_NSC_vectorized(NSC):
+    """
+    Relative diminution of Ag due to inhibition by NSC. Vectorized version of :func:`_inhibition_by_NSC`.
+
+    :param numpy.ndarray NSC: Surfacic contents of water-soluble carbohydrates  (mol C m-2)
+
+    :return: Relative diminutions (dimensionless)
+    :rtype: numpy.ndarray
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inhibition = np.minimum(parameters.Inhibition_max * (NSC - parameters.WSC_min) / (parameters.K_Inhibition + NSC - parameters.WSC_min), 1)
+    return np.where(NSC <= parameters.WSC_min, 0., inhibition)
+
+
+def calculate_photosynthesis_vectorized(PAR, surfacic_nitrogen, NSC_Retroinhibition, surfacic_NSC, Ts, Ci):
+    """
+    Computes photosynthesis rates following Farquhar's model. Vectorized version of :func:`calculate_photosynthesis`.
+
+    :param numpy.ndarray PAR: PAR absorbed (mol m-2 s-1)
+    :param numpy.ndarray surfacic_nitrogen: surfacic nitrogen contents (g m-2)
+    :param bool NSC_Retroinhibition: if True, Ag is inhibited by surfacic NSC (Non-Structural Carbohydrates).
+    :param numpy.ndarray surfacic_NSC: surfacic contents of NSC (mol C m-2).
+    :param numpy.ndarray Ts: organ temperatures (degree C)
+    :param numpy.ndarray Ci: internal CO2 (mol mol-1)
+
+    :return: Ag (mol m-2 s-1), An (mol m-2 s-1), Rd (mol m-2 s-1)
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+    PARAM_N = parameters.PARAM_N
+
+    #: RuBisCO parameters dependance to temperature
+    Kc = _f_temperature_vectorized('Kc', parameters.KC25, Ts)
+    Ko = _f_temperature_vectorized('Ko', parameters.KO25, Ts)
+    Gamma = _f_temperature_vectorized('Gamma', parameters.GAMMA25, Ts)
+
+    #: RuBisCO-limited carboxylation rate
+    Vc_max25 = PARAM_N['S_surfacic_nitrogen']['Vc_max25'] * (surfacic_nitrogen - PARAM_N['surfacic_nitrogen_min']['Vc_max25'])
+    Vc_max = _f_temperature_vectorized('Vc_max', Vc_max25, Ts)
+    Ac = (Vc_max * (Ci - Gamma)) / (Ci + Kc * (1 + parameters.O2 / Ko))
+
+    #: RuBP regeneration-limited carboxylation rate via electron transport
+    ALPHA = PARAM_N['S_surfacic_nitrogen']['alpha'] * surfacic_nitrogen + PARAM_N['beta']
+    Jmax25 = PARAM_N['S_surfacic_nitrogen']['Jmax25'] * (surfacic_nitrogen - PARAM_N['surfacic_nitrogen_min']['Jmax25'])
+    Jmax = _f_temperature_vectorized('Jmax', Jmax25, Ts)
+    with np.errstate(invalid='ignore'):
+        J = ((Jmax + ALPHA * PAR) - np.sqrt((Jmax + ALPHA * PAR) ** parameters.J_expo - parameters.J_A * parameters.THETA * ALPHA * PAR * Jmax)) / (
+                parameters.J_B * parameters.THETA)
+    Aj = (J * (Ci - Gamma)) / (parameters.Aj_A * Ci + parameters.Aj_B * Gamma)
+
+    #: Gross assimilation rate (mol m-2 s-1)
+    if NSC_Retroinhibition:
+        Ag = np.minimum(Ac, Aj) * (1 - _inhibition_by_NSC_vectorized(surfacic_NSC))
+    else:
+        #: Triose phosphate utilisation-limited carboxylation rate
+        TPU25 = PARAM_N['S_surfacic_nitrogen']['TPU25'] * (surfacic_nitrogen - PARAM_N['surfacic_nitrogen_min']['TPU25'])
+        TPU = _f_temperature_vectorized('TPU', TPU25, Ts)
+        Vomax = (Vc_max * Ko * Gamma) / (parameters.Vomax_A * Kc * parameters.O2)
+        Vo = (Vomax * parameters.O2) / (parameters.O2 + Ko * (1 + Ci / Kc))
+        Ap = (1 - Gamma / Ci) * (parameters.Ap_A * TPU + Vo)
+        Ag = np.minimum(np.minimum(Ac, Aj), Ap)
+
+    #: Mitochondrial respiration rate of organ in light Rd (processes other than photorespiration)
+    Rdark25 = PARAM_N['S_surfacic_nitrogen']['Rdark25'] * (surfacic_nitrogen - PARAM_N['surfacic_nitrogen_min']['Rdark25'])
+    Rdark = _f_temperature_vectorized('Rdark', Rdark25, Ts)
+    Rd = Rdark * (parameters.Rd_A + (1 - parameters.Rd_A) * parameters.Rd_B ** (PAR / parameters.Rd_C))
+
+    #: Net C assimilation (mol m-2 s-1): no net assimilation when Ag <= 0 (see :func:`calculate_photosynthesis`)
+    no_assimilation = Ag <= 0
+    An = np.where(no_assimilation, 0., Ag - Rd)
+    Ag = np.where(no_assimilation, 0., Ag)
+
+    return Ag, An, Rd
+
+
+def _organ_temperature_vectorized(w, z, Zh, Ur, PAR, gsw, Ta, Ts, RH, is_blade):
+    """
+    Energy balance of the organs. Vectorized version of :func:`_organ_temperature`.
+
+    :param numpy.ndarray w: organ characteristic dimensions (m)
+    :param numpy.ndarray z: organ heights from soil (m)
+    :param numpy.ndarray Zh: canopy heights (m)
+    :param float Ur: wind speed (m s-1) at the reference height
+    :param numpy.ndarray PAR: absorbed PAR (mol m-2 s-1)
+    :param numpy.ndarray gsw: stomatal conductances to water vapour (mol m-2 s-1)
+    :param float Ta: air temperature (degree C)
+    :param numpy.ndarray Ts: organ temperatures (degree C)
+    :param float RH: Relative humidity (decimal fraction)
+    :param numpy.ndarray is_blade: True for the lamina, False for the cylindric organs
+
+    :return: Ts (organ temperatures, degree C), Tr (organ transpiration rates, mm s-1)
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    d = parameters.Zh_d * Zh
+    Zo = parameters.Zh_Zo * Zh
+    Ur = max(Ur, parameters.Ur_min)
+
+    #: Wind speed at organ height and resistances to heat
+    u_star = (Ur * parameters.K) / np.log((parameters.ZR - d) / Zo)
+    Uh = (u_star / parameters.K) * np.log((Zh - d) / Zo)
+    u = Uh * np.exp(parameters.A * (z / Zh - 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rbh = np.where(is_blade,
+                       parameters.rhb_blade_A * np.sqrt(w / u),
+                       w / (parameters.rhb_other_A * ((u * w) / parameters.rhb_other_B) ** parameters.rhb_other_C))
+    ra = 1 / (parameters.K ** parameters.ra_expo * Ur) * (np.log((parameters.ZR - d) / Zo)) ** parameters.ra_expo
+
+    #: Net absorbed radiation Rn (J m-2 s-1)
+    Rn = (PAR * parameters.PARa_to_RGa) / parameters.Watt_to_PPFD
+    es_Ta = parameters.s_C * exp((parameters.s_B * Ta) / (parameters.s_A + Ta))
+    V = RH * es_Ta
+
+    #: Transpiration (mm s-1), Penman-Monteith
+    Ta_K = Ta + parameters.KELVIN_DEGREE
+    es_Tl = parameters.s_C * np.exp((parameters.s_B * Ts) / (parameters.s_A + Ts))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.where(Ts == Ta,
+                     ((parameters.s_B * parameters.s_A) / (Ta_K + parameters.s_A) ** parameters.s_expo) * es_Ta,
+                     (es_Tl - es_Ta) / (Ts + parameters.KELVIN_DEGREE - Ta_K))
+    VPDa = es_Ta - V
+    rbw = parameters.rbh_rbw * rbh
+    gsw_physic = (gsw * parameters.R * (Ts + parameters.KELVIN_DEGREE)) / parameters.PATM
+    rswp = 1 / gsw_physic
+    Tr = np.maximum(0., (s * Rn + (parameters.RHOCP * VPDa) / (rbh + ra)) / (parameters.LAMBDA * (s + parameters.GAMMA * ((rbw + ra + rswp) / (rbh + ra)))))
+
+    #: Organ temperature
+    Ts = Ta + ((rbh + ra) * (Rn - parameters.LAMBDA * Tr)) / parameters.RHOCP
+
+    return Ts, Tr
+
+
+def _anderson_step_vectorized(Ci, Ts, new_Ci, new_Ts, history):
+    """
+    Next iterate of the iterations to find Ci and Ts, with the Anderson acceleration of depth 1. Vectorized version of :func:`_anderson_step`.
+
+    :param numpy.ndarray Ci: Ci at the current iteration (mol mol-1)
+    :param numpy.ndarray Ts: Ts at the current iteration (degree C)
+    :param numpy.ndarray new_Ci: Ci computed from the current iteration (mol mol-1)
+    :param numpy.ndarray new_Ts: Ts computed from the current iteration (degree C)
+    :param tuple history: the residuals, the computed Ci and Ts and the norms of the residuals at the previous iteration, NaN at the first iteration
+
+    :return: Ci and Ts at the next iteration, and the history for the next step
+    :rtype: (numpy.ndarray, numpy.ndarray, tuple)
+    """
+    prec_residual_Ci, prec_residual_Ts, prec_new_Ci, prec_new_Ts, prec_norm = history
+    with np.errstate(divide='ignore', invalid='ignore'):
+        residual_Ci = (new_Ci - Ci) / Ci
+        residual_Ts = np.where(Ts != 0, (new_Ts - Ts) / Ts, new_Ts - Ts)
+        norm = np.sqrt(residual_Ci ** 2 + residual_Ts ** 2)
+        delta_Ci, delta_Ts = residual_Ci - prec_residual_Ci, residual_Ts - prec_residual_Ts
+        delta_norm2 = delta_Ci ** 2 + delta_Ts ** 2
+        gamma = (delta_Ci * residual_Ci + delta_Ts * residual_Ts) / delta_norm2
+        accelerated_Ci = new_Ci - gamma * (new_Ci - prec_new_Ci)
+        accelerated_Ts = new_Ts - gamma * (new_Ts - prec_new_Ts)
+        is_accelerated = (norm < prec_norm) & (delta_norm2 > 0) & (accelerated_Ci > 0)
+    return (np.where(is_accelerated, accelerated_Ci, new_Ci), np.where(is_accelerated, accelerated_Ts, new_Ts),
+            (residual_Ci, residual_Ts, new_Ci, new_Ts, norm))
+
+
+def run_vectorized(surfacic_nitrogen, NSC_Retroinhibition, surfacic_NSC, width, height, PAR, Ta, ambient_CO2, RH, Ur, organs_names, height_canopy,
+                   Ci_init=None, Ts_init=None, statistics=None):
+    """
+    Computes the photosynthesis of a set of photosynthetic elements, or of the primitives of photosynthetic elements, vectorized across the elements.
+
+    The internal CO2 and the temperature of each element are found with the same fixed-point iterations and convergence criterion as in :func:`run`.
+    The iterations of an element stop as soon as it has converged, so that the outputs are those of :func:`run` for each element.
+
+    :param numpy.ndarray surfacic_nitrogen: surfacic nitrogen content of the elements (g m-2). NaN values are replaced by :attr:`NA_0`
+    :param bool NSC_Retroinhibition: if True, Ag is inhibited by surfacic NSC (Non-Structural Carbohydrates).
+    :param numpy.ndarray surfacic_NSC: surfacic content of NSC of the elements (mol C m-2).
+    :param numpy.ndarray width: width of the organs (or diameter for stem organs) (m)
+    :param numpy.ndarray height: height of the organs from soil (m)
+    :param numpy.ndarray PAR: absorbed PAR (mol m-2 s-1)
+    :param float Ta: air temperature (C)
+    :param float ambient_CO2: air CO2 (mol mol-1)
+    :param float RH: relative humidity (decimal fraction)
+    :param float Ur: wind at the reference height (zr) (m s-1)
+    :param organs_names: names of the organs to which belong the elements
+    :type organs_names: list or numpy.ndarray
+    :param numpy.ndarray height_canopy: total canopy height of the axis of each element (m)
+    :param numpy.ndarray Ci_init: initial values of Ci (mol mol-1), e.g. their values at the previous time step. If None, or for the NaN values,
+           Ci_init = :attr:`Ci_init_ratio` * ambient_CO2
+    :param numpy.ndarray Ts_init: initial values of Ts (C), e.g. their values at the previous time step. If None, or for the NaN values, Ts_init = Ta
+    :param SolverStatistics statistics: if not None, the numbers of iterations and the convergence failures are recorded in `statistics`
+
+    :return: Ag (mol m-2 s-1), An (mol m-2 s-1), Rd (mol m-2 s-1),
+        Tr (mmol m-2 s-1), Ts (C) and  gsw (mol m-2 s-1), one array of each per element
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+    surfacic_nitrogen = np.asarray(surfacic_nitrogen, dtype=float)
+    surfacic_nitrogen = np.where(np.isnan(surfacic_nitrogen), parameters.NA_0, surfacic_nitrogen)
+    surfacic_NSC, width, height, PAR, height_canopy = (np.asarray(array, dtype=float) for array in (surfacic_NSC, width, height, PAR, height_canopy))
+    is_blade = np.asarray(organs_names) == 'blade'
+    nb_elements = len(PAR)
+
+    Ci = np.full(nb_elements, parameters.Ci_init_ratio * ambient_CO2)  # Initial values
+    if Ci_init is not None:
+        Ci_init = np.asarray(Ci_init, dtype=float)
+        Ci = np.where(np.isnan(Ci_init), Ci, Ci_init)
+    Ts = np.full(nb_elements, float(Ta))
+    if Ts_init is not None:
+        Ts_init = np.asarray(Ts_init, dtype=float)
+        Ts = np.where(np.isnan(Ts_init), Ts, Ts_init)
+    Ag, An, Rd, Tr, gsw = (np.zeros(nb_elements) for _ in range(5))
+    history = tuple(np.full(nb_elements, np.nan) for _ in range(5))  # the previous iteration of each element, for the Anderson acceleration
+    nb_iterations = np.zeros(nb_elements, dtype=int)
+    active = np.arange(nb_elements)
+    count = 0
+
+    while active.size:
+        prec_Ci, prec_Ts = Ci[active], Ts[active]
+        active_PAR, active_surfacic_nitrogen = PAR[active], surfacic_nitrogen[active]
+        new_Ag, new_An, new_Rd = calculate_photosynthesis_vectorized(active_PAR, active_surfacic_nitrogen, NSC_Retroinhibition, surfacic_NSC[active], prec_Ts, prec_Ci)
+        # Stomatal conductance to water
+        new_gsw = _stomatal_conductance(new_Ag, new_An, active_surfacic_nitrogen, ambient_CO2, RH)
+        # New values of Ci and Ts
+        new_Ci = _calculate_Ci(ambient_CO2, new_An, new_gsw)
+        new_Ts, new_Tr = _organ_temperature_vectorized(width[active], height[active], height_canopy[active], Ur, active_PAR, new_gsw, Ta, prec_Ts, RH, is_blade[active])
+        Ag[active], An[active], Rd[active], gsw[active], Ci[active], Ts[active], Tr[active] = new_Ag, new_An, new_Rd, new_gsw, new_Ci, new_Ts, new_Tr
+        nb_iterations[active] += 1
+        count += 1
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            Ci_converged = np.abs((new_Ci - prec_Ci) / prec_Ci) < parameters.DELTA_CONVERGENCE
+            Ts_converged = ((prec_Ts == 0) & (new_Ts - prec_Ts == 0)) | (np.abs((new_Ts - prec_Ts) / prec_Ts) < parameters.DELTA_CONVERGENCE)
+        if count >= parameters.MAX_ITERATIONS:
+            if statistics is not None:
+                for j in np.flatnonzero(~Ci_converged):
+                    statistics.record_failure(organs_names[active[j]], 'Ci', prec_Ci[j], new_Ci[j])
+                for j in np.flatnonzero(~Ts_converged):
+                    statistics.record_failure(organs_names[active[j]], 'Ts', prec_Ts[j], new_Ts[j])
+            break
+        not_converged = ~(Ci_converged & Ts_converged)
+        active = active[not_converged]
+        if parameters.ANDERSON_ACCELERATION:
+            next_Ci, next_Ts, active_history = _anderson_step_vectorized(prec_Ci[not_converged], prec_Ts[not_converged], new_Ci[not_converged], new_Ts[not_converged],
+                                                                         tuple(values[active] for values in history))
+            Ci[active], Ts[active] = next_Ci, next_Ts
+            for values, active_values in zip(history, active_history):
+                values[active] = active_values
+
+    if statistics is not None:
+        statistics.record(nb_iterations)
+
+    #: Conversion of Tr from mm s-1 to mmol m-2 s-1
+    Tr = (Tr * 1E6) / parameters.MM_WATER
+    #: Decrease efficency of non-lamina organs
+    Ag = np.where(is_blade, Ag, Ag * parameters.EFFICENCY_STEM)
+    return Ag, An, Rd, Tr, Ts, gsw
@@ -125,6 +125,9 @@ PARAM_TEMP = {'deltaHa': {'Vc_max': 89.7, 'Jmax': 48.9, 'TPU': 47., 'Kc': 79.43,
               'deltaS': {'Vc_max': 0.486, 'Jmax': 0.495, 'TPU': 0.495}, 'Tref': 298.15}
 
 DELTA_CONVERGENCE = 0.01  #: The relative delta for Ci and Ts convergence.
+MAX_ITERATIONS = 30  #: The maximal number of iterations to find Ci and Ts.
+ANDERSON_ACCELERATION = False  #: If True, the iterations to find Ci and Ts are accelerated with the Anderson method, if not they are plain fixed-point iterations
+WARM_START = False  #: If True, the iterations to find Ci and Ts of an element start from their values at the previous time step
 
 # -- Inhibition of the photosynthesis by carbohydrates (from Azcon-Bieto 1983)
 WSC_min = 100000  # Surfacic WSC content above which inhibition of the photosynthesis by WSC occures (mol C m-2)
@@ -2,6 +2,10 @@
 
 from __future__ import division  # use "//" to do integer division
 
+import itertools
+
+import numpy as np
+
 from openalea.farquharwheat import model
 from openalea.farquharwheat import parameters
 
@@ -25,6 +29,72 @@ class SimulationInputsError(SimulationError):
     pass
 
 
+class PrimitivesStore(object):
+    """
+    The PrimitivesStore class stores the primitives (i.e. the triangles) of the elements, for the computation of the photosynthesis at primitive scale.
+
+    The relative absorbed energy, the absorbed PAR and the area of the primitives of all the elements are concatenated in flat arrays :
+    the primitives of the i-th element of :attr:`keys` are in the slice [offsets[i], offsets[i+1]) of :attr:`Erel`, :attr:`PARa` and :attr:`area`.
+
+    Use :meth:`fill` to fill the store from the outputs of Caribu, and :meth:`select` to get the primitives of some elements.
+    """
+
+    def __init__(self):
+        self.keys = []  #: the keys of the elements, in the order of their primitives
+        self.offsets = np.zeros(1, dtype=int)  #: the index of the first primitive of each element, followed by the number of primitives
+        self.Erel = np.zeros(0)  #: the relative surfacic absorbed energy of the primitives
+        self.PARa = np.zeros(0)  #: the absorbed PAR of the primitives (mol m-2 s-1)
+        self.area = np.zeros(0)  #: the area of the primitives (m2)
+        self._positions = {}  #: the position of each element in :attr:`keys`
+
+    def fill(self, Erel_prim, area_prim, energy=1.):
+        """
+        Fill the store with the primitives of the elements, replacing the primitives already stored.
+
+        :param dict Erel_prim: the relative surfacic absorbed energy of the primitives of each element: {key: [Erel, ...], ...}
+        :param dict area_prim: the area of the primitives of each element: {key: [area, ...], ...}
+        :param float energy: the incident PAR above the canopy (mol m-2 s-1)
+        """
+        self.keys = list(Erel_prim.keys())
+        nb_primitives = np.array([len(Erel_prim[key]) for key in self.keys], dtype=int)
+        self.offsets = np.concatenate(([0], np.cumsum(nb_primitives))).astype(int)
+        self.Erel = np.fromiter(itertools.chain.from_iterable(Erel_prim[key] for key in self.keys), dtype=float, count=self.offsets[-1])
+        self.area = np.fromiter(itertools.chain.from_iterable(area_prim[key] for key in self.keys), dtype=float, count=self.offsets[-1])
+        self._positions = {key: position for position, key in enumerate(self.keys)}
+        self.set_energy(energy)
+
+    def set_energy(self, energy):
+        """
+        Compute the absorbed PAR of the primitives from the incident PAR above the canopy.
+
+        :param float energy: the incident PAR above the canopy (mol m-2 s-1)
+        """
+        self.PARa = self.Erel * energy
+
+    def select(self, keys, new_keys=None):
+        """
+        Get the primitives of some elements. The elements which are not in the store have no primitive.
+
+        :param list keys: the keys of the elements
+        :param list new_keys: the keys of the elements in the returned store. If None, `keys` are used.
+
+        :return: A new store with the primitives of the elements, in the order of `keys`.
+        :rtype: PrimitivesStore
+        """
+        # the missing elements are at position -1, i.e. the last element, which has no primitive
+        positions = np.array([self._positions.get(key, -1) for key in keys], dtype=int)
+        starts = np.append(self.offsets[:-1], 0)[positions]
+        nb_primitives = np.append(np.diff(self.offsets), 0)[positions]
+
+        selection = PrimitivesStore()
+        selection.keys = list(keys if new_keys is None else new_keys)
+        selection.offsets = np.concatenate(([0], np.cumsum(nb_primitives))).astype(int)
+        indexes = np.repeat(starts - selection.offsets[:-1], nb_primitives) + np.arange(selection.offsets[-1])
+        selection.Erel, selection.PARa, selection.area = self.Erel[indexes], self.PARa[indexes], self.area[indexes]
+        selection._positions = {key: position for position, key in enumerate(selection.keys)}
+        return selection
+
+
 class Simulation(object):
     """The Simulation class permits to initialize and run a simulation.
     """
@@ -47,13 +117,26 @@ class Simulation(object):
         #: for more information about the outputs.
         self.outputs = {}
 
+        #: The primitives of the elements, for the computation at primitive scale (see :attr:`parameters.prim_scale <farquharwheat.parameters.prim_scale>`).
+        #:
+        #: `primitives` is a :class:`PrimitivesStore` whose keys are the ids of the elements.
+        #: If None, the primitives are given by the inputs `PARa_prim` and `area_prim` of the elements.
+        self.primitives = None
+
+        #: The statistics of the iterations to find Ci and Ts at the last run (see :class:`model.SolverStatistics <farquharwheat.model.SolverStatistics>`).
+        self.solver_statistics = model.SolverStatistics()
+
+        #: The values of Ci and Ts of the elements at the last run, used as initial values of the iterations if :attr:`parameters.WARM_START <farquharwheat.parameters.WARM_START>`:
+        #:     {(plant_index, axis_label, metamer_index, organ_label, element_label): (Ci, Ts), ...}
+        self._solver_state = {}
+
         #: Update parameters if specified
         if update_parameters:
             parameters.__dict__.update(update_parameters)
 
-    def initialize(self, inputs):
+    def initialize(self, inputs, primitives=None):
         """
-        Initialize :attr:`inputs` from `inputs`.
+        Initialize :attr:`inputs` from `inputs`, and :attr:`primitives` from `primitives`.
 
         :param dict inputs: Dictionary of two dictionaries :
                     - `elements` : The inputs by element.
@@ -62,11 +145,65 @@ class Simulation(object):
 
             See :meth:`Model.run <farquharwheat.model.run>`
                for more information about the inputs.
+        :param PrimitivesStore primitives: The primitives of the elements, with the ids of the elements as keys.
+               If None, the primitives are given by the inputs `PARa_prim` and `area_prim` of the elements.
         """
         self.inputs.clear()
         self.inputs.update(inputs)
+        self.primitives = primitives
+
+    def _get_primitives(self, elements_ids):
+        """
+        Get the primitives of some elements, from :attr:`primitives` or from the inputs `PARa_prim` and `area_prim` of the elements.
+
+        :param list elements_ids: the ids of the elements
+
+        :return: The primitives of the elements, in the order of `elements_ids`.
+        :rtype: PrimitivesStore
+        """
+        if self.primitives is not None:
+            return self.primitives.select(elements_ids)
+        primitives = PrimitivesStore()
+        elements_inputs = {element_id: self.inputs['elements'][element_id] for element_id in elements_ids
+                           if self.inputs['elements'][element_id]['PARa_prim']}  # the area of the primitives of an element without primitive is 0
+        primitives.fill({element_id: element_inputs['PARa_prim'] for element_id, element_inputs in elements_inputs.items()},
+                        {element_id: element_inputs['area_prim'] for element_id, element_inputs in elements_inputs.items()})
+        return primitives.select(elements_ids)
+
+    @staticmethod
+    def _calculate_surfacic_nitrogen(element_inputs):
+        """
+        Surfacic nitrogen of an element used to regulate photosynthesis, depending on :attr:`parameters.SurfacicProteins`.
+
+        :param dict element_inputs: the inputs of the element
+
+        :return: surfacic nitrogen (g m-2)
+        :rtype: float
+        """
+        if parameters.SurfacicProteins:
+            surfacic_photosynthetic_proteins = model.calculate_surfacic_photosynthetic_proteins(element_inputs['proteins'],
+                                                                                                element_inputs['green_area'])
+            return model.calculate_surfacic_nonstructural_nitrogen_Farquhar(surfacic_photosynthetic_proteins)
+        return model.calculate_surfacic_nitrogen(element_inputs['nitrates'],
+                                                 element_inputs['amino_acids'],
+                                                 element_inputs['proteins'],
+                                                 element_inputs['Nstruct'],
+                                                 element_inputs['green_area'])
+
+    def is_dark_period(self):
+        """
+        Whether the absorbed PAR of all the elements of the main stem with a geometry is null.
+
+        :return: True if no element absorbs PAR
+        :rtype: bool
+        """
+        elements_ids = [element_id for (element_id, element_inputs) in self.inputs['elements'].items()
+                        if element_id[1] == 'MS' and element_inputs['height'] is not None]
+        if parameters.prim_scale:
+            return not np.any(self._get_primitives(elements_ids).PARa)
+        return not any(self.inputs['elements'][element_id]['PARa'] for element_id in elements_ids)
 
-    def run(self, Ta, ambient_CO2, RH, Ur):
+    def run(self, Ta, ambient_CO2, RH, Ur, dark_period=None, update_parameters=None):
         """
         Compute Farquhar variables for each element in :attr:`inputs` and put
         the results in :attr:`outputs`.
@@ -75,10 +212,38 @@ class Simulation(object):
         :param float ambient_CO2: air CO2 at t (mol mol-1)
         :param float RH: relative humidity at t (decimal fraction)
         :param float Ur: wind speed at the top of the canopy at t (m s-1)
+        :param bool dark_period: If True, the absorbed PAR of the elements is considered null: Ag is set to 0 and only the dark respiration,
+               the minimal stomatal conductance and the energy balance of the organs are computed, vectorized across the elements
+               (see :func:`model.run_dark <farquharwheat.model.run_dark>`). If False, the full model is run for each element.
+               If None (default), the dark-period mode is used when the absorbed PAR of all the elements is null (see :meth:`is_dark_period`).
+        :param dict update_parameters: the parameters to update for this run only, e.g. a more robust configuration of the iterations
+               to find Ci and Ts: {'param1': value1, 'param2': value2, ...}. The previous values of the parameters are restored after the run.
+
+        At primitive scale, the photosynthesis of the primitives of all the elements is computed at once (see :meth:`_run_primitives`).
+        If :attr:`parameters.WARM_START <farquharwheat.parameters.WARM_START>`, the iterations to find Ci and Ts of each element (or of its primitives)
+        start from their values at the previous run. The statistics of the iterations are put in :attr:`solver_statistics`.
         """
 
+        if update_parameters:
+            previous_parameters = {parameter_name: getattr(parameters, parameter_name) for parameter_name in update_parameters}
+            parameters.__dict__.update(update_parameters)
+            try:
+                self.run(Ta, ambient_CO2, RH, Ur, dark_period)
+            finally:
+                parameters.__dict__.update(previous_parameters)
+            return
+
         self.outputs.update({inputs_type: {} for inputs_type in self.inputs['elements'].keys()})
+        self.solver_statistics = model.SolverStatistics()
+
+        if dark_period is None:
+            dark_period = self.is_dark_period()
+        if dark_period:
+            self._run_dark(Ta, ambient_CO2, RH, Ur)
+            return
 
+        primitives_elements = []  # the elements computed at primitive scale: [(element_id, surfacic_nitrogen, surfacic_NSC, height_canopy), ...]
+        solver_state = {}  # the values of Ci and Ts of the elements computed at element scale
         for (element_id, element_inputs) in self.inputs['elements'].items():
 
             axis_id = element_id[:2]
@@ -94,51 +259,147 @@ class Simulation(object):
             else:
                 PARa = element_inputs['PARa']  #: Amount of absorbed PAR per unit area (mol m-2 s-1)
                 height_canopy = self.inputs['axes'][axis_id]['height_canopy']
-
-                if parameters.SurfacicProteins:
-                    surfacic_photosynthetic_proteins = model.calculate_surfacic_photosynthetic_proteins(element_inputs['proteins'],
-                                                                                                        element_inputs['green_area'])
-
-                    surfacic_nitrogen = model.calculate_surfacic_nonstructural_nitrogen_Farquhar(surfacic_photosynthetic_proteins)
-
-                else:
-                    surfacic_nitrogen = model.calculate_surfacic_nitrogen(element_inputs['nitrates'],
-                                                                          element_inputs['amino_acids'],
-                                                                          element_inputs['proteins'],
-                                                                          element_inputs['Nstruct'],
-                                                                          element_inputs['green_area'])
+                surfacic_nitrogen = self._calculate_surfacic_nitrogen(element_inputs)
 
                 surfacic_NSC = model.calculate_surfacic_WSC(element_inputs['sucrose'], element_inputs['starch'], element_inputs['fructan'], element_inputs['green_area'])
 
                 if not parameters.prim_scale:
                     #:  Computation at organ scale
+                    Ci_init, Ts_init = self._solver_state.get(element_id, (None, None)) if parameters.WARM_START else (None, None)
                     Ag, An, Rd, Tr, Ts, gs = model.run(surfacic_nitrogen,
                                                        parameters.NSC_Retroinhibition,
                                                        surfacic_NSC,
                                                        element_inputs['width'],
                                                        element_inputs['height'],
                                                        PARa, Ta, ambient_CO2,
-                                                       RH, Ur, organ_label, height_canopy)
+                                                       RH, Ur, organ_label, height_canopy,
+                                                       Ci_init, Ts_init, self.solver_statistics)
+                    solver_state[element_id] = (model._calculate_Ci(ambient_CO2, An, gs), Ts)  # Ci of the last iteration
 
                 else:
-                    #:  Computation at primitive scale
-                    Ag_prim_list = []
-                    for PARa_prim in element_inputs['PARa_prim']:  #: Amount of absorbed PAR per unit area (mol m-2 s-1)
-                        Ag_prim, An, Rd, Tr, Ts, gs = model.run(surfacic_nitrogen,
-                                                                parameters.NSC_Retroinhibition,
-                                                                surfacic_NSC,
-                                                                element_inputs['width'],
-                                                                element_inputs['height'],
-                                                                PARa_prim, Ta, ambient_CO2,
-                                                                RH, Ur, organ_label, height_canopy)
-                        Ag_prim_list.append(Ag_prim)
-                    if not Ag_prim_list:
-                        Ag = 0
-                    else:
-                        Ag = sum([Ag_prim * area_prim for Ag_prim, area_prim in zip(Ag_prim_list, element_inputs['area_prim'])]) / sum(element_inputs['area_prim'])
+                    #:  Computation at primitive scale, for all the elements at once
+                    primitives_elements.append((element_id, surfacic_nitrogen, surfacic_NSC, height_canopy))
+                    continue
 
             element_outputs = {'Ag': Ag, 'An': An, 'Rd': Rd,
                                'Tr': Tr, 'Ts': Ts, 'gs': gs,
                                'width': element_inputs['width'], 'height': element_inputs['height']}
 
             self.outputs[element_id] = element_outputs
+
+        if primitives_elements:
+            solver_state.update(self._run_primitives(primitives_elements, Ta, ambient_CO2, RH, Ur))
+        self._solver_state = solver_state
+
+    def _get_initial_values(self, elements_ids):
+        """
+        Get the initial values of Ci and Ts of the elements for the iterations of the vectorized model.
+
+        :param list elements_ids: the ids of the elements
+
+        :return: the values of Ci and Ts of the elements at the previous run, NaN for the elements which were not computed,
+                 or (None, None) if not :attr:`parameters.WARM_START <farquharwheat.parameters.WARM_START>`
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        if not parameters.WARM_START:
+            return None, None
+        Ci_init, Ts_init = zip(*[self._solver_state.get(element_id, (np.nan, np.nan)) for element_id in elements_ids])
+        return np.array(Ci_init, dtype=float), np.array(Ts_init, dtype=float)
+
+    def _run_primitives(self, primitives_elements, Ta, ambient_CO2, RH, Ur):
+        """
+        Compute Farquhar variables of the elements at primitive scale, vectorized across the primitives of all the elements, and put the results in :attr:`outputs`.
+
+        Ag of an element is the mean of Ag of its primitives weighted by their area. The other variables are those of the last primitive of the element.
+        An element without primitive has a null Ag, and the other variables of a primitive with a null absorbed PAR.
+
+        :param list primitives_elements: the elements to compute: [(element_id, surfacic_nitrogen, surfacic_NSC, height_canopy), ...]
+        :param float Ta: air temperature at t (degree Celsius)
+        :param float ambient_CO2: air CO2 at t (mol mol-1)
+        :param float RH: relative humidity at t (decimal fraction)
+        :param float Ur: wind speed at the top of the canopy at t (m s-1)
+
+        :return: the values of Ci and Ts of the last primitive of each element: {element_id: (Ci, Ts), ...}
+        :rtype: dict
+        """
+        elements_ids, surfacic_nitrogen, surfacic_NSC, height_canopy = zip(*primitives_elements)
+        primitives = self._get_primitives(elements_ids)
+
+        # an element without primitive is computed on a single primitive with null absorbed PAR and null area
+        nb_primitives = np.diff(primitives.offsets)
+        nb_computed_primitives = np.maximum(nb_primitives, 1)
+        offsets = np.concatenate(([0], np.cumsum(nb_computed_primitives)))
+        PARa, area = np.zeros(offsets[-1]), np.zeros(offsets[-1])
+        primitives_indexes = np.repeat(offsets[:-1] - primitives.offsets[:-1], nb_primitives) + np.arange(primitives.offsets[-1])
+        PARa[primitives_indexes], area[primitives_indexes] = primitives.PARa, primitives.area
+
+        width = [self.inputs['elements'][element_id]['width'] for element_id in elements_ids]
+        height = [self.inputs['elements'][element_id]['height'] for element_id in elements_ids]
+        surfacic_nitrogen = [np.nan if value is None else value for value in surfacic_nitrogen]
+
+        # the inputs of the elements, repeated for each of their primitives
+        primitives_surfacic_nitrogen, primitives_surfacic_NSC, primitives_width, primitives_height, primitives_height_canopy = (
+            np.repeat(np.array(values, dtype=float), nb_computed_primitives) for values in (surfacic_nitrogen, surfacic_NSC, width, height, height_canopy))
+        primitives_organs_names = np.repeat(np.array([element_id[3] for element_id in elements_ids]), nb_computed_primitives)
+        # the primitives of an element start from the values of Ci and Ts of its last primitive at the previous run
+        primitives_Ci_init, primitives_Ts_init = self._get_initial_values(elements_ids)
+        if parameters.WARM_START:
+            primitives_Ci_init, primitives_Ts_init = np.repeat(primitives_Ci_init, nb_computed_primitives), np.repeat(primitives_Ts_init, nb_computed_primitives)
+
+        Ag, An, Rd, Tr, Ts, gs = model.run_vectorized(primitives_surfacic_nitrogen, parameters.NSC_Retroinhibition, primitives_surfacic_NSC,
+                                                      primitives_width, primitives_height, PARa, Ta, ambient_CO2, RH, Ur,
+                                                      primitives_organs_names, primitives_height_canopy, primitives_Ci_init, primitives_Ts_init,
+                                                      self.solver_statistics)
+
+        #: Ag of the elements, weighted by the area of the primitives
+        with np.errstate(divide='ignore', invalid='ignore'):
+            elements_Ag = np.add.reduceat(Ag * area, offsets[:-1]) / np.add.reduceat(area, offsets[:-1])
+        elements_Ag = np.where(nb_primitives > 0, elements_Ag, 0.).tolist()
+        last_primitives = offsets[1:] - 1
+        An, Rd, Tr, Ts, gs = (outputs[last_primitives].tolist() for outputs in (An, Rd, Tr, Ts, gs))
+
+        for i, element_id in enumerate(elements_ids):
+            self.outputs[element_id] = {'Ag': elements_Ag[i], 'An': An[i], 'Rd': Rd[i],
+                                        'Tr': Tr[i], 'Ts': Ts[i], 'gs': gs[i],
+                                        'width': width[i], 'height': height[i]}
+        return {element_id: (model._calculate_Ci(ambient_CO2, An[i], gs[i]), Ts[i]) for i, element_id in enumerate(elements_ids)}  # Ci of the last iteration
+
+    def _run_dark(self, Ta, ambient_CO2, RH, Ur):
+        """
+        Compute Farquhar variables of the elements in the dark, vectorized across the elements, and put the results in :attr:`outputs`.
+
+        :param float Ta: air temperature at t (degree Celsius)
+        :param float ambient_CO2: air CO2 at t (mol mol-1)
+        :param float RH: relative humidity at t (decimal fraction)
+        :param float Ur: wind speed at the top of the canopy at t (m s-1)
+        """
+        elements_ids, surfacic_nitrogen, width, height, organs_names, height_canopy = [], [], [], [], [], []
+        for (element_id, element_inputs) in self.inputs['elements'].items():
+            axis_id = element_id[:2]
+            if axis_id[1] != 'MS':  # Calculation only for the main stem
+                continue
+            if element_inputs['height'] is None:
+                self.outputs[element_id] = {'Ag': 0., 'An': 0., 'Rd': 0., 'Tr': 0., 'Ts': self.inputs['axes'][axis_id]['SAM_temperature'], 'gs': 0.,
+                                            'width': element_inputs['width'], 'height': element_inputs['height']}
+                continue
+            elements_ids.append(element_id)
+            surfacic_nitrogen.append(self._calculate_surfacic_nitrogen(element_inputs))
+            width.append(element_inputs['width'])
+            height.append(element_inputs['height'])
+            organs_names.append(element_id[3])
+            height_canopy.append(self.inputs['axes'][axis_id]['height_canopy'])
+
+        if not elements_ids:
+            self._solver_state = {}
+            return
+
+        surfacic_nitrogen = np.array([np.nan if value is None else value for value in surfacic_nitrogen], dtype=float)
+        Ci_init, Ts_init = self._get_initial_values(elements_ids)
+        dark_outputs = model.run_dark(surfacic_nitrogen, width, height, Ta, ambient_CO2, RH, Ur, organs_names, height_canopy, Ci_init, Ts_init, self.solver_statistics)
+        Ag, An, Rd, Tr, Ts, gs = (outputs.tolist() for outputs in dark_outputs)
+
+        for i, element_id in enumerate(elements_ids):
+            self.outputs[element_id] = {'Ag': Ag[i], 'An': An[i], 'Rd': Rd[i],
+                                        'Tr': Tr[i], 'Ts': Ts[i], 'gs': gs[i],
+                                        'width': width[i], 'height': height[i]}
+        self._solver_state = {element_id: (model._calculate_Ci(ambient_CO2, An[i], gs[i]), Ts[i]) for i, element_id in enumerate(elements_ids)}  # Ci of the last iteration
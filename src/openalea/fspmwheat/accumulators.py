@@ -0,0 +1,699 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import division
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from openalea.cnwheat import model as cnwheat_model, postprocessing as cnwheat_postprocessing
+from openalea.fspmwheat.meteo import MeteoError
+
+"""
+    fspmwheat.accumulators
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`fspmwheat.accumulators` computes the post-processing tables of :mod:`fspmwheat.fspmwheat_postprocessing`
+    during the simulation.
+
+    Each accumulator is updated with the outputs and the post-processing of each time step, and maintains running sums,
+    daily aggregates, incremental linear regressions and the dates of the phenological events of the leaves. The tables are
+    emitted at the end of the simulation, without reading or keeping the whole history of the outputs:
+
+        * :class:`LeafTraitsAccumulator` emits the table of :func:`fspmwheat_postprocessing.leaf_traits`,
+        * :class:`CanopyDynamicsAccumulator` emits the table of :func:`fspmwheat_postprocessing.canopy_dynamics`,
+        * :class:`CUsagesAccumulator` emits the table of :func:`fspmwheat_postprocessing.table_C_usages`,
+        * :class:`PerformanceIndicesAccumulator` emits the tables of :func:`fspmwheat_postprocessing.calculate_performance_indices`.
+
+    The functions of :mod:`fspmwheat.fspmwheat_postprocessing` align some of the aggregated variables by position rather than
+    by time step. The accumulators align them by time step, which gives the same tables as long as the simulation starts at
+    t=0 with a time step of 1 hour and every time step has outputs (e.g. at least one hidden zone).
+
+    :class:`PostprocessingAccumulators` gathers the four accumulators and computes the post-processing of CN-Wheat
+    at each time step (see :func:`cnwheat.postprocessing.postprocessing`).
+
+    Example::
+
+        from openalea.fspmwheat.accumulators import PostprocessingAccumulators
+        accumulators = PostprocessingAccumulators(meteo, plant_density=250)
+        ...
+        # at each time step, once the outputs are built from the MTG
+        accumulators.update_from_outputs(t, axes_outputs, organs_outputs, hiddenzones_outputs, elements_outputs, soils_outputs, delta_t=3600)
+        ...
+        accumulators.save(scenario_postprocessing_dirpath)
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the name of the column of the time steps
+T_INDEX = 't'
+
+AMINO_ACIDS_C_RATIO = cnwheat_model.EcophysiologicalConstants.AMINO_ACIDS_C_RATIO  #: Mean number of mol of C in 1 mol of the major amino acids of plants (Glu, Gln, Ser, Asp, Ala, Gly)
+AMINO_ACIDS_N_RATIO = cnwheat_model.EcophysiologicalConstants.AMINO_ACIDS_N_RATIO  #: Mean number of mol of N in 1 mol of the major amino acids of plants (Glu, Gln, Ser, Asp, Ala, Gly)
+
+
+def _day(t):
+    """The day of time step `t` (hour), starting from day 1."""
+    return t // 24 + 1
+
+
+def _first(series):
+    """The first value of `series`, or NaN if `series` is empty."""
+    return series.iloc[0] if len(series) > 0 else np.nan
+
+
+def _divide(numerator, denominator):
+    """Divide as NumPy does, i.e. without raising an exception if `denominator` is 0."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.float64(numerator) / denominator
+
+
+class _RunningSum(object):
+    """A cumulative sum which skips the NaN values, as :meth:`pandas.Series.cumsum`."""
+
+    def __init__(self):
+        self.total = 0.
+
+    def add(self, value):
+        """Add `value` to the sum, and return the cumulative sum (NaN if `value` is NaN)."""
+        if pd.isnull(value):
+            return np.nan
+        self.total += value
+        return self.total
+
+
+class _Mean(object):
+    """A mean which skips the NaN values, as :meth:`pandas.Series.mean`."""
+
+    def __init__(self):
+        self.total = 0.
+        self.count = 0
+
+    def add(self, value):
+        if not pd.isnull(value):
+            self.total += value
+            self.count += 1
+
+    @property
+    def value(self):
+        return self.total / self.count if self.count > 0 else np.nan
+
+
+class _LinearRegression(object):
+    """
+    The least squares regression of `y` against `x`, updated point by point with Welford's algorithm.
+    The slope is the one returned by `numpy.polyfit(x, y, 1)[0]`.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean_x = 0.
+        self.mean_y = 0.
+        self.sum_squares_x = 0.  #: sum of squared deviations of x
+        self.sum_products = 0.  #: sum of products of deviations of x and y
+
+    def add(self, x, y):
+        self.count += 1
+        delta_x = x - self.mean_x
+        self.mean_x += delta_x / self.count
+        self.mean_y += (y - self.mean_y) / self.count
+        self.sum_squares_x += delta_x * (x - self.mean_x)
+        self.sum_products += delta_x * (y - self.mean_y)
+
+    @property
+    def slope(self):
+        if self.count < 2 or self.sum_squares_x == 0:
+            return np.nan
+        return self.sum_products / self.sum_squares_x
+
+
+def _update_max(values, key, value):
+    """Update the maximum `values[key]` with `value`, skipping the NaN values as :meth:`pandas.Series.max`."""
+    if pd.isnull(value):
+        values.setdefault(key, np.nan)
+    elif key not in values or pd.isnull(values[key]) or value > values[key]:
+        values[key] = value
+
+
+class Accumulator(object):
+    """
+    Base class of the accumulators. An accumulator is updated with the outputs and the post-processing of each time step,
+    and emits its tables at the end of the simulation.
+    """
+
+    #: the string to save the missing values in the CSV files
+    NA_REP = ''
+
+    def update(self, t, step_dataframes):
+        """
+        Update the accumulator with the outputs and the post-processing of a time step.
+
+        :param int t: the time step (hour)
+        :param dict [str, pandas.DataFrame] step_dataframes: the outputs and the post-processing at time step `t`, by basename of the
+                                                              CSV files of the simulation, e.g. 'axes_outputs' or 'elements_postprocessing'.
+        """
+        raise NotImplementedError()
+
+    def tables(self):
+        """
+        Emit the tables of the accumulator.
+
+        :return: the tables, by name of CSV file
+        :rtype: dict [str, pandas.DataFrame]
+        """
+        raise NotImplementedError()
+
+    def save(self, scenario_postprocessing_dirpath):
+        """
+        Save the tables of the accumulator.
+
+        :param str scenario_postprocessing_dirpath: the path to the postprocessing CSV files of the scenario
+        """
+        for filename, table in self.tables().items():
+            table.to_csv(os.path.join(scenario_postprocessing_dirpath, filename), index=False, na_rep=self.NA_REP)
+
+
+class LeafTraitsAccumulator(Accumulator):
+    """
+    Incremental version of :func:`fspmwheat_postprocessing.leaf_traits`. The rate of elongation of each leaf is regressed
+    during the simulation, so statsmodels is not needed.
+    """
+
+    FILENAME = 'leaf_traits.csv'
+    NA_REP = 'NA'
+
+    #: the columns of the table, in the order of :func:`fspmwheat_postprocessing.leaf_traits`
+    COLUMNS = ['metamer', 'leaf_Lmax', 'leaf_Lmax_em', 'lamina_Lmax', 'sheath_Lmax', 'lamina_Wmax', 'lamina_W_Lg', 'SSLW', 'LSSW', 'internode_Lmax', 'lamina_W_Lg_em',
+               't_em', 'sumTT_em', 'phyllo_TT', 'sumTT_em_prev', 'RER', 'sumTT_init', 'ageTT_init_em_prev', 't_lig', 'sumTT_lig', 'ageTT_lig',
+               't_senesc_onset', 'sumTT_senesc_onset', 'ageTT_senesc_onset', 't_senesc_end', 'sumTT_senesc_end', 'ageTT_senesc_end',
+               'lifespanTT_lig_green', 'lifespanTT_lig', 'SLN', 'SLA', 'green_area']
+
+    #: the final traits of the hidden zones, i.e. their values at the last time step where `leaf_Lmax` is defined
+    HIDDENZONE_FINAL_TRAITS = ['leaf_Lmax', 'leaf_Lmax_em', 'lamina_Lmax', 'sheath_Lmax', 'SSLW', 'LSSW']
+
+    def __init__(self):
+        self._leaves = {}  #: the traits of the leaves, by metamer
+        self._SLN = {}  #: the mean SLN of the green ligulated laminae, by metamer
+        self._SLA = {}  #: the mean SLA of the green ligulated laminae, by metamer
+        self._RER_regressions = {}  #: the regressions of log(leaf_L) against the sum of equivalent time, by metamer
+        self._sum_time_eq = _RunningSum()
+
+    def _leaf(self, metamer):
+        return self._leaves.setdefault(metamer, {})
+
+    def update(self, t, step_dataframes):
+        df_axe = step_dataframes['axes_outputs']
+        df_hz = step_dataframes['hiddenzones_outputs']
+        df_elt = step_dataframes['elements_postprocessing']
+
+        sum_TT = _first(df_axe['sum_TT'])
+        sum_time_eq = None
+        for delta_teq in df_axe.loc[df_axe['axis'] == 'MS', 'delta_teq']:
+            sum_time_eq = self._sum_time_eq.add(delta_teq)
+
+        # --- Final traits per leaf, and lamina width / length at leaf emergence
+        df_hz_MS = df_hz[(df_hz['axis'] == 'MS') & (df_hz['plant'] == 1)]
+        for row in df_hz_MS[df_hz_MS['leaf_Lmax'].notnull()].itertuples(index=False):
+            leaf = self._leaf(row.metamer)
+            for trait in self.HIDDENZONE_FINAL_TRAITS:
+                leaf[trait] = getattr(row, trait)
+            leaf['lamina_Wmax'] = row.leaf_Wmax
+            leaf['lamina_W_Lg'] = _divide(row.leaf_Wmax, row.lamina_Lmax)
+            if pd.notnull(row.internode_Lmax):
+                leaf['internode_Lmax'] = row.internode_Lmax
+        for row in df_hz_MS[df_hz_MS['leaf_Wmax'].notnull()].itertuples(index=False):
+            leaf = self._leaf(row.metamer)
+            if 'lamina_W_Lg_em' not in leaf:
+                leaf['lamina_W_Lg_em'] = _divide(row.leaf_Wmax, row.lamina_Lmax)
+
+        # --- Time of leaf initiation
+        for metamer in df_hz['metamer']:
+            leaf = self._leaf(metamer)
+            if 't_init' not in leaf:
+                leaf['t_init'] = t if t != 0 else np.nan
+                leaf['sumTT_init'] = sum_TT if t != 0 else np.nan
+
+        # --- Time of leaf emergence, and RER until the emergence of the previous leaf
+        data_RER = df_hz[(df_hz['axis'] == 'MS') & (df_hz['metamer'] >= 4)]
+        for metamer in data_RER.loc[data_RER['leaf_is_emerged'].eq(True), 'metamer']:
+            leaf = self._leaf(metamer)
+            if 't_em' not in leaf:
+                leaf['t_em'] = t
+                leaf['sumTT_em'] = sum_TT
+        if sum_time_eq is not None:
+            for metamer, leaf_L in zip(data_RER['metamer'], data_RER['leaf_L']):
+                previous_leaf_t_em = self._leaves.get(metamer - 1, {}).get('t_em')
+                if previous_leaf_t_em is None or previous_leaf_t_em == t:
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        log_leaf_L = np.log(leaf_L)
+                    self._RER_regressions.setdefault(metamer, _LinearRegression()).add(sum_time_eq, log_leaf_L)
+
+        # --- Ligulation, senescence, and traits of the green ligulated laminae
+        df_lam = df_elt[(df_elt['axis'] == 'MS') & (df_elt['element'] == 'LeafElement1')]
+        df_lam_green = df_lam[df_lam['is_growing'].eq(False) & (df_lam['senesced_mstruct'] == 0)]
+        for row in df_lam_green.itertuples(index=False):
+            leaf = self._leaf(row.metamer)
+            if 't_lig' not in leaf:
+                leaf['t_lig'] = t
+                leaf['sumTT_lig'] = sum_TT
+            self._SLN.setdefault(row.metamer, _Mean()).add(row.SLN)
+            self._SLA.setdefault(row.metamer, _Mean()).add(row.SLA)
+            _update_max(leaf, 'green_area', row.green_area)
+        for event, is_reached in (('senesc_onset', df_lam['senesced_mstruct'] > 0),
+                                  ('senesc_end', df_lam['mstruct'] == 0)):
+            for metamer in df_lam.loc[is_reached, 'metamer']:
+                leaf = self._leaf(metamer)
+                if 't_' + event not in leaf:
+                    leaf['t_' + event] = t
+                    leaf['sumTT_' + event] = sum_TT
+
+    def tables(self):
+        leaves = {metamer: dict(traits) for metamer, traits in self._leaves.items()}
+        # the leaf following each emerged leaf has the emergence of its previous leaf
+        for metamer, traits in self._leaves.items():
+            if 't_em' in traits:
+                leaves.setdefault(metamer + 1, {})['sumTT_em_prev'] = traits['sumTT_em']
+        for metamer, regression in self._RER_regressions.items():
+            if 't_em' in self._leaves.get(metamer - 1, {}):
+                leaves[metamer]['RER'] = regression.slope
+        for metamer in self._SLN:
+            leaves[metamer]['SLN'] = self._SLN[metamer].value
+            leaves[metamer]['SLA'] = self._SLA[metamer].value
+
+        leaf_traits_df = pd.DataFrame.from_dict(leaves, orient='index').reindex(columns=self.COLUMNS[1:] + ['t_init'])
+        leaf_traits_df.index.name = 'metamer'
+        leaf_traits_df = leaf_traits_df.reset_index().sort_values('metamer')
+        leaf_traits_df['phyllo_TT'] = leaf_traits_df.sumTT_em - leaf_traits_df.sumTT_em_prev
+        leaf_traits_df['ageTT_init_em_prev'] = leaf_traits_df.sumTT_em_prev - leaf_traits_df.sumTT_init
+        leaf_traits_df.loc[leaf_traits_df['metamer'] < 3, 't_lig'] = np.nan
+        leaf_traits_df.loc[leaf_traits_df['metamer'] < 3, 'sumTT_lig'] = np.nan
+        leaf_traits_df['ageTT_lig'] = leaf_traits_df.sumTT_lig - leaf_traits_df.sumTT_em
+        leaf_traits_df['ageTT_senesc_onset'] = leaf_traits_df.sumTT_senesc_onset - leaf_traits_df.sumTT_em
+        leaf_traits_df['ageTT_senesc_end'] = leaf_traits_df.sumTT_senesc_end - leaf_traits_df.sumTT_em
+        leaf_traits_df['lifespanTT_lig_green'] = leaf_traits_df.sumTT_senesc_onset - leaf_traits_df.sumTT_lig
+        leaf_traits_df['lifespanTT_lig'] = leaf_traits_df.sumTT_senesc_end - leaf_traits_df.sumTT_lig
+        return {self.FILENAME: leaf_traits_df[self.COLUMNS]}
+
+
+class CanopyDynamicsAccumulator(Accumulator):
+    """
+    Incremental version of :func:`fspmwheat_postprocessing.canopy_dynamics`.
+
+    :param fspmwheat.meteo.Meteo meteo: the meteo of the simulation, for the incident PAR
+    :param int plant_density: the plant density (plant m-2)
+    """
+
+    FILENAME = 'canopy_dynamics_daily.csv'
+
+    def __init__(self, meteo, plant_density=250):
+        self.meteo = meteo
+        self.plant_density = plant_density
+        self._LAI = {}  #: the mean LAI, by day
+        self._ratio_PARa_PARi = {}  #: the mean ratio of absorbed to incident PAR, by day
+        self._first_t = {}  #: the first time step with meteo, by day
+        self._PARa_surface = {}  #: the PAR absorbed by the stems and laminae, by day
+        self._green_area = {}  #: the mean green area of the stems and laminae, by day
+
+    def update(self, t, step_dataframes):
+        df_elt = step_dataframes['elements_postprocessing']
+        day = _day(t)
+
+        # --- LAI
+        df_lam = df_elt[df_elt['element'] == 'LeafElement1']
+        if len(df_lam) > 0:
+            self._LAI.setdefault(day, _Mean()).add(df_lam['green_area'].sum() * self.plant_density)
+
+        # --- Ratio of incident PAR that is absorbed by the plant, and surfacic PAR absorbed per day
+        try:
+            PARi = self.meteo.value('PARi', t)
+        except MeteoError:
+            return
+        if len(df_elt) == 0:
+            return
+        PARa_surface = (df_elt['PARa'] * df_elt['green_area'] * self.plant_density).sum()
+        self._ratio_PARa_PARi.setdefault(day, _Mean()).add(_divide(PARa_surface, PARi))
+        self._first_t.setdefault(day, t)
+        df_stem_lam = df_elt[df_elt['element'].isin(['StemElement', 'LeafElement1'])]
+        if len(df_stem_lam) > 0:
+            self._PARa_surface[day] = self._PARa_surface.get(day, 0.) + (df_stem_lam['PARa'] * df_stem_lam['green_area']).sum()
+            self._green_area.setdefault(day, _Mean()).add(df_stem_lam['green_area'].sum())
+
+    def tables(self):
+        df_LAI_days = pd.DataFrame({'day': list(self._LAI.keys()), 'LAI': [mean.value for mean in self._LAI.values()]}, columns=['day', 'LAI'])
+        tutu_days = pd.DataFrame({'day': list(self._first_t.keys()),
+                                  't': list(self._first_t.values()),
+                                  'ratio_PARa_PARi': [self._ratio_PARa_PARi[day].value for day in self._first_t]}, columns=['day', 't', 'ratio_PARa_PARi'])
+        tutu2_days = pd.DataFrame({'day': list(self._PARa_surface.keys()),
+                                   'PARa_surface2': list(self._PARa_surface.values()),
+                                   'green_area': [self._green_area[day].value for day in self._PARa_surface]}, columns=['day', 'PARa_surface2', 'green_area'])
+        tutu2_days['PARa_surfacique'] = tutu2_days.PARa_surface2 / tutu2_days.green_area
+        tutu2_days['PARa_mol_m2_d'] = tutu2_days['PARa_surfacique'] * 3600 * 10 ** -6
+
+        canopy_df = df_LAI_days.merge(tutu_days, on='day', how='outer')
+        canopy_df = canopy_df.merge(tutu2_days[['day', 'PARa_mol_m2_d']], on='day', how='outer')
+        return {self.FILENAME: canopy_df}
+
+
+class CUsagesAccumulator(Accumulator):
+    """
+    Incremental version of :func:`fspmwheat_postprocessing.table_C_usages`.
+    """
+
+    FILENAME = 'C_usages.csv'
+
+    #: the cumulated C usages
+    CUMULATED_USAGES = ['C_produced', 'Respi_roots', 'Respi_shoot', 'exudation', 'Structure_roots', 'Structure_shoot']
+
+    def __init__(self):
+        self._rows = []  #: the C usages at each time step
+        self._running_sums = {usage: _RunningSum() for usage in self.CUMULATED_USAGES}
+        self._initial_C_NS = None  #: the non structural C in the phloem and in the other organs at the first time step
+
+    def update(self, t, step_dataframes):
+        df_axe = step_dataframes['axes_postprocessing']
+        df_elt = step_dataframes['elements_postprocessing']
+        df_org = step_dataframes['organs_postprocessing']
+        df_hz = step_dataframes['hiddenzones_postprocessing']
+        if len(df_elt) == 0:
+            return
+
+        df_roots = df_org[df_org['organ'] == 'roots']
+        df_phloem = df_org[df_org['organ'] == 'phloem']
+
+        # Photosynthesis
+        C_produced = (df_elt['Photosynthesis'].fillna(0) * df_elt['nb_replications'].fillna(1.)).sum()
+
+        # Structural growth
+        C_consumption_mstruct_roots = (df_roots.sucrose_consumption_mstruct.fillna(0) + df_roots.AA_consumption_mstruct.fillna(0) * AMINO_ACIDS_C_RATIO / AMINO_ACIDS_N_RATIO).sum()
+        C_consumption_mstruct_hz = df_hz.sucrose_consumption_mstruct.fillna(0) + df_hz.AA_consumption_mstruct.fillna(0) * AMINO_ACIDS_C_RATIO / AMINO_ACIDS_N_RATIO
+        C_consumption_mstruct_shoot = (C_consumption_mstruct_hz * df_hz['nb_replications']).sum()
+
+        # Non structural C
+        C_NS_phloem = (df_phloem.sucrose.fillna(0) + df_phloem.amino_acids.fillna(0) * AMINO_ACIDS_C_RATIO / AMINO_ACIDS_N_RATIO).sum()
+        C_NS_elt = df_elt.sucrose.fillna(0) + df_elt.fructan.fillna(0) + df_elt.starch.fillna(0) + (
+                df_elt.amino_acids.fillna(0) + df_elt.proteins.fillna(0)) * AMINO_ACIDS_C_RATIO / AMINO_ACIDS_N_RATIO
+        C_NS_hz = df_hz.sucrose.fillna(0) + df_hz.fructan.fillna(0) + (df_hz.amino_acids.fillna(0) + df_hz.proteins.fillna(0)) * AMINO_ACIDS_C_RATIO / AMINO_ACIDS_N_RATIO
+        C_NS_roots = (df_roots.sucrose.fillna(0) + df_roots.amino_acids.fillna(0) * AMINO_ACIDS_C_RATIO / AMINO_ACIDS_N_RATIO).sum()
+        C_NS_other = C_NS_roots + (C_NS_elt * df_elt['nb_replications'].fillna(1.)).sum() + (C_NS_hz * df_hz['nb_replications'].fillna(1.)).sum()
+        if self._initial_C_NS is None:
+            self._initial_C_NS = (C_NS_phloem, C_NS_other)
+
+        step_usages = {'C_produced': C_produced,
+                       'Respi_roots': df_axe.C_respired_roots.sum(min_count=1),
+                       'Respi_shoot': df_axe.C_respired_shoot.sum(min_count=1),
+                       'exudation': df_axe.C_exudated.fillna(0).sum(),
+                       'Structure_roots': C_consumption_mstruct_roots,
+                       'Structure_shoot': C_consumption_mstruct_shoot}
+        row = {'t': t}
+        for usage in self.CUMULATED_USAGES:
+            row[usage] = self._running_sums[usage].add(step_usages[usage])
+        row['NS_phloem'] = C_NS_phloem - self._initial_C_NS[0]
+        row['NS_other'] = C_NS_other - self._initial_C_NS[1]
+        self._rows.append(row)
+
+    def tables(self):
+        C_usages = pd.DataFrame(self._rows, columns=['t'] + self.CUMULATED_USAGES + ['NS_phloem', 'NS_other'])
+        C_usages['C_budget'] = (C_usages.Respi_roots + C_usages.Respi_shoot + C_usages.exudation + C_usages.Structure_roots + C_usages.Structure_shoot + C_usages.NS_phloem +
+                                C_usages.NS_other) / C_usages.C_produced
+        return {self.FILENAME: C_usages}
+
+
+class PerformanceIndicesAccumulator(Accumulator):
+    """
+    Incremental version of :func:`fspmwheat_postprocessing.calculate_performance_indices`. The regressions are updated
+    during the simulation, so statsmodels is not needed.
+
+    :param fspmwheat.meteo.Meteo meteo: the meteo of the simulation, for the incident PAR
+    :param int plant_density: the plant density (plant m-2)
+    :param CUsagesAccumulator C_usages: the accumulator of the C usages, updated with the same time steps
+    """
+
+    RUE_FILENAME = 'RUE.csv'
+    FILENAME = 'performance_indices.csv'
+
+    #: the daily maxima of the RUE table
+    RUE_DAILY_MAXIMA = ['PARa', 'PARa_cum', 'sum_dry_mass', 'sum_dry_mass_shoot', 'senesced_mstruct']
+
+    def __init__(self, meteo, plant_density, C_usages):
+        self.meteo = meteo
+        self.plant_density = plant_density
+        self.C_usages = C_usages
+        self._PARa_cum = _RunningSum()
+        self._RGint_BL_cum = _RunningSum()
+        self._PARa2_cum = _RunningSum()
+        self._photosynthesis_cum = _RunningSum()
+        self._RUE_regressions = {name: _LinearRegression() for name in ('shoot', 'plant', 'shoot_including_senesced', 'plant_including_senesced',
+                                                                        'shoot_couvert', 'plant_couvert')}
+        self._photosynthetic_yield_regression = _LinearRegression()
+        self._RUE_days = {}  #: the first time step and the maxima of :attr:`RUE_DAILY_MAXIMA`, by day
+        self._RGR_days = {}  #: the maxima of the dry masses and of the thermal time, by day
+        self._laminae_days = {}  #: the maxima of the green area and of the dry mass of the laminae, by day
+        self._green_area_max = {}  #: the maximal green area of the laminae, by metamer
+        self._laminae_emergence = {}  #: the first time step of the laminae and the thermal time at this step, by metamer
+        self._t_end = None
+        self._last_laminae = None  #: the laminae at the last time step
+        self._LAI = np.nan  #: the LAI at the last time step
+
+    def update(self, t, step_dataframes):
+        df_elt = step_dataframes['elements_postprocessing']
+        df_axe = step_dataframes['axes_postprocessing']
+        df_axe_out = step_dataframes['axes_outputs']
+        day = _day(t)
+        sum_dry_mass = _first(df_axe['sum_dry_mass'])
+        sum_dry_mass_shoot = _first(df_axe['sum_dry_mass_shoot'])
+        sum_TT = _first(df_axe_out['sum_TT'])
+
+        if len(df_elt) > 0:
+            self._t_end = t
+            nb_replications = df_elt['nb_replications'].fillna(1.)
+
+            # --- RUE (g DM. MJ-1 PARa)
+            PARa = (df_elt['PARa'] * df_elt['green_area'] * nb_replications * 3600 / 4.6 * 10 ** -6).sum()
+            PARa_cum = self._PARa_cum.add(PARa)
+            senesced_mstruct = df_elt['senesced_mstruct'].sum()
+            self._RUE_regressions['shoot'].add(PARa_cum, sum_dry_mass_shoot)
+            self._RUE_regressions['plant'].add(PARa_cum, sum_dry_mass)
+            self._RUE_regressions['shoot_including_senesced'].add(PARa_cum, sum_dry_mass_shoot + senesced_mstruct)
+            self._RUE_regressions['plant_including_senesced'].add(PARa_cum, sum_dry_mass + senesced_mstruct)
+
+            # --- Daily RUE
+            RUE_day = self._RUE_days.setdefault(day, {'t': t})
+            for name, value in zip(self.RUE_DAILY_MAXIMA, (PARa, PARa_cum, sum_dry_mass, sum_dry_mass_shoot, senesced_mstruct)):
+                _update_max(RUE_day, name, value)
+
+            # --- Photosynthetic efficiency of the plant
+            PARa2_cum = self._PARa2_cum.add((df_elt['PARa'] * df_elt['green_area'] * nb_replications).sum())
+            photosynthesis_cum = self._photosynthesis_cum.add((df_elt['Ag'] * df_elt['green_area'] * nb_replications).sum())
+            self._photosynthetic_yield_regression.add(PARa2_cum, photosynthesis_cum)
+
+        df_lamina = df_elt[df_elt['element'] == 'LeafElement1']
+        if len(df_lamina) > 0:
+            self._last_laminae = df_lamina[['metamer', 'green_area', 'mstruct', 'sum_dry_mass', 'is_growing']].copy()
+            self._LAI = df_lamina['green_area'].sum() * self.plant_density
+            for metamer, green_area in zip(df_lamina['metamer'], df_lamina['green_area']):
+                _update_max(self._green_area_max, metamer, green_area)
+                if metamer not in self._laminae_emergence:
+                    self._laminae_emergence[metamer] = (t, sum_TT)
+
+            # --- RUE (g DM. MJ-1 RGint estimated from LAI using Beer-Lambert's law with extinction coefficient of 0.4)
+            try:
+                PARi = self.meteo.value('PARi', t)
+            except MeteoError:
+                pass
+            else:
+                PARint_BL = PARi * (1 - np.exp(-0.4 * self._LAI))
+                RGint_BL_cum = self._RGint_BL_cum.add(PARint_BL * 3600 / 2.02 * 10 ** -6)
+                self._RUE_regressions['shoot_couvert'].add(RGint_BL_cum, sum_dry_mass_shoot * self.plant_density)
+                self._RUE_regressions['plant_couvert'].add(RGint_BL_cum, sum_dry_mass * self.plant_density)
+
+            # --- Daily green area and dry mass of the laminae
+            laminae_day = self._laminae_days.setdefault(day, {})
+            _update_max(laminae_day, 'green_area', df_lamina['green_area'].sum())
+            _update_max(laminae_day, 'sum_dry_mass', df_lamina['sum_dry_mass'].sum())
+
+        # --- Daily dry masses, for the RGR
+        if len(df_axe) > 0 and len(df_axe_out) > 0:
+            RGR_day = self._RGR_days.setdefault(day, {})
+            for name in ('sum_dry_mass', 'sum_dry_mass_shoot', 'sum_dry_mass_roots'):
+                _update_max(RGR_day, name, df_axe[name].iloc[0])
+            _update_max(RGR_day, 'sum_TT', sum_TT)
+
+    def _RUE_table(self):
+        RUE_day_df = pd.DataFrame.from_dict(self._RUE_days, orient='index').reindex(columns=['t'] + self.RUE_DAILY_MAXIMA)
+        RUE_day_df.index.name = 'day'
+        RUE_day_df = RUE_day_df.reset_index()
+        tmp = RUE_day_df.copy()
+        tmp['day_prec7'] = tmp.day + 7
+        tmp['sum_dry_mass_prec7'] = tmp['sum_dry_mass']
+        tmp['senesced_mstruct_prec7'] = tmp['senesced_mstruct']
+        tmp['PARa_cum_prec7'] = tmp['PARa_cum']
+        RUE_day_df = RUE_day_df.merge(tmp[['day_prec7', 'sum_dry_mass_prec7', 'senesced_mstruct_prec7', 'PARa_cum_prec7']], left_on='day', right_on='day_prec7', how='left')
+        RUE_day_df['RUE_plant_MJ_PAR'] = (RUE_day_df.sum_dry_mass - RUE_day_df.sum_dry_mass_prec7) / (RUE_day_df.PARa_cum - RUE_day_df.PARa_cum_prec7)
+        RUE_day_df['RUE_plant_total_MJ_PAR'] = (RUE_day_df.sum_dry_mass + RUE_day_df.senesced_mstruct - RUE_day_df.sum_dry_mass_prec7 - RUE_day_df.senesced_mstruct_prec7) / (
+                RUE_day_df.PARa_cum - RUE_day_df.PARa_cum_prec7)
+        return RUE_day_df
+
+    def _RGR_table(self):
+        df_RGR = pd.DataFrame.from_dict(self._RGR_days, orient='index').reindex(columns=['sum_dry_mass', 'sum_dry_mass_shoot', 'sum_dry_mass_roots', 'sum_TT'])
+        df_RGR.index.name = 'day'
+        df_RGR = df_RGR.reset_index()
+        df_RGR_prev = df_RGR.copy()
+        df_RGR_prev.day = df_RGR_prev.day + 1
+        df_RGR_prev['sum_dry_mass_prev'] = df_RGR_prev.sum_dry_mass
+        df_RGR_prev['sum_dry_mass_shoot_prev'] = df_RGR_prev.sum_dry_mass_shoot
+        df_RGR_prev['sum_dry_mass_roots_prev'] = df_RGR_prev.sum_dry_mass_roots
+        df_RGR_prev['sum_TT_prev'] = df_RGR_prev.sum_TT
+        df_RGR = df_RGR.merge(df_RGR_prev[['day', 'sum_TT_prev', 'sum_dry_mass_prev', 'sum_dry_mass_shoot_prev', 'sum_dry_mass_roots_prev']], on='day')
+        df_RGR['delta_sum_TT'] = df_RGR.sum_TT - df_RGR.sum_TT_prev
+        df_RGR['delta_sum_dry_mass'] = df_RGR.sum_dry_mass - df_RGR.sum_dry_mass_prev
+        df_RGR['delta_sum_dry_mass_shoot'] = df_RGR.sum_dry_mass_shoot - df_RGR.sum_dry_mass_shoot_prev
+        df_RGR['delta_sum_dry_mass_roots'] = df_RGR.sum_dry_mass_roots - df_RGR.sum_dry_mass_roots_prev
+        df_RGR['RGR'] = df_RGR.delta_sum_dry_mass / df_RGR.sum_dry_mass
+        df_RGR['RGR_shoot'] = df_RGR.delta_sum_dry_mass_shoot / df_RGR.sum_dry_mass_shoot
+        df_RGR['RGR_roots'] = df_RGR.delta_sum_dry_mass_roots / df_RGR.sum_dry_mass_roots
+        df_RGR['RGR_TT'] = df_RGR.RGR / df_RGR.delta_sum_TT
+        df_RGR['RGR_shoot_TT'] = df_RGR.RGR_shoot / df_RGR.delta_sum_TT
+        df_RGR['RGR_roots_TT'] = df_RGR.RGR_roots / df_RGR.delta_sum_TT
+
+        # --- mean NAR: Net Assimilation Rate : delta g DM m-2 Cd-1
+        df_lamina_day_tot = pd.DataFrame.from_dict(self._laminae_days, orient='index').reindex(columns=['green_area', 'sum_dry_mass'])
+        df_lamina_day_tot.index.name = 'day'
+        df_lamina_day_tot = df_lamina_day_tot.reset_index()
+        df_lamina_day_tot['sum_dry_mass_laminea'] = df_lamina_day_tot['sum_dry_mass']
+        df_RGR = df_RGR.merge(df_lamina_day_tot[['day', 'green_area', 'sum_dry_mass_laminea']], on='day')
+        df_RGR['NAR_TT'] = df_RGR.delta_sum_dry_mass / df_RGR.green_area / df_RGR.delta_sum_TT
+        df_RGR['LAR'] = df_RGR.green_area / df_RGR.sum_dry_mass
+        df_RGR['LMR'] = df_RGR.sum_dry_mass_laminea / df_RGR.sum_dry_mass
+        df_RGR['SLA'] = df_RGR.green_area / df_RGR.sum_dry_mass_laminea
+        return df_RGR
+
+    def tables(self):
+        # --- senesced area
+        df_lamina_end = self._last_laminae
+        green_area_max = df_lamina_end['metamer'].map(self._green_area_max)
+        LAI_senesced = (green_area_max - df_lamina_end['green_area']).sum() * self.plant_density
+
+        # --- Photosynthetic C allocated to Respiration and to Exudation
+        C_usages = self.C_usages.tables()[self.C_usages.FILENAME]
+        C_usages_end = C_usages.iloc[-1]
+
+        # --- Final canopy traits
+        nb_final_em_leaves = df_lamina_end.metamer.max()
+        nb_final_lig_leaves = df_lamina_end[df_lamina_end['is_growing'].eq(False)].metamer.max()
+        df_lamina_end_green = df_lamina_end[(df_lamina_end.green_area > 0) & (df_lamina_end.mstruct > 0)]
+        if df_lamina_end_green.shape[0] > 1:
+            final_avg_SLA = sum(df_lamina_end_green.green_area) / (sum(df_lamina_end_green.sum_dry_mass) * 10 ** -3)
+        else:
+            final_avg_SLA = np.nan
+
+        # --- average phyllochron
+        phyllochron_regression = _LinearRegression()
+        for metamer, (t, sum_TT) in sorted(self._laminae_emergence.items()):
+            if t > 0 and pd.notnull(sum_TT):
+                phyllochron_regression.add(sum_TT, metamer)
+
+        df_RGR = self._RGR_table()
+        res_df = pd.DataFrame.from_dict({'LAI': [self._LAI],
+                                         'LAI_senesced': [LAI_senesced],
+                                         'RUE_plant_MJ_PAR': [self._RUE_regressions['plant'].slope],
+                                         'RUE_shoot_MJ_PAR': [self._RUE_regressions['shoot'].slope],
+                                         'RUE_plant_total_MJ_PAR': [self._RUE_regressions['plant_including_senesced'].slope],
+                                         'RUE_shoot_total_MJ_PAR': [self._RUE_regressions['shoot_including_senesced'].slope],
+                                         'RUE_plant_MJ_RGint': [self._RUE_regressions['plant_couvert'].slope],
+                                         'RUE_shoot_MJ_RGint': [self._RUE_regressions['shoot_couvert'].slope],
+                                         'Photosynthetic_efficiency': [self._photosynthetic_yield_regression.slope],
+                                         'C_usages_Respi_roots': C_usages_end.Respi_roots / C_usages_end.C_produced,
+                                         'C_usages_Respi_shoot': C_usages_end.Respi_shoot / C_usages_end.C_produced,
+                                         'C_usages_Respi': C_usages_end.Respi_shoot / C_usages_end.C_produced + C_usages_end.Respi_roots / C_usages_end.C_produced,
+                                         'C_usages_exudation': C_usages_end.exudation / C_usages_end.C_produced,
+                                         't_final': [self._t_end],
+                                         'nb_final_em': [nb_final_em_leaves],
+                                         'nb_final_lig': [nb_final_lig_leaves],
+                                         'final_avg_SLA': [final_avg_SLA],
+                                         'avg_phyllochron': [_divide(1, phyllochron_regression.slope)],
+                                         'avg_RGR_TT': [df_RGR.RGR_TT.mean()],
+                                         'avg_RGR_shoot_TT': [df_RGR.RGR_shoot_TT.mean()],
+                                         'avg_RGR_roots_TT': [df_RGR.RGR_roots_TT.mean()],
+                                         'avg_NAR_TT': [df_RGR.NAR_TT.mean()],
+                                         'avg_LAR': [df_RGR.LAR.mean()],
+                                         'final_LAR': [df_RGR.LAR.iloc[-1]],
+                                         'avg_LMR': [df_RGR.LMR.mean()],
+                                         'final_LMR': [df_RGR.LMR.iloc[-1]],
+                                         'avg_SLA': [df_RGR.SLA.mean()],
+                                         'tot_PARa_MJ': [self._PARa_cum.total]
+                                         })
+        return {self.RUE_FILENAME: self._RUE_table(), self.FILENAME: res_df}
+
+
+class PostprocessingAccumulators(object):
+    """
+    The accumulators of all the post-processing tables of :mod:`fspmwheat.fspmwheat_postprocessing`.
+
+    :param fspmwheat.meteo.Meteo meteo: the meteo of the simulation, for the incident PAR
+    :param int plant_density: the plant density (plant m-2)
+    """
+
+    def __init__(self, meteo, plant_density=250):
+        self.leaf_traits = LeafTraitsAccumulator()
+        self.canopy_dynamics = CanopyDynamicsAccumulator(meteo, plant_density)
+        self.C_usages = CUsagesAccumulator()
+        self.performance_indices = PerformanceIndicesAccumulator(meteo, plant_density, self.C_usages)
+        #: the accumulators, in the order of their update
+        self.accumulators = [self.leaf_traits, self.canopy_dynamics, self.C_usages, self.performance_indices]
+
+    def update(self, t, step_dataframes):
+        """
+        Update the accumulators with the outputs and the post-processing of a time step (see :meth:`Accumulator.update`).
+
+        :param int t: the time step (hour)
+        :param dict [str, pandas.DataFrame] step_dataframes: the outputs and the post-processing at time step `t`, by basename of CSV file
+        """
+        for accumulator in self.accumulators:
+            accumulator.update(t, step_dataframes)
+
+    def update_from_outputs(self, t, axes_outputs, organs_outputs, hiddenzones_outputs, elements_outputs, soils_outputs, delta_t):
+        """
+        Compute the post-processing of CN-Wheat at a time step, then update the accumulators.
+
+        :param int t: the time step (hour)
+        :param pandas.DataFrame axes_outputs: the outputs at axis scale at time step `t`
+        :param pandas.DataFrame organs_outputs: the outputs at organ scale at time step `t`
+        :param pandas.DataFrame hiddenzones_outputs: the outputs at hidden zone scale at time step `t`
+        :param pandas.DataFrame elements_outputs: the outputs at element scale at time step `t`
+        :param pandas.DataFrame soils_outputs: the outputs at soil scale at time step `t`
+        :param int delta_t: the delta between two runs, in seconds
+
+        :return: the post-processing of CN-Wheat at time step `t`, by basename of CSV file, e.g. 'axes_postprocessing'
+        :rtype: dict [str, pandas.DataFrame]
+        """
+        step_dataframes = {}
+        for name, outputs_df in (('axes_outputs', axes_outputs), ('organs_outputs', organs_outputs), ('hiddenzones_outputs', hiddenzones_outputs),
+                                 ('elements_outputs', elements_outputs), ('soils_outputs', soils_outputs)):
+            outputs_df = outputs_df.copy()
+            outputs_df.insert(0, T_INDEX, t)
+            step_dataframes[name] = outputs_df.fillna(value=np.nan).infer_objects()  # Convert back None to NaN
+
+        (_, _, step_dataframes['organs_postprocessing'],
+         step_dataframes['elements_postprocessing'],
+         step_dataframes['hiddenzones_postprocessing'],
+         step_dataframes['axes_postprocessing'],
+         step_dataframes['soils_postprocessing']) = cnwheat_postprocessing.postprocessing(axes_df=step_dataframes['axes_outputs'].copy(),
+                                                                                          hiddenzones_df=step_dataframes['hiddenzones_outputs'].copy(),
+                                                                                          organs_df=step_dataframes['organs_outputs'].copy(),
+                                                                                          elements_df=step_dataframes['elements_outputs'].copy(),
+                                                                                          soils_df=step_dataframes['soils_outputs'].copy(),
+                                                                                          delta_t=delta_t)
+        self.update(t, step_dataframes)
+        return {name: step_df for name, step_df in step_dataframes.items() if name.endswith('_postprocessing')}
+
+    def save(self, scenario_postprocessing_dirpath):
+        """
+        Save the tables of all the accumulators.
+
+        :param str scenario_postprocessing_dirpath: the path to the postprocessing CSV files of the scenario
+        """
+        for accumulator in self.accumulators:
+            accumulator.save(scenario_postprocessing_dirpath)
@@ -0,0 +1,67 @@
+# -*- coding: latin-1 -*-
+
+"""
+    fspmwheat.active_set
+    ~~~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`fspmwheat.active_set` defines the active sets of the facades, i.e. the elements which are passed to the models at each run.
+
+    Most of the elements of a mature canopy are inert for a given model: the model either does not read them at all,
+    or computes for them outputs equal to their inputs. The facades skip the inert elements when they initialize the inputs
+    of the models, and leave their properties in the MTG and their rows in the shared dataframes untouched.
+    An element is inert only if running the model on it would not modify anything, so the outputs of the simulation are identical.
+
+    The active sets are computed at each run from the current properties of the MTG, so an inert element becomes active again
+    as soon as another model modifies it.
+
+    Elong-Wheat has no inert elements: it updates the age of all the elements at each run, and reads the mature laminae
+    to compute the ligule heights. So :class:`ElongWheatFacade <fspmwheat.elongwheat_facade.ElongWheatFacade>` still passes all the elements to the model.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def growthwheat_active_elements(hiddenzone_inputs):
+    """
+    Give the emerged elements of a metamer read by Growth-Wheat, according to the inputs of the hidden zone of the metamer:
+        * the visible internode if the internode is visible,
+        * the lamina and the visible sheath if the leaf has emerged and is growing (the sheath grows once the lamina is mature).
+
+    The hidden elements are selected by the facade, as they are read only during the remobilisation.
+
+    :param dict hiddenzone_inputs: The inputs of the hidden zone of the metamer: {input_name: input_value, ...}.
+
+    :return: The (organ label, element label) of the emerged elements read by Growth-Wheat.
+    :rtype: set
+    """
+    active_elements = set()
+    if hiddenzone_inputs['internode_is_visible']:
+        active_elements.add(('internode', 'StemElement'))
+    if hiddenzone_inputs['leaf_is_emerged'] and hiddenzone_inputs['leaf_is_growing']:
+        active_elements.update((('blade', 'LeafElement1'), ('sheath', 'StemElement')))
+    return active_elements
+
+
+def is_senescwheat_element_inert(element_properties, organ_senesced_length=None):
+    """
+    Check whether an element is inert for Senesc-Wheat, i.e. fully senescent and already updated as such by Senesc-Wheat:
+    it does not grow, its green area and its structural mass are null, its senesced length is its length, and it is flagged as over.
+    Senesc-Wheat computes for such an element outputs equal to its inputs.
+
+    :param dict element_properties: The properties of the element in the MTG: {property_name: property_value, ...}.
+    :param float organ_senesced_length: The senesced length of the organ of the element, for the elements whose senesced length is copied
+                                        to their organ, None otherwise.
+
+    :return: True if the element is inert for Senesc-Wheat.
+    :rtype: bool
+    """
+    if not element_properties.get('is_over') or element_properties.get('is_growing', True):
+        return False
+    if element_properties.get('green_area') != 0 or element_properties.get('mstruct') != 0:
+        return False
+    senesced_length = element_properties.get('senesced_length_element')
+    if senesced_length is None or senesced_length != element_properties.get('length'):
+        return False
+    return organ_senesced_length is None or organ_senesced_length == senesced_length
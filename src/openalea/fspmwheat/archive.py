@@ -0,0 +1,142 @@
+# -*- coding: latin-1 -*-
+
+import numpy as np
+import pandas as pd
+
+from openalea.fspmwheat import fspmwheat_facade
+from openalea.fspmwheat.state_store import mirror_in_state_store, sync_shared_mtg
+from openalea.fspmwheat.topology import ORGAN_SCALE, archive_vertices, get_topology_index
+
+"""
+    fspmwheat.archive
+    ~~~~~~~~~~~~~~~~~
+
+    The module :mod:`fspmwheat.archive` archives the dead organs out of the :class:`MTG <openalea.mtg.mtg.MTG>` shared between all models.
+
+    Over a long simulation, the MTG accumulates fully senescent organs, which all the facades still traverse at each run.
+    :meth:`OrganArchive.archive_dead_organs` moves the final state of the dead organs into a compact frozen table, and archives
+    their vertices in the topology index (see :func:`fspmwheat.topology.archive_vertices`): the vertices remain in the MTG,
+    so the geometry (ADEL, Caribu) is unchanged, but the traversals of the facades skip them. The time of a traversal
+    thus stays bounded by the number of living organs as the simulation lengthens.
+
+    An organ is dead when all its elements with a positive length are over (see :func:`is_element_dead`).
+    The internodes are never archived: their lengths give the heights of the upper phytomers in Elong-Wheat.
+    The models do not run on the archived organs anymore: in particular, Elong-Wheat stops updating the age of their elements,
+    and does not count the ligules of the archived laminae in the ligule heights, which are dominated by the ligules of the upper living leaves.
+
+    The archived organs remain visible to the post-processing: :class:`FSPMWheatFacade <fspmwheat.fspmwheat_facade.FSPMWheatFacade>`
+    adds the final state of the archived elements to the outputs read from the MTG (see argument `organ_archive` of its constructor).
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the labels of the organs which can be archived
+ARCHIVED_ORGANS_LABELS = {'blade', 'sheath', 'peduncle', 'ear'}
+
+
+def is_element_dead(element_properties):
+    """
+    Check whether an element is dead, i.e. flagged as over by Senesc-Wheat and not growing.
+
+    :param dict element_properties: The properties of the element in the MTG: {property_name: property_value, ...}.
+
+    :return: True if the element is dead.
+    :rtype: bool
+    """
+    return bool(element_properties.get('is_over')) and not element_properties.get('is_growing', False)
+
+
+class OrganArchive(object):
+    """
+    A frozen table of the final state of the dead organs archived out of the MTG shared between all models.
+
+    The table stores the values of the variables of :data:`fspmwheat.fspmwheat_facade.ELEMENTS_VARIABLES` for each element
+    of the archived organs, as they were in the MTG at the time of the archival.
+    """
+
+    def __init__(self, shared_mtg, organs_labels=None):
+        """
+        :param openalea.mtg.mtg.MTG shared_mtg: The MTG shared between all models.
+        :param set organs_labels: The labels of the organs which can be archived. If None, use :data:`ARCHIVED_ORGANS_LABELS`.
+        """
+        self._shared_mtg = shared_mtg  #: the MTG shared between all models
+        self.organs_labels = frozenset(ARCHIVED_ORGANS_LABELS if organs_labels is None else organs_labels)  #: the labels of the organs which can be archived
+        self.variables = tuple(sorted(fspmwheat_facade.ELEMENTS_VARIABLES))  #: the variables stored for each element
+        self.organs = {}  #: the time of the archival of each archived organ: {organ_id: t, ...}
+        self._elements = {}  #: the values of the variables of each archived element, in the order of :attr:`variables`: {element_id: (value, ...), ...}
+
+    def __len__(self):
+        return len(self._elements)
+
+    def __contains__(self, topology_id):
+        return topology_id in self._elements or topology_id in self.organs
+
+    def archive_dead_organs(self, t=None):
+        """
+        Archive the dead organs of the MTG which are not archived yet: store the final state of their elements
+        and archive their vertices in the topology index.
+
+        :param int t: The current time step, recorded with the archived organs.
+
+        :return: The ids of the newly archived organs.
+        :rtype: list
+        """
+        sync_shared_mtg(self._shared_mtg)
+        topology = get_topology_index(self._shared_mtg)
+        mtg_lengths = self._shared_mtg.property('length')
+
+        archived_organs_vids = []
+        archived_organs_ids = []
+        archived_elements_ids = []
+        for mtg_organ_vid in topology.vertices(ORGAN_SCALE):
+            if topology.label(mtg_organ_vid) not in self.organs_labels:
+                continue
+            mtg_elements_vids = [mtg_element_vid for mtg_element_vid in topology.components(mtg_organ_vid)
+                                 if np.nan_to_num(mtg_lengths.get(mtg_element_vid, 0)) != 0]
+            if not mtg_elements_vids or not all(is_element_dead(self._shared_mtg.get_vertex_property(mtg_element_vid)) for mtg_element_vid in mtg_elements_vids):
+                continue
+            for mtg_element_vid in mtg_elements_vids:
+                mtg_element_properties = self._shared_mtg.get_vertex_property(mtg_element_vid)
+                element_id = topology.topology_id(mtg_element_vid)
+                self._elements[element_id] = tuple(mtg_element_properties.get(variable, np.nan) for variable in self.variables)
+                archived_elements_ids.append(element_id)
+            organ_id = topology.topology_id(mtg_organ_vid)
+            self.organs[organ_id] = t
+            archived_organs_vids.append(mtg_organ_vid)
+            archived_organs_ids.append(organ_id)
+
+        if archived_organs_vids:
+            archive_vertices(self._shared_mtg, archived_organs_vids)
+            # the archived elements are no more read by the models
+            mirror_in_state_store(self._shared_mtg, {}, {'elements': archived_elements_ids})
+        return archived_organs_ids
+
+    def get(self, element_id):
+        """
+        :param tuple element_id: The id of an archived element.
+
+        :return: The final state of the element: {variable: value, ...}.
+        :rtype: dict
+        """
+        return dict(zip(self.variables, self._elements[element_id]))
+
+    def elements_data(self):
+        """
+        :return: The final state of all the archived elements, in the format of the outputs read from the MTG: {element_id: {variable: value, ...}, ...}.
+        :rtype: dict
+        """
+        return {element_id: dict(zip(self.variables, values)) for element_id, values in self._elements.items()}
+
+    def to_dataframe(self):
+        """
+        :return: The archived elements in the format of the elements outputs dataframe, i.e. the topology columns followed by the variables, sorted by ids.
+        :rtype: pandas.DataFrame
+        """
+        ids_df = pd.DataFrame(list(self._elements.keys()), columns=fspmwheat_facade.ELEMENTS_TOPOLOGY_COLUMNS)
+        data_df = pd.DataFrame(list(self._elements.values()), columns=list(self.variables))
+        df = pd.concat([ids_df, data_df], axis=1)
+        df.sort_values(by=fspmwheat_facade.ELEMENTS_TOPOLOGY_COLUMNS, inplace=True)
+        df.reset_index(drop=True, inplace=True)
+        return df
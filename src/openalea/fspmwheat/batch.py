@@ -0,0 +1,385 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import print_function
+
+import json
+import multiprocessing as mp
+import os
+import sqlite3
+import time
+import traceback
+from multiprocessing.connection import wait
+
+try:
+    import resource
+except ImportError:  # not available on Windows: the memory cap is then ignored
+    resource = None
+
+from openalea.wheatfspm.watchdog import SolverHealthError
+
+"""
+    fspmwheat.batch
+    ~~~~~~~~~~~~~~~
+
+    The module :mod:`fspmwheat.batch` runs a batch of jobs (e.g. the scenarios of a simulation plan) in a pool of worker processes.
+
+    The jobs are recorded in a :class:`JobQueue`, stored in a SQLite file, with their status, their number of attempts, their timings and their errors.
+    Each job is run in its own process, with an optional wall-clock timeout and memory cap, so that a job which crashes or hangs does not stop the batch.
+    The jobs aborted by a solver watchdog (see :mod:`wheatfspm.watchdog`) are recorded with a distinct kind of failure.
+    A function which catches the exceptions of a simulation to print them must re-raise them when it runs a job (see :func:`is_batch_job`),
+    otherwise its job is recorded as done whatever its failure.
+    The jobs which failed for a transient reason are retried. A batch which was interrupted is resumed by running :func:`run_batch` again
+    with the same queue: the completed jobs are not run again.
+
+    Example::
+
+        from openalea.fspmwheat import batch
+        batch.run_batch('scenarios_queue.sqlite', run_fspmwheat, scenarios_ids, nb_workers=4)
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the status of the jobs
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+#: the kinds of failure of a job
+ERROR = 'error'  #: the job raised an exception
+CRASH = 'crash'  #: the process of the job exited without result, e.g. killed by the system
+TIMEOUT = 'timeout'  #: the job exceeded the wall-clock timeout
+ABORTED = 'aborted'  #: the job was aborted by a solver watchdog (see :class:`wheatfspm.watchdog.SolverWatchdog`)
+
+#: the exceptions considered as transient by default, i.e. the jobs which raise them are retried
+TRANSIENT_EXCEPTIONS = (OSError,)
+
+#: the default wall-clock timeout of an attempt of a job (s)
+DEFAULT_TIMEOUT = 48 * 3600
+
+#: the default maximum size of the virtual memory of each worker process (bytes)
+DEFAULT_MEMORY_LIMIT = 8 * 1024 ** 3
+
+#: the environment variable set in the processes of the jobs, and inherited by their subprocesses (see :func:`is_batch_job`)
+BATCH_JOB_ENVIRONMENT_VARIABLE = 'FSPMWHEAT_BATCH_JOB'
+
+_CREATE_JOBS_TABLE = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    rank INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    submitted REAL,
+    started REAL,
+    finished REAL,
+    duration REAL,
+    total_duration REAL NOT NULL DEFAULT 0,
+    failure TEXT,
+    error TEXT
+)
+"""
+
+_JOBS_COLUMNS = ['job_id', 'status', 'attempts', 'submitted', 'started', 'finished', 'duration', 'total_duration', 'failure', 'error']
+
+
+class BatchError(Exception):
+    pass
+
+
+def _encode_job_id(job_id):
+    """
+    Encode a job id to store it in the queue. The job ids must be serializable to JSON, e.g. integers or strings.
+
+    :param job_id: the id of a job
+
+    :return: the JSON representation of `job_id`
+    :rtype: str
+    """
+    if hasattr(job_id, 'item'):  # numpy scalars
+        job_id = job_id.item()
+    try:
+        return json.dumps(job_id)
+    except TypeError:
+        raise BatchError('The id of job {!r} cannot be stored in the queue: use integers or strings'.format(job_id))
+
+
+class JobQueue(object):
+    """
+    A queue of jobs stored in a SQLite file.
+
+    The queue is only accessed by the process which schedules the jobs (see :func:`run_batch`), the workers report their results to it.
+    """
+
+    def __init__(self, path):
+        """
+        :param str path: the path of the SQLite file of the queue. It is created if it does not exist.
+        """
+        self.path = path  #: the path of the SQLite file of the queue
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.execute(_CREATE_JOBS_TABLE)
+
+    def close(self):
+        """
+        Close the connection to the SQLite file.
+        """
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, jobs_ids):
+        """
+        Add jobs to the queue. The jobs which are already in the queue are left unchanged, whatever their status.
+
+        :param list jobs_ids: the ids of the jobs
+
+        :return: the number of jobs added
+        :rtype: int
+        """
+        now = time.time()
+        with self._connection:
+            next_rank = self._connection.execute('SELECT COALESCE(MAX(rank) + 1, 0) FROM jobs').fetchone()[0]
+            nb_added = 0
+            for job_id in jobs_ids:
+                cursor = self._connection.execute('INSERT OR IGNORE INTO jobs (job_id, rank, status, submitted) VALUES (?, ?, ?, ?)',
+                                                  (_encode_job_id(job_id), next_rank + nb_added, PENDING, now))
+                nb_added += cursor.rowcount
+        return nb_added
+
+    def requeue(self, statuses=(RUNNING,), reset_attempts=False):
+        """
+        Set the jobs with one of `statuses` back to pending.
+        The jobs still running when a batch was interrupted are requeued when the batch is resumed.
+
+        :param tuple statuses: the status of the jobs to requeue
+        :param bool reset_attempts: if True, the number of attempts of the requeued jobs is reset to 0
+
+        :return: the number of jobs requeued
+        :rtype: int
+        """
+        attempts = '0' if reset_attempts else 'attempts'
+        with self._connection:
+            cursor = self._connection.execute('UPDATE jobs SET status = ?, attempts = {} WHERE status IN ({})'.format(attempts, ', '.join('?' * len(statuses))),
+                                              (PENDING,) + tuple(statuses))
+        return cursor.rowcount
+
+    def claim(self):
+        """
+        Mark the first pending job as running.
+
+        :return: the id of the job, or None if no job is pending
+        """
+        with self._connection:
+            row = self._connection.execute('SELECT job_id FROM jobs WHERE status = ? ORDER BY rank LIMIT 1', (PENDING,)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute('UPDATE jobs SET status = ?, attempts = attempts + 1, started = ?, finished = NULL, duration = NULL WHERE job_id = ?',
+                                     (RUNNING, time.time(), row[0]))
+        return json.loads(row[0])
+
+    def complete(self, job_id, duration):
+        """
+        Mark a job as done.
+
+        :param job_id: the id of the job
+        :param float duration: the wall-clock duration of the attempt (s)
+        """
+        self._finish(job_id, DONE, duration, None, None)
+
+    def fail(self, job_id, duration, failure, error, retry):
+        """
+        Record the failure of an attempt of a job.
+
+        :param job_id: the id of the job
+        :param float duration: the wall-clock duration of the attempt (s)
+        :param str failure: the kind of failure, one of :attr:`ERROR`, :attr:`ABORTED`, :attr:`CRASH` and :attr:`TIMEOUT`
+        :param str error: the description of the error
+        :param bool retry: if True, the job is set back to pending, else it is marked as failed
+        """
+        self._finish(job_id, PENDING if retry else FAILED, duration, failure, error)
+
+    def _finish(self, job_id, status, duration, failure, error):
+        with self._connection:
+            self._connection.execute('UPDATE jobs SET status = ?, finished = ?, duration = ?, total_duration = total_duration + ?, failure = ?, error = ? '
+                                     'WHERE job_id = ?',
+                                     (status, time.time(), duration, duration, failure, error, _encode_job_id(job_id)))
+
+    def attempts(self, job_id):
+        """
+        :param job_id: the id of a job
+
+        :return: the number of attempts of the job
+        :rtype: int
+        """
+        row = self._connection.execute('SELECT attempts FROM jobs WHERE job_id = ?', (_encode_job_id(job_id),)).fetchone()
+        if row is None:
+            raise BatchError('Unknown job {!r}'.format(job_id))
+        return row[0]
+
+    def jobs(self, status=None):
+        """
+        The jobs of the queue, in the order of their submission.
+
+        :param str status: if not None, only the jobs with this status are returned
+
+        :return: a dictionary per job with the keys :attr:`_JOBS_COLUMNS`
+        :rtype: list
+        """
+        query = 'SELECT {} FROM jobs'.format(', '.join(_JOBS_COLUMNS))
+        parameters = ()
+        if status is not None:
+            query += ' WHERE status = ?'
+            parameters = (status,)
+        jobs = []
+        for row in self._connection.execute(query + ' ORDER BY rank', parameters):
+            job = dict(zip(_JOBS_COLUMNS, row))
+            job['job_id'] = json.loads(job['job_id'])
+            jobs.append(job)
+        return jobs
+
+    def counts(self):
+        """
+        :return: the number of jobs per status
+        :rtype: dict
+        """
+        counts = {status: 0 for status in (PENDING, RUNNING, DONE, FAILED)}
+        counts.update(self._connection.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+        return counts
+
+
+def is_batch_job():
+    """
+    Whether the current process runs a job of a batch (see :func:`run_batch`), or is a subprocess of such a process.
+
+    :return: True if the current process runs a job of a batch
+    :rtype: bool
+    """
+    return os.environ.get(BATCH_JOB_ENVIRONMENT_VARIABLE) == '1'
+
+
+def _run_job(function, job_id, memory_limit, transient_exceptions, connection):
+    """
+    Run a job in a worker process and send its result to the scheduler.
+
+    :param callable function: the function which runs a job
+    :param job_id: the id of the job, passed to `function`
+    :param int memory_limit: the maximum size of the virtual memory of the process (bytes), or None
+    :param tuple transient_exceptions: the exceptions after which the job is retried
+    :param multiprocessing.connection.Connection connection: the connection to the scheduler
+    """
+    os.environ[BATCH_JOB_ENVIRONMENT_VARIABLE] = '1'
+    if memory_limit is not None and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    try:
+        function(job_id)
+    except BaseException as e:
+        connection.send((False, isinstance(e, transient_exceptions), traceback.format_exc(), ABORTED if isinstance(e, SolverHealthError) else ERROR))
+    else:
+        connection.send((True, False, None, None))
+    finally:
+        connection.close()
+
+
+def run_batch(queue_path, function, jobs_ids=(), nb_workers=None, timeout=DEFAULT_TIMEOUT, memory_limit=DEFAULT_MEMORY_LIMIT, max_attempts=3,
+              transient_exceptions=TRANSIENT_EXCEPTIONS, retry_crashes=True, retry_timeouts=False, retry_failed=False, poll_interval=1., verbose=True):
+    """
+    Run the jobs of a queue in a pool of worker processes, until no job is pending.
+
+    The jobs `jobs_ids` are first added to the queue, then the jobs left running by an interrupted batch are requeued.
+    The jobs already done are not run again.
+
+    :param str queue_path: the path of the SQLite file of the queue
+    :param callable function: the function which runs a job, called with the id of the job. It must be picklable, i.e. defined at the top level of a module.
+           It must raise an exception if the job fails: if it catches the exceptions, it must re-raise them when :func:`is_batch_job` is True.
+    :param list jobs_ids: the ids of the jobs to add to the queue
+    :param int nb_workers: the number of jobs run simultaneously. If None, the number of CPUs
+    :param float timeout: the wall-clock timeout of an attempt (s). The process of a job which exceeds it is terminated. If None, no timeout
+    :param int memory_limit: the maximum size of the virtual memory of each worker process (bytes). If None, no limit.
+           Not supported on Windows.
+    :param int max_attempts: the maximum number of attempts of a job
+    :param tuple transient_exceptions: the exceptions after which a job is retried. The other exceptions make the job fail at once
+    :param bool retry_crashes: if True, a job whose process exits without result (e.g. killed by the system) is retried
+    :param bool retry_timeouts: if True, a job which exceeds `timeout` is retried
+    :param bool retry_failed: if True, the jobs which failed in a previous batch are requeued, with their attempts reset
+    :param float poll_interval: the maximum interval between two checks of the workers (s)
+    :param bool verbose: if True, print the end of each job
+
+    :return: the number of jobs per status at the end of the batch
+    :rtype: dict
+    """
+    if nb_workers is None:
+        nb_workers = mp.cpu_count()
+    if nb_workers < 1:
+        raise BatchError('The number of workers must be positive, got {}'.format(nb_workers))
+
+    with JobQueue(queue_path) as queue:
+        queue.submit(jobs_ids)
+        queue.requeue((RUNNING,))
+        if retry_failed:
+            queue.requeue((FAILED,), reset_attempts=True)
+
+        running = {}  # {job id: (process, connection, start time)}
+        try:
+            while True:
+                # start new jobs
+                while len(running) < nb_workers:
+                    job_id = queue.claim()
+                    if job_id is None:
+                        break
+                    parent_connection, child_connection = mp.Pipe(duplex=False)
+                    process = mp.Process(target=_run_job, args=(function, job_id, memory_limit, transient_exceptions, child_connection), name='job-{}'.format(job_id))
+                    process.start()
+                    child_connection.close()
+                    running[job_id] = (process, parent_connection, time.time())
+                if not running:
+                    break
+
+                wait_timeout = poll_interval
+                if timeout is not None:
+                    now = time.time()
+                    wait_timeout = max(0., min([wait_timeout] + [start + timeout - now for (_, _, start) in running.values()]))
+                wait([connection for (_, connection, _) in running.values()], wait_timeout)
+
+                # collect the results
+                for job_id, (process, connection, start) in list(running.items()):
+                    duration = time.time() - start
+                    result = None
+                    if connection.poll():
+                        try:
+                            result = connection.recv()
+                        except EOFError:  # the process exited without result
+                            process.join()
+                            result = (False, retry_crashes, 'exit code {}'.format(process.exitcode), CRASH)
+                    elif timeout is not None and duration > timeout:
+                        process.terminate()
+                        result = (False, retry_timeouts, 'timeout of {} s exceeded'.format(timeout), TIMEOUT)
+                    if result is None:
+                        continue
+
+                    process.join()
+                    connection.close()
+                    del running[job_id]
+                    success, transient, error, failure = result
+                    if success:
+                        queue.complete(job_id, duration)
+                        status = DONE
+                    else:
+                        retry = transient and queue.attempts(job_id) < max_attempts
+                        queue.fail(job_id, duration, failure, error, retry)
+                        status = PENDING if retry else FAILED
+                    if verbose:
+                        print('Job {}: {} in {:.1f} s{}'.format(job_id, status if success else failure, duration, ', retried' if status == PENDING else ''))
+        finally:
+            # the jobs interrupted are left running in the queue, and requeued when the batch is resumed
+            for process, connection, _ in running.values():
+                process.terminate()
+                process.join()
+                connection.close()
+
+        return queue.counts()
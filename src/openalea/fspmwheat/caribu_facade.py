@@ -7,7 +7,11 @@ import warnings
 from openalea.caribu.CaribuScene import CaribuScene
 from openalea.caribu.sky_tools import GenSky, GetLight, Gensun, GetLightsSun, spitters_horaire
 
-from openalea.fspmwheat import tools
+from openalea.fspmwheat import geometry, tools
+from openalea.fspmwheat.primitives import attach_primitives_store, get_primitives_store
+from openalea.fspmwheat.recorder import run_model
+from openalea.fspmwheat.state_store import get_state_store, mirror_in_state_store, sync_shared_mtg
+from openalea.fspmwheat.topology import get_topology_index
 
 """
     fspmwheat.caribu_facade
@@ -29,7 +33,7 @@ from openalea.fspmwheat import tools
 SHARED_ELEMENTS_INPUTS_OUTPUTS_INDEXES = ['plant', 'axis', 'metamer', 'organ', 'element']
 
 #: the outputs of Caribu
-CARIBU_OUTPUTS = ['PARa', 'Erel', 'PARa_prim', 'Erel_prim']
+CARIBU_OUTPUTS = ['PARa', 'Erel', 'Erel_prim', 'area_prim']
 
 
 class CaribuFacade(object):
@@ -45,18 +49,22 @@ class CaribuFacade(object):
                  shared_mtg,
                  shared_elements_inputs_outputs_df,
                  geometrical_model,
-                 update_shared_df=True):
+                 update_shared_df=True,
+                 recorder=None):
         """
         :param openalea.mtg.MTG shared_mtg: The MTG shared between all models.
         :param pandas.DataFrame shared_elements_inputs_outputs_df: The dataframe of inputs and outputs at elements scale shared between all models.
         :param openalea.adel.adel_dynamic.AdelWheatDyn geometrical_model: The model which deals with geometry. This model must have an attribute "domain".
         :param bool update_shared_df: If `True`  update the shared dataframes at init and at each run (unless stated otherwise)
+        :param fspmwheat.recorder.FacadeRecorder recorder: the recorder of the runs of the model (see :mod:`fspmwheat.recorder`), or None
         """
         self._shared_mtg = shared_mtg  #: the MTG shared between all models
+        self._recorder = recorder  #: the recorder of the runs of the model, or None
         self._shared_elements_inputs_outputs_df = shared_elements_inputs_outputs_df  #: the dataframe at elements scale shared between all models
         self._geometrical_model = geometrical_model  #: the model which deals with geometry
         self._alea_canopy = pd.DataFrame()  #: alea table to generate the heterogeneous canopy
         self._update_shared_df = update_shared_df
+        self._dark_outputs_vids = set()  #: the vertices whose null outputs of the current dark period are already in the shared dataframes
 
     def run(self, run_caribu, sun_sky_option='mix', energy=1, DOY=1, hourTU=12, latitude=48.85, diffuse_model='soc', azimuts=4, zenits=5, heterogeneous_canopy=False,
             plant_density=250., inter_row=0.15, update_shared_df=None, prim_scale=False):
@@ -76,8 +84,10 @@ class CaribuFacade(object):
         :param float plant_density: Number of plant per m2 in the stand (plant m-2).
         :param float inter_row: Inter-row spacing in the stand (m).
         :param bool update_shared_df: if 'True', update the shared dataframes at this time step.
-        :param bool prim_scale: If True, light distribution output at primitive scale, if not at organ scale
+        :param bool prim_scale: If True, light distribution output at primitive scale, if not at organ scale.
+               The absorbed PAR of the primitives is put in the store of the primitives attached to the MTG (see :func:`fspmwheat.primitives.attach_primitives_store`).
         """
+        sync_shared_mtg(self._shared_mtg)
         c_scene_sky, c_scene_sun, Erel_input, Erel_input_prim = self._initialize_model(run_caribu,
                                                                                        1,
                                                                                        diffuse_model,
@@ -93,7 +103,7 @@ class CaribuFacade(object):
         if run_caribu:
             #: Diffuse light
             if sun_sky_option == 'sky':
-                raw, aggregated_sky = c_scene_sky.run(direct=True, infinite=True)
+                raw, aggregated_sky = run_model(self._recorder, 'caribu', c_scene_sky, direct=True, infinite=True)
                 Erel_sky = aggregated_sky['par']['Eabs']  #: Erel is the relative surfacic absorbed energy per organ
                 PARa_sky = {k: v * energy for k, v in Erel_sky.items()}
                 Erel_output = Erel_sky
@@ -102,12 +112,12 @@ class CaribuFacade(object):
                 # Primitive scale
                 if prim_scale:
                     Erel_prim = raw['par']['Eabs']
-                    raw_Eabs_abs = {k: [Eabs * energy for Eabs in raw['par']['Eabs'][k]] for k in raw['par']['Eabs']}
-                    outputs.update({'Erel_prim': Erel_prim, 'PARa_prim': raw_Eabs_abs, 'area_prim': raw['par']['area']})
+                    self._get_primitives_store().fill(Erel_prim, raw['par']['area'], energy)
+                    outputs.update({'Erel_prim': Erel_prim, 'area_prim': raw['par']['area']})
 
             #: Direct light
             elif sun_sky_option == 'sun':
-                raw, aggregated_sun = c_scene_sun.run(direct=True, infinite=True)
+                raw, aggregated_sun = run_model(self._recorder, 'caribu', c_scene_sun, direct=True, infinite=True)
                 Erel_sun = aggregated_sun['par']['Eabs']  #: Erel is the relative surfacic absorbed energy per organ
                 PARa_sun = {k: v * energy for k, v in Erel_sun.items()}
                 Erel_output = Erel_sun
@@ -116,16 +126,16 @@ class CaribuFacade(object):
                 # Primitive scale
                 if prim_scale:
                     Erel_prim = raw['par']['Eabs']
-                    raw_Eabs_abs = {k: [Eabs * energy for Eabs in raw['par']['Eabs'][k]] for k in raw['par']['Eabs']}
-                    outputs.update({'Erel_prim': Erel_prim, 'PARa_prim': raw_Eabs_abs, 'area_prim': raw['par']['area']})
+                    self._get_primitives_store().fill(Erel_prim, raw['par']['area'], energy)
+                    outputs.update({'Erel_prim': Erel_prim, 'area_prim': raw['par']['area']})
 
             #: Mix sky-Sun
             elif sun_sky_option == 'mix':
                 #: Diffuse
-                raw_sky, aggregated_sky = c_scene_sky.run(direct=True, infinite=True)
+                raw_sky, aggregated_sky = run_model(self._recorder, 'caribu', c_scene_sky, direct=True, infinite=True)
                 Erel_sky = aggregated_sky['par']['Eabs']
                 #: Direct
-                raw_sun, aggregated_sun = c_scene_sun.run(direct=True, infinite=True)
+                raw_sun, aggregated_sun = run_model(self._recorder, 'caribu', c_scene_sun, direct=True, infinite=True)
                 Erel_sun = aggregated_sun['par']['Eabs']
 
                 #: Spitters's model estimating for the diffuse:direct ratio
@@ -149,17 +159,64 @@ class CaribuFacade(object):
             outputs.update({'PARa': PARa_output, 'Erel': Erel_output})
         else:
             PARa_output = {k: v * energy for k, v in Erel_input.items()}
-            raw_Eabs_abs = {k: [Eabs * energy for Eabs in Erel_input_prim[k]] for k in Erel_input_prim}
             outputs.update({'PARa': PARa_output})
 
             # Primitive scale
             if prim_scale:
-                outputs.update({'PARa_prim': raw_Eabs_abs})
+                primitives_store = get_primitives_store(self._shared_mtg)
+                if primitives_store is None:  # Caribu was not run on this MTG yet: use the primitives of the MTG
+                    primitives_store = attach_primitives_store(self._shared_mtg)
+                    primitives_store.fill(Erel_input_prim, self._shared_mtg.property('area_prim'))
+                primitives_store.set_energy(energy)
 
         # Updates
-        self.update_shared_MTG(outputs)
+        dark_period = not run_caribu and energy == 0
+        if dark_period:
+            # During the dark period, the outputs are null at each step: only push the ones which changed since the previous step
+            self.update_shared_MTG(self._changed_outputs(outputs))
+        else:
+            self.update_shared_MTG(outputs)
         if update_shared_df or (update_shared_df is None and self._update_shared_df):
-            self.update_shared_dataframes(outputs)
+            if dark_period:
+                # the null outputs do not change during the dark period: only write the rows of the elements created since the previous step
+                new_outputs = {param: {vid: value for vid, value in param_outputs.items() if vid not in self._dark_outputs_vids} for param, param_outputs in outputs.items()}
+                if any(new_outputs.values()):
+                    self.update_shared_dataframes(new_outputs)
+                for param_outputs in new_outputs.values():
+                    self._dark_outputs_vids.update(param_outputs)
+            else:
+                self.update_shared_dataframes(outputs)
+                self._dark_outputs_vids.clear()
+
+    def _get_primitives_store(self):
+        """
+        Get the store of the primitives attached to the MTG shared between all models, and attach a new one if needed.
+
+        :return: The store of the primitives of the elements.
+        :rtype: farquharwheat.simulation.PrimitivesStore
+        """
+        primitives_store = get_primitives_store(self._shared_mtg)
+        if primitives_store is None:
+            primitives_store = attach_primitives_store(self._shared_mtg)
+        return primitives_store
+
+    def _changed_outputs(self, outputs):
+        """
+        Select the outputs which differ from the values of the MTG shared between all models.
+
+        :param dict outputs: {'param1': { vid1: , vid2, ...}, 'param2': { vid1: , vid2, ...}}
+
+        :return: the outputs whose value is not already in the shared MTG, with the same structure as `outputs`
+        :rtype: dict
+        """
+        mtg_properties = self._shared_mtg.properties()
+        changed_outputs = {}
+        for param, param_outputs in outputs.items():
+            mtg_values = mtg_properties.get(param, {})
+            param_changed_outputs = {vid: value for vid, value in param_outputs.items() if vid not in mtg_values or mtg_values[vid] != value}
+            if param_changed_outputs:
+                changed_outputs[param] = param_changed_outputs
+        return changed_outputs
 
     def _initialize_model(self, run_caribu, energy, diffuse_model, azimuts, zenits, DOY, hourTU, latitude, heterogeneous_canopy, plant_density, inter_row):
         """
@@ -201,6 +258,7 @@ class CaribuFacade(object):
 
             #: Optical properties
             opt = {'par': {}}
+            geometry.update_geometry(self._shared_mtg)  # the geometry is updated only when it is read, and only if the dimensions of some organs changed
             geom = self._shared_mtg.property('geometry')
 
             for vid in geom.keys():
@@ -256,12 +314,13 @@ class CaribuFacade(object):
         # Built alea table if does not exist yet
         if self._alea_canopy.empty:
             elements_vid_list = []
-            for mtg_plant_vid in self._shared_mtg.components_iter(self._shared_mtg.root):
-                for mtg_axis_vid in self._shared_mtg.components_iter(mtg_plant_vid):
-                    for mtg_metamer_vid in self._shared_mtg.components_iter(mtg_axis_vid):
-                        for mtg_organ_vid in self._shared_mtg.components_iter(mtg_metamer_vid):
-                            for mtg_element_vid in self._shared_mtg.components_iter(mtg_organ_vid):
-                                if self._shared_mtg.label(mtg_element_vid) == 'LeafElement1':
+            topology = get_topology_index(self._shared_mtg)
+            for mtg_plant_vid in topology.components(topology.root):
+                for mtg_axis_vid in topology.components(mtg_plant_vid):
+                    for mtg_metamer_vid in topology.components(mtg_axis_vid):
+                        for mtg_organ_vid in topology.components(mtg_metamer_vid):
+                            for mtg_element_vid in topology.components(mtg_organ_vid):
+                                if topology.label(mtg_element_vid) == 'LeafElement1':
                                     elements_vid_list.append(mtg_element_vid)
             elements_vid_df = pd.DataFrame({'vid': elements_vid_list, 'tmp': 1})
             positions_df = pd.DataFrame({'pos': range(len(positions)),
@@ -325,6 +384,14 @@ class CaribuFacade(object):
             # update the MTG
             self._shared_mtg.property(param).update(aggregated_outputs[param])
 
+        if get_state_store(self._shared_mtg) is not None:
+            topology = get_topology_index(self._shared_mtg)
+            elements_data_dict = {}
+            for param, param_outputs in aggregated_outputs.items():
+                for vid, value in param_outputs.items():
+                    elements_data_dict.setdefault(topology.topology_id(vid), {})[param] = value
+            mirror_in_state_store(self._shared_mtg, {'elements': elements_data_dict})
+
     def update_shared_dataframes(self, aggregated_outputs):
         """
         Update the dataframes shared between all models from the inputs dataframes or the outputs dataframes of the model.
@@ -333,14 +400,13 @@ class CaribuFacade(object):
         ids = []
         ids_lidt_built = False
         aggregated_outputs_list = {}
+        topology = get_topology_index(self._shared_mtg)
 
         for param in aggregated_outputs.keys():
             aggregated_outputs_list[param] = []
             for vid in sorted(aggregated_outputs[param].keys()):
                 if not ids_lidt_built:
-                    ind = int(self._shared_mtg.index(self._shared_mtg.complex_at_scale(vid, 1))), self._shared_mtg.label(self._shared_mtg.complex_at_scale(vid, 2)), \
-                          int(self._shared_mtg.index(self._shared_mtg.complex_at_scale(vid, 3))), self._shared_mtg.label(self._shared_mtg.complex_at_scale(vid, 4)), self._shared_mtg.label(vid)
-                    ids.append(ind)
+                    ids.append(topology.topology_id(vid))
                 aggregated_outputs_list[param].append(aggregated_outputs[param][vid])
             ids_lidt_built = True
 
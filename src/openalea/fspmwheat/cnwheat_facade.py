@@ -6,6 +6,9 @@ from openalea.cnwheat import model as cnwheat_model, simulation as cnwheat_simul
     converter as cnwheat_converter, postprocessing as cnwheat_postprocessing, parameters as cnwheat_parameters
 
 from openalea.fspmwheat import tools
+from openalea.fspmwheat.recorder import run_model
+from openalea.fspmwheat.state_store import get_state_store, sync_shared_mtg
+from openalea.fspmwheat.topology import get_topology_index
 
 import numpy as np
 import math
@@ -79,7 +82,9 @@ class CNWheatFacade(object):
                  shared_hiddenzones_inputs_outputs_df,
                  shared_elements_inputs_outputs_df,
                  shared_soils_inputs_outputs_df,
-                 update_shared_df=True):
+                 update_shared_df=True,
+                 watchdog=None,
+                 recorder=None):
         """
         :param openalea.mtg.mtg.MTG shared_mtg: The MTG shared between all models.
         :param int delta_t: The delta between two runs, in seconds.
@@ -95,12 +100,16 @@ class CNWheatFacade(object):
         :param pandas.DataFrame shared_elements_inputs_outputs_df: the dataframe of inputs and outputs at elements scale shared between all models.
         :param pandas.DataFrame shared_soils_inputs_outputs_df: the dataframe of inputs and outputs at soils scale shared between all models.
         :param bool update_shared_df: If `True`  update the shared dataframes at init and at each run (unless stated otherwise)
+        :param wheatfspm.watchdog.SolverWatchdog watchdog: the watchdog which monitors the health of the solver of CNWheat, or None
+        :param fspmwheat.recorder.FacadeRecorder recorder: the recorder of the runs of the model (see :mod:`fspmwheat.recorder`), or None
 
         """
 
         self._shared_mtg = shared_mtg  #: the MTG shared between all models
+        self._recorder = recorder  #: the recorder of the runs of the model, or None
 
-        self._simulation = cnwheat_simulation.Simulation(respiration_model=respiwheat_model, delta_t=delta_t, culm_density=culm_density)
+        self._simulation = cnwheat_simulation.Simulation(respiration_model=respiwheat_model, delta_t=delta_t, culm_density=culm_density,
+                                                          watchdog=watchdog)
 
         self.population, self.soils = cnwheat_converter.from_dataframes(model_organs_inputs_df, model_hiddenzones_inputs_df, model_elements_inputs_df, model_soils_inputs_df)
 
@@ -133,8 +142,9 @@ class CNWheatFacade(object):
         :param bool update_shared_df: if 'True', update the shared dataframes at this time step.
         """
 
+        sync_shared_mtg(self._shared_mtg)
         self._initialize_model(Tair=Tair, Tsoil=Tsoil, tillers_replications=tillers_replications)
-        self._simulation.run()
+        run_model(self._recorder, 'cnwheat', self._simulation)
         self._update_shared_MTG()
 
         if update_shared_df or (update_shared_df is None and self._update_shared_df):
@@ -223,14 +233,15 @@ class CNWheatFacade(object):
         self.population = cnwheat_model.Population()
 
         # traverse the MTG recursively from top
-        for mtg_plant_vid in self._shared_mtg.components_iter(self._shared_mtg.root):
-            mtg_plant_index = int(self._shared_mtg.index(mtg_plant_vid))
+        topology = get_topology_index(self._shared_mtg)
+        for mtg_plant_vid in topology.components(topology.root):
+            mtg_plant_index = topology.index(mtg_plant_vid)
             # create a new plant
             cnwheat_plant = cnwheat_model.Plant(mtg_plant_index)
             is_valid_plant = False
 
-            for mtg_axis_vid in self._shared_mtg.components_iter(mtg_plant_vid):
-                mtg_axis_label = self._shared_mtg.label(mtg_axis_vid)
+            for mtg_axis_vid in topology.components(mtg_plant_vid):
+                mtg_axis_label = topology.label(mtg_axis_vid)
 
                 #: Hack to treat tillering cases : TEMPORARY
                 if mtg_axis_label != 'MS':
@@ -251,7 +262,7 @@ class CNWheatFacade(object):
                     mtg_axis_properties = self._shared_mtg.get_vertex_property(mtg_axis_vid)
                     if mtg_organ_label in mtg_axis_properties:
                         mtg_organ_properties = mtg_axis_properties[mtg_organ_label]
-                        cnwheat_organ_data_names = set(cnwheat_simulation.Simulation.ORGANS_STATE).intersection(cnwheat_organ.__dict__)
+                        cnwheat_organ_data_names = set(data_name for data_name in cnwheat_simulation.Simulation.ORGANS_STATE if hasattr(cnwheat_organ, data_name))
                         if set(mtg_organ_properties).issuperset(cnwheat_organ_data_names):
                             cnwheat_organ_data_dict = {}
                             for cnwheat_organ_data_name in cnwheat_organ_data_names:
@@ -261,7 +272,8 @@ class CNWheatFacade(object):
                                 if math.isnan(mtg_organ_properties[cnwheat_organ_data_name]) or mtg_organ_properties[cnwheat_organ_data_name] is None:
                                     print('Missing variable', cnwheat_organ_data_name, 'for vertex id', mtg_axis_vid, 'which is', mtg_organ_label)
 
-                            cnwheat_organ.__dict__.update(cnwheat_organ_data_dict)
+                            for cnwheat_organ_data_name, cnwheat_organ_data_value in cnwheat_organ_data_dict.items():
+                                setattr(cnwheat_organ, cnwheat_organ_data_name, cnwheat_organ_data_value)
 
                             # Update parameters if specified
                             if mtg_organ_label in self._update_parameters:
@@ -281,8 +293,8 @@ class CNWheatFacade(object):
                     continue
 
                 has_valid_phytomer = False
-                for mtg_metamer_vid in self._shared_mtg.components_iter(mtg_axis_vid):
-                    mtg_metamer_index = int(self._shared_mtg.index(mtg_metamer_vid))
+                for mtg_metamer_vid in topology.components(mtg_axis_vid):
+                    mtg_metamer_index = topology.index(mtg_metamer_vid)
 
                     # create a new phytomer
                     cnwheat_phytomer = cnwheat_model.Phytomer(mtg_metamer_index, cohorts=cnwheat_plant.cohorts, cohorts_replications=cohorts_replications)  #: Hack to treat tillering cases :TEMPORARY
@@ -315,8 +327,8 @@ class CNWheatFacade(object):
                         has_valid_hiddenzone = False
 
                     has_valid_organ = False
-                    for mtg_organ_vid in self._shared_mtg.components_iter(mtg_metamer_vid):
-                        mtg_organ_label = self._shared_mtg.label(mtg_organ_vid)
+                    for mtg_organ_vid in topology.components(mtg_metamer_vid):
+                        mtg_organ_label = topology.label(mtg_organ_vid)
                         if mtg_organ_label not in MTG_TO_CNWHEAT_PHYTOMERS_ORGANS_MAPPING or self._shared_mtg.get_vertex_property(mtg_organ_vid)['length'] == 0:
                             continue
 
@@ -332,9 +344,9 @@ class CNWheatFacade(object):
                         has_valid_element = False
 
                         # Create a new element
-                        for mtg_element_vid in self._shared_mtg.components_iter(mtg_organ_vid):
+                        for mtg_element_vid in topology.components(mtg_organ_vid):
                             mtg_element_properties = self._shared_mtg.get_vertex_property(mtg_element_vid)
-                            mtg_element_label = self._shared_mtg.label(mtg_element_vid)
+                            mtg_element_label = topology.label(mtg_element_vid)
                             if mtg_element_label not in cnwheat_converter.DATAFRAME_TO_CNWHEAT_ELEMENTS_NAMES_MAPPING \
                                     or (self._shared_mtg.get_vertex_property(mtg_element_vid)['length'] == 0) \
                                     or (self._shared_mtg.get_vertex_property(mtg_element_vid).get('mstruct', 0) == 0) \
@@ -394,21 +406,13 @@ class CNWheatFacade(object):
             if cnwheat_organ_label not in mtg_property_names:
                 self._shared_mtg.add_property(cnwheat_organ_label)
 
-        mtg_plants_iterator = self._shared_mtg.components_iter(self._shared_mtg.root)
+        topology = get_topology_index(self._shared_mtg)
         # traverse CN-Wheat population from top
         for cnwheat_plant in self.population.plants:
             cnwheat_plant_index = cnwheat_plant.index
-            while True:
-                mtg_plant_vid = next(mtg_plants_iterator)
-                if int(self._shared_mtg.index(mtg_plant_vid)) == cnwheat_plant_index:
-                    break
-            mtg_axes_iterator = self._shared_mtg.components_iter(mtg_plant_vid)
             for cnwheat_axis in cnwheat_plant.axes:
                 cnwheat_axis_label = cnwheat_axis.label
-                while True:
-                    mtg_axis_vid = next(mtg_axes_iterator)
-                    if self._shared_mtg.label(mtg_axis_vid) == cnwheat_axis_label:
-                        break
+                mtg_axis_vid = topology.vid((cnwheat_plant_index, cnwheat_axis_label))
 
                 cnwheat_axis_property_names = [property_name for property_name in cnwheat_simulation.Simulation.AXES_RUN_VARIABLES if hasattr(cnwheat_axis, property_name)]
                 for cnwheat_axis_property_name in cnwheat_axis_property_names:
@@ -425,13 +429,9 @@ class CNWheatFacade(object):
                     for cnwheat_property_name in cnwheat_simulation.Simulation.ORGANS_RUN_VARIABLES:
                         if hasattr(cnwheat_organ, cnwheat_property_name):
                             mtg_organ_properties[cnwheat_property_name] = getattr(cnwheat_organ, cnwheat_property_name)
-                mtg_metamers_iterator = self._shared_mtg.components_iter(mtg_axis_vid)
                 for cnwheat_phytomer in cnwheat_axis.phytomers:
                     cnwheat_phytomer_index = cnwheat_phytomer.index
-                    while True:
-                        mtg_metamer_vid = next(mtg_metamers_iterator)
-                        if int(self._shared_mtg.index(mtg_metamer_vid)) == cnwheat_phytomer_index:
-                            break
+                    mtg_metamer_vid = topology.vid((cnwheat_plant_index, cnwheat_axis_label, cnwheat_phytomer_index))
                     if cnwheat_phytomer.hiddenzone is not None:
                         mtg_hiddenzone_label = cnwheat_converter.CNWHEAT_CLASSES_TO_DATAFRAME_ORGANS_MAPPING[cnwheat_model.HiddenZone]
                         if mtg_hiddenzone_label not in self._shared_mtg.get_vertex_property(mtg_metamer_vid):
@@ -442,8 +442,8 @@ class CNWheatFacade(object):
                         for cnwheat_property_name in cnwheat_simulation.Simulation.HIDDENZONE_RUN_VARIABLES:
                             if hasattr(cnwheat_phytomer.hiddenzone, cnwheat_property_name):
                                 mtg_hiddenzone_properties[cnwheat_property_name] = getattr(cnwheat_phytomer.hiddenzone, cnwheat_property_name)
-                    for mtg_organ_vid in self._shared_mtg.components_iter(mtg_metamer_vid):
-                        mtg_organ_label = self._shared_mtg.label(mtg_organ_vid)
+                    for mtg_organ_vid in topology.components(mtg_metamer_vid):
+                        mtg_organ_label = topology.label(mtg_organ_vid)
                         if mtg_organ_label not in MTG_TO_CNWHEAT_PHYTOMERS_ORGANS_MAPPING:
                             continue
                         cnwheat_organ = getattr(cnwheat_phytomer, CNWHEAT_ATTRIBUTES_MAPPING[MTG_TO_CNWHEAT_PHYTOMERS_ORGANS_MAPPING[mtg_organ_label]])
@@ -458,8 +458,8 @@ class CNWheatFacade(object):
                             elif cnwheat_organ_property_name not in self._shared_mtg.get_vertex_property(mtg_organ_vid):
                                 self._shared_mtg.property(cnwheat_organ_property_name)[mtg_organ_vid] = attribute_value
 
-                        for mtg_element_vid in self._shared_mtg.components_iter(mtg_organ_vid):
-                            mtg_element_label = self._shared_mtg.label(mtg_element_vid)
+                        for mtg_element_vid in topology.components(mtg_organ_vid):
+                            mtg_element_label = topology.label(mtg_element_vid)
                             if mtg_element_label not in cnwheat_converter.DATAFRAME_TO_CNWHEAT_ELEMENTS_NAMES_MAPPING:
                                 continue
                             cnwheat_element = getattr(cnwheat_organ, cnwheat_converter.DATAFRAME_TO_CNWHEAT_ELEMENTS_NAMES_MAPPING[mtg_element_label])
@@ -481,6 +481,11 @@ class CNWheatFacade(object):
                         if hasattr(self.soils[axis_id], cnwheat_property_name):
                             mtg_soil_properties[cnwheat_property_name] = getattr(self.soils[axis_id], cnwheat_property_name)
 
+        # CN-Wheat updates the whole population : refresh the shared state store, if any, from the MTG
+        state_store = get_state_store(self._shared_mtg)
+        if state_store is not None:
+            state_store.load_from_mtg()
+
     def _update_shared_dataframes(self, cnwheat_axes_data_df=None, cnwheat_organs_data_df=None,
                                   cnwheat_hiddenzones_data_df=None, cnwheat_elements_data_df=None,
                                   cnwheat_soils_data_df=None):
@@ -2,7 +2,10 @@
 import numpy as np
 
 from openalea.elongwheat import converter, simulation
-from openalea.fspmwheat import tools
+from openalea.fspmwheat import geometry, tools
+from openalea.fspmwheat.recorder import run_model
+from openalea.fspmwheat.state_store import mirror_in_state_store, sync_shared_mtg
+from openalea.fspmwheat.topology import AXIS_SCALE, get_topology_index, invalidate_topology_index
 
 """
     fspmwheat.elongwheat_facade
@@ -47,7 +50,7 @@ class ElongWheatFacade(object):
                  shared_hiddenzones_inputs_outputs_df,
                  shared_elements_inputs_outputs_df,
                  geometrical_model, phytoT=None, update_parameters=None,
-                 update_shared_df=True, option_static=False):
+                 update_shared_df=True, option_static=False, recorder=None):
         """
         :param openalea.mtg.mtg.MTG shared_mtg: The MTG shared between all models.
         :param int delta_t: The delta between two runs, in seconds.
@@ -63,15 +66,23 @@ class ElongWheatFacade(object):
         :param dict update_parameters: A dictionary with the parameters to update, should have the form {'param1': value1, 'param2': value2, ...}.
         :param bool update_shared_df: If `True`  update the shared dataframes at init and at each run (unless stated otherwise)
         :param bool option_static: Whether the model should be run for a static plant architecture
+        :param fspmwheat.recorder.FacadeRecorder recorder: the recorder of the runs of the model (see :mod:`fspmwheat.recorder`), or None
         """
 
         self._shared_mtg = shared_mtg  #: the MTG shared between all models
+        self._recorder = recorder  #: the recorder of the runs of the model, or None
 
         self._simulation = simulation.Simulation(delta_t=delta_t, update_parameters=update_parameters)  #: the simulator to use to run the model
 
         self.geometrical_model = geometrical_model  #: the model which deals with geometry
+        #: the manager of the geometry of the shared MTG, which updates the geometry when it is read. Not used for a static plant architecture.
+        self._geometry_manager = geometry.GeometryManager(shared_mtg, geometrical_model) if option_static else geometry.get_geometry_manager(shared_mtg, geometrical_model)
         self._phytoT = phytoT  #: dataframe generated by adel and needed by the method add_metamer()
 
+        #: the names of the element inputs which were not read from the MTG at the last initialization of the model: {element_id: [input_name, ...], ...}
+        #: They are written in the MTG with the outputs of the model.
+        self._completed_elements_inputs = {}
+
         all_elongwheat_inputs_dict = converter.from_dataframes(model_hiddenzones_inputs_df, model_elements_inputs_df, model_axes_inputs_df)
         self._update_shared_MTG(all_elongwheat_inputs_dict['hiddenzone'], all_elongwheat_inputs_dict['elements'], all_elongwheat_inputs_dict['axes'], option_static)
 
@@ -92,8 +103,9 @@ class ElongWheatFacade(object):
         :param bool optimal_growth_option: if True the model will assume optimal growth conditions
         :param bool update_shared_df: if 'True', update the shared dataframes at this time step.
         """
+        sync_shared_mtg(self._shared_mtg)
         self._initialize_model()
-        self._simulation.run(Tair, Tsoil, optimal_growth_option)
+        run_model(self._recorder, 'elongwheat', self._simulation, Tair, Tsoil, optimal_growth_option)
         self._update_shared_MTG(self._simulation.outputs['hiddenzone'], self._simulation.outputs['elements'], self._simulation.outputs['axes'], option_static)
 
         if update_shared_df or (update_shared_df is None and self._update_shared_df):
@@ -109,13 +121,16 @@ class ElongWheatFacade(object):
         all_elongwheat_SAM_temperature_dict = {}
         all_elongwheat_length_dict = {}
         elongwheat_cumulated_internode_length = {}
+        self._completed_elements_inputs.clear()
+
+        topology = get_topology_index(self._shared_mtg)
 
-        for mtg_plant_vid in self._shared_mtg.components_iter(self._shared_mtg.root):
-            mtg_plant_index = int(self._shared_mtg.index(mtg_plant_vid))
+        for mtg_plant_vid in topology.components(topology.root):
+            mtg_plant_index = topology.index(mtg_plant_vid)
 
             # Axis scale
-            for mtg_axis_vid in self._shared_mtg.components_iter(mtg_plant_vid):
-                mtg_axis_label = self._shared_mtg.label(mtg_axis_vid)
+            for mtg_axis_vid in topology.components(mtg_plant_vid):
+                mtg_axis_label = topology.label(mtg_axis_vid)
                 # if mtg_axis_label != 'MS':
                 #     continue
                 mtg_axis_properties = self._shared_mtg.get_vertex_property(mtg_axis_vid)
@@ -140,8 +155,8 @@ class ElongWheatFacade(object):
                     elongwheat_cumulated_internode_length[axis_id] = []
 
                 # Metamer scale
-                for mtg_metamer_vid in self._shared_mtg.components_iter(mtg_axis_vid):
-                    mtg_metamer_index = int(self._shared_mtg.index(mtg_metamer_vid))
+                for mtg_metamer_vid in topology.components(mtg_axis_vid):
+                    mtg_metamer_index = topology.index(mtg_metamer_vid)
                     elongwheat_hiddenzone_data_from_mtg_organs_data = {}  # TODO: a voir si c'est toujours utile
 
                     mtg_metamer_properties = self._shared_mtg.get_vertex_property(mtg_metamer_vid)
@@ -172,15 +187,15 @@ class ElongWheatFacade(object):
                                 elongwheat_cumulated_internode_length[axis_id].append(mtg_hiddenzone_properties['internode_L'])
                                 all_elongwheat_length_dict[axis_id][mtg_metamer_index]['cumulated_internode'].extend(elongwheat_cumulated_internode_length[axis_id])
                             else:
-                                internode_organ_vid = self._shared_mtg.components_at_scale(mtg_metamer_vid, 4)[0]
-                                assert self._shared_mtg.label(internode_organ_vid) == 'internode'
-                                internode_element_labels = [self._shared_mtg.label(internode_element) for internode_element in self._shared_mtg.components_at_scale(internode_organ_vid, 5)]
+                                internode_organ_vid = topology.components(mtg_metamer_vid)[0]
+                                assert topology.label(internode_organ_vid) == 'internode'
+                                internode_element_labels = [topology.label(internode_element) for internode_element in topology.components(internode_organ_vid)]
                                 if internode_element_labels == ['baseElement', 'topElement']:
                                     all_elongwheat_length_dict[axis_id][mtg_metamer_index]['cumulated_internode'].extend(elongwheat_cumulated_internode_length[axis_id])
 
                     # Organ scale
-                    for mtg_organ_vid in self._shared_mtg.components_iter(mtg_metamer_vid):
-                        mtg_organ_label = self._shared_mtg.label(mtg_organ_vid)
+                    for mtg_organ_vid in topology.components(mtg_metamer_vid):
+                        mtg_organ_label = topology.label(mtg_organ_vid)
                         mtg_organ_properties = self._shared_mtg.get_vertex_property(mtg_organ_vid)
                         if np.nan_to_num(self._shared_mtg.property('length').get(mtg_organ_vid, 0)) == 0:
                             continue
@@ -188,12 +203,13 @@ class ElongWheatFacade(object):
                             elongwheat_hiddenzone_data_from_mtg_organs_data['lamina_Lmax'] = mtg_organ_properties['shape_mature_length']
                             elongwheat_hiddenzone_data_from_mtg_organs_data['leaf_Wmax'] = mtg_organ_properties['shape_max_width']
                         # Element scale
-                        for mtg_element_vid in self._shared_mtg.components_iter(mtg_organ_vid):
-                            mtg_element_label = self._shared_mtg.label(mtg_element_vid)
+                        for mtg_element_vid in topology.components(mtg_organ_vid):
+                            mtg_element_label = topology.label(mtg_element_vid)
                             mtg_element_properties = self._shared_mtg.get_vertex_property(mtg_element_vid)
                             if np.nan_to_num(self._shared_mtg.property('length').get(mtg_element_vid, 0)) == 0:
                                 continue
-                            if np.isnan(mtg_element_properties.get('age', 0)):
+                            is_age_completed = np.isnan(mtg_element_properties.get('age', 0))
+                            if is_age_completed:
                                 mtg_element_properties['age'] = 0.
                             if set(mtg_element_properties).issuperset(simulation.ELEMENT_INPUTS):
                                 elongwheat_element_inputs_dict = {}
@@ -201,6 +217,8 @@ class ElongWheatFacade(object):
                                     elongwheat_element_inputs_dict[elongwheat_element_input_name] = mtg_element_properties[elongwheat_element_input_name]
                                 element_id = (mtg_plant_index, mtg_axis_label, mtg_metamer_index, mtg_organ_label, mtg_element_label)
                                 all_elongwheat_elements_dict[element_id] = elongwheat_element_inputs_dict
+                                if is_age_completed:
+                                    self._completed_elements_inputs[element_id] = ['age']
                                 # Complete dict of lengths
                                 if mtg_organ_label == 'sheath' and not mtg_element_properties['is_growing']:
                                     all_elongwheat_length_dict[axis_id][mtg_metamer_index]['sheath'].append(mtg_element_properties['length'])
@@ -246,33 +264,60 @@ class ElongWheatFacade(object):
                     axis_to_metamers_mapping[axis_id] = []
                 axis_to_metamers_mapping[axis_id].append(metamer_id)
 
-            for mtg_plant_vid in self._shared_mtg.components_iter(self._shared_mtg.root):
-                mtg_plant_index = int(self._shared_mtg.index(mtg_plant_vid))
-                for mtg_axis_vid in self._shared_mtg.components_iter(mtg_plant_vid):
-                    mtg_axis_label = self._shared_mtg.label(mtg_axis_vid)
-                    mtg_metamer_ids = set([(mtg_plant_index, mtg_axis_label, int(self._shared_mtg.index(mtg_metamer_vid))) for mtg_metamer_vid in self._shared_mtg.components_iter(mtg_axis_vid)])
-                    if (mtg_plant_index, mtg_axis_label) not in axis_to_metamers_mapping:
-                        continue
-                    new_metamer_ids = set(axis_to_metamers_mapping[(mtg_plant_index, mtg_axis_label)]).difference(mtg_metamer_ids)
-                    for _ in new_metamer_ids:
-                        self.geometrical_model.add_metamer(self._shared_mtg, self._phytoT, plant=mtg_plant_index, axe=mtg_axis_label)  # Add new metamer with only top and base element
-                    # default value to age property in order to run  update_geometry()
-                    for mtg_organ_vid in self._shared_mtg.components_at_scale(mtg_axis_vid, 4):
-                        if self._shared_mtg.property('label')[mtg_organ_vid] == 'blade':
+            topology = get_topology_index(self._shared_mtg)
+            updated_axes_vids = []
+            new_metamers_added = False
+            for mtg_axis_vid in topology.vertices(AXIS_SCALE):
+                axis_id = topology.topology_id(mtg_axis_vid)
+                if axis_id not in axis_to_metamers_mapping:
+                    continue
+                updated_axes_vids.append(mtg_axis_vid)
+                mtg_metamer_ids = set([topology.topology_id(mtg_metamer_vid) for mtg_metamer_vid in topology.components(mtg_axis_vid)])
+                new_metamer_ids = set(axis_to_metamers_mapping[axis_id]).difference(mtg_metamer_ids)
+                for _ in new_metamer_ids:
+                    self.geometrical_model.add_metamer(self._shared_mtg, self._phytoT, plant=axis_id[0], axe=axis_id[1])  # Add new metamer with only top and base element
+                    new_metamers_added = True
+            if new_metamers_added:
+                invalidate_topology_index(self._shared_mtg)
+                topology = get_topology_index(self._shared_mtg)
+
+            # default value to age property in order to run  update_geometry()
+            for mtg_axis_vid in updated_axes_vids:
+                for mtg_metamer_vid in topology.components(mtg_axis_vid):
+                    for mtg_organ_vid in topology.components(mtg_metamer_vid):
+                        if topology.label(mtg_organ_vid) == 'blade':
                             self._shared_mtg.property('age')[mtg_organ_vid] = self._shared_mtg.property('age').get(mtg_organ_vid, 0)
 
-            self.geometrical_model.update_geometry(self._shared_mtg)  # Add HiddenElement and Stem/Leaf Element
+            # Add HiddenElement and Stem/Leaf Element. The update of the geometry is needed only if some elements are missing in the MTG ;
+            # otherwise, it is done later, when the geometry is read
+            if new_metamers_added or any(element_id not in topology for element_id in all_elongwheat_elements_data_dict):
+                self._geometry_manager.update_geometry(force=True)
+
+        # only the data updated by the model are written in the MTG, plus the element inputs which were not read from the MTG
+        elongwheat_hiddenzones_modified_data = tools.get_modified_data(all_elongwheat_hiddenzones_data_dict)
+        elongwheat_elements_modified_data = dict(tools.get_modified_data(all_elongwheat_elements_data_dict))
+        elongwheat_axes_modified_data = tools.get_modified_data(all_elongwheat_axes_data_dict)
+        for element_id, completed_element_inputs in self._completed_elements_inputs.items():
+            if element_id in all_elongwheat_elements_data_dict:
+                elongwheat_element_data_dict = all_elongwheat_elements_data_dict[element_id]
+                elongwheat_element_modified_data = {input_name: elongwheat_element_data_dict[input_name] for input_name in completed_element_inputs}
+                elongwheat_element_modified_data.update(elongwheat_elements_modified_data.get(element_id, {}))
+                elongwheat_elements_modified_data[element_id] = elongwheat_element_modified_data
 
         # update the properties of the MTG
-        for mtg_plant_vid in self._shared_mtg.components_iter(self._shared_mtg.root):
-            mtg_plant_index = int(self._shared_mtg.index(mtg_plant_vid))
+        removed_hiddenzones_ids = []
+        # the geometry is updated only for the elements which are still missing in the MTG, i.e. not created by a previous update of the geometry.
+        # The topology index, invalidated by these updates, is rebuilt once by the next reader: meanwhile, the new elements are looked up in the MTG.
+        topology = get_topology_index(self._shared_mtg)
+        for mtg_plant_vid in topology.components(topology.root):
+            mtg_plant_index = topology.index(mtg_plant_vid)
 
             # Axis scale
-            for mtg_axis_vid in self._shared_mtg.components_iter(mtg_plant_vid):
-                mtg_axis_label = self._shared_mtg.label(mtg_axis_vid)
+            for mtg_axis_vid in topology.components(mtg_plant_vid):
+                mtg_axis_label = topology.label(mtg_axis_vid)
                 axis_id = (mtg_plant_index, mtg_axis_label)
-                if axis_id in all_elongwheat_axes_data_dict:
-                    elongwheat_axis_data_dict = all_elongwheat_axes_data_dict[axis_id]
+                if axis_id in elongwheat_axes_modified_data:
+                    elongwheat_axis_data_dict = elongwheat_axes_modified_data[axis_id]
                     for axis_data_name, axis_data_value in elongwheat_axis_data_dict.items():
                         self._shared_mtg.property(axis_data_name)[mtg_axis_vid] = axis_data_value
 
@@ -280,8 +325,8 @@ class ElongWheatFacade(object):
                     continue
 
                 # metamer scale
-                for mtg_metamer_vid in self._shared_mtg.components_iter(mtg_axis_vid):
-                    mtg_metamer_index = int(self._shared_mtg.index(mtg_metamer_vid))
+                for mtg_metamer_vid in topology.components(mtg_axis_vid):
+                    mtg_metamer_index = topology.index(mtg_metamer_vid)
                     hiddenzone_id = (mtg_plant_index, mtg_axis_label, mtg_metamer_index)
                     mtg_organs_data_from_elongwheat_hiddenzone_data = {}
                     if hiddenzone_id in all_elongwheat_hiddenzones_data_dict:
@@ -290,18 +335,20 @@ class ElongWheatFacade(object):
                         if 'hiddenzone' not in mtg_metamer_properties:
                             self._shared_mtg.property('hiddenzone')[mtg_metamer_vid] = {}
 
-                        for hiddenzone_data_name, hiddenzone_data_value in elongwheat_hiddenzone_data_dict.items():
+                        for hiddenzone_data_name, hiddenzone_data_value in elongwheat_hiddenzones_modified_data.get(hiddenzone_id, {}).items():
                             self._shared_mtg.property('hiddenzone')[mtg_metamer_vid][hiddenzone_data_name] = hiddenzone_data_value
-                            if hiddenzone_data_name in ('lamina_Lmax', 'leaf_Wmax'):
-                                mtg_organs_data_from_elongwheat_hiddenzone_data[hiddenzone_data_name] = hiddenzone_data_value  # To be stored at organ scale (see below)
+                        for hiddenzone_data_name in ('lamina_Lmax', 'leaf_Wmax'):
+                            if hiddenzone_data_name in elongwheat_hiddenzone_data_dict:
+                                mtg_organs_data_from_elongwheat_hiddenzone_data[hiddenzone_data_name] = elongwheat_hiddenzone_data_dict[hiddenzone_data_name]  # To be stored at organ scale (see below)
 
                     elif 'hiddenzone' in self._shared_mtg.get_vertex_property(mtg_metamer_vid):
                         # remove the 'hiddenzone' property from this metamer
                         del self._shared_mtg.property('hiddenzone')[mtg_metamer_vid]
+                        removed_hiddenzones_ids.append(hiddenzone_id)
 
                     # Organ scale
-                    for mtg_organ_vid in self._shared_mtg.components_iter(mtg_metamer_vid):
-                        mtg_organ_label = self._shared_mtg.label(mtg_organ_vid)
+                    for mtg_organ_vid in topology.components(mtg_metamer_vid):
+                        mtg_organ_label = topology.label(mtg_organ_vid)
 
                         if mtg_organ_label not in ('blade', 'sheath', 'internode'):
                             continue
@@ -318,28 +365,28 @@ class ElongWheatFacade(object):
                         # Data from hidden zones to be stored at organ scale
                         if mtg_organ_label == 'blade':
                             if len(mtg_organs_data_from_elongwheat_hiddenzone_data) != 0:
-                                self._shared_mtg.property('shape_mature_length')[mtg_organ_vid] = mtg_organs_data_from_elongwheat_hiddenzone_data['lamina_Lmax']
-                                self._shared_mtg.property('shape_max_width')[mtg_organ_vid] = mtg_organs_data_from_elongwheat_hiddenzone_data['leaf_Wmax']
+                                self._geometry_manager.set_property('shape_mature_length', mtg_organ_vid, mtg_organs_data_from_elongwheat_hiddenzone_data['lamina_Lmax'])
+                                self._geometry_manager.set_property('shape_max_width', mtg_organ_vid, mtg_organs_data_from_elongwheat_hiddenzone_data['leaf_Wmax'])
                             else:
                                 blade_id = organ_id + ('LeafElement1',)
                                 if blade_id in all_elongwheat_elements_data_dict.keys():
-                                    self._shared_mtg.property('shape_mature_length')[mtg_organ_vid] = all_elongwheat_elements_data_dict[organ_id + ('LeafElement1',)]['length']
-                                    self._shared_mtg.property('shape_max_width')[mtg_organ_vid] = all_elongwheat_elements_data_dict[organ_id + ('LeafElement1',)]['Wmax']
+                                    self._geometry_manager.set_property('shape_mature_length', mtg_organ_vid, all_elongwheat_elements_data_dict[organ_id + ('LeafElement1',)]['length'])
+                                    self._geometry_manager.set_property('shape_max_width', mtg_organ_vid, all_elongwheat_elements_data_dict[organ_id + ('LeafElement1',)]['Wmax'])
 
                         # Update of organ scale from elements dataframe
                         # Organ length should be correct in order to get correct lengths at both organ and element scales after performing the update_geometry()
                         organ_visible_length = all_elongwheat_elements_data_dict.get(organ_id + ('LeafElement1',), {}).get('length', 0.) + \
                                                all_elongwheat_elements_data_dict.get(organ_id + ('StemElement',), {}).get('length', 0.)
-                        self._shared_mtg.property('visible_length')[mtg_organ_vid] = organ_visible_length
+                        self._geometry_manager.set_property('visible_length', mtg_organ_vid, organ_visible_length)
                         self._shared_mtg.property('age')[mtg_organ_vid] = all_elongwheat_elements_data_dict.get(organ_id + ('LeafElement1',), {}).get('age', 0.)
                         organ_hidden_length = all_elongwheat_elements_data_dict.get(organ_id + ('HiddenElement',), {}).get('length', 0.)
                         total_organ_length = organ_visible_length + organ_hidden_length
-                        self._shared_mtg.property('length')[mtg_organ_vid] = total_organ_length
+                        self._geometry_manager.set_property('length', mtg_organ_vid, total_organ_length)
 
                         # Element scale. Most of the code is temporary, waiting for an update of adel in order that the model could update organ properties from elements.
                         mtg_element_labels = {}
-                        for actual_element_vid in self._shared_mtg.components_iter(mtg_organ_vid):
-                            actual_element_label = self._shared_mtg.label(actual_element_vid)
+                        for actual_element_vid in topology.components(mtg_organ_vid):
+                            actual_element_label = topology.label(actual_element_vid)
                             mtg_element_labels[actual_element_label] = actual_element_vid
                         potential_element_ids = [organ_id + (element_type,) for element_type in ELEMENT_TYPES]
                         for element_id in potential_element_ids:
@@ -349,22 +396,24 @@ class ElongWheatFacade(object):
                                 # Element just created by elongwheat but not yet in MTG
                                 if element_label not in mtg_element_labels.keys():  # MG : This case does not seem to be usefull
                                     if element_label in ('StemElement', 'LeafElement1'):
-                                        self._shared_mtg.property('visible_length')[mtg_organ_vid] = elongwheat_element_data_dict['length']
-                                    self.geometrical_model.update_geometry(self._shared_mtg)  # Update element scale based on organ infos
-                                    mtg_element_vid = [vid for vid in self._shared_mtg.components_iter(mtg_organ_vid) if
-                                                       self._shared_mtg.label(vid) == element_label]  # if self._shared_mtg.label(vid) in ('StemElement', 'LeafElement1')
+                                        self._geometry_manager.set_property('visible_length', mtg_organ_vid, elongwheat_element_data_dict['length'])
+                                    mtg_element_vid = [vid for vid in self._shared_mtg.components(mtg_organ_vid) if self._shared_mtg.label(vid) == element_label]
+                                    if not mtg_element_vid:
+                                        self._geometry_manager.update_geometry(force=True)  # Update element scale based on organ infos
+                                        mtg_element_vid = [vid for vid in self._shared_mtg.components(mtg_organ_vid) if self._shared_mtg.label(vid) == element_label]
+                                    mtg_element_vid = mtg_element_vid[0]
                                     for element_data_name, element_data_value in elongwheat_element_data_dict.items():
-                                        self._shared_mtg.property(element_data_name)[mtg_element_vid[0]] = element_data_value
+                                        self._geometry_manager.set_property(element_data_name, mtg_element_vid, element_data_value)
 
-                                # Already existant element
+                                # Already existant element : only the updated data are written
                                 else:
                                     mtg_element_vid = mtg_element_labels[element_label]
-                                    for element_data_name, element_data_value in elongwheat_element_data_dict.items():
-                                        self._shared_mtg.property(element_data_name)[mtg_element_vid] = element_data_value
+                                    for element_data_name, element_data_value in elongwheat_elements_modified_data.get(element_id, {}).items():
+                                        self._geometry_manager.set_property(element_data_name, mtg_element_vid, element_data_value)
 
                                 # Put some properties from organ scale at element scale
                                 for organ_data_name in mtg_elements_data_from_organ_data:
-                                    self._shared_mtg.property(organ_data_name)[mtg_element_vid] = mtg_elements_data_from_organ_data[organ_data_name]
+                                    self._geometry_manager.set_property(organ_data_name, mtg_element_vid, mtg_elements_data_from_organ_data[organ_data_name])
 
                         # # update of organ scale from elements
                         # new_mtg_element_labels = {}
@@ -390,6 +439,12 @@ class ElongWheatFacade(object):
                         # total_organ_length = organ_visible_length + organ_hidden_length
                         # self._shared_mtg.property('length')[mtg_organ_vid] = total_organ_length
 
+        if option_static:
+            mirror_in_state_store(self._shared_mtg, {'axes': elongwheat_axes_modified_data})
+        else:
+            mirror_in_state_store(self._shared_mtg, {'axes': elongwheat_axes_modified_data, 'hiddenzones': elongwheat_hiddenzones_modified_data, 'elements': elongwheat_elements_modified_data},
+                                  {'hiddenzones': removed_hiddenzones_ids})
+
     def _update_shared_dataframes(self, elongwheat_hiddenzones_data_df, elongwheat_elements_data_df, elongwheat_axes_data_df):
         """
         Update the dataframes shared between all models from the inputs dataframes or the outputs dataframes of the model.
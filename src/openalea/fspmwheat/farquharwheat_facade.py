@@ -2,10 +2,16 @@
 
 import numpy as np
 
-from openalea.astk.plantgl_utils import get_height  # for height calculation
+from openalea.plantgl.algo import Tesselator  # for height calculation ; not from openalea.plantgl.all, which loads the viewer
+from openalea.plantgl.scenegraph import Shape
 
 from openalea.farquharwheat import converter, simulation, parameters
-from openalea.fspmwheat import tools
+from openalea.fspmwheat import geometry, tools
+from openalea.fspmwheat.recorder import run_model
+from openalea.fspmwheat.primitives import get_primitives_store
+from openalea.fspmwheat.state_store import attach_state_store, get_state_store, sync_shared_mtg
+from openalea.fspmwheat.topology import get_topology_index
+from openalea.wheatfspm.watchdog import SolverHealthError
 
 """
     fspmwheat.farquharwheat_facade
@@ -33,6 +39,49 @@ FARQUHARWHEAT_VISIBLE_ELEMENTS_INPUTS = ['StemElement', 'LeafElement1']
 SHARED_ELEMENTS_INPUTS_OUTPUTS_INDEXES = ['plant', 'axis', 'metamer', 'organ', 'element']
 
 
+def calculate_elements_heights(elements_geometries):
+    """
+    Calculate the heights of elements from their geometry, in one vectorized pass over the vertices of the triangles of all the elements.
+    The height of an element is the mean height of the centers of its triangles, as computed by :func:`openalea.astk.plantgl_utils.get_height`.
+
+    :param dict elements_geometries: The PlantGL geometry of each element: {vid: geometry, ...}
+
+    :return: The height of each element: {vid: height, ...}. The height is NaN for the elements without triangle.
+    :rtype: dict
+    """
+    vids = list(elements_geometries.keys())
+    tesselator = Tesselator()
+    points_heights_list = []
+    triangles_indexes_list = []
+    nb_triangles = np.zeros(len(vids), dtype=int)
+    nb_points = 0
+    for i, vid in enumerate(vids):
+        element_geometry = elements_geometries[vid]
+        if isinstance(element_geometry, Shape):
+            element_geometry = element_geometry.geometry
+        if not element_geometry.apply(tesselator) or tesselator.triangulation is None:
+            continue
+        mesh = tesselator.triangulation
+        points = np.array(mesh.pointList, dtype=float).reshape(-1, 3)
+        triangles_indexes = np.array(mesh.indexList, dtype=int).reshape(-1, 3)
+        points_heights_list.append(points[:, 2])
+        triangles_indexes_list.append(triangles_indexes + nb_points)
+        nb_points += len(points)
+        nb_triangles[i] = len(triangles_indexes)
+
+    heights = np.full(len(vids), np.nan)
+    if nb_triangles.sum() > 0:
+        triangles_heights = np.concatenate(points_heights_list)[np.concatenate(triangles_indexes_list)].mean(axis=1)
+        is_defined = ~np.isnan(triangles_heights)
+        elements_indexes = np.repeat(np.arange(len(vids)), nb_triangles)
+        sum_heights = np.bincount(elements_indexes, weights=np.where(is_defined, triangles_heights, 0.), minlength=len(vids))
+        nb_defined_heights = np.bincount(elements_indexes, weights=is_defined, minlength=len(vids))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            heights = sum_heights / nb_defined_heights
+
+    return dict(zip(vids, heights.tolist()))
+
+
 class FarquharWheatFacade(object):
     """
     The FarquharWheatFacade class permits to initialize, run the model FarquharWheat
@@ -48,7 +97,9 @@ class FarquharWheatFacade(object):
                  model_axes_inputs_df,
                  shared_elements_inputs_outputs_df,
                  update_parameters=None,
-                 update_shared_df=True):
+                 update_shared_df=True,
+                 watchdog=None,
+                 recorder=None):
         """
         :param openalea.mtg.mtg.MTG shared_mtg: The MTG shared between all models.
         :param pandas.DataFrame model_elements_inputs_df: the inputs of the model at elements scale.
@@ -56,11 +107,26 @@ class FarquharWheatFacade(object):
         :param pandas.DataFrame shared_elements_inputs_outputs_df: the dataframe of inputs and outputs at elements scale shared between all models.
         :param dict update_parameters: A dictionary with the parameters to update, should have the form {'param1': value1, 'param2': value2, ...}.
         :param bool update_shared_df: If `True`  update the shared dataframes at init and at each run (unless stated otherwise)
+        :param wheatfspm.watchdog.SolverWatchdog watchdog: the watchdog which checks the convergence of the iterations to find Ci and Ts at each run, or None
+        :param fspmwheat.recorder.FacadeRecorder recorder: the recorder of the runs of the model (see :mod:`fspmwheat.recorder`), or None
         """
         self._shared_mtg = shared_mtg  #: the MTG shared between all models
+        self._recorder = recorder  #: the recorder of the runs of the model, or None
+        self._state_store = get_state_store(shared_mtg)  #: the store of the state shared between all models, attached to the MTG
+        if self._state_store is None:
+            self._state_store = attach_state_store(shared_mtg)
+
+        self._watchdog = watchdog  #: the watchdog which checks the convergence of the iterations to find Ci and Ts
 
         self._simulation = simulation.Simulation(update_parameters=update_parameters)  #: the simulator to use to run the model
 
+        self._element_default_properties = parameters.ElementDefaultProperties().__dict__  #: the default values of the inputs of the elements
+
+        #: the heights of the elements computed from their geometry: {vid: (geometry, height), ...}
+        #: A height is reused as long as the geometry of the element is the same object.
+        self._elements_heights = {}
+        self._elements_heights_geometry_version = None  #: the version of the geometry of the MTG when the heights were cached (see :func:`fspmwheat.geometry.geometry_version`)
+
         all_farquharwheat_inputs_dict = converter.from_dataframe(model_elements_inputs_df, model_axes_inputs_df)
         self._update_shared_MTG(all_farquharwheat_inputs_dict)
 
@@ -69,7 +135,7 @@ class FarquharWheatFacade(object):
         if self._update_shared_df:
             self._update_shared_dataframes(model_elements_inputs_df)
 
-    def run(self, Ta, ambient_CO2, RH, Ur, update_shared_df=None):
+    def run(self, Ta, ambient_CO2, RH, Ur, update_shared_df=None, dark_period=None):
         """
         Run the model and update the MTG and the dataframes shared between all models.
 
@@ -78,15 +144,35 @@ class FarquharWheatFacade(object):
         :param float RH: relative humidity at t (decimal fraction)
         :param float Ur: wind speed at the top of the canopy at t (m s-1)
         :param bool update_shared_df: if 'True', update the shared dataframes at this time step.
+        :param bool dark_period: if 'True', no PAR is absorbed at this time step: Ag is null and only the dark respiration, the minimal stomatal conductance
+               and the organ temperatures are computed (see :meth:`Simulation.run <farquharwheat.simulation.Simulation.run>`).
+               If None, the dark period is detected from the absorbed PAR of the elements.
         """
+        sync_shared_mtg(self._shared_mtg)
         self._initialize_model()
-        self._simulation.run(Ta, ambient_CO2, RH, Ur)
+        run_model(self._recorder, 'farquharwheat', self._simulation, Ta, ambient_CO2, RH, Ur, dark_period=dark_period)
+        if self._watchdog is not None:
+            self._check_solver(Ta, ambient_CO2, RH, Ur, dark_period)
         self._update_shared_MTG({'elements': self._simulation.outputs, 'axes': ''})
 
         if update_shared_df or (update_shared_df is None and self._update_shared_df):
             farquharwheat_elements_outputs_df = converter.to_dataframe(self._simulation.outputs)
             self._update_shared_dataframes(farquharwheat_elements_outputs_df)
 
+    def _check_solver(self, Ta, ambient_CO2, RH, Ur, dark_period):
+        """
+        Check the convergence of the iterations of the last run with the watchdog. If the watchdog falls back, run the model again
+        with :attr:`wheatfspm.watchdog.SolverWatchdog.fallback_fixed_point_parameters`, and check the iterations again.
+        """
+        try:
+            self._watchdog.check_fixed_point('farquharwheat', self._simulation.solver_statistics)
+        except SolverHealthError as error:
+            if not error.fallback:
+                raise
+            run_model(self._recorder, 'farquharwheat', self._simulation, Ta, ambient_CO2, RH, Ur, dark_period=dark_period,
+                      update_parameters=self._watchdog.fallback_fixed_point_parameters)
+            self._watchdog.check_fixed_point('farquharwheat', self._simulation.solver_statistics, fallback=True)
+
     def _initialize_model(self):
         """
         Initialize the inputs of the model from the MTG shared between all models.
@@ -94,11 +180,19 @@ class FarquharWheatFacade(object):
         all_farquharwheat_elements_inputs_dict = {}
         all_farquharwheat_axes_inputs_dict = {}
 
+        # the geometry is needed to compute the heights of the elements
+        geometry.update_geometry(self._shared_mtg)
+        mtg_geometry = self._shared_mtg.property('geometry')
+        axes_heights_vids = []  # the inputs of each axis, and the vertices of its elements whose height is needed : [(axis inputs, [vid, ...]), ...]
+        elements_heights_vids = []  # the inputs of the elements whose height is computed from their geometry, and their vertices : [(element inputs, vid), ...]
+        elements_vids = {}  # the vertex of each element : {element_id: vid, ...}
+
         # traverse the MTG recursively from top ...
-        for mtg_plant_vid in self._shared_mtg.components_iter(self._shared_mtg.root):
-            mtg_plant_index = int(self._shared_mtg.index(mtg_plant_vid))
-            for mtg_axis_vid in self._shared_mtg.components_iter(mtg_plant_vid):
-                mtg_axis_label = self._shared_mtg.label(mtg_axis_vid)
+        topology = get_topology_index(self._shared_mtg)
+        for mtg_plant_vid in topology.components(topology.root):
+            mtg_plant_index = topology.index(mtg_plant_vid)
+            for mtg_axis_vid in topology.components(mtg_plant_vid):
+                mtg_axis_label = topology.label(mtg_axis_vid)
                 if mtg_axis_label != 'MS':
                     continue
                 axis_id = (mtg_plant_index, mtg_axis_label)
@@ -106,19 +200,19 @@ class FarquharWheatFacade(object):
                 for farquharwheat_axis_input_name in converter.FARQUHARWHEAT_AXES_INPUTS:
                     farquharwheat_axis_inputs_dict[farquharwheat_axis_input_name] = self._shared_mtg.get_vertex_property(mtg_axis_vid).get(farquharwheat_axis_input_name)
 
-                height_element_list = [0.]
+                axes_heights_vids.append((farquharwheat_axis_inputs_dict, []))
 
-                for mtg_metamer_vid in self._shared_mtg.components_iter(mtg_axis_vid):
-                    mtg_metamer_index = int(self._shared_mtg.index(mtg_metamer_vid))
-                    for mtg_organ_vid in self._shared_mtg.components_iter(mtg_metamer_vid):
-                        mtg_organ_label = self._shared_mtg.label(mtg_organ_vid)
+                for mtg_metamer_vid in topology.components(mtg_axis_vid):
+                    mtg_metamer_index = topology.index(mtg_metamer_vid)
+                    for mtg_organ_vid in topology.components(mtg_metamer_vid):
+                        mtg_organ_label = topology.label(mtg_organ_vid)
                         # mtg_organ_length = np.nan_to_num(self._shared_mtg.get_vertex_property(mtg_organ_vid).get('length', 0))
                         if mtg_organ_label not in FARQUHARWHEAT_ORGANS_NAMES:  # or mtg_organ_length <= 0
                             continue
 
-                        for mtg_element_vid in self._shared_mtg.components_iter(mtg_organ_vid):
+                        for mtg_element_vid in topology.components(mtg_organ_vid):
                             mtg_element_properties = self._shared_mtg.get_vertex_property(mtg_element_vid)
-                            mtg_element_label = self._shared_mtg.label(mtg_element_vid)
+                            mtg_element_label = topology.label(mtg_element_vid)
                             mtg_element_length = np.nan_to_num(self._shared_mtg.get_vertex_property(mtg_element_vid).get('length', 0.))
                             mtg_element_green_area = np.nan_to_num(self._shared_mtg.get_vertex_property(mtg_element_vid).get('green_area', 0.))
 
@@ -131,22 +225,21 @@ class FarquharWheatFacade(object):
                             element_id = (mtg_plant_index, mtg_axis_label, mtg_metamer_index, mtg_organ_label, mtg_element_label)
 
                             farquharwheat_element_inputs_dict = {}
-                            FARQUHARWHEAT_ELEMENT_DEFAULT_PROPERTIES = parameters.ElementDefaultProperties().__dict__
 
                             for farquharwheat_element_input_name in converter.FARQUHARWHEAT_ELEMENTS_INPUTS:
                                 mtg_element_input = mtg_element_properties.get(farquharwheat_element_input_name)
                                 if mtg_element_input is None:
-                                    mtg_element_input = FARQUHARWHEAT_ELEMENT_DEFAULT_PROPERTIES.get(farquharwheat_element_input_name)
+                                    mtg_element_input = self._element_default_properties.get(farquharwheat_element_input_name)
                                 #: Height computation for growing visible elements
                                 if mtg_element_label in FARQUHARWHEAT_VISIBLE_ELEMENTS_INPUTS and farquharwheat_element_input_name == 'height':
-                                    mtg_element_geom = self._shared_mtg.property('geometry').get(mtg_element_vid)
-                                    if mtg_element_geom is not None:  # It seems like visible elements with very little area don't have geometry.
+                                    # the height is computed below from the geometry, for all the elements at once
+                                    mtg_element_input = None
+                                    if mtg_geometry.get(mtg_element_vid) is not None:  # It seems like visible elements with very little area don't have geometry.
                                         # TODO : Ckeck ADEL's area threshold for geometry representation
-                                        triangle_heights = get_height({mtg_element_vid: self._shared_mtg.property('geometry')[mtg_element_vid]})
-                                        mtg_element_input = np.nanmean(triangle_heights[mtg_element_vid])
+                                        elements_heights_vids.append((farquharwheat_element_inputs_dict, mtg_element_vid))
+                                        axes_heights_vids[-1][1].append(mtg_element_vid)
                                     else:
-                                        mtg_element_input = None
-                                    height_element_list.append(mtg_element_input)
+                                        axes_heights_vids[-1][1].append(None)
                                 #: Width is actually diameter for Sheath and Internodes
                                 if mtg_organ_label in ['sheath', 'internode', 'pedoncule', 'ear'] and farquharwheat_element_input_name == 'width':
                                     mtg_element_input = mtg_element_properties.get('diameter', 0.0)
@@ -154,48 +247,78 @@ class FarquharWheatFacade(object):
                                 farquharwheat_element_inputs_dict[farquharwheat_element_input_name] = mtg_element_input
 
                             all_farquharwheat_elements_inputs_dict[element_id] = farquharwheat_element_inputs_dict
+                            elements_vids[element_id] = mtg_element_vid
 
-                farquharwheat_axis_inputs_dict['height_canopy'] = np.nanmax(np.array(height_element_list, dtype=np.float64))
-                if np.isnan(farquharwheat_axis_inputs_dict['height_canopy']) or (farquharwheat_axis_inputs_dict['height_canopy'] is None):
-                    farquharwheat_axis_inputs_dict['height_canopy'] = parameters.AxisDefaultProperties().__dict__['height']
                 all_farquharwheat_axes_inputs_dict[axis_id] = farquharwheat_axis_inputs_dict
 
-        self._simulation.initialize({'elements': all_farquharwheat_elements_inputs_dict, 'axes': all_farquharwheat_axes_inputs_dict})
+        # heights of the elements and of the canopy
+        elements_heights = self._get_elements_heights([mtg_element_vid for _, mtg_element_vid in elements_heights_vids])
+        for farquharwheat_element_inputs_dict, mtg_element_vid in elements_heights_vids:
+            farquharwheat_element_inputs_dict['height'] = elements_heights[mtg_element_vid]
+        for farquharwheat_axis_inputs_dict, axis_heights_vids in axes_heights_vids:
+            height_element_list = [0.] + [elements_heights.get(mtg_element_vid) for mtg_element_vid in axis_heights_vids]
+            farquharwheat_axis_inputs_dict['height_canopy'] = np.nanmax(np.array(height_element_list, dtype=np.float64))
+            if np.isnan(farquharwheat_axis_inputs_dict['height_canopy']) or (farquharwheat_axis_inputs_dict['height_canopy'] is None):
+                farquharwheat_axis_inputs_dict['height_canopy'] = parameters.AxisDefaultProperties().__dict__['height']
+
+        # primitives of the elements, from the store filled by Caribu
+        primitives = None
+        primitives_store = get_primitives_store(self._shared_mtg)
+        if parameters.prim_scale and primitives_store is not None:
+            primitives = primitives_store.select(list(elements_vids.values()), list(elements_vids.keys()))
+
+        self._simulation.initialize({'elements': all_farquharwheat_elements_inputs_dict, 'axes': all_farquharwheat_axes_inputs_dict}, primitives)
+
+    def _get_elements_heights(self, vids):
+        """
+        Get the heights of elements from their geometry. The heights are cached, and computed only for the elements whose geometry changed.
+
+        :param list vids: The vertices of the elements. All the elements must have a geometry.
+
+        :return: The height of each element: {vid: height, ...}
+        :rtype: dict
+        """
+        mtg_geometry = self._shared_mtg.property('geometry')
+
+        geometry_version = geometry.geometry_version(self._shared_mtg)
+        if geometry_version is None or geometry_version != self._elements_heights_geometry_version:
+            # the geometry was updated : forget the heights of the elements whose geometry was replaced or removed
+            self._elements_heights = {vid: (element_geometry, height) for vid, (element_geometry, height) in self._elements_heights.items()
+                                      if mtg_geometry.get(vid) is element_geometry}
+            self._elements_heights_geometry_version = geometry_version
+
+        new_elements_geometries = {}
+        for vid in vids:
+            element_geometry = mtg_geometry[vid]
+            cached_element_geometry, _ = self._elements_heights.get(vid, (None, None))
+            if cached_element_geometry is not element_geometry:
+                new_elements_geometries[vid] = element_geometry
+        if new_elements_geometries:
+            for vid, height in calculate_elements_heights(new_elements_geometries).items():
+                self._elements_heights[vid] = (new_elements_geometries[vid], height)
+
+        return {vid: self._elements_heights[vid][1] for vid in vids}
 
     def _update_shared_MTG(self, farquharwheat_data_dict):
         """
         Update the MTG shared between all models from the inputs or the outputs of the model.
+        The data of the elements are written in the columns of the store of the state shared between all models, and pushed to the MTG
+        when the MTG is read (see :func:`fspmwheat.state_store.sync_shared_mtg`).
 
         :param dict farquharwheat_data_dict: Farquhar-Wheat outputs.
         """
-        # add the properties if needed
-        mtg_property_names = self._shared_mtg.property_names()
-        for farquharwheat_elements_data_name in converter.FARQUHARWHEAT_ELEMENTS_INPUTS_OUTPUTS:
-            if farquharwheat_elements_data_name not in mtg_property_names:
-                self._shared_mtg.add_property(farquharwheat_elements_data_name)
-
-        # traverse the MTG recursively from top ...
-        for mtg_plant_vid in self._shared_mtg.components_iter(self._shared_mtg.root):
-            mtg_plant_index = int(self._shared_mtg.index(mtg_plant_vid))
-            for mtg_axis_vid in self._shared_mtg.components_iter(mtg_plant_vid):
-                mtg_axis_label = self._shared_mtg.label(mtg_axis_vid)
-                for mtg_metamer_vid in self._shared_mtg.components_iter(mtg_axis_vid):
-                    mtg_metamer_index = int(self._shared_mtg.index(mtg_metamer_vid))
-                    for mtg_organ_vid in self._shared_mtg.components_iter(mtg_metamer_vid):
-                        mtg_organ_label = self._shared_mtg.label(mtg_organ_vid)
-                        if mtg_organ_label not in FARQUHARWHEAT_ORGANS_NAMES:
-                            continue
-                        for mtg_element_vid in self._shared_mtg.components_iter(mtg_organ_vid):
-                            mtg_element_label = self._shared_mtg.label(mtg_element_vid)
-                            element_id = (mtg_plant_index, mtg_axis_label, mtg_metamer_index, mtg_organ_label, mtg_element_label)
-                            if element_id not in farquharwheat_data_dict['elements']:
-                                continue
-                            # update the element in the MTG
-                            farquharwheat_element_data_dict = farquharwheat_data_dict['elements'][element_id]
-                            for farquharwheat_element_data_name, farquharwheat_element_data_value in farquharwheat_element_data_dict.items():
-                                self._shared_mtg.property(farquharwheat_element_data_name)[mtg_element_vid] = farquharwheat_element_data_value
-                                if mtg_organ_label in ['sheath', 'internode', 'pedoncule', 'ear'] and farquharwheat_element_data_name == 'width':
-                                    self._shared_mtg.property('diameter')[mtg_element_vid] = farquharwheat_element_data_value
+        self._state_store.update('elements', farquharwheat_data_dict['elements'])
+
+        #: Width is actually diameter for Sheath and Internodes
+        if 'diameter' not in self._shared_mtg.property_names():
+            self._shared_mtg.add_property('diameter')
+        topology = get_topology_index(self._shared_mtg)
+        for element_id, farquharwheat_element_data_dict in farquharwheat_data_dict['elements'].items():
+            if element_id[3] not in ['sheath', 'internode', 'pedoncule', 'ear'] or 'width' not in farquharwheat_element_data_dict:
+                continue
+            mtg_element_vid = topology.vid(element_id)
+            if mtg_element_vid is not None:
+                self._shared_mtg.property('diameter')[mtg_element_vid] = farquharwheat_element_data_dict['width']
 
     def _update_shared_dataframes(self, farquharwheat_elements_data_df):
         """
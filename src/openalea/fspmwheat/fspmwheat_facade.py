@@ -4,6 +4,7 @@ from openalea.elongwheat import simulation as elongwheat_simulation
 from openalea.farquharwheat import converter as farquharwheat_converter
 from openalea.growthwheat import simulation as growthwheat_simulation
 from openalea.senescwheat import converter as senescwheat_converter
+from openalea.fspmwheat.topology import get_topology_index
 import numpy as np
 import pandas as pd
 
@@ -64,7 +65,7 @@ class FSPMWheatFacade(object):
 
     """
 
-    def __init__(self, shared_mtg):
+    def __init__(self, shared_mtg, organ_archive=None):
         # shared_axes_inputs_outputs_df,
         # shared_organs_inputs_outputs_df,
         # shared_hiddenzones_inputs_outputs_df,
@@ -73,6 +74,8 @@ class FSPMWheatFacade(object):
         # update_shared_df = True):
         """
         :param openalea.mtg.mtg.MTG shared_mtg: The MTG shared between all models.
+        :param fspmwheat.archive.OrganArchive organ_archive: The archive of the dead organs of `shared_mtg`, if any.
+               The final state of the archived elements is added to the outputs read from the MTG.
         :param pandas.DataFrame shared_axes_inputs_outputs_df: the dataframe of inputs and outputs at axes scale shared between all models.
         :param pandas.DataFrame shared_organs_inputs_outputs_df: the dataframe of inputs and outputs at organs scale shared between all models.
         :param pandas.DataFrame shared_hiddenzones_inputs_outputs_df: the dataframe of inputs and outputs at hiddenzones scale shared between all models.
@@ -82,6 +85,7 @@ class FSPMWheatFacade(object):
         """
 
         self._shared_mtg = shared_mtg  #: the MTG shared between all models
+        self._organ_archive = organ_archive  #: the archive of the dead organs of the MTG
 
         # self._shared_axes_inputs_outputs_df = shared_axes_inputs_outputs_df  #: the dataframe at axes scale shared between all models
         # self._shared_organs_inputs_outputs_df = shared_organs_inputs_outputs_df  #: the dataframe at organs scale shared between all models
@@ -106,12 +110,13 @@ class FSPMWheatFacade(object):
         organs_dict = {}
         soils_dict = {}
 
-        for mtg_plant_vid in self._shared_mtg.components_iter(self._shared_mtg.root):
-            mtg_plant_index = int(self._shared_mtg.index(mtg_plant_vid))
+        topology = get_topology_index(self._shared_mtg)
+        for mtg_plant_vid in topology.components(topology.root):
+            mtg_plant_index = topology.index(mtg_plant_vid)
 
             # Axis scale
-            for mtg_axis_vid in self._shared_mtg.components_iter(mtg_plant_vid):
-                mtg_axis_label = self._shared_mtg.label(mtg_axis_vid)
+            for mtg_axis_vid in topology.components(mtg_plant_vid):
+                mtg_axis_label = topology.label(mtg_axis_vid)
                 mtg_axis_properties = self._shared_mtg.get_vertex_property(mtg_axis_vid)
                 axis_id = (mtg_plant_index, mtg_axis_label)
                 axis_dict = {}
@@ -147,8 +152,8 @@ class FSPMWheatFacade(object):
                     soils_dict[axis_id] = soil_dict
 
                 # Metamer scale
-                for mtg_metamer_vid in self._shared_mtg.components_iter(mtg_axis_vid):
-                    mtg_metamer_index = int(self._shared_mtg.index(mtg_metamer_vid))
+                for mtg_metamer_vid in topology.components(mtg_axis_vid):
+                    mtg_metamer_index = topology.index(mtg_metamer_vid)
                     mtg_metamer_properties = self._shared_mtg.get_vertex_property(mtg_metamer_vid)
                     if 'hiddenzone' in mtg_metamer_properties:
                         hiddenzone_id = (mtg_plant_index, mtg_axis_label, mtg_metamer_index)
@@ -161,11 +166,11 @@ class FSPMWheatFacade(object):
                         hiddenzones_dict[hiddenzone_id] = hiddenzone_dict
 
                     # Photosynthetic organ scale
-                    for mtg_organ_vid in self._shared_mtg.components_iter(mtg_metamer_vid):
-                        mtg_organ_label = self._shared_mtg.label(mtg_organ_vid)
+                    for mtg_organ_vid in topology.components(mtg_metamer_vid):
+                        mtg_organ_label = topology.label(mtg_organ_vid)
                         # Element scale
-                        for mtg_element_vid in self._shared_mtg.components_iter(mtg_organ_vid):
-                            mtg_element_label = self._shared_mtg.label(mtg_element_vid)
+                        for mtg_element_vid in topology.components(mtg_organ_vid):
+                            mtg_element_label = topology.label(mtg_element_vid)
                             mtg_element_properties = self._shared_mtg.get_vertex_property(mtg_element_vid)
                             if np.nan_to_num(self._shared_mtg.property('length').get(mtg_element_vid, 0)) == 0:
                                 continue
@@ -175,6 +180,11 @@ class FSPMWheatFacade(object):
                             element_id = (mtg_plant_index, mtg_axis_label, mtg_metamer_index, mtg_organ_label, mtg_element_label)
                             elements_dict[element_id] = element_dict
 
+        # Archived elements
+        if self._organ_archive is not None:
+            for element_id, element_dict in self._organ_archive.elements_data().items():
+                elements_dict.setdefault(element_id, element_dict)
+
         return {'axes': axes_dict, 'elements': elements_dict, 'hiddenzones': hiddenzones_dict, 'organs': organs_dict, 'soils': soils_dict}
 
     @staticmethod
@@ -3,7 +3,6 @@
 import os
 import pandas as pd
 import numpy as np
-import statsmodels.api as sm
 
 from openalea.cnwheat import model as cnwheat_model
 
@@ -15,6 +14,7 @@ def leaf_traits(scenario_outputs_dirpath, scenario_postprocessing_dirpath):
     :param str scenario_outputs_dirpath: the path to the CSV outputs file of the scenario
     :param str scenario_postprocessing_dirpath: the path to the CSV postprocessing file of the scenari
     """
+    import statsmodels.api as sm
 
     # --- Import simulations outputs/prostprocessings
     df_axe = pd.read_csv(os.path.join(scenario_outputs_dirpath, 'axes_outputs.csv'))
@@ -271,6 +271,7 @@ def calculate_performance_indices(scenario_outputs_dirpath, scenario_postprocess
     :param str meteo_dirpath: the path to the CSV meteo file
     :param int plant_density: the plant density (plant m-2)
     """
+    import statsmodels.api as sm
 
     # --- Import simulations prostprocessings and outputs
     df_elt = pd.read_csv(os.path.join(scenario_postprocessing_dirpath, 'elements_postprocessing.csv'))
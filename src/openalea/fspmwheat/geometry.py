@@ -0,0 +1,180 @@
+# -*- coding: latin-1 -*-
+
+from openalea.fspmwheat.topology import invalidate_topology_index
+
+"""
+    fspmwheat.geometry
+    ~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`fspmwheat.geometry` defines a manager of the geometry of the :class:`MTG <openalea.mtg.mtg.MTG>`
+    shared between all models.
+
+    The geometry (property 'geometry' of the MTG) is computed by the geometrical model (e.g. :class:`AdelDyn <openalea.adel.adel_dynamic.AdelDyn>`)
+    from the dimensions of the organs. Instead of updating the geometry after each run of Elong-Wheat, the facades record the vertices
+    whose length, width or visibility changed (see :func:`set_geometrical_property`), and the geometry is updated only when it is read,
+    i.e. by :class:`CaribuFacade <fspmwheat.caribu_facade.CaribuFacade>` and :class:`FarquharWheatFacade <fspmwheat.farquharwheat_facade.FarquharWheatFacade>`
+    (see :func:`update_geometry`), and only if some of these vertices changed since the last update.
+
+    The geometrical model computes the positions of the organs of an axis from the dimensions of all the organs below them,
+    so a change of one organ moves all the organs above it : the geometry is always updated for the whole MTG.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the properties of the organs and elements used by the geometrical model to compute the geometry
+GEOMETRICAL_PROPERTIES = {'length', 'visible_length', 'senesced_length', 'shape_mature_length', 'shape_max_width', 'width', 'diameter'}
+
+#: the name of the attribute used to attach the geometry manager to the MTG
+GEOMETRY_MANAGER_ATTRIBUTE = '_fspmwheat_geometry_manager'
+
+
+class GeometryManager(object):
+    """
+    The manager of the geometry of a :class:`MTG <openalea.mtg.mtg.MTG>`.
+    It records the vertices whose geometrical properties changed, and updates the geometry on demand.
+    """
+
+    def __init__(self, mtg, geometrical_model):
+        """
+        :param openalea.mtg.mtg.MTG mtg: The MTG.
+        :param openalea.adel.adel_dynamic.AdelDyn geometrical_model: The model which deals with geometry.
+                This model must implement a method `update_geometry(mtg)` to compute the geometry of all the elements of a MTG.
+        """
+        self._mtg = mtg  #: the MTG
+        self.geometrical_model = geometrical_model  #: the model which deals with geometry
+        self._dirty_vids = set()  #: the vertices whose geometrical properties changed since the last update of the geometry
+        self.version = 0  #: the number of updates of the geometry. Can be used to invalidate values computed from the geometry.
+        self.nb_requests = 0  #: the number of requests of an up-to-date geometry
+
+    @property
+    def dirty_vertices(self):
+        """The vertices whose geometrical properties changed since the last update of the geometry."""
+        return frozenset(self._dirty_vids)
+
+    def is_dirty(self):
+        """
+        :return: `True` if the geometrical properties of some vertices changed since the last update of the geometry.
+        :rtype: bool
+        """
+        return len(self._dirty_vids) != 0
+
+    def mark_dirty(self, vids):
+        """
+        Record that the geometrical properties of some vertices changed.
+
+        :param iterable vids: The vertices.
+        """
+        self._dirty_vids.update(vids)
+
+    def set_property(self, property_name, vid, value):
+        """
+        Set the value of a property of a vertex, and record the vertex if the property is geometrical and its value changed.
+
+        :param str property_name: The name of the property.
+        :param int vid: The vertex.
+        :param value: The new value of the property.
+        """
+        mtg_property = self._mtg.property(property_name)
+        if property_name in GEOMETRICAL_PROPERTIES and vid not in self._dirty_vids:
+            previous_value = mtg_property.get(vid)
+            if previous_value is None or previous_value != value:  # NaN are always considered as changed
+                self._dirty_vids.add(vid)
+        mtg_property[vid] = value
+
+    def update_geometry(self, force=False):
+        """
+        Update the geometry of the MTG if the geometrical properties of some vertices changed since the last update.
+
+        :param bool force: If `True`, update the geometry even if no geometrical property changed,
+                           e.g. because the topology of the MTG changed.
+
+        :return: `True` if the geometry was updated.
+        :rtype: bool
+        """
+        self.nb_requests += 1
+        if not (force or self._dirty_vids):
+            return False
+        self.geometrical_model.update_geometry(self._mtg)
+        invalidate_topology_index(self._mtg)  # the geometrical model can add elements to the MTG
+        self._dirty_vids.clear()
+        self.version += 1
+        return True
+
+
+def get_geometry_manager(mtg, geometrical_model=None):
+    """
+    Get the geometry manager of a MTG. If `geometrical_model` is given and the MTG has no manager yet, a manager is created and attached to the MTG.
+
+    :param openalea.mtg.mtg.MTG mtg: The MTG.
+    :param openalea.adel.adel_dynamic.AdelDyn geometrical_model: The model which deals with geometry.
+
+    :return: The geometry manager of `mtg`, or `None` if no manager was attached.
+    :rtype: GeometryManager
+    """
+    geometry_manager = getattr(mtg, GEOMETRY_MANAGER_ATTRIBUTE, None)
+    if geometry_manager is None and geometrical_model is not None:
+        geometry_manager = GeometryManager(mtg, geometrical_model)
+        setattr(mtg, GEOMETRY_MANAGER_ATTRIBUTE, geometry_manager)
+    return geometry_manager
+
+
+def set_geometrical_property(mtg, property_name, vid, value):
+    """
+    Set the value of a property of a vertex of a MTG, recording the change in the geometry manager of the MTG, if any.
+
+    :param openalea.mtg.mtg.MTG mtg: The MTG.
+    :param str property_name: The name of the property.
+    :param int vid: The vertex.
+    :param value: The new value of the property.
+    """
+    geometry_manager = get_geometry_manager(mtg)
+    if geometry_manager is None:
+        mtg.property(property_name)[vid] = value
+    else:
+        geometry_manager.set_property(property_name, vid, value)
+
+
+def mark_geometry_dirty(mtg, vids):
+    """
+    Record in the geometry manager of a MTG, if any, that the geometrical properties of some vertices changed.
+
+    :param openalea.mtg.mtg.MTG mtg: The MTG.
+    :param iterable vids: The vertices.
+    """
+    geometry_manager = get_geometry_manager(mtg)
+    if geometry_manager is not None:
+        geometry_manager.mark_dirty(vids)
+
+
+def update_geometry(mtg, force=False):
+    """
+    Update the geometry of a MTG if needed. Must be called before reading the property 'geometry' of the MTG.
+    Without geometry manager, the geometry is supposed to be updated by the caller of the models and nothing is done.
+
+    :param openalea.mtg.mtg.MTG mtg: The MTG.
+    :param bool force: If `True`, update the geometry even if no geometrical property changed.
+
+    :return: `True` if the geometry was updated.
+    :rtype: bool
+    """
+    from openalea.fspmwheat.state_store import sync_shared_mtg  # imported here to avoid a circular import
+    sync_shared_mtg(mtg)  # the dimensions written in the store of the state must be in the MTG
+    geometry_manager = get_geometry_manager(mtg)
+    if geometry_manager is None:
+        return False
+    return geometry_manager.update_geometry(force)
+
+
+def geometry_version(mtg):
+    """
+    :param openalea.mtg.mtg.MTG mtg: The MTG.
+
+    :return: The number of updates of the geometry of `mtg` done by its geometry manager, or `None` if `mtg` has no geometry manager.
+    :rtype: int
+    """
+    geometry_manager = get_geometry_manager(mtg)
+    if geometry_manager is None:
+        return None
+    return geometry_manager.version
@@ -2,6 +2,10 @@
 
 from openalea.growthwheat import converter, simulation, parameters
 from openalea.fspmwheat import tools
+from openalea.fspmwheat.active_set import growthwheat_active_elements
+from openalea.fspmwheat.recorder import run_model
+from openalea.fspmwheat.state_store import mirror_in_state_store, sync_shared_mtg
+from openalea.fspmwheat.topology import get_topology_index
 
 """
     fspmwheat.growthwheat_facade
@@ -55,7 +59,8 @@ class GrowthWheatFacade(object):
                  shared_elements_inputs_outputs_df,
                  shared_axes_inputs_outputs_df,
                  update_parameters=None,
-                 update_shared_df=True):
+                 update_shared_df=True,
+                 recorder=None):
 
         """
         :param openalea.mtg.mtg.MTG shared_mtg: The MTG shared between all models.
@@ -70,14 +75,20 @@ class GrowthWheatFacade(object):
         :param pandas.DataFrame shared_axes_inputs_outputs_df: the dataframe of inputs and outputs at axis scale shared between all models.
         :param dict update_parameters: A dictionary with the parameters to update, should have the form {'param1': value1, 'param2': value2, ...}.
         :param bool update_shared_df: If `True`  update the shared dataframes at init and at each run (unless stated otherwise)
+        :param fspmwheat.recorder.FacadeRecorder recorder: the recorder of the runs of the model (see :mod:`fspmwheat.recorder`), or None
         """
         if update_parameters is None:
             update_parameters = {}
 
         self._shared_mtg = shared_mtg  #: the MTG shared between all models
+        self._recorder = recorder  #: the recorder of the runs of the model, or None
 
         self._simulation = simulation.Simulation(delta_t=delta_t, update_parameters=update_parameters)  #: the simulator to use to run the model
 
+        #: the names of the element inputs which were not read from the MTG at the last initialization of the model: {element_id: [input_name, ...], ...}
+        #: They are written in the MTG with the outputs of the model.
+        self._completed_elements_inputs = {}
+
         all_growthwheat_inputs_dict = converter.from_dataframes(model_hiddenzones_inputs_df, model_elements_inputs_df, model_roots_inputs_df, model_axes_inputs_df)
 
         self._update_shared_MTG(all_growthwheat_inputs_dict['hiddenzone'], all_growthwheat_inputs_dict['elements'], all_growthwheat_inputs_dict['roots'], all_growthwheat_inputs_dict['axes'])
@@ -96,8 +107,9 @@ class GrowthWheatFacade(object):
         :param bool postflowering_stages: if True the model will calculate root growth with the parameters calibrated for post flowering stages
         :param bool update_shared_df: if 'True', update the shared dataframes at this time step.
         """
+        sync_shared_mtg(self._shared_mtg)
         self._initialize_model()
-        self._simulation.run(postflowering_stages)
+        run_model(self._recorder, 'growthwheat', self._simulation, postflowering_stages)
         self._update_shared_MTG(self._simulation.outputs['hiddenzone'], self._simulation.outputs['elements'], self._simulation.outputs['roots'], self._simulation.outputs['axes'])
 
         if update_shared_df or (update_shared_df is None and self._update_shared_df):
@@ -107,17 +119,20 @@ class GrowthWheatFacade(object):
     def _initialize_model(self):
         """
         Initialize the inputs of the model from the MTG shared between all models.
+        Only the elements read by the model are passed to it (see :func:`fspmwheat.active_set.growthwheat_active_elements`).
         """
 
         all_growthwheat_hiddenzones_inputs_dict = {}
         all_growthwheat_elements_inputs_dict = {}
         all_growthwheat_roots_inputs_dict = {}
         all_growthwheat_axes_inputs_dict = {}
+        self._completed_elements_inputs.clear()
 
-        for mtg_plant_vid in self._shared_mtg.components_iter(self._shared_mtg.root):
-            mtg_plant_index = int(self._shared_mtg.index(mtg_plant_vid))
-            for mtg_axis_vid in self._shared_mtg.components_iter(mtg_plant_vid):
-                mtg_axis_label = self._shared_mtg.label(mtg_axis_vid)
+        topology = get_topology_index(self._shared_mtg)
+        for mtg_plant_vid in topology.components(topology.root):
+            mtg_plant_index = topology.index(mtg_plant_vid)
+            for mtg_axis_vid in topology.components(mtg_plant_vid):
+                mtg_axis_label = topology.label(mtg_axis_vid)
                 if mtg_axis_label != 'MS':
                     continue
 
@@ -140,27 +155,29 @@ class GrowthWheatFacade(object):
                             growthwheat_roots_inputs_dict[growthwheat_roots_input_name] = mtg_roots_properties[growthwheat_roots_input_name]
                         all_growthwheat_roots_inputs_dict[roots_id] = growthwheat_roots_inputs_dict
 
-                for mtg_metamer_vid in self._shared_mtg.components_iter(mtg_axis_vid):
+                for mtg_metamer_vid in topology.components(mtg_axis_vid):
 
-                    mtg_metamer_index = int(self._shared_mtg.index(mtg_metamer_vid))
+                    mtg_metamer_index = topology.index(mtg_metamer_vid)
 
                     mtg_metamer_properties = self._shared_mtg.get_vertex_property(mtg_metamer_vid)
                     if 'hiddenzone' in mtg_metamer_properties:
                         hiddenzone_id = (mtg_plant_index, mtg_axis_label, mtg_metamer_index)
                         mtg_hiddenzone_properties = mtg_metamer_properties['hiddenzone']
 
+                        active_elements = None  # all the emerged elements are passed to the model if the inputs of the hidden zone are incomplete
                         if set(mtg_hiddenzone_properties).issuperset(simulation.HIDDENZONE_INPUTS):  # Initial values are set by elongwheat
                             growthwheat_hiddenzone_inputs_dict = {}
                             for growthwheat_hiddenzone_input_name in simulation.HIDDENZONE_INPUTS:
                                 growthwheat_hiddenzone_inputs_dict[growthwheat_hiddenzone_input_name] = mtg_hiddenzone_properties[growthwheat_hiddenzone_input_name]
                             all_growthwheat_hiddenzones_inputs_dict[hiddenzone_id] = growthwheat_hiddenzone_inputs_dict
+                            active_elements = growthwheat_active_elements(growthwheat_hiddenzone_inputs_dict)
 
                         # We take only the elements of growing metamers ie. the ones with hiddenzones
-                        for mtg_organ_vid in self._shared_mtg.components_iter(mtg_metamer_vid):
-                            mtg_organ_label = self._shared_mtg.label(mtg_organ_vid)
+                        for mtg_organ_vid in topology.components(mtg_metamer_vid):
+                            mtg_organ_label = topology.label(mtg_organ_vid)
 
-                            for mtg_element_vid in self._shared_mtg.components_iter(mtg_organ_vid):
-                                mtg_element_label = self._shared_mtg.label(mtg_element_vid)
+                            for mtg_element_vid in topology.components(mtg_organ_vid):
+                                mtg_element_label = topology.label(mtg_element_vid)
                                 element_id = (mtg_plant_index, mtg_axis_label, mtg_metamer_index, mtg_organ_label, mtg_element_label)
                                 mtg_element_properties = self._shared_mtg.get_vertex_property(mtg_element_vid)
 
@@ -168,6 +185,7 @@ class GrowthWheatFacade(object):
                                         mtg_element_properties.get('length', 0) > 0:  # Note : ADEL puts length to positive value after updates even for HiddenElement.
 
                                     growthwheat_element_inputs_dict = {}
+                                    completed_element_inputs = []
 
                                     # Exclude the HiddenElement appart from remobilization cases
                                     remobilisation = False
@@ -176,16 +194,25 @@ class GrowthWheatFacade(object):
                                             remobilisation = True
                                         else:
                                             continue
+                                    # Exclude the emerged elements which are not read by the model, unless some of their inputs must be completed in the MTG
+                                    elif active_elements is not None and (mtg_organ_label, mtg_element_label) not in active_elements and \
+                                            all(mtg_element_properties.get(growthwheat_element_input_name) is not None for growthwheat_element_input_name in simulation.ELEMENT_INPUTS):
+                                        continue
 
                                     for growthwheat_element_input_name in simulation.ELEMENT_INPUTS:
                                         mtg_element_input = mtg_element_properties.get(growthwheat_element_input_name)
                                         if mtg_element_input is None:
                                             mtg_element_input = parameters.OrganInit().__dict__[growthwheat_element_input_name]
+                                            completed_element_inputs.append(growthwheat_element_input_name)
                                         growthwheat_element_inputs_dict[growthwheat_element_input_name] = mtg_element_input
                                         if remobilisation:
                                             # Needed later on for CN Wheat calculation. TODO: Should it be in elongwheat_facade instead ? (MG)
                                             growthwheat_element_inputs_dict['green_area'] = mtg_element_properties.get('area')
+                                    if remobilisation:
+                                        completed_element_inputs.append('green_area')
                                     all_growthwheat_elements_inputs_dict[element_id] = growthwheat_element_inputs_dict
+                                    if completed_element_inputs:
+                                        self._completed_elements_inputs[element_id] = completed_element_inputs
 
         self._simulation.initialize({'hiddenzone': all_growthwheat_hiddenzones_inputs_dict, 'elements': all_growthwheat_elements_inputs_dict,
                                      'roots': all_growthwheat_roots_inputs_dict, 'axes': all_growthwheat_axes_inputs_dict})
@@ -208,23 +235,37 @@ class GrowthWheatFacade(object):
             if growthwheat_data_name not in mtg_property_names:
                 self._shared_mtg.add_property(growthwheat_data_name)
 
+        # only the data updated by the model are written in the MTG, plus the element inputs which were not read from the MTG
+        growthwheat_hiddenzones_modified_data = tools.get_modified_data(all_growthwheat_hiddenzones_data_dict)
+        growthwheat_elements_modified_data = dict(tools.get_modified_data(all_growthwheat_elements_data_dict))
+        growthwheat_roots_modified_data = tools.get_modified_data(all_growthwheat_roots_data_dict)
+        growthwheat_axes_modified_data = tools.get_modified_data(all_growthwheat_axes_data_dict)
+        for element_id, completed_element_inputs in self._completed_elements_inputs.items():
+            if element_id in all_growthwheat_elements_data_dict:
+                growthwheat_element_data_dict = all_growthwheat_elements_data_dict[element_id]
+                growthwheat_element_modified_data = {input_name: growthwheat_element_data_dict[input_name] for input_name in completed_element_inputs}
+                growthwheat_element_modified_data.update(growthwheat_elements_modified_data.get(element_id, {}))
+                growthwheat_elements_modified_data[element_id] = growthwheat_element_modified_data
+
         # update the properties of the MTG
-        for mtg_plant_vid in self._shared_mtg.components_iter(self._shared_mtg.root):
-            mtg_plant_index = int(self._shared_mtg.index(mtg_plant_vid))
-            for mtg_axis_vid in self._shared_mtg.components_iter(mtg_plant_vid):
-                mtg_axis_label = self._shared_mtg.label(mtg_axis_vid)
+        removed_hiddenzones_ids = []
+        topology = get_topology_index(self._shared_mtg)
+        for mtg_plant_vid in topology.components(topology.root):
+            mtg_plant_index = topology.index(mtg_plant_vid)
+            for mtg_axis_vid in topology.components(mtg_plant_vid):
+                mtg_axis_label = topology.label(mtg_axis_vid)
                 axis_id = (mtg_plant_index, mtg_axis_label)
 
                 if mtg_axis_label != 'MS':
                     continue
 
-                growthwheat_axis_data_dict = all_growthwheat_axes_data_dict[axis_id]
+                growthwheat_axis_data_dict = growthwheat_axes_modified_data.get(axis_id, {})
                 for axis_data_name, axis_data_value in growthwheat_axis_data_dict.items():
                     self._shared_mtg.property(axis_data_name)[mtg_axis_vid] = axis_data_value
 
                 roots_id = (mtg_plant_index, mtg_axis_label, 'roots')
                 if roots_id in all_growthwheat_roots_data_dict:
-                    growthwheat_roots_data_dict = all_growthwheat_roots_data_dict[roots_id]
+                    growthwheat_roots_data_dict = growthwheat_roots_modified_data.get(roots_id, {})
                     mtg_axis_properties = self._shared_mtg.get_vertex_property(mtg_axis_vid)
                     if 'roots' not in mtg_axis_properties:
                         self._shared_mtg.property('roots')[mtg_axis_vid] = {}
@@ -232,11 +273,11 @@ class GrowthWheatFacade(object):
                         self._shared_mtg.property('roots')[mtg_axis_vid][roots_data_name] = roots_data_value
 
                 #: Metamer scale
-                for mtg_metamer_vid in self._shared_mtg.components_iter(mtg_axis_vid):
-                    mtg_metamer_index = int(self._shared_mtg.index(mtg_metamer_vid))
+                for mtg_metamer_vid in topology.components(mtg_axis_vid):
+                    mtg_metamer_index = topology.index(mtg_metamer_vid)
                     hiddenzone_id = (mtg_plant_index, mtg_axis_label, mtg_metamer_index)
                     if hiddenzone_id in all_growthwheat_hiddenzones_data_dict:
-                        growthwheat_hiddenzone_data_dict = all_growthwheat_hiddenzones_data_dict[hiddenzone_id]
+                        growthwheat_hiddenzone_data_dict = growthwheat_hiddenzones_modified_data.get(hiddenzone_id, {})
                         mtg_metamer_properties = self._shared_mtg.get_vertex_property(mtg_metamer_vid)
                         if 'hiddenzone' not in mtg_metamer_properties:  # MG : when is it used ?
                             self._shared_mtg.property('hiddenzone')[mtg_metamer_vid] = {}
@@ -246,22 +287,27 @@ class GrowthWheatFacade(object):
                     elif 'hiddenzone' in self._shared_mtg.get_vertex_property(mtg_metamer_vid):
                         # remove the 'hiddenzone' property from this metamer
                         del self._shared_mtg.property('hiddenzone')[mtg_metamer_vid]
+                        removed_hiddenzones_ids.append(hiddenzone_id)
 
                     #: Organ scale
-                    for mtg_organ_vid in self._shared_mtg.components_iter(mtg_metamer_vid):
-                        mtg_organ_label = self._shared_mtg.label(mtg_organ_vid)
+                    for mtg_organ_vid in topology.components(mtg_metamer_vid):
+                        mtg_organ_label = topology.label(mtg_organ_vid)
 
                         #: Element scale
-                        for mtg_element_vid in self._shared_mtg.components_iter(mtg_organ_vid):
-                            mtg_element_label = self._shared_mtg.label(mtg_element_vid)
+                        for mtg_element_vid in topology.components(mtg_organ_vid):
+                            mtg_element_label = topology.label(mtg_element_vid)
                             element_id = (mtg_plant_index, mtg_axis_label, mtg_metamer_index, mtg_organ_label, mtg_element_label)
 
-                            if element_id in all_growthwheat_elements_data_dict:
-                                growthwheat_element_data_dict = all_growthwheat_elements_data_dict[element_id]
+                            if element_id in growthwheat_elements_modified_data:
+                                growthwheat_element_data_dict = growthwheat_elements_modified_data[element_id]
 
                                 for element_data_name, element_data_value in growthwheat_element_data_dict.items():
                                     self._shared_mtg.property(element_data_name)[mtg_element_vid] = element_data_value
 
+        mirror_in_state_store(self._shared_mtg, {'axes': growthwheat_axes_modified_data, 'organs': growthwheat_roots_modified_data,
+                                                 'hiddenzones': growthwheat_hiddenzones_modified_data, 'elements': growthwheat_elements_modified_data},
+                              {'hiddenzones': removed_hiddenzones_ids})
+
     def _update_shared_dataframes(self, growthwheat_hiddenzones_data_df, growthwheat_elements_data_df, growthwheat_roots_data_df, growthwheat_axes_data_df):
         """
         Update the dataframes shared between all models from the inputs dataframes or the outputs dataframes of the model.
@@ -0,0 +1,243 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import division
+
+import math
+
+import numpy as np
+import pandas as pd
+
+"""
+    fspmwheat.meteo
+    ~~~~~~~~~~~~~~~
+
+    The module :mod:`fspmwheat.meteo` provides the meteo forcings of the simulations.
+
+    The meteo file is read once and its numeric columns are stored in contiguous NumPy arrays. As the meteo is regularly
+    sampled (e.g. hourly), the row of a time step is computed from ``t``, so that reading the meteo at a time step does not
+    depend on the length of the file. The sums of a variable over the next time steps (e.g. the PAR of the next hours,
+    which triggers the run of the light model) are computed once for the whole file and then read like the other variables.
+
+    Multi-year files can be streamed by chunks (see parameter `chunksize` of :meth:`Meteo.from_csv`): only the rows from the
+    current time step onwards are then kept in memory, and the meteo must be read forward in time.
+
+    Example::
+
+        from openalea.fspmwheat.meteo import Meteo
+        meteo = Meteo.from_csv('meteo_Ljutovac2002.csv')
+        Tair, Tsoil = meteo.values(['air_temperature', 'soil_temperature'], t)
+        PARi_next_hours = meteo.rolling_sum('PARi', t, 4)
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the name of the column of the time steps
+T_INDEX = 't'
+
+
+class MeteoError(Exception):
+    pass
+
+
+class Meteo(object):
+    """
+    Regularly sampled meteo forcings, indexed by time step.
+
+    :param pandas.DataFrame meteo_df: the meteo, indexed by time step (or with a column `t`). Only the numeric columns are kept.
+    :param bool interpolate: if True, the variables at a time step between two rows are linearly interpolated ;
+                             otherwise reading a time step which is not a row of the meteo raises a :class:`MeteoError`.
+    """
+
+    def __init__(self, meteo_df, interpolate=False):
+        self.interpolate = interpolate  #: whether the variables are interpolated between the rows
+        self.first_t = None  #: the first time step of the meteo
+        self.delta_t = None  #: the time step of the meteo
+        self._reader = None  #: the reader of the next chunks of the meteo file, when the meteo is streamed
+        self._start = 0  #: the index, in the whole meteo, of the first row stored in memory
+        self._columns = {}  #: the stored rows of the variables, by variable name
+        self._rolling_sums = {}  #: the sums of the variables over the next time steps, by (variable name, number of time steps)
+        self._load(meteo_df)
+
+    @classmethod
+    def from_csv(cls, meteo_filepath, usecols=None, chunksize=None, interpolate=False):
+        """
+        Read the meteo from a CSV file.
+
+        :param str meteo_filepath: the path of the meteo file, with a column `t`.
+        :param list [str] usecols: the columns to read. If None, read all the columns.
+        :param int chunksize: if not None, stream the meteo file by chunks of `chunksize` rows instead of reading it at once.
+        :param bool interpolate: see :class:`Meteo`.
+
+        :return: the meteo
+        :rtype: Meteo
+        """
+        if usecols is not None and T_INDEX not in usecols:
+            usecols = [T_INDEX] + list(usecols)
+        if chunksize is None:
+            return cls(pd.read_csv(meteo_filepath, usecols=usecols), interpolate)
+        reader = pd.read_csv(meteo_filepath, usecols=usecols, chunksize=chunksize)
+        meteo = cls(next(reader), interpolate)
+        meteo._reader = reader
+        return meteo
+
+    @property
+    def variables(self):
+        """The names of the variables of the meteo."""
+        return list(self._columns.keys())
+
+    def value(self, name, t):
+        """
+        Get a variable of the meteo at a time step.
+
+        :param str name: the name of the variable
+        :param float t: the time step
+
+        :return: the value of the variable, with the type of its column (e.g. int for `DOY`).
+        :rtype: int or float
+        """
+        return self.values((name,), t)[0]
+
+    def values(self, names, t):
+        """
+        Get several variables of the meteo at a time step.
+
+        :param list [str] names: the names of the variables
+        :param float t: the time step
+
+        :return: the values of the variables, in the order of `names`
+        :rtype: tuple
+        """
+        index, fraction = self._locate(t)
+        if fraction == 0:
+            self._ensure_loaded(index, index + 1)
+            row = index - self._start
+            return tuple(self._column(name)[row].item() for name in names)
+        self._ensure_loaded(index, index + 2)
+        row = index - self._start
+        if row + 1 >= self._length():
+            raise MeteoError('Time step {} is after the end of the meteo'.format(t))
+        values = []
+        for name in names:
+            column = self._column(name)
+            values.append(float(column[row] + fraction * (column[row + 1] - column[row])))
+        return tuple(values)
+
+    def rolling_sum(self, name, t, nb_steps):
+        """
+        Get the sum of a variable over the `nb_steps` rows of the meteo from time step `t` included, e.g. the PAR of the
+        next hours. The rows after the end of the meteo are ignored.
+        The sums are computed once for all the rows of the meteo stored in memory.
+
+        :param str name: the name of the variable
+        :param float t: the first time step of the sum. Must be a row of the meteo.
+        :param int nb_steps: the number of rows to sum
+
+        :return: the sum of the variable
+        :rtype: float
+        """
+        index, fraction = self._locate(t)
+        if fraction != 0:
+            raise MeteoError('Time step {} is not a row of the meteo'.format(t))
+        self._ensure_loaded(index, index + nb_steps)
+        key = (name, nb_steps)
+        if key not in self._rolling_sums:
+            column = self._column(name).astype(float)
+            padded_column = np.concatenate((column, np.zeros(nb_steps - 1)))
+            self._rolling_sums[key] = np.lib.stride_tricks.sliding_window_view(padded_column, nb_steps).sum(axis=1)
+        return self._rolling_sums[key][index - self._start].item()
+
+    def _load(self, meteo_df):
+        """
+        Store the rows of a meteo dataframe in the columns, after the rows already stored.
+
+        :param pandas.DataFrame meteo_df: the rows to store
+        """
+        if T_INDEX in meteo_df.columns:
+            meteo_df = meteo_df.set_index(T_INDEX)
+        t = meteo_df.index.values.astype(float)
+        if len(t) == 0:
+            raise MeteoError('The meteo is empty')
+        if self.first_t is None:
+            self.first_t = t[0]
+            self.delta_t = t[1] - t[0] if len(t) > 1 else 1.
+            if self.delta_t <= 0:
+                raise MeteoError('The time steps of the meteo must be increasing')
+        expected_t = self.first_t + self.delta_t * np.arange(self._start + self._length(), self._start + self._length() + len(t))
+        if not np.allclose(t, expected_t, rtol=0, atol=1e-9 * self.delta_t):
+            raise MeteoError('The time steps of the meteo must be regularly sampled')
+        numeric_df = meteo_df.select_dtypes(include=[np.number])
+        for name in numeric_df.columns:
+            new_values = numeric_df[name].values
+            if name in self._columns:
+                new_values = np.concatenate((self._columns[name], new_values))
+            self._columns[name] = np.ascontiguousarray(new_values)
+        self._rolling_sums.clear()
+
+    def _length(self):
+        """The number of rows stored in memory."""
+        return len(next(iter(self._columns.values()))) if self._columns else 0
+
+    def _locate(self, t):
+        """
+        Locate a time step in the whole meteo.
+
+        :param float t: the time step
+
+        :return: the index of the row at or before `t`, and the fraction of time step between this row and the next one.
+        :rtype: (int, float)
+        """
+        position = (t - self.first_t) / self.delta_t
+        index = int(math.floor(position + 1e-9))
+        fraction = position - index
+        if abs(fraction) <= 1e-9:
+            fraction = 0
+        elif not self.interpolate:
+            raise MeteoError('Time step {} is not a row of the meteo and the meteo is not interpolated'.format(t))
+        if index < 0:
+            raise MeteoError('Time step {} is before the beginning of the meteo'.format(t))
+        return index, fraction
+
+    def _ensure_loaded(self, start, stop):
+        """
+        Check that the rows [`start`, `stop`[ of the whole meteo are stored in memory. When the meteo is streamed,
+        read the next chunks of the file if needed, and drop the rows before `start`.
+        The row `start` must be stored in memory ; the rows after the end of the meteo are ignored.
+
+        :param int start: the index of the first row
+        :param int stop: the index after the last row
+        """
+        if start < self._start:
+            raise MeteoError('The meteo is streamed and can only be read forward: the rows before time step {} have been dropped'.format(
+                self.first_t + self._start * self.delta_t))
+        while self._reader is not None and stop > self._start + self._length():
+            try:
+                chunk = next(self._reader)
+            except StopIteration:
+                self._reader = None
+                break
+            self._drop_before(start)
+            self._load(chunk)
+        if start >= self._start + self._length():
+            raise MeteoError('Time step {} is after the end of the meteo'.format(self.first_t + start * self.delta_t))
+
+    def _drop_before(self, start):
+        """
+        Drop the rows stored in memory before row `start` of the whole meteo.
+
+        :param int start: the index of the first row to keep
+        """
+        nb_dropped_rows = min(start, self._start + self._length()) - self._start
+        if nb_dropped_rows <= 0:
+            return
+        for name, column in self._columns.items():
+            self._columns[name] = np.ascontiguousarray(column[nb_dropped_rows:])
+        self._start += nb_dropped_rows
+
+    def _column(self, name):
+        """The stored rows of variable `name`."""
+        try:
+            return self._columns[name]
+        except KeyError:
+            raise MeteoError('Unknown meteo variable: {}'.format(name))
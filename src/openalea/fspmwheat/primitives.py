@@ -0,0 +1,46 @@
+# -*- coding: latin-1 -*-
+
+from openalea.farquharwheat.simulation import PrimitivesStore
+
+"""
+    fspmwheat.primitives
+    ~~~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`fspmwheat.primitives` attaches to the :class:`MTG <openalea.mtg.mtg.MTG>` shared between all models
+    the store of the primitives of the elements (i.e. their triangles).
+
+    The primitives are not stored in the MTG but in a separate :class:`farquharwheat.simulation.PrimitivesStore`,
+    filled by :class:`CaribuFacade <fspmwheat.caribu_facade.CaribuFacade>` and read by
+    :class:`FarquharWheatFacade <fspmwheat.farquharwheat_facade.FarquharWheatFacade>` at primitive scale.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the name of the attribute used to attach the store of the primitives of the elements to the MTG
+PRIMITIVES_STORE_ATTRIBUTE = '_fspmwheat_primitives_store'
+
+
+def attach_primitives_store(shared_mtg):
+    """
+    Create an empty store of the primitives of the elements, whose keys are the vertices of the elements, and attach it to the MTG.
+
+    :param openalea.mtg.mtg.MTG shared_mtg: The MTG shared between all models.
+
+    :return: The store attached to `shared_mtg`.
+    :rtype: farquharwheat.simulation.PrimitivesStore
+    """
+    primitives_store = PrimitivesStore()
+    setattr(shared_mtg, PRIMITIVES_STORE_ATTRIBUTE, primitives_store)
+    return primitives_store
+
+
+def get_primitives_store(shared_mtg):
+    """
+    :param openalea.mtg.mtg.MTG shared_mtg: The MTG shared between all models.
+
+    :return: The store of the primitives attached to `shared_mtg`, or `None` if no store was attached.
+    :rtype: farquharwheat.simulation.PrimitivesStore
+    """
+    return getattr(shared_mtg, PRIMITIVES_STORE_ATTRIBUTE, None)
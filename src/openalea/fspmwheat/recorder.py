@@ -0,0 +1,312 @@
+# -*- coding: latin-1 -*-
+
+import copy
+import gzip
+import importlib
+import io
+import os
+import pickle
+import timeit
+import types
+
+import numpy as np
+import pandas as pd
+
+"""
+    fspmwheat.recorder
+    ~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`fspmwheat.recorder` records the runs of the models within a coupled simulation, and replays them one model at a time.
+
+    Profiling one model within a coupled simulation is slow and noisy: the geometry and the other models must be run to reach the
+    time steps of interest. A :class:`FacadeRecorder` is attached to the facades (see argument `recorder` of their constructors),
+    which run their model through :func:`run_model`. At each run, the recorder stores, in a compressed file by model:
+
+        * the exact state of the model before the run (the :class:`Simulation` of the model, initialized with its inputs, or the scenes of Caribu),
+        * the arguments of the run and the parameters of the model,
+        * the outputs of the run and its duration.
+
+    :func:`replay` then runs the recorded models again without the MTG, the geometry or the other models, checks that they give the recorded outputs,
+    and reports the duration of each run. :func:`load_model` gives the model of a record, ready to run, e.g. to profile it.
+
+    The models are recorded by pickling. The modules referenced by the models (e.g. the model of respiration of CN-Wheat) are recorded by name.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the names of the models which can be recorded, i.e. the names given to :func:`run_model` by the facades
+MODELS_NAMES = ('caribu', 'farquharwheat', 'elongwheat', 'growthwheat', 'senescwheat', 'cnwheat')
+
+#: the columns of the report of :func:`replay`
+REPLAY_REPORT_COLUMNS = ['model', 'index', 't', 'recorded_duration', 'duration', 'outputs_match']
+
+
+class _Pickler(pickle.Pickler):
+    """A pickler which records the modules by name."""
+
+    def persistent_id(self, obj):
+        if isinstance(obj, types.ModuleType):
+            return obj.__name__
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    """An unpickler which imports the modules recorded by :class:`_Pickler`."""
+
+    def persistent_load(self, pid):
+        return importlib.import_module(pid)
+
+
+def _dumps(obj):
+    buffer_ = io.BytesIO()
+    _Pickler(buffer_, protocol=pickle.HIGHEST_PROTOCOL).dump(obj)
+    return buffer_.getvalue()
+
+
+def _loads(data):
+    return _Unpickler(io.BytesIO(data)).load()
+
+
+def _get_parameters_module(model_name):
+    """Return the module of the parameters of the model `model_name`, or None if the model has no parameters (Caribu)."""
+    if model_name == 'caribu':
+        return None
+    return importlib.import_module('openalea.{}.parameters'.format(model_name))
+
+
+def _is_parameters_object(value, parameters_module):
+    """Return True if `value` is an instance of a class of `parameters_module`, e.g. the parameters of the organs of CN-Wheat."""
+    return type(value).__module__ == parameters_module.__name__
+
+
+def get_parameters(model_name):
+    """
+    Get the current parameters of a model.
+
+    :param str model_name: The name of the model, one of :data:`MODELS_NAMES`.
+
+    :return: A copy of the values of the module of the parameters of the model, or of the attributes of its objects: {parameter_name: value, ...}.
+    :rtype: dict
+    """
+    parameters_module = _get_parameters_module(model_name)
+    if parameters_module is None:
+        return {}
+    parameters_values = {}
+    for parameter_name, value in vars(parameters_module).items():
+        if parameter_name.startswith('_') or isinstance(value, (types.ModuleType, types.FunctionType, type)):
+            continue
+        if _is_parameters_object(value, parameters_module):
+            value = vars(value)
+        parameters_values[parameter_name] = copy.deepcopy(value)
+    return parameters_values
+
+
+def set_parameters(model_name, parameters_values):
+    """
+    Set the parameters of a model, and register again the temperature responses of the model, if any (see :mod:`wheatfspm.temperature`).
+
+    :param str model_name: The name of the model, one of :data:`MODELS_NAMES`.
+    :param dict parameters_values: The parameters, as given by :func:`get_parameters`.
+    """
+    parameters_module = _get_parameters_module(model_name)
+    if parameters_module is None:
+        return
+    for parameter_name, value in parameters_values.items():
+        current_value = getattr(parameters_module, parameter_name, None)
+        if _is_parameters_object(current_value, parameters_module):
+            vars(current_value).update(copy.deepcopy(value))
+        else:
+            setattr(parameters_module, parameter_name, copy.deepcopy(value))
+    model_module = importlib.import_module('openalea.{}.model'.format(model_name))
+    if hasattr(model_module, 'register_temperature_responses'):
+        model_module.register_temperature_responses()
+
+
+def get_outputs(model_name, model, result):
+    """
+    Get the outputs of the last run of a model, in a format which can be compared by :func:`compare_outputs`.
+
+    :param str model_name: The name of the model, one of :data:`MODELS_NAMES`.
+    :param model: The model: the :class:`Simulation` of the model, or a scene of Caribu.
+    :param result: The value returned by the run of the model.
+
+    :return: The outputs of the model: the value returned by the run for Caribu, the outputs of the model converted to dataframes otherwise.
+    """
+    if model_name == 'caribu':
+        return result
+    converter = importlib.import_module('openalea.{}.converter'.format(model_name))
+    if model_name == 'cnwheat':
+        return converter.to_dataframes(model.population, model.soils)
+    if model_name == 'farquharwheat':
+        return converter.to_dataframe(model.outputs)
+    return converter.to_dataframes(model.outputs)
+
+
+def compare_outputs(recorded_outputs, outputs, rtol=1E-7, atol=1E-10, path='outputs'):
+    """
+    Compare the outputs of a replayed run to the recorded outputs.
+
+    :param recorded_outputs: The recorded outputs (see :func:`get_outputs`).
+    :param outputs: The outputs of the replayed run.
+    :param float rtol: The relative tolerance on the numerical values.
+    :param float atol: The absolute tolerance on the numerical values.
+    :param str path: The path of the compared outputs, for the messages.
+
+    :return: The messages describing the differences, empty if the outputs match.
+    :rtype: list
+    """
+    if isinstance(recorded_outputs, pd.DataFrame):
+        try:
+            pd.testing.assert_frame_equal(outputs, recorded_outputs, check_exact=False, rtol=rtol, atol=atol)
+        except AssertionError as error:
+            return ['{}: {}'.format(path, error)]
+        return []
+    if isinstance(recorded_outputs, dict):
+        if not isinstance(outputs, dict) or set(outputs) != set(recorded_outputs):
+            return ['{}: different keys'.format(path)]
+        return [message for key in recorded_outputs for message in compare_outputs(recorded_outputs[key], outputs[key], rtol, atol, '{}[{!r}]'.format(path, key))]
+    if isinstance(recorded_outputs, (list, tuple)):
+        if not isinstance(outputs, (list, tuple)) or len(outputs) != len(recorded_outputs):
+            return ['{}: different lengths'.format(path)]
+        return [message for i, (recorded_item, item) in enumerate(zip(recorded_outputs, outputs)) for message in compare_outputs(recorded_item, item, rtol, atol, '{}[{}]'.format(path, i))]
+    try:
+        match = np.allclose(outputs, recorded_outputs, rtol=rtol, atol=atol, equal_nan=True)
+    except TypeError:  # not numerical
+        match = bool(outputs == recorded_outputs)
+    return [] if match else ['{}: {!r} instead of {!r}'.format(path, outputs, recorded_outputs)]
+
+
+class FacadeRecorder(object):
+    """
+    Record the runs of the models in compressed files, one file by model, named after the model (see :meth:`filepath`).
+    Each run is appended to the file of its model as soon as it is done, so the runs before an error of the simulation are kept.
+    """
+
+    FILENAME_TEMPLATE = '{}_runs.pkl.gz'  #: the template of the names of the files, formatted with the name of the model
+
+    def __init__(self, dirpath='.', models_names=None):
+        """
+        :param str dirpath: The directory of the files of the records. Existing files are overwritten.
+        :param list models_names: The names of the models to record, among :data:`MODELS_NAMES`. If None, record all the models.
+        """
+        self.dirpath = dirpath  #: the directory of the files of the records
+        self.models_names = frozenset(MODELS_NAMES if models_names is None else models_names)  #: the names of the models to record
+        self.t = None  #: the current time step of the simulation, recorded with the runs. Set by the main loop of the simulation, if needed.
+        self.nb_runs = {}  #: the number of runs recorded for each model: {model_name: nb_runs, ...}
+        for model_name in self.models_names:
+            if os.path.exists(self.filepath(model_name)):
+                os.remove(self.filepath(model_name))
+
+    def filepath(self, model_name):
+        """
+        :param str model_name: The name of a model.
+
+        :return: The path of the file of the records of the model.
+        :rtype: str
+        """
+        return os.path.join(self.dirpath, FacadeRecorder.FILENAME_TEMPLATE.format(model_name))
+
+    def run(self, model_name, model, *args, **kwargs):
+        """
+        Run a model, and record the run if the model is in :attr:`models_names`.
+
+        :param str model_name: The name of the model, one of :data:`MODELS_NAMES`.
+        :param model: The model to run: the :class:`Simulation` of the model initialized with its inputs, or a scene of Caribu.
+        :param args: The positional arguments of the method `run` of the model.
+        :param kwargs: The keyword arguments of the method `run` of the model.
+
+        :return: The value returned by the method `run` of the model.
+        """
+        if model_name not in self.models_names:
+            return model.run(*args, **kwargs)
+        model_state = _dumps(model)
+        parameters_values = get_parameters(model_name)
+        start = timeit.default_timer()
+        result = model.run(*args, **kwargs)
+        duration = timeit.default_timer() - start
+        index = self.nb_runs.get(model_name, 0)
+        record = {'model': model_name, 'index': index, 't': self.t, 'model_state': model_state, 'args': args, 'kwargs': kwargs,
+                  'parameters': parameters_values, 'outputs': get_outputs(model_name, model, result), 'duration': duration}
+        with gzip.open(self.filepath(model_name), 'ab') as records_file:
+            records_file.write(_dumps(record))
+        self.nb_runs[model_name] = index + 1
+        return result
+
+
+def run_model(recorder, model_name, model, *args, **kwargs):
+    """
+    Run a model through a recorder, or directly if there is no recorder. Used by the facades to run their model.
+
+    :param FacadeRecorder recorder: The recorder, or None.
+    :param str model_name: The name of the model, one of :data:`MODELS_NAMES`.
+    :param model: The model to run.
+    :param args: The positional arguments of the method `run` of the model.
+    :param kwargs: The keyword arguments of the method `run` of the model.
+
+    :return: The value returned by the method `run` of the model.
+    """
+    if recorder is None:
+        return model.run(*args, **kwargs)
+    return recorder.run(model_name, model, *args, **kwargs)
+
+
+def read_records(filepath):
+    """
+    Read the records of the runs of a model.
+
+    :param str filepath: The path of the file of the records (see :meth:`FacadeRecorder.filepath`).
+
+    :return: A generator of the records, in the order of the runs.
+    :rtype: generator
+    """
+    with gzip.open(filepath, 'rb') as records_file:
+        while True:
+            try:
+                # each record was pickled on its own (see :func:`_dumps`): a new unpickler per record, so the memo of a record is not reused for the next ones
+                yield _Unpickler(records_file).load()
+            except EOFError:
+                return
+
+
+def load_model(record):
+    """
+    Load the model of a record, and set its parameters, so the model is ready to run with the recorded arguments:
+    `model.run(*record['args'], **record['kwargs'])`.
+
+    :param dict record: A record, as read by :func:`read_records`.
+
+    :return: The model, in its state before the recorded run.
+    """
+    set_parameters(record['model'], record['parameters'])
+    return _loads(record['model_state'])
+
+
+def replay(filepath, indexes=None, rtol=1E-7, atol=1E-10):
+    """
+    Run again the recorded runs of a model, check their outputs and measure their duration.
+
+    :param str filepath: The path of the file of the records (see :meth:`FacadeRecorder.filepath`).
+    :param set indexes: The indexes of the runs to replay. If None, replay all the runs.
+    :param float rtol: The relative tolerance on the outputs.
+    :param float atol: The absolute tolerance on the outputs.
+
+    :return: The report of the runs, with the columns :data:`REPLAY_REPORT_COLUMNS`, and the differences between the replayed
+             and the recorded outputs: {index: [message, ...], ...}, for the runs whose outputs do not match.
+    :rtype: (pandas.DataFrame, dict)
+    """
+    report = []
+    differences = {}
+    for record in read_records(filepath):
+        if indexes is not None and record['index'] not in indexes:
+            continue
+        model = load_model(record)
+        start = timeit.default_timer()
+        result = model.run(*record['args'], **record['kwargs'])
+        duration = timeit.default_timer() - start
+        messages = compare_outputs(record['outputs'], get_outputs(record['model'], model, result), rtol, atol)
+        if messages:
+            differences[record['index']] = messages
+        report.append((record['model'], record['index'], record['t'], record['duration'], duration, not messages))
+    return pd.DataFrame(report, columns=REPLAY_REPORT_COLUMNS), differences
@@ -4,7 +4,11 @@ import numpy as np
 
 from openalea.senescwheat import converter, simulation
 
-from openalea.fspmwheat import tools
+from openalea.fspmwheat import geometry, tools
+from openalea.fspmwheat.active_set import is_senescwheat_element_inert
+from openalea.fspmwheat.recorder import run_model
+from openalea.fspmwheat.state_store import attach_state_store, get_state_store
+from openalea.fspmwheat.topology import get_topology_index
 
 """
     fspmwheat.senescwheat_facade
@@ -13,6 +17,8 @@ from openalea.fspmwheat import tools
     This module permits to initialize and run the model SenescWheat from a :class:`MTG <openalea.mtg.mtg.MTG>`
     in a convenient and transparent way, wrapping all the internal complexity of the model, and dealing
     with all the tedious initialization and conversion processes.
+    The inputs and outputs of the model are read and written in the columns of the store of the state
+    attached to the MTG (see :mod:`fspmwheat.state_store`).
     :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
     :license: see LICENSE for details.
 """
@@ -30,6 +36,26 @@ SHARED_ORGANS_INPUTS_OUTPUTS_INDEXES = ['plant', 'axis', 'organ']
 SHARED_ELEMENTS_INPUTS_OUTPUTS_INDEXES = ['plant', 'axis', 'metamer', 'organ', 'element']
 
 
+def _read_columns(table, rows, names, complete=True):
+    """
+    Read the values of some variables in a table of the store of the state, with one slice of column per variable.
+
+    :param fspmwheat.state_store.StateTable table: The table.
+    :param numpy.ndarray rows: The rows to read.
+    :param list names: The variables to read.
+    :param bool complete: If `True`, a row where one of the variables was never written is read as `None`.
+                          Otherwise, only the written values of each row are read.
+
+    :return: The values of each row, in the order of `rows` : [{variable: value, ...}, ...]
+    :rtype: list
+    """
+    columns = [table.column(name)[rows].tolist() if table.has_column(name) else [None] * len(rows) for name in names]
+    written = [table.written(name)[rows].tolist() for name in names]
+    if complete:
+        return [dict(zip(names, values)) if all(row_written) else None for values, row_written in zip(zip(*columns), zip(*written))]
+    return [{name: value for name, value, is_written in zip(names, values, row_written) if is_written} for values, row_written in zip(zip(*columns), zip(*written))]
+
+
 class SenescWheatFacade(object):
     """
     The SenescWheatFacade class permits to initialize, run the model SenescWheat
@@ -46,7 +72,8 @@ class SenescWheatFacade(object):
                  shared_axes_inputs_outputs_df,
                  shared_elements_inputs_outputs_df,
                  update_parameters=None,
-                 update_shared_df=True):
+                 update_shared_df=True,
+                 recorder=None):
 
         """
         :param openalea.mtg.mtg.MTG shared_mtg: The MTG shared between all models.
@@ -59,9 +86,14 @@ class SenescWheatFacade(object):
         :param pandas.DataFrame shared_elements_inputs_outputs_df: the dataframe of inputs and outputs at element scale shared between all models.
         :param dict update_parameters: A dictionary with the parameters to update, should have the form {'param1': value1, 'param2': value2, ...}.
         :param bool update_shared_df: If `True`  update the shared dataframes at init and at each run (unless stated otherwise)
+        :param fspmwheat.recorder.FacadeRecorder recorder: the recorder of the runs of the model (see :mod:`fspmwheat.recorder`), or None
         """
 
         self._shared_mtg = shared_mtg  #: the MTG shared between all models
+        self._recorder = recorder  #: the recorder of the runs of the model, or None
+        self._state_store = get_state_store(shared_mtg)  #: the store of the state shared between all models, attached to the MTG
+        if self._state_store is None:
+            self._state_store = attach_state_store(shared_mtg)
 
         self._simulation = simulation.Simulation(delta_t=delta_t, update_parameters=update_parameters)  #: the simulator to use to run the model
 
@@ -85,7 +117,7 @@ class SenescWheatFacade(object):
         """
 
         self._initialize_model()
-        self._simulation.run(forced_max_protein_elements=forced_max_protein_elements, postflowering_stages=postflowering_stages)
+        run_model(self._recorder, 'senescwheat', self._simulation, forced_max_protein_elements=forced_max_protein_elements, postflowering_stages=postflowering_stages)
         self._update_shared_MTG(self._simulation.outputs['roots'], self._simulation.outputs['axes'], self._simulation.outputs['elements'])
 
         if update_shared_df or (update_shared_df is None and self._update_shared_df):
@@ -94,121 +126,80 @@ class SenescWheatFacade(object):
 
     def _initialize_model(self):
         """
-        Initialize the inputs of the model from the MTG shared between all models.
+        Initialize the inputs of the model from the columns of the store of the state shared between all models (see :mod:`fspmwheat.state_store`).
+        The elements which are inert for the model are not passed to the model (see :func:`fspmwheat.active_set.is_senescwheat_element_inert`).
         """
         all_senescwheat_roots_inputs_dict = {}
         all_senescwheat_axes_inputs_dict = {}
         all_senescwheat_elements_inputs_dict = {}
 
-        # traverse the MTG recursively from the top ...
-        for mtg_plant_vid in self._shared_mtg.components_iter(self._shared_mtg.root):
-            mtg_plant_index = int(self._shared_mtg.index(mtg_plant_vid))
-            for mtg_axis_vid in self._shared_mtg.components_iter(mtg_plant_vid):
-                mtg_axis_label = self._shared_mtg.label(mtg_axis_vid)
-                if mtg_axis_label != 'MS':
-                    continue
-                axis_id = (mtg_plant_index, mtg_axis_label)
-                mtg_axis_properties = self._shared_mtg.get_vertex_property(mtg_axis_vid)
-                if set(mtg_axis_properties).issuperset(converter.SENESCWHEAT_AXES_INPUTS):
-                    senescwheat_axis_inputs_dict = {}
-                    for senescwheat_axis_input_name in converter.SENESCWHEAT_AXES_INPUTS:
-                        senescwheat_axis_inputs_dict[senescwheat_axis_input_name] = mtg_axis_properties[senescwheat_axis_input_name]
-                    all_senescwheat_axes_inputs_dict[axis_id] = senescwheat_axis_inputs_dict
-                if 'roots' in mtg_axis_properties:
-                    mtg_roots_properties = mtg_axis_properties['roots']
-                    if set(mtg_roots_properties).issuperset(converter.SENESCWHEAT_ROOTS_INPUTS):
-                        senescwheat_roots_inputs_dict = {}
-                        for senescwheat_roots_input_name in converter.SENESCWHEAT_ROOTS_INPUTS:
-                            senescwheat_roots_inputs_dict[senescwheat_roots_input_name] = mtg_roots_properties[senescwheat_roots_input_name]
-                        all_senescwheat_roots_inputs_dict[axis_id] = senescwheat_roots_inputs_dict
-                for mtg_metamer_vid in self._shared_mtg.components_iter(mtg_axis_vid):
-                    mtg_metamer_index = int(self._shared_mtg.index(mtg_metamer_vid))
-                    for mtg_organ_vid in self._shared_mtg.components_iter(mtg_metamer_vid):
-                        mtg_organ_label = self._shared_mtg.label(mtg_organ_vid)
-                        if mtg_organ_label not in PHOTOSYNTHETIC_ORGANS_NAMES:
-                            continue
-                        # if np.nan_to_num( self._shared_mtg.property('length').get(mtg_organ_vid,0)) == 0: continue
-                        for mtg_element_vid in self._shared_mtg.components_iter(mtg_organ_vid):
-                            mtg_element_properties = self._shared_mtg.get_vertex_property(mtg_element_vid)
-                            mtg_element_label = self._shared_mtg.label(mtg_element_vid)
-                            element_id = (mtg_plant_index, mtg_axis_label, mtg_metamer_index, mtg_organ_label, mtg_element_label)
-                            if np.nan_to_num(self._shared_mtg.property('length').get(mtg_element_vid, 0)) == 0:
-                                continue
-                            if set(mtg_element_properties).issuperset(converter.SENESCWHEAT_ELEMENTS_INPUTS):
-                                senescwheat_element_inputs_dict = {}
-                                for senescwheat_element_input_name in converter.SENESCWHEAT_ELEMENTS_INPUTS:
-                                    senescwheat_element_inputs_dict[senescwheat_element_input_name] = mtg_element_properties[senescwheat_element_input_name]
-                                all_senescwheat_elements_inputs_dict[element_id] = senescwheat_element_inputs_dict
-                                # TODO: temporary ; replace 'SENESCWHEAT_ELEMENT_PROPERTIES_TEMP' by default values
-                                SENESCWHEAT_ELEMENT_PROPERTIES_TEMP = {'starch': 0, 'max_proteins': 0, 'amino_acids': 0,
-                                                                       'proteins': 0, 'Nstruct': 0, 'mstruct': 0, 'fructan': 0,
-                                                                       'sucrose': 0, 'green_area': 0, 'cytokinins': 0}
-                                senescwheat_element_inputs_dict = {}
-                                for senescwheat_element_input_name in converter.SENESCWHEAT_ELEMENTS_INPUTS:
-                                    if senescwheat_element_input_name in mtg_element_properties:
-                                        senescwheat_element_inputs_dict[senescwheat_element_input_name] = mtg_element_properties[senescwheat_element_input_name]
-                                    else:
-                                        senescwheat_element_inputs_dict[senescwheat_element_input_name] = SENESCWHEAT_ELEMENT_PROPERTIES_TEMP[senescwheat_element_input_name]
-                                all_senescwheat_elements_inputs_dict[element_id] = senescwheat_element_inputs_dict
+        # only the ids of the vertices of the MTG which are not archived are read
+        topology = get_topology_index(self._shared_mtg)
+
+        # axes and roots of the main stems which have all their inputs
+        axes_table = self._state_store.axes
+        axes_ids = [axis_id for axis_id in axes_table.ids if axis_id[1] == 'MS' and topology.vid(axis_id) is not None]
+        axes_rows = axes_table.rows(axes_ids)
+        for axis_id, axis_inputs in zip(axes_ids, _read_columns(axes_table, axes_rows, converter.SENESCWHEAT_AXES_INPUTS)):
+            if axis_inputs is not None:
+                all_senescwheat_axes_inputs_dict[axis_id] = axis_inputs
+
+        organs_table = self._state_store.organs
+        roots_ids = [roots_id for roots_id in organs_table.ids if roots_id[1] == 'MS' and roots_id[2] == 'roots' and topology.vid(roots_id[:-1]) is not None]
+        roots_rows = organs_table.rows(roots_ids)
+        for roots_id, roots_inputs in zip(roots_ids, _read_columns(organs_table, roots_rows, converter.SENESCWHEAT_ROOTS_INPUTS)):
+            if roots_inputs is not None:
+                all_senescwheat_roots_inputs_dict[roots_id[:-1]] = roots_inputs
+
+        # photosynthetic elements of the main stems with a non null length and all their inputs
+        elements_table = self._state_store.elements
+        elements_ids = [element_id for element_id in elements_table.ids
+                        if element_id[1] == 'MS' and element_id[3] in PHOTOSYNTHETIC_ORGANS_NAMES and topology.vid(element_id) is not None]
+        elements_rows = elements_table.rows(elements_ids)
+        elements_lengths = np.nan_to_num(np.asarray(elements_table.column('length')[elements_rows], dtype=float))
+        elements_inputs = _read_columns(elements_table, elements_rows, converter.SENESCWHEAT_ELEMENTS_INPUTS)
+        elements_flags = _read_columns(elements_table, elements_rows, ['is_over', 'is_growing'], complete=False)
+        mtg_organs_senesced_lengths = self._shared_mtg.property('senesced_length')
+        for element_id, element_length, element_inputs, element_flags in zip(elements_ids, elements_lengths, elements_inputs, elements_flags):
+            if element_length == 0 or element_inputs is None:
+                continue
+            organ_senesced_length = mtg_organs_senesced_lengths.get(topology.vid(element_id[:-1])) if element_id[-1] in ('LeafElement1', 'StemElement') else None
+            element_flags.update(element_inputs)
+            if is_senescwheat_element_inert(element_flags, organ_senesced_length):
+                continue
+            all_senescwheat_elements_inputs_dict[element_id] = element_inputs
 
         self._simulation.initialize({'roots': all_senescwheat_roots_inputs_dict, 'axes': all_senescwheat_axes_inputs_dict, 'elements': all_senescwheat_elements_inputs_dict})
 
     def _update_shared_MTG(self, senescwheat_roots_data_dict, senescwheat_axes_data_dict, senescwheat_elements_data_dict):
         """
         Update the MTG shared between all models from the inputs or the outputs of the model.
+        The data are written in the columns of the store of the state shared between all models, and pushed to the MTG
+        when the MTG is read (see :func:`fspmwheat.state_store.sync_shared_mtg`). The senesced length of the leaves and stems is copied to their organ.
+
         :param dict senescwheat_roots_data_dict: Senesc-Wheat outputs at root scale
         :param dict senescwheat_axes_data_dict: Senesc-Wheat outputs at axis scale
         :param dict senescwheat_elements_data_dict: Senesc-Wheat outputs at element scale
         """
-
-        # add the properties if needed
-        mtg_property_names = self._shared_mtg.property_names()
-        if 'roots' not in mtg_property_names:
-            self._shared_mtg.add_property('roots')
-        for senescwheat_elements_data_name in converter.SENESCWHEAT_ELEMENTS_INPUTS_OUTPUTS:
-            if senescwheat_elements_data_name not in mtg_property_names:
-                self._shared_mtg.add_property(senescwheat_elements_data_name)
-
-        # traverse the MTG recursively from top ...
-        for mtg_plant_vid in self._shared_mtg.components_iter(self._shared_mtg.root):
-            mtg_plant_index = int(self._shared_mtg.index(mtg_plant_vid))
-            for mtg_axis_vid in self._shared_mtg.components_iter(mtg_plant_vid):
-                mtg_axis_label = self._shared_mtg.label(mtg_axis_vid)
-                if mtg_axis_label != 'MS':
-                    continue
-
-                # update the axis property in the MTG
-                axis_id = (mtg_plant_index, mtg_axis_label)
-                mtg_axis_properties = self._shared_mtg.get_vertex_property(mtg_axis_vid)
-                mtg_axis_properties.update(senescwheat_axes_data_dict.get(axis_id, []))
-                # update the roots in the MTG
-                if axis_id not in senescwheat_roots_data_dict:
-                    continue
-                if 'roots' not in self._shared_mtg.get_vertex_property(mtg_axis_vid):
-                    self._shared_mtg.property('roots')[mtg_axis_vid] = {}
-                mtg_roots_properties = self._shared_mtg.get_vertex_property(mtg_axis_vid)['roots']
-                mtg_roots_properties.update(senescwheat_roots_data_dict[axis_id])
-                for mtg_metamer_vid in self._shared_mtg.components_iter(mtg_axis_vid):
-                    mtg_metamer_index = int(self._shared_mtg.index(mtg_metamer_vid))
-                    for mtg_organ_vid in self._shared_mtg.components_iter(mtg_metamer_vid):
-                        mtg_organ_label = self._shared_mtg.label(mtg_organ_vid)
-                        # senesced_length_organ = 0.  # Temporaire
-                        if mtg_organ_label not in PHOTOSYNTHETIC_ORGANS_NAMES:
-                            continue
-                        for mtg_element_vid in self._shared_mtg.components_iter(mtg_organ_vid):
-                            mtg_element_label = self._shared_mtg.label(mtg_element_vid)
-                            element_id = (mtg_plant_index, mtg_axis_label, mtg_metamer_index, mtg_organ_label, mtg_element_label)
-                            if element_id not in senescwheat_elements_data_dict:
-                                continue
-                            # update the element in the MTG
-                            senescwheat_element_data_dict = senescwheat_elements_data_dict[element_id]
-                            for senescwheat_element_data_name, senescwheat_element_data_value in senescwheat_element_data_dict.items():
-                                self._shared_mtg.property(senescwheat_element_data_name)[mtg_element_vid] = senescwheat_element_data_value
-                                # Temporaire avant de trouver une solution pour :
-                                # 1) piloter la senescence des feuilles par green_area plutot que par senesced_length,
-                                # 2) updater les organes  partir des lments et non l'inverse.
-                                if senescwheat_element_data_name == 'senesced_length_element' and mtg_element_label in ['LeafElement1', 'StemElement']:
-                                    self._shared_mtg.property('senesced_length')[mtg_organ_vid] = np.nan_to_num(self._shared_mtg.property(senescwheat_element_data_name).get(mtg_element_vid, 0.))
+        self._state_store.update('axes', senescwheat_axes_data_dict)
+        self._state_store.update('organs', {axis_id + ('roots',): senescwheat_roots_data for axis_id, senescwheat_roots_data in senescwheat_roots_data_dict.items()})
+        self._state_store.update('elements', senescwheat_elements_data_dict)
+
+        # Temporaire avant de trouver une solution pour :
+        # 1) piloter la senescence des feuilles par green_area plutot que par senesced_length,
+        # 2) updater les organes  partir des lments et non l'inverse.
+        if 'senesced_length' not in self._shared_mtg.property_names():
+            self._shared_mtg.add_property('senesced_length')
+        topology = get_topology_index(self._shared_mtg)
+        for element_id, senescwheat_element_data_dict in senescwheat_elements_data_dict.items():
+            if element_id[-1] not in ('LeafElement1', 'StemElement') or 'senesced_length_element' not in senescwheat_element_data_dict:
+                continue
+            mtg_organ_vid = topology.vid(element_id[:-1])
+            if mtg_organ_vid is None:
+                continue
+            senesced_length_element = senescwheat_element_data_dict['senesced_length_element']
+            geometry.set_geometrical_property(self._shared_mtg, 'senesced_length', mtg_organ_vid,
+                                              np.nan_to_num(senesced_length_element if senesced_length_element is not None else 0.))
 
     def _update_shared_dataframes(self, senescwheat_roots_data_df, senescwheat_axes_data_df, senescwheat_elements_data_df):
         """
@@ -0,0 +1,558 @@
+# -*- coding: latin-1 -*-
+import numbers
+
+import numpy as np
+import pandas as pd
+
+from openalea.fspmwheat import fspmwheat_facade, geometry
+from openalea.fspmwheat.topology import AXIS_SCALE, ELEMENT_SCALE, METAMER_SCALE, get_topology_index
+
+"""
+    fspmwheat.state_store
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`fspmwheat.state_store` defines a columnar store of the state shared between all models.
+
+    The store holds one table per scale (axes, organs, hiddenzones, elements and soils). Each table has a fixed schema,
+    given by the variables of the scale in :mod:`fspmwheat.fspmwheat_facade`, and stores each variable in a NumPy array
+    whose rows are identified by the topology ids used by the models (e.g. (plant, axis, metamer, organ, element) for the elements).
+    The columns can be read and written as NumPy views, without any copy of the values per attribute.
+
+    The store is attached to the :class:`MTG <openalea.mtg.mtg.MTG>` shared between all models (see :func:`attach_state_store`).
+    The facades of Senesc-Wheat and Farquhar-Wheat write their outputs in the columns of the store instead of the vertices of the MTG,
+    and Senesc-Wheat reads its inputs from these columns.
+    The MTG remains the support of the geometry (ADEL, Caribu) : the values written in the store are pushed to the MTG lazily,
+    i.e. only the modified values and only when the MTG is about to be read (see :func:`sync_shared_mtg`).
+    Conversely, the other facades mirror in the store the values they write in the MTG (see :func:`mirror_in_state_store`).
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the tables of the store : name of the table -> (topology columns, variables)
+TABLES_SCHEMAS = {'axes': (fspmwheat_facade.AXES_TOPOLOGY_COLUMNS, fspmwheat_facade.AXES_VARIABLES),
+                  'organs': (fspmwheat_facade.ORGANS_TOPOLOGY_COLUMNS, fspmwheat_facade.ORGANS_VARIABLES),
+                  'hiddenzones': (fspmwheat_facade.HIDDENZONES_TOPOLOGY_COLUMNS, fspmwheat_facade.HIDDENZONES_VARIABLES),
+                  'elements': (fspmwheat_facade.ELEMENTS_TOPOLOGY_COLUMNS, fspmwheat_facade.ELEMENTS_VARIABLES),
+                  'soils': (fspmwheat_facade.SOILS_TOPOLOGY_COLUMNS, fspmwheat_facade.SOILS_VARIABLES)}
+
+#: the name of the attribute used to attach the store to the MTG
+STATE_STORE_ATTRIBUTE = '_fspmwheat_state_store'
+
+#: the initial number of rows allocated for each table
+INITIAL_CAPACITY = 16
+
+
+def _column_dtype(values):
+    """
+    Get the dtype of a new column from the values to store in it.
+
+    :param list values: The values.
+
+    :return: `int64` if all the values are integers, `float64` if all the values are numbers, `object` otherwise (booleans, strings, ...).
+    :rtype: numpy.dtype
+    """
+    if all(isinstance(value, numbers.Integral) and not isinstance(value, (bool, np.bool_)) for value in values):
+        return np.dtype(np.int64)
+    if all(isinstance(value, numbers.Real) and not isinstance(value, (bool, np.bool_)) for value in values):
+        return np.dtype(np.float64)
+    return np.dtype(object)
+
+
+def _missing_value(dtype):
+    """
+    :param numpy.dtype dtype: The dtype of a column.
+
+    :return: The value of the missing cells of a column of type `dtype` : `nan` for floats, 0 for integers and `None` for objects.
+    """
+    if dtype.kind == 'f':
+        return np.nan
+    if dtype.kind == 'i':
+        return 0
+    return None
+
+
+def _new_array(capacity, dtype):
+    """
+    :param int capacity: The number of rows.
+    :param numpy.dtype dtype: The dtype of the array.
+
+    :return: An array of `capacity` missing values ; or of `False` if `dtype` is `bool`.
+    :rtype: numpy.ndarray
+    """
+    if dtype == bool:
+        return np.zeros(capacity, dtype=bool)
+    return np.full(capacity, _missing_value(dtype), dtype=dtype)
+
+
+class StateTable(object):
+    """
+    A table of the state shared between all models at one scale.
+
+    The rows are identified by topology ids. The columns are NumPy arrays, allocated at the first write of each variable
+    with a dtype inferred from the written values (see :func:`_column_dtype`). A column of integers is converted to floats when
+    non integer values have to be stored in it ; any column is converted to `object` when non numeric values have to be stored in it.
+
+    Each cell written with `mark_dirty=True` is marked as modified until the table is synchronized with the MTG (see :meth:`pop_dirty`).
+    """
+
+    def __init__(self, topology_columns, variables):
+        """
+        :param list topology_columns: The names of the components of the ids of the rows.
+        :param set variables: The variables of the table.
+        """
+        self.topology_columns = list(topology_columns)  #: the names of the components of the ids
+        self.variables = frozenset(variables)  #: the schema of the table
+        self._ids = []  #: the id of each row
+        self._rows = {}  #: the row of each id
+        self._capacity = INITIAL_CAPACITY  #: the number of rows allocated in each column
+        self._columns = {}  #: the columns allocated so far : variable -> array
+        self._written = {}  #: the written cells of each column : variable -> array of bool
+        self._dirty = {}  #: the cells modified since the last synchronization : variable -> array of bool
+        self._removed_ids = set()  #: the ids removed since the last synchronization
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, topology_id):
+        return topology_id in self._rows
+
+    @property
+    def ids(self):
+        """The ids of the rows, in the order of the rows."""
+        return self._ids
+
+    def row(self, topology_id):
+        """
+        :param tuple topology_id: The id of a row.
+
+        :return: The index of the row of `topology_id`.
+        :rtype: int
+        """
+        return self._rows[topology_id]
+
+    def rows(self, topology_ids, add_missing=False):
+        """
+        Get the rows of several ids.
+
+        :param iterable topology_ids: The ids.
+        :param bool add_missing: If `True`, add a row for each id which is not in the table yet ; otherwise raise a `KeyError`.
+
+        :return: The index of the row of each id.
+        :rtype: numpy.ndarray
+        """
+        topology_ids = list(topology_ids)
+        if add_missing:
+            self.add(topology_ids)
+        return np.fromiter((self._rows[topology_id] for topology_id in topology_ids), dtype=np.intp)
+
+    def add(self, topology_ids):
+        """
+        Add a row for each id which is not in the table yet. The cells of the new rows are missing.
+
+        :param iterable topology_ids: The ids.
+        """
+        new_ids = [topology_id for topology_id in dict.fromkeys(topology_ids) if topology_id not in self._rows]
+        if not new_ids:
+            return
+        nb_rows = len(self._ids) + len(new_ids)
+        if nb_rows > self._capacity:
+            self._reserve(max(nb_rows, 2 * self._capacity))
+        for topology_id in new_ids:
+            self._rows[topology_id] = len(self._ids)
+            self._ids.append(topology_id)
+            self._removed_ids.discard(topology_id)
+
+    def remove(self, topology_ids, mark_dirty=True):
+        """
+        Remove the rows of some ids. The rows are compacted, so the views on the columns previously returned by :meth:`column` become outdated.
+
+        :param iterable topology_ids: The ids to remove. The ids which are not in the table are ignored.
+        :param bool mark_dirty: If `True`, the ids will be removed from the MTG at the next synchronization.
+        """
+        ids_to_remove = set(topology_ids).intersection(self._rows)
+        if not ids_to_remove:
+            return
+        kept_rows = np.array([row for row, topology_id in enumerate(self._ids) if topology_id not in ids_to_remove], dtype=np.intp)
+        for arrays in (self._columns, self._written, self._dirty):
+            for name, array in arrays.items():
+                compacted_array = _new_array(self._capacity, array.dtype)
+                compacted_array[:len(kept_rows)] = array[kept_rows]
+                arrays[name] = compacted_array
+        self._ids = [self._ids[row] for row in kept_rows]
+        self._rows = {topology_id: row for row, topology_id in enumerate(self._ids)}
+        if mark_dirty:
+            self._removed_ids.update(ids_to_remove)
+
+    def _reserve(self, capacity):
+        """
+        Grow the columns up to `capacity` rows.
+
+        :param int capacity: The new number of rows allocated in each column.
+        """
+        for arrays in (self._columns, self._written, self._dirty):
+            for name, array in arrays.items():
+                new_array = _new_array(capacity, array.dtype)
+                new_array[:self._capacity] = array
+                arrays[name] = new_array
+        self._capacity = capacity
+
+    def _allocate(self, name, dtype):
+        """
+        Allocate the column of a variable, or convert it to `dtype`.
+
+        :param str name: The variable.
+        :param numpy.dtype dtype: The dtype of the column.
+        """
+        if name not in self.variables:
+            raise KeyError('{} is not a variable of the table {}'.format(name, self.topology_columns))
+        if name in self._columns:
+            column = self._columns[name]
+            if column.dtype == dtype:
+                return
+            new_column = _new_array(self._capacity, dtype)
+            new_column[self._written[name]] = column[self._written[name]]
+            self._columns[name] = new_column
+        else:
+            self._columns[name] = _new_array(self._capacity, dtype)
+            self._written[name] = _new_array(self._capacity, np.dtype(bool))
+            self._dirty[name] = _new_array(self._capacity, np.dtype(bool))
+
+    def has_column(self, name):
+        """
+        :param str name: A variable.
+
+        :return: `True` if at least one value of `name` was written in the table.
+        :rtype: bool
+        """
+        return name in self._columns
+
+    def column(self, name):
+        """
+        Get a view on the column of a variable. The view can be modified in place ; in that case, call :meth:`mark_dirty` so that
+        the modifications are pushed to the MTG.
+
+        :param str name: The variable.
+
+        :return: The values of `name` for all the rows, in the order of the rows. See :func:`_missing_value` for the missing values.
+        :rtype: numpy.ndarray
+        """
+        if name not in self._columns:
+            self._allocate(name, np.dtype(np.float64))
+        return self._columns[name][:len(self._ids)]
+
+    def written(self, name):
+        """
+        :param str name: The variable.
+
+        :return: For each row, whether a value of `name` was written.
+        :rtype: numpy.ndarray
+        """
+        if name not in self._columns:
+            return np.zeros(len(self._ids), dtype=bool)
+        return self._written[name][:len(self._ids)]
+
+    def set_column(self, name, values, rows=None, mark_dirty=True):
+        """
+        Write the values of a variable.
+
+        :param str name: The variable.
+        :param values: The values to write, one per row of `rows`.
+        :param numpy.ndarray rows: The rows to write. If `None`, write all the rows.
+        :param bool mark_dirty: If `True`, the written values will be pushed to the MTG at the next synchronization.
+        """
+        if rows is None:
+            rows = np.arange(len(self._ids))
+        values_list = values.tolist() if isinstance(values, np.ndarray) else list(values)
+        dtype = _column_dtype(values_list)
+        if name in self._columns:
+            current_dtype = self._columns[name].dtype
+            if current_dtype == object or dtype == object:
+                dtype = np.dtype(object)
+            elif current_dtype.kind == 'f' or dtype.kind == 'f':
+                dtype = np.dtype(np.float64)
+        self._allocate(name, dtype)
+        if dtype == object:
+            column = self._columns[name]
+            for row, value in zip(rows, values_list):
+                column[row] = value
+        else:
+            self._columns[name][rows] = values_list
+        self._written[name][rows] = True
+        if mark_dirty:
+            self._dirty[name][rows] = True
+
+    def mark_dirty(self, name, rows=None):
+        """
+        Mark some values of a variable as modified, e.g. after an in place modification of a view returned by :meth:`column`.
+
+        :param str name: The variable.
+        :param numpy.ndarray rows: The modified rows. If `None`, all the rows are marked.
+        """
+        if rows is None:
+            rows = slice(0, len(self._ids))
+        self.column(name)
+        self._written[name][rows] = True
+        self._dirty[name][rows] = True
+
+    def update(self, data_dict, mark_dirty=True):
+        """
+        Write the data of a model, given in the format of the inputs/outputs of the models.
+        The variables which are not in the schema of the table are ignored.
+
+        :param dict data_dict: The data to write : {topology id: {variable: value, ...}, ...}
+        :param bool mark_dirty: If `True`, the written values will be pushed to the MTG at the next synchronization.
+        """
+        if not data_dict:
+            return
+        self.add(data_dict.keys())
+        values_per_variable = {}
+        for topology_id, data in data_dict.items():
+            row = self._rows[topology_id]
+            for name, value in data.items():
+                if name in self.variables:
+                    values_per_variable.setdefault(name, ([], []))
+                    values_per_variable[name][0].append(row)
+                    values_per_variable[name][1].append(value)
+        for name, (rows, values) in values_per_variable.items():
+            self.set_column(name, values, np.array(rows, dtype=np.intp), mark_dirty)
+
+    def get(self, topology_id):
+        """
+        :param tuple topology_id: The id of a row.
+
+        :return: The values written in the row of `topology_id` : {variable: value, ...}
+        :rtype: dict
+        """
+        row = self._rows[topology_id]
+        return {name: column[row].item() if isinstance(column[row], np.generic) else column[row]
+                for name, column in self._columns.items() if self._written[name][row]}
+
+    def is_dirty(self):
+        """
+        :return: `True` if some values were modified or some rows were removed since the last synchronization.
+        :rtype: bool
+        """
+        return bool(self._removed_ids) or any(dirty[:len(self._ids)].any() for dirty in self._dirty.values())
+
+    def pop_dirty(self):
+        """
+        Get the values modified and the ids removed since the last synchronization, and reset the modification flags.
+
+        :return: the modified values {topology id: {variable: value, ...}, ...} and the removed ids.
+        :rtype: (dict, set)
+        """
+        dirty_data = {}
+        nb_rows = len(self._ids)
+        for name, dirty in self._dirty.items():
+            dirty_rows = np.flatnonzero(dirty[:nb_rows])
+            if dirty_rows.size == 0:
+                continue
+            for row, value in zip(dirty_rows.tolist(), self._columns[name][dirty_rows].tolist()):
+                dirty_data.setdefault(self._ids[row], {})[name] = value
+            dirty[dirty_rows] = False
+        removed_ids = self._removed_ids
+        self._removed_ids = set()
+        return dirty_data, removed_ids
+
+    def to_dataframe(self):
+        """
+        :return: The table in the format of the inputs/outputs dataframes, i.e. the topology columns followed by the variables, sorted by ids.
+        :rtype: pandas.DataFrame
+        """
+        ids_df = pd.DataFrame(self._ids, columns=self.topology_columns)
+        data_df = pd.DataFrame({name: self.column(name) for name in sorted(self._columns)})
+        df = pd.concat([ids_df, data_df], axis=1)
+        df.sort_values(by=self.topology_columns, inplace=True)
+        df.reset_index(drop=True, inplace=True)
+        return df
+
+
+class SharedStateStore(object):
+    """
+    The store of the state shared between all models, with one :class:`StateTable` per scale : axes, organs, hiddenzones, elements and soils.
+    """
+
+    def __init__(self, shared_mtg):
+        """
+        :param openalea.mtg.mtg.MTG shared_mtg: The MTG shared between all models.
+        """
+        self._shared_mtg = shared_mtg  #: the MTG shared between all models
+        self.tables = {table_name: StateTable(topology_columns, variables) for table_name, (topology_columns, variables) in TABLES_SCHEMAS.items()}  #: the tables of the store
+
+    @property
+    def axes(self):
+        return self.tables['axes']
+
+    @property
+    def organs(self):
+        return self.tables['organs']
+
+    @property
+    def hiddenzones(self):
+        return self.tables['hiddenzones']
+
+    @property
+    def elements(self):
+        return self.tables['elements']
+
+    @property
+    def soils(self):
+        return self.tables['soils']
+
+    def load_from_mtg(self):
+        """
+        Fill the tables with the values of the MTG. The loaded values are not marked as modified.
+        """
+        data_dicts = {table_name: {} for table_name in self.tables}
+        topology = get_topology_index(self._shared_mtg)
+
+        for mtg_axis_vid in topology.vertices(AXIS_SCALE):
+            axis_id = topology.topology_id(mtg_axis_vid)
+            mtg_axis_properties = self._shared_mtg.get_vertex_property(mtg_axis_vid)
+            data_dicts['axes'][axis_id] = {name: value for name, value in mtg_axis_properties.items() if name in self.axes.variables}
+            for organ_name in fspmwheat_facade.BOTANICAL_ORGANS_AT_AXIS_SCALE:
+                if organ_name in mtg_axis_properties:
+                    data_dicts['organs'][axis_id + (organ_name,)] = mtg_axis_properties[organ_name]
+            if 'soil' in mtg_axis_properties:
+                data_dicts['soils'][axis_id] = mtg_axis_properties['soil']
+
+        for mtg_metamer_vid in topology.vertices(METAMER_SCALE):
+            mtg_hiddenzone_properties = self._shared_mtg.get_vertex_property(mtg_metamer_vid).get('hiddenzone')
+            if mtg_hiddenzone_properties is not None:
+                data_dicts['hiddenzones'][topology.topology_id(mtg_metamer_vid)] = mtg_hiddenzone_properties
+
+        for mtg_element_vid in topology.vertices(ELEMENT_SCALE):
+            mtg_element_properties = self._shared_mtg.get_vertex_property(mtg_element_vid)
+            element_data = {name: value for name, value in mtg_element_properties.items() if name in self.elements.variables}
+            if element_data:
+                data_dicts['elements'][topology.topology_id(mtg_element_vid)] = element_data
+
+        for table_name, data_dict in data_dicts.items():
+            self.tables[table_name].update(data_dict, mark_dirty=False)
+
+    def update(self, table_name, data_dict, mark_dirty=True):
+        """
+        Write the data of a model in a table. See :meth:`StateTable.update`.
+
+        :param str table_name: The name of the table : 'axes', 'organs', 'hiddenzones', 'elements' or 'soils'.
+        :param dict data_dict: The data to write : {topology id: {variable: value, ...}, ...}
+        :param bool mark_dirty: If `True`, the written values will be pushed to the MTG at the next synchronization.
+        """
+        self.tables[table_name].update(data_dict, mark_dirty)
+
+    def is_synced(self):
+        """
+        :return: `True` if all the values of the store have been pushed to the MTG.
+        :rtype: bool
+        """
+        return not any(table.is_dirty() for table in self.tables.values())
+
+    def sync_mtg(self):
+        """
+        Push to the MTG the values modified in the store since the last synchronization.
+        The values of the ids which are not in the MTG are discarded.
+        The changes of the dimensions of the elements are recorded in the geometry manager of the MTG, if any (see :mod:`fspmwheat.geometry`).
+        """
+        if self.is_synced():
+            return
+        topology = get_topology_index(self._shared_mtg)
+        mtg_property_names = set(self._shared_mtg.property_names())
+
+        def mtg_property(name):
+            if name not in mtg_property_names:
+                self._shared_mtg.add_property(name)
+                mtg_property_names.add(name)
+            return self._shared_mtg.property(name)
+
+        for table_name, table in self.tables.items():
+            dirty_data, removed_ids = table.pop_dirty()
+            for topology_id, data in dirty_data.items():
+                if table_name in ('axes', 'elements'):
+                    mtg_vid = topology.vid(topology_id)
+                    if mtg_vid is None:
+                        continue
+                    for name, value in data.items():
+                        mtg_property(name)
+                        # the geometry is updated only if a dimension of the element changed
+                        geometry.set_geometrical_property(self._shared_mtg, name, mtg_vid, value)
+                else:
+                    if table_name == 'organs':
+                        mtg_vid, property_name = topology.vid(topology_id[:-1]), topology_id[-1]
+                    elif table_name == 'soils':
+                        mtg_vid, property_name = topology.vid(topology_id), 'soil'
+                    else:
+                        mtg_vid, property_name = topology.vid(topology_id), 'hiddenzone'
+                    if mtg_vid is None:
+                        continue
+                    mtg_property(property_name).setdefault(mtg_vid, {}).update(data)
+            if table_name == 'hiddenzones':
+                for topology_id in removed_ids:
+                    mtg_vid = topology.vid(topology_id)
+                    if mtg_vid is not None:
+                        mtg_property('hiddenzone').pop(mtg_vid, None)
+
+    def to_dataframes(self):
+        """
+        :return: The tables in the format of the inputs/outputs dataframes : axes, elements, hiddenzones, organs, soils.
+        :rtype: (pandas.DataFrame, pandas.DataFrame, pandas.DataFrame, pandas.DataFrame, pandas.DataFrame)
+        """
+        return tuple(self.tables[table_name].to_dataframe() for table_name in ('axes', 'elements', 'hiddenzones', 'organs', 'soils'))
+
+
+def attach_state_store(shared_mtg):
+    """
+    Create a store of the state shared between all models, fill it with the values of the MTG and attach it to the MTG.
+    Once the store is attached, the facades of Senesc-Wheat and Farquhar-Wheat write their outputs in it, the other facades mirror their outputs in it,
+    and its modifications are pushed to the MTG before the MTG is read. The facades of Senesc-Wheat and Farquhar-Wheat attach a store if none is attached.
+
+    :param openalea.mtg.mtg.MTG shared_mtg: The MTG shared between all models.
+
+    :return: The store attached to `shared_mtg`.
+    :rtype: SharedStateStore
+    """
+    state_store = SharedStateStore(shared_mtg)
+    state_store.load_from_mtg()
+    setattr(shared_mtg, STATE_STORE_ATTRIBUTE, state_store)
+    return state_store
+
+
+def get_state_store(shared_mtg):
+    """
+    :param openalea.mtg.mtg.MTG shared_mtg: The MTG shared between all models.
+
+    :return: The store attached to `shared_mtg`, or `None` if no store was attached.
+    :rtype: SharedStateStore
+    """
+    return getattr(shared_mtg, STATE_STORE_ATTRIBUTE, None)
+
+
+def sync_shared_mtg(shared_mtg):
+    """
+    Push to the MTG the modifications of the store attached to it, if any. Must be called before reading the MTG.
+
+    :param openalea.mtg.mtg.MTG shared_mtg: The MTG shared between all models.
+    """
+    state_store = get_state_store(shared_mtg)
+    if state_store is not None:
+        state_store.sync_mtg()
+
+
+def mirror_in_state_store(shared_mtg, data_dicts, removed_ids=None):
+    """
+    Mirror in the store attached to the MTG, if any, the values written in the MTG by a facade.
+    The mirrored values are not marked as modified, since the MTG is already up to date.
+
+    :param openalea.mtg.mtg.MTG shared_mtg: The MTG shared between all models.
+    :param dict data_dicts: The values written in the MTG : {table name: {topology id: {variable: value, ...}, ...}, ...}
+    :param dict removed_ids: The ids removed from the MTG : {table name: [topology id, ...], ...}
+    """
+    state_store = get_state_store(shared_mtg)
+    if state_store is None:
+        return
+    for table_name, data_dict in data_dicts.items():
+        state_store.update(table_name, data_dict, mark_dirty=False)
+    for table_name, topology_ids in (removed_ids or {}).items():
+        state_store.tables[table_name].remove(topology_ids, mark_dirty=False)
+
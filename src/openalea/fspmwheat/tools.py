@@ -4,17 +4,14 @@ import os
 
 import numpy as np
 import pandas as pd
-from scipy import stats
-import matplotlib.pyplot as plt
-
-from openalea.adel.mtg import to_plantgl
-from openalea.plantgl.all import Viewer, Vector3
 
 """
     fspmwheat.tools
     ~~~~~~~~~~~~~~~
 
     This module provides convenient tools needed by the facades.
+    The plotting and viewing dependencies (matplotlib, PlantGL viewer) are imported by the functions which need them,
+    so that importing the facades does not load them.
 
     :copyright: Copyright 2014-2015 INRA-ECOSYS, see AUTHORS.
     :license: see LICENSE for details.
@@ -79,6 +76,23 @@ def combine_dataframes_inplace(model_dataframe, shared_column_indexes, shared_da
     for column in new_shared_dataframe.columns:
         shared_dataframe_to_update[column] = new_shared_dataframe[column]
     shared_dataframe_to_update.reset_index(0, drop=True, inplace=True)
+
+
+def get_modified_data(data_dict):
+    """Get the data updated by a model at its last run.
+
+    The outputs of the models which store only the variables they update (e.g. :class:`wheatfspm.copy_on_write.CopyOnWriteOutputs`)
+    give these variables only, so the facades do not write again in the MTG the values which did not change.
+    Other data (e.g. the inputs of a model read from dataframes) are returned as is.
+
+    :param dict data_dict: The data of a model at one scale: {id: {variable_name: variable_value, ...}, ...}.
+
+    :return: The data updated by the model: {id: {variable_name: variable_value, ...}, ...}.
+    :rtype: dict
+    """
+    if hasattr(data_dict, 'get_modified_data'):
+        return data_dict.get_modified_data()
+    return data_dict
     
     
 def plot_linear_regression(x_array, y_array, x_label='x', y_label='y', plot_filepath=None):
@@ -107,6 +121,9 @@ def plot_linear_regression(x_array, y_array, x_label='x', y_label='y', plot_file
                                plot_filepath='compare.png')
 
     """
+    from scipy import stats
+    import matplotlib.pyplot as plt
+
     # Perform fit
     (aCoeff, bCoeff, rVal, _, _) = stats.linregress(x_array, y_array)
 
@@ -141,7 +158,9 @@ def plot_linear_regression(x_array, y_array, x_label='x', y_label='y', plot_file
         
 
 def color_MTG_Nitrogen(g, df, t, SCREENSHOT_DIRPATH):
-    
+    from openalea.adel.mtg import to_plantgl
+    from openalea.plantgl.all import Viewer, Vector3
+
     def color_map(N):
         if 0 <= N <= 0.5:  # TODO: organe senescent (prendre prop)
             vid_colors = [150, 100, 0]
@@ -0,0 +1,250 @@
+# -*- coding: latin-1 -*-
+
+"""
+    fspmwheat.topology
+    ~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`fspmwheat.topology` defines an index of the topology of the :class:`MTG <openalea.mtg.mtg.MTG>`
+    shared between all models.
+
+    The index maps the ids used by the models, i.e. (plant, axis, metamer, organ, element), to the vertices of the MTG
+    and conversely, and caches the components of each vertex and the vertices at each scale.
+    It is built once and then reused by all the facades until the topology of the MTG changes.
+    The facades which modify the topology of the MTG (i.e. :class:`ElongWheatFacade <fspmwheat.elongwheat_facade.ElongWheatFacade>`
+    when it adds metamers) must call :func:`invalidate_topology_index` after the modification.
+
+    The vertices archived with :func:`archive_vertices` (e.g. the dead organs, see :mod:`fspmwheat.archive`) remain in the MTG,
+    but the index skips them and their components in :meth:`TopologyIndex.components` and :meth:`TopologyIndex.vertices`,
+    so the traversals of the facades do not visit them anymore.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the scales of the MTG
+PLANT_SCALE = 1
+AXIS_SCALE = 2
+METAMER_SCALE = 3
+ORGAN_SCALE = 4
+ELEMENT_SCALE = 5
+
+#: the scales at which the vertices are identified by their index. At the other scales, the vertices are identified by their label.
+INDEXED_SCALES = {PLANT_SCALE, METAMER_SCALE}
+
+#: the name of the attribute used to attach the topology index to the MTG
+TOPOLOGY_INDEX_ATTRIBUTE = '_fspmwheat_topology_index'
+
+#: the name of the attribute used to attach the set of the archived vertices to the MTG
+ARCHIVED_VERTICES_ATTRIBUTE = '_fspmwheat_archived_vertices'
+
+
+class TopologyIndex(object):
+    """
+    An index of the topology of a :class:`MTG <openalea.mtg.mtg.MTG>`, from the plant scale to the element scale.
+
+    The ids of the vertices are the tuples used in the inputs/outputs of the models :
+        * plant: (plant index,)
+        * axis: (plant index, axis label)
+        * metamer: (plant index, axis label, metamer index)
+        * organ: (plant index, axis label, metamer index, organ label)
+        * element: (plant index, axis label, metamer index, organ label, element label)
+
+    The archived vertices and their components are not visited by :meth:`components` and :meth:`vertices`,
+    but their ids are still indexed (see :meth:`vid` and :meth:`topology_id`).
+
+    The index is a snapshot of the topology at the time it was built. Use :func:`get_topology_index` to get an up-to-date index.
+    """
+
+    def __init__(self, mtg):
+        """
+        :param openalea.mtg.mtg.MTG mtg: The MTG to index.
+        """
+        self._mtg = mtg  #: the indexed MTG
+        self._components = {}  #: the components of each vertex, in the order of the MTG
+        self._labels = {}  #: the label of each vertex
+        self._indexes = {}  #: the index of each vertex of the plant and metamer scales
+        self._vid_to_id = {}  #: the id of each vertex
+        self._id_to_vid = {}  #: the vertex of each id
+        self._vertices_at_scale = {scale: [] for scale in range(PLANT_SCALE, ELEMENT_SCALE + 1)}  #: the vertices at each scale, in the order of the MTG
+        self._archived_vertices = frozenset(get_archived_vertices(mtg))  #: the vertices skipped by the traversals, with their components
+        self._nb_vertices = mtg.nb_vertices()  #: the number of vertices of the MTG when the index was built
+        self._is_valid = True
+
+        self._index_components(mtg.root, (), PLANT_SCALE, False)
+
+    def _index_components(self, complex_vid, complex_id, scale, is_archived):
+        """
+        Index recursively the components of a vertex.
+
+        :param int complex_vid: The vertex whose components are indexed.
+        :param tuple complex_id: The id of the vertex `complex_vid`.
+        :param int scale: The scale of the components.
+        :param bool is_archived: `True` if `complex_vid` or one of its complexes is archived.
+        """
+        components = list(self._mtg.components_iter(complex_vid))
+        self._components[complex_vid] = [component_vid for component_vid in components if component_vid not in self._archived_vertices]
+        for component_vid in components:
+            component_label = self._mtg.label(component_vid)
+            self._labels[component_vid] = component_label
+            if scale in INDEXED_SCALES:
+                component_key = int(self._mtg.index(component_vid))
+                self._indexes[component_vid] = component_key
+            else:
+                component_key = component_label
+            component_id = complex_id + (component_key,)
+            self._vid_to_id[component_vid] = component_id
+            self._id_to_vid.setdefault(component_id, component_vid)
+            is_component_archived = is_archived or component_vid in self._archived_vertices
+            if not is_component_archived:
+                self._vertices_at_scale[scale].append(component_vid)
+            if scale < ELEMENT_SCALE:
+                self._index_components(component_vid, component_id, scale + 1, is_component_archived)
+
+    @property
+    def root(self):
+        """The root of the indexed MTG."""
+        return self._mtg.root
+
+    def is_valid(self):
+        """
+        Check whether the index still matches the topology of the MTG.
+
+        :return: `False` if the index was invalidated or if vertices were added to or removed from the MTG since the index was built.
+        :rtype: bool
+        """
+        return self._is_valid and self._mtg.nb_vertices() == self._nb_vertices
+
+    def invalidate(self):
+        """
+        Mark the index as outdated.
+        """
+        self._is_valid = False
+
+    def components(self, vid):
+        """
+        Get the components of a vertex.
+
+        :param int vid: The vertex.
+
+        :return: The components of `vid` which are not archived, in the order of the MTG. Empty if `vid` has no component or if `vid` is an element.
+        :rtype: list [int]
+        """
+        return self._components.get(vid, [])
+
+    def label(self, vid):
+        """
+        :param int vid: The vertex.
+
+        :return: The label of `vid`.
+        :rtype: str
+        """
+        return self._labels[vid]
+
+    def index(self, vid):
+        """
+        :param int vid: A vertex at plant or metamer scale.
+
+        :return: The index of `vid`.
+        :rtype: int
+        """
+        return self._indexes[vid]
+
+    def vertices(self, scale):
+        """
+        :param int scale: The scale.
+
+        :return: The vertices at scale `scale` which are not archived, in the order of the MTG.
+        :rtype: list [int]
+        """
+        return self._vertices_at_scale[scale]
+
+    def vid(self, topology_id, default=None):
+        """
+        Get the vertex corresponding to an id.
+
+        :param tuple topology_id: The id of the vertex, e.g. (plant index, axis label, metamer index).
+        :param default: The value to return if `topology_id` is not in the MTG.
+
+        :return: The vertex corresponding to `topology_id`, or `default`.
+        :rtype: int
+        """
+        return self._id_to_vid.get(topology_id, default)
+
+    def topology_id(self, vid):
+        """
+        Get the id of a vertex.
+
+        :param int vid: The vertex.
+
+        :return: The id of `vid`, e.g. (plant index, axis label, metamer index).
+        :rtype: tuple
+        """
+        return self._vid_to_id[vid]
+
+    def is_archived(self, vid):
+        """
+        :param int vid: The vertex.
+
+        :return: `True` if `vid` was archived with :func:`archive_vertices`. The traversals skip its components too.
+        :rtype: bool
+        """
+        return vid in self._archived_vertices
+
+    def __contains__(self, topology_id):
+        return topology_id in self._id_to_vid
+
+
+def get_topology_index(mtg):
+    """
+    Get the topology index of a MTG. The index is built if the MTG has not been indexed yet
+    or if its topology changed since the last build ; otherwise the cached index is returned.
+
+    :param openalea.mtg.mtg.MTG mtg: The MTG.
+
+    :return: The topology index of `mtg`.
+    :rtype: TopologyIndex
+    """
+    topology_index = getattr(mtg, TOPOLOGY_INDEX_ATTRIBUTE, None)
+    if topology_index is None or not topology_index.is_valid():
+        topology_index = TopologyIndex(mtg)
+        setattr(mtg, TOPOLOGY_INDEX_ATTRIBUTE, topology_index)
+    return topology_index
+
+
+def invalidate_topology_index(mtg):
+    """
+    Invalidate the topology index of a MTG. Must be called each time vertices are added to or removed from the MTG.
+    The index will be rebuilt at the next call to :func:`get_topology_index`.
+
+    :param openalea.mtg.mtg.MTG mtg: The MTG.
+    """
+    topology_index = getattr(mtg, TOPOLOGY_INDEX_ATTRIBUTE, None)
+    if topology_index is not None:
+        topology_index.invalidate()
+
+
+def archive_vertices(mtg, vids):
+    """
+    Archive some vertices of a MTG: the vertices remain in the MTG, but the topology index skips them and their components
+    in the traversals (see :class:`TopologyIndex`). The topology index is invalidated.
+
+    :param openalea.mtg.mtg.MTG mtg: The MTG.
+    :param iterable vids: The vertices to archive.
+    """
+    archived_vertices = getattr(mtg, ARCHIVED_VERTICES_ATTRIBUTE, None)
+    if archived_vertices is None:
+        archived_vertices = set()
+        setattr(mtg, ARCHIVED_VERTICES_ATTRIBUTE, archived_vertices)
+    archived_vertices.update(vids)
+    invalidate_topology_index(mtg)
+
+
+def get_archived_vertices(mtg):
+    """
+    :param openalea.mtg.mtg.MTG mtg: The MTG.
+
+    :return: The vertices of `mtg` archived with :func:`archive_vertices`.
+    :rtype: set
+    """
+    return getattr(mtg, ARCHIVED_VERTICES_ATTRIBUTE, set())
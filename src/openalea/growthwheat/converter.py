@@ -38,41 +38,29 @@ def from_dataframes(hiddenzone_inputs, element_inputs, root_inputs, axis_inputs)
 
     .. seealso:: see :attr:`simulation.Simulation.inputs` for the structure of Growth-Wheat inputs.
     """
-    all_hiddenzone_dict = {}
-    all_element_dict = {}
-    all_root_dict = {}
-    all_axes_dict = {}
-    hiddenzone_inputs_columns = hiddenzone_inputs.columns.difference(HIDDENZONE_TOPOLOGY_COLUMNS)
-    element_inputs_columns = element_inputs.columns.difference(ELEMENT_TOPOLOGY_COLUMNS)
-    root_inputs_columns = root_inputs.columns.difference(ROOT_TOPOLOGY_COLUMNS)
-    axis_inputs_columns = axis_inputs.columns.difference(AXIS_TOPOLOGY_COLUMNS)
-
-    for element_inputs_id, element_inputs_group in element_inputs.groupby(ELEMENT_TOPOLOGY_COLUMNS):
-        # element
-        element_inputs_series = element_inputs_group.loc[element_inputs_group.first_valid_index()]
-        element_inputs_dict = element_inputs_series[element_inputs_columns].to_dict()
-        all_element_dict[element_inputs_id] = element_inputs_dict
-
-    hiddenzone_inputs_grouped = hiddenzone_inputs.groupby(HIDDENZONE_TOPOLOGY_COLUMNS)
-    for hiddenzone_inputs_id, hiddenzone_inputs_group in hiddenzone_inputs_grouped:
-        # hiddenzone
-        hiddenzone_inputs_series = hiddenzone_inputs_group.loc[hiddenzone_inputs_group.first_valid_index()]
-        hiddenzone_inputs_dict = hiddenzone_inputs_series[hiddenzone_inputs_columns].to_dict()
-        all_hiddenzone_dict[hiddenzone_inputs_id] = hiddenzone_inputs_dict
-
-    for root_inputs_id, root_inputs_group in root_inputs.groupby(ROOT_TOPOLOGY_COLUMNS):
-        # root
-        root_inputs_series = root_inputs_group.loc[root_inputs_group.first_valid_index()]
-        root_inputs_dict = root_inputs_series[root_inputs_columns].to_dict()
-        all_root_dict[root_inputs_id] = root_inputs_dict
-
-    for axis_inputs_id, axis_inputs_group in axis_inputs.groupby(AXIS_TOPOLOGY_COLUMNS):
-        # axis
-        axis_inputs_series = axis_inputs_group.loc[axis_inputs_group.first_valid_index()]
-        axis_inputs_dict = axis_inputs_series[axis_inputs_columns].to_dict()
-        all_axes_dict[axis_inputs_id] = axis_inputs_dict
-
-    return {'hiddenzone': all_hiddenzone_dict, 'elements': all_element_dict, 'roots': all_root_dict, 'axes': all_axes_dict}
+    return {'hiddenzone': _dataframe_to_dict(hiddenzone_inputs, HIDDENZONE_TOPOLOGY_COLUMNS),
+            'elements': _dataframe_to_dict(element_inputs, ELEMENT_TOPOLOGY_COLUMNS),
+            'roots': _dataframe_to_dict(root_inputs, ROOT_TOPOLOGY_COLUMNS),
+            'axes': _dataframe_to_dict(axis_inputs, AXIS_TOPOLOGY_COLUMNS)}
+
+
+def _dataframe_to_dict(dataframe, topology_columns):
+    """
+    Convert a dataframe to a dictionary with the data of the first row of each topological element,
+    sorted by topological element, as done with :meth:`pandas.DataFrame.groupby` on `topology_columns`.
+
+    :param pandas.DataFrame dataframe: the dataframe to convert
+    :param list [str] topology_columns: the columns which define the topology in `dataframe`
+
+    :return: The data of the first row of each topological element, by id of topological element.
+    :rtype: dict [tuple, dict [str, object]]
+    """
+    data_columns = dataframe.columns.difference(topology_columns)
+    first_rows = dataframe.dropna(subset=topology_columns).drop_duplicates(subset=topology_columns).sort_values(topology_columns)
+    ids = zip(*[first_rows[column].to_numpy().tolist() for column in topology_columns])
+    data = [first_rows[column].to_numpy().tolist() for column in data_columns]
+    rows = zip(*data) if data else [()] * len(first_rows)
+    return {current_id: dict(zip(data_columns, row)) for current_id, row in zip(ids, rows)}
 
 
 def to_dataframes(data_dict):
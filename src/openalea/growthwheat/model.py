@@ -81,6 +81,26 @@ def calculate_delta_leaf_enclosed_mstruct_postE(delta_leaf_pseudo_age, leaf_pseu
     return max(0., delta_enclosed_mstruct)
 
 
+def calculate_delta_leaf_enclosed_mstruct_postE_vectorized(delta_leaf_pseudo_age, leaf_pseudo_age, leaf_pseudostem_L, enclosed_mstruct, LSSW):
+    """ Vectorized version of :func:`calculate_delta_leaf_enclosed_mstruct_postE`.
+
+    :param numpy.ndarray delta_leaf_pseudo_age: Delta of Pseudo age of the leaves since beginning of automate elongation (s)
+    :param numpy.ndarray leaf_pseudo_age: Pseudo age of the leaves since beginning of automate elongation (s)
+    :param numpy.ndarray leaf_pseudostem_L: Pseudostem lengths (m)
+    :param numpy.ndarray enclosed_mstruct: mstruct of the enclosed leaves (g)
+    :param numpy.ndarray LSSW: Lineic Structural Sheath Weights (g m-1).
+
+    :return: delta_leaf_enclosed_mstruct (g)
+    :rtype: numpy.ndarray
+    """
+    enclosed_mstruct_max = leaf_pseudostem_L * LSSW
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta_enclosed_mstruct = np.where(leaf_pseudo_age < parameters.te,
+                                          (enclosed_mstruct_max - enclosed_mstruct) / (parameters.te - leaf_pseudo_age) * delta_leaf_pseudo_age,
+                                          0.)
+    return np.where(delta_enclosed_mstruct > 0., delta_enclosed_mstruct, 0.)
+
+
 def calculate_delta_internode_enclosed_mstruct(internode_L, delta_internode_L, ratio_mstruct_DM):
     """ Relation between length and mstruct for the internode segment located in the hidden zone.
     Same relationship than for enclosed leaf corrected by RATIO_ENCLOSED_LEAF_INTERNODE.
@@ -126,6 +146,30 @@ def calculate_delta_internode_enclosed_mstruct_postL(delta_internode_pseudo_age,
     return max(0., delta_enclosed_mstruct)
 
 
+def calculate_delta_internode_enclosed_mstruct_postL_vectorized(delta_internode_pseudo_age, internode_pseudo_age, internode_L, internode_pseudostem_L, internode_Lmax, LSIW,
+                                                                enclosed_mstruct):
+    """ Vectorized version of :func:`calculate_delta_internode_enclosed_mstruct_postL`. A NaN or null `internode_Lmax` means that the final length of the internode is unknown.
+
+    :param numpy.ndarray delta_internode_pseudo_age: Delta of Pseudo age of the internodes since beginning of automate elongation (s)
+    :param numpy.ndarray internode_pseudo_age: Pseudo age of the internodes since beginning of automate elongation (s)
+    :param numpy.ndarray internode_L: Current lenghts of the internodes (m)
+    :param numpy.ndarray internode_pseudostem_L: Pseudostem lengths of the internodes (m)
+    :param numpy.ndarray internode_Lmax: Final lengths of the internodes (m)
+    :param numpy.ndarray LSIW: Lineic Structural Internode Weights (g m-1).
+    :param numpy.ndarray enclosed_mstruct: mstruct of the enclosed internodes (g)
+
+    :return: delta_internode_enclosed_mstruct (g)
+    :rtype: numpy.ndarray
+    """
+    no_internode_Lmax = np.isnan(internode_Lmax) | (internode_Lmax == 0)
+    enclosed_mstruct_max = np.where(no_internode_Lmax, internode_L, np.minimum(internode_pseudostem_L, internode_Lmax)) * LSIW
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta_enclosed_mstruct = np.where(internode_pseudo_age < parameters.te_IN,
+                                          (enclosed_mstruct_max - enclosed_mstruct) / (parameters.te_IN - internode_pseudo_age) * delta_internode_pseudo_age,
+                                          0.)
+    return np.where(delta_enclosed_mstruct > 0., delta_enclosed_mstruct, 0.)
+
+
 def calculate_delta_emerged_tissue_mstruct(SW, previous_mstruct, metric):
     """ delta mstruct of emerged tissue (lamina, sheath and internode). Calculated from tissue area.
 
@@ -141,6 +185,20 @@ def calculate_delta_emerged_tissue_mstruct(SW, previous_mstruct, metric):
     return max(0., delta_mstruct)
 
 
+def calculate_delta_emerged_tissue_mstruct_vectorized(SW, previous_mstruct, metric):
+    """ Vectorized version of :func:`calculate_delta_emerged_tissue_mstruct`.
+
+    :param numpy.ndarray SW: For Lamina : Structural Specific Weight (g m-2); For sheath and internode : Lineic Structural Weight (g m-1)
+    :param numpy.ndarray previous_mstruct: mstruct at the previous time step i.e. not yet updated (g)
+    :param numpy.ndarray metric: For Lamina : Area at the current time step (m2); For sheath and internode : Length at the current time step (m)
+
+    :return: delta mstruct (g)
+    :rtype: numpy.ndarray
+    """
+    delta_mstruct = SW * metric - previous_mstruct
+    return np.where(delta_mstruct > 0., delta_mstruct, 0.)
+
+
 def calculate_delta_Nstruct(delta_mstruct):
     """ delta Nstruct of hidden zone and emerged tissue (lamina and sheath).
 
@@ -165,6 +223,21 @@ def calculate_export(delta_mstruct, metabolite, hiddenzone_mstruct):
     return delta_mstruct * max(0., (metabolite / hiddenzone_mstruct))
 
 
+def calculate_export_vectorized(delta_mstruct, metabolite, hiddenzone_mstruct):
+    """Vectorized version of :func:`calculate_export`.
+
+    :param numpy.ndarray delta_mstruct: Delta of structural dry mass of the emerged parts of the leaves (g)
+    :param numpy.ndarray metabolite: Metabolite amounts in the hidden zones (mol C or N)
+    :param numpy.ndarray hiddenzone_mstruct: Structural masses of the hidden zones (g)
+
+    :return: metabolite export (mol N)
+    :rtype: numpy.ndarray
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        concentration = metabolite / hiddenzone_mstruct
+    return delta_mstruct * np.where(concentration > 0., concentration, 0.)
+
+
 def calculate_init_cytokinins_emerged_tissue(delta_mstruct):
     """Initial amount of cytokinins allocated in the mstruct of a newly emerged tissue.
 
@@ -2,12 +2,15 @@
 
 from __future__ import division  # use "//" to do integer division
 
-import copy
+import operator
+
+import numpy as np
 
 from openalea.growthwheat import model
 from openalea.growthwheat import parameters
 
 from openalea.respiwheat.model import RespirationModel
+from openalea.wheatfspm.copy_on_write import CopyOnWriteOutputs
 
 """
     growthwheat.simulation
@@ -44,6 +47,13 @@ ELEMENT_INPUTS_OUTPUTS = sorted(set(ELEMENT_INPUTS + ELEMENT_OUTPUTS))
 ROOT_INPUTS_OUTPUTS = sorted(set(ROOT_INPUTS + ROOT_OUTPUTS))
 AXIS_INPUTS_OUTPUTS = sorted(set(AXIS_INPUTS + AXIS_OUTPUTS))
 
+#: the inputs of the hidden zones and of the emerged elements gathered in arrays by the vectorized computation
+HIDDENZONE_VECTORIZED_INPUTS = ['leaf_is_growing', 'leaf_is_emerged', 'internode_is_visible', 'leaf_pseudo_age', 'delta_leaf_pseudo_age', 'internode_pseudo_age',
+                                'delta_internode_pseudo_age', 'leaf_L', 'delta_leaf_L', 'internode_L', 'delta_internode_L', 'leaf_pseudostem_length', 'internode_distance_to_emerge',
+                                'internode_Lmax', 'SSLW', 'LSSW', 'LSIW', 'sucrose', 'amino_acids', 'fructan', 'proteins', 'leaf_enclosed_mstruct', 'leaf_enclosed_Nstruct',
+                                'internode_enclosed_mstruct', 'internode_enclosed_Nstruct', 'mstruct']
+EMERGED_ELEMENT_VECTORIZED_INPUTS = ['mstruct', 'Nstruct', 'green_area', 'length', 'sucrose', 'amino_acids', 'proteins', 'cytokinins']
+
 
 class SimulationError(Exception):
     pass
@@ -53,6 +63,60 @@ class SimulationRunError(SimulationError):
     pass
 
 
+def _to_arrays(all_inputs, inputs_names):
+    """
+    Gather the inputs of several hidden zones or elements in one array per input. The inputs equal to None are set to NaN.
+    As in the scalar computation, which has no default value for the inputs, a missing input raises a KeyError.
+
+    :param list all_inputs: The inputs of the hidden zones or elements: [{input_name: input_value, ...}, ...].
+    :param list inputs_names: The names of the inputs to gather.
+
+    :return: The values of each input: {input_name: numpy.ndarray, ...}.
+    :rtype: dict
+    """
+    get_inputs_values = operator.itemgetter(*inputs_names)
+    inputs_values = np.array([get_inputs_values(inputs) for inputs in all_inputs], dtype=float)
+    inputs_values = inputs_values.reshape(len(all_inputs), len(inputs_names)).T
+    return dict(zip(inputs_names, inputs_values))
+
+
+def _to_flags(values):
+    """
+    Convert an array of boolean inputs gathered by :func:`_to_arrays` to a mask. NaN values, i.e. None inputs, are False.
+
+    :param numpy.ndarray values: the values of the inputs
+
+    :return: the mask
+    :rtype: numpy.ndarray
+    """
+    return (values != 0) & ~np.isnan(values)
+
+
+def _set_outputs(all_outputs, ids, outputs_arrays, inputs_arrays):
+    """
+    Set the outputs of several hidden zones or elements computed as arrays. Only the values which differ from the inputs are set, so that
+    the records of the hidden zones or elements which do not change are not even created.
+
+    :param CopyOnWriteOutputs all_outputs: The outputs of the hidden zones or elements.
+    :param list ids: The ids of the hidden zones or elements.
+    :param dict outputs_arrays: The outputs of the hidden zones or elements: {output_name: numpy.ndarray, ...}.
+    :param dict inputs_arrays: The inputs of the hidden zones or elements, as gathered by :func:`_to_arrays`: {input_name: numpy.ndarray, ...}.
+    """
+    rows_outputs = {}  # {row: [(output_name, output_value), ...], ...}
+    for output_name, output_values in outputs_arrays.items():
+        output_values_list = output_values.tolist()
+        if output_name in inputs_arrays:
+            rows = np.flatnonzero(output_values != inputs_arrays[output_name]).tolist()
+        else:
+            rows = range(len(ids))
+        for row in rows:
+            rows_outputs.setdefault(row, []).append((output_name, output_values_list[row]))
+    for row, row_outputs in rows_outputs.items():
+        record = all_outputs[ids[row]]
+        for output_name, output_value in row_outputs:
+            record[output_name] = output_value
+
+
 class Simulation(object):
     """The Simulation class permits to initialize and run a simulation.
     """
@@ -77,6 +141,7 @@ class Simulation(object):
         #:      'roots': {(plant_index, axis_label): {root_input_name: root_input_value, ...}, ...}}
         #: See :TODO?
         #: for more information about the inputs.
+        #: The outputs of each type are a :class:`CopyOnWriteOutputs` initialized from the inputs of the same type.
         self.outputs = {}
 
         #: the delta t of the simulation (in seconds)
@@ -95,31 +160,32 @@ class Simulation(object):
         self.inputs.clear()
         self.inputs.update(inputs)
 
-    def run(self, postflowering_stages=False):
+    def run(self, postflowering_stages=False, vectorized=False):
         """
         Run the simulation.
 
         :param bool postflowering_stages: if True the model will calculate root growth with the parameters calibrated for post flowering stages
+        :param bool vectorized: If True, the growth of all the hidden zones and emerged elements is computed at once from arrays of inputs.
+                                Otherwise the hidden zones are computed one after the other. Both give the same outputs.
         """
-        # Copy the inputs into the output dict
-        self.outputs.update({inputs_type: copy.deepcopy(all_inputs) for inputs_type, all_inputs in self.inputs.items() if inputs_type in {'hiddenzone', 'elements', 'roots', 'axes'}})
+        # Initialize the outputs from the inputs. The inputs are not copied: only the updated variables are stored in the outputs
+        self.outputs.update({inputs_type: CopyOnWriteOutputs(all_inputs) for inputs_type, all_inputs in self.inputs.items() if inputs_type in {'hiddenzone', 'elements', 'roots', 'axes'}})
+
+        if vectorized:
+            self._run_hiddenzones_vectorized()
+        else:
+            self._run_hiddenzones()
+        self._run_roots(postflowering_stages)
 
-        # Hidden growing zones
+    def _run_hiddenzones(self):
+        """
+        Compute the growth of the hidden zones and of the emerged elements, one hidden zone after the other.
+        """
         all_hiddenzone_inputs = self.inputs['hiddenzone']
         all_hiddenzone_outputs = self.outputs['hiddenzone']
-
-        # elements
         all_elements_inputs = self.inputs['elements']
         all_elements_outputs = self.outputs['elements']
 
-        # roots
-        all_roots_inputs = self.inputs['roots']
-        all_roots_outputs = self.outputs['roots']
-
-        # axes
-        all_axes_inputs = self.inputs['axes']
-        all_axes_outputs = self.outputs['axes']
-
         # ----------------------------------------------
         # ----------- Hiddenzones and elements ---------
         # ----------------------------------------------
@@ -285,83 +351,254 @@ class Simulation(object):
 
                 # -- Remobilisation at the end of leaf elongation
                 if hiddenzone_inputs['leaf_is_remobilizing']:
-                    share_leaf = curr_hiddenzone_outputs['leaf_enclosed_mstruct'] / curr_hiddenzone_outputs['mstruct']
-
-                    # Case when the hiddenzone contains a hidden part of lamina
-                    if hiddenzone_inputs['leaf_pseudostem_length'] > hiddenzone_inputs['sheath_Lmax']:
-                        hidden_sheath_mstruct = model.calculate_sheath_mstruct(hiddenzone_inputs['sheath_Lmax'], hiddenzone_inputs['LSSW'])
-                        share_hidden_sheath = hidden_sheath_mstruct / curr_hiddenzone_outputs['leaf_enclosed_mstruct']
-                    else:
-                        share_hidden_sheath = 1
-
-                    # Add to hidden part of the sheath
-                    hidden_sheath_id = hiddenzone_id + tuple(['sheath', 'HiddenElement'])
-                    if hidden_sheath_id not in self.outputs['elements'].keys():
-                        new_sheath_outputs = parameters.OrganInit().__dict__
-                        self.outputs['elements'][hidden_sheath_id] = new_sheath_outputs
-                    curr_hidden_sheath_outputs = self.outputs['elements'][hidden_sheath_id]
-                    curr_hidden_sheath_outputs['mstruct'] = curr_hiddenzone_outputs['leaf_enclosed_mstruct'] * share_hidden_sheath
-                    curr_hidden_sheath_outputs['max_mstruct'] = curr_hiddenzone_outputs['leaf_enclosed_mstruct'] * share_hidden_sheath
-                    curr_hidden_sheath_outputs['Nstruct'] = curr_hiddenzone_outputs['leaf_enclosed_Nstruct'] * share_hidden_sheath
-                    curr_hidden_sheath_outputs['sucrose'] = curr_hiddenzone_outputs['sucrose'] * share_leaf * share_hidden_sheath
-                    curr_hidden_sheath_outputs['amino_acids'] = curr_hiddenzone_outputs['amino_acids'] * share_leaf * share_hidden_sheath
-                    curr_hidden_sheath_outputs['fructan'] = curr_hiddenzone_outputs['fructan'] * share_leaf * share_hidden_sheath
-                    curr_hidden_sheath_outputs['proteins'] = curr_hiddenzone_outputs['proteins'] * share_leaf * share_hidden_sheath
-                    self.outputs['elements'][hidden_sheath_id] = curr_hidden_sheath_outputs
-
-                    # Add to hidden part of the lamina, if any
-                    if share_hidden_sheath < 1:
-                        hidden_lamina_id = hiddenzone_id + tuple(['blade', 'HiddenElement'])
-                        curr_hidden_lamina_outputs = self.outputs['elements'][hidden_lamina_id]
-                        curr_hidden_lamina_outputs['mstruct'] = curr_hiddenzone_outputs['leaf_enclosed_mstruct'] * (1 - share_hidden_sheath)
-                        curr_hidden_lamina_outputs['max_mstruct'] = curr_hiddenzone_outputs['leaf_enclosed_mstruct'] * (1 - share_hidden_sheath)
-                        curr_hidden_lamina_outputs['Nstruct'] = curr_hiddenzone_outputs['leaf_enclosed_Nstruct'] * (1 - share_hidden_sheath)
-                        curr_hidden_lamina_outputs['sucrose'] = curr_hiddenzone_outputs['sucrose'] * share_leaf * (1 - share_hidden_sheath)
-                        curr_hidden_lamina_outputs['amino_acids'] = curr_hiddenzone_outputs['amino_acids'] * share_leaf * (1 - share_hidden_sheath)
-                        curr_hidden_lamina_outputs['fructan'] = curr_hiddenzone_outputs['fructan'] * share_leaf * (1 - share_hidden_sheath)
-                        curr_hidden_lamina_outputs['proteins'] = curr_hiddenzone_outputs['proteins'] * share_leaf * (1 - share_hidden_sheath)
-                        self.outputs['elements'][hidden_lamina_id] = curr_hidden_lamina_outputs
-
-                    # Remove in hiddenzone
-                    curr_hiddenzone_outputs = self.outputs['hiddenzone'][hiddenzone_id]
-                    curr_hiddenzone_outputs['leaf_enclosed_mstruct'] = 0
-                    curr_hiddenzone_outputs['leaf_enclosed_Nstruct'] = 0
-                    curr_hiddenzone_outputs['mstruct'] = curr_hiddenzone_outputs['internode_enclosed_mstruct']
-                    curr_hiddenzone_outputs['Nstruct'] = curr_hiddenzone_outputs['internode_enclosed_Nstruct']
-                    curr_hiddenzone_outputs['sucrose'] -= curr_hiddenzone_outputs['sucrose'] * share_leaf
-                    curr_hiddenzone_outputs['amino_acids'] -= curr_hiddenzone_outputs['amino_acids'] * share_leaf
-                    curr_hiddenzone_outputs['fructan'] -= curr_hiddenzone_outputs['fructan'] * share_leaf
-                    curr_hiddenzone_outputs['proteins'] -= curr_hiddenzone_outputs['proteins'] * share_leaf
-                    self.outputs['hiddenzone'][hiddenzone_id] = curr_hiddenzone_outputs
-
-                    # Turn remobilizing flag to False
-                    self.outputs['hiddenzone'][hiddenzone_id]['leaf_is_remobilizing'] = False
+                    self._remobilize_leaf(hiddenzone_id, hiddenzone_inputs)
 
                 # -- Remobilisation at the end of internode elongation
                 # Internodes stop to elongate after leaves. We cannot test delta_internode_L > 0 for the cases of short internodes which are mature before GA production.
                 if hiddenzone_inputs['internode_is_remobilizing']:
+                    self._remobilize_internode(hiddenzone_id)
+
+    def _run_hiddenzones_vectorized(self):
+        """
+        Compute the growth of the hidden zones and of the emerged elements of the main stem at once, from one array per variable.
+        The branches of the model (leaf vs internode, emerged vs hidden, mature vs growing) are selected with masks. The remobilisations, which
+        only occur once per hidden zone, are computed as in :meth:`_run_hiddenzones`.
+        """
+        all_hiddenzone_inputs = self.inputs['hiddenzone']
+        all_hiddenzone_outputs = self.outputs['hiddenzone']
+        all_elements_inputs = self.inputs['elements']
+
+        hiddenzones_ids = [hiddenzone_id for hiddenzone_id in sorted(all_hiddenzone_inputs) if hiddenzone_id[1] == 'MS']  # TODO: tillers are not computed
+        if not hiddenzones_ids:
+            return
+        hiddenzones_inputs = [all_hiddenzone_inputs[hiddenzone_id] for hiddenzone_id in hiddenzones_ids]
+        hz = _to_arrays(hiddenzones_inputs, HIDDENZONE_VECTORIZED_INPUTS)
+
+        # -- Delta Growth internode
+        ratio_mstruct_DM = model.calculate_ratio_mstruct_DM(hz['mstruct'], hz['sucrose'], hz['fructan'], hz['amino_acids'], hz['proteins'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta_internode_enclosed_mstruct = np.where(hz['internode_pseudo_age'] < parameters.internode_rapid_growth_t,  #: Internode is not yet in rapide growth stage
+                                                        model.calculate_delta_internode_enclosed_mstruct(hz['internode_L'], hz['delta_internode_L'], ratio_mstruct_DM),
+                                                        model.calculate_delta_internode_enclosed_mstruct_postL_vectorized(hz['delta_internode_pseudo_age'],
+                                                                                                                          hz['internode_pseudo_age'],
+                                                                                                                          hz['internode_L'],
+                                                                                                                          hz['internode_distance_to_emerge'],
+                                                                                                                          hz['internode_Lmax'],
+                                                                                                                          hz['LSIW'],
+                                                                                                                          hz['internode_enclosed_mstruct']))
+        delta_internode_enclosed_Nstruct = model.calculate_delta_Nstruct(delta_internode_enclosed_mstruct)
+
+        #: Internode is visible
+        visible_internodes = np.flatnonzero(_to_flags(hz['internode_is_visible']))
+        delta_internode_mstruct, internode_exports = self._grow_emerged_elements(hiddenzones_ids, hz, visible_internodes, ('internode', 'StemElement'), 'LSIW', 'length',
+                                                                                 add_cytokinins=False)
+
+        # -- Delta Growth leaf
+        leaf_is_hidden = ~_to_flags(hz['leaf_is_emerged'])
+        leaf_is_emerged_and_growing = ~leaf_is_hidden & _to_flags(hz['leaf_is_growing'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta_leaf_enclosed_mstruct = np.where(leaf_is_hidden,
+                                                   model.calculate_delta_leaf_enclosed_mstruct(hz['leaf_L'], hz['delta_leaf_L'], ratio_mstruct_DM),
+                                                   np.where(leaf_is_emerged_and_growing,
+                                                            model.calculate_delta_leaf_enclosed_mstruct_postE_vectorized(hz['delta_leaf_pseudo_age'],
+                                                                                                                         hz['leaf_pseudo_age'],
+                                                                                                                         hz['leaf_pseudostem_length'],
+                                                                                                                         hz['leaf_enclosed_mstruct'],
+                                                                                                                         hz['LSSW']),
+                                                            0.))
+        delta_leaf_enclosed_Nstruct = model.calculate_delta_Nstruct(delta_leaf_enclosed_mstruct)
+
+        #: Leaf has emerged and is growing : either the lamina is growing, or the lamina is mature and the sheath is growing
+        emerged_leaves = np.flatnonzero(leaf_is_emerged_and_growing)
+        lamina_is_growing = np.array([bool(all_elements_inputs[hiddenzones_ids[i] + ('blade', 'LeafElement1')]['is_growing']) for i in emerged_leaves], dtype=bool)
+        delta_lamina_mstruct, lamina_exports = self._grow_emerged_elements(hiddenzones_ids, hz, emerged_leaves[lamina_is_growing], ('blade', 'LeafElement1'), 'SSLW', 'green_area')
+        delta_sheath_mstruct, sheath_exports = self._grow_emerged_elements(hiddenzones_ids, hz, emerged_leaves[~lamina_is_growing], ('sheath', 'StemElement'), 'LSSW', 'length')
+        leaf_exports = {metabolite: lamina_exports[metabolite] + sheath_exports[metabolite] for metabolite in lamina_exports}  #: the lamina and the sheath do not grow at the same time
+
+        # -- CN consumption due to mstruct/Nstruct growth of the enclosed leaf and of the internode
+        AA_consumption_mstruct = model.calculate_s_Nstruct_amino_acids((delta_leaf_enclosed_Nstruct + delta_internode_enclosed_Nstruct),
+                                                                       model.calculate_delta_Nstruct(delta_lamina_mstruct),
+                                                                       model.calculate_delta_Nstruct(delta_sheath_mstruct),
+                                                                       model.calculate_delta_Nstruct(delta_internode_mstruct))  #: Consumption of amino acids due to mstruct growth (mol N)
+        sucrose_consumption_mstruct = model.calculate_s_mstruct_sucrose((delta_leaf_enclosed_mstruct + delta_internode_enclosed_mstruct),
+                                                                        delta_lamina_mstruct,
+                                                                        delta_sheath_mstruct,
+                                                                        AA_consumption_mstruct)  #: Consumption of sucrose due to mstruct growth (mol C)
+        Respi_growth = RespirationModel.R_growth(sucrose_consumption_mstruct)  #: Respiration growth (mol C)
+
+        # -- Update of hiddenzone outputs
+        leaf_enclosed_mstruct = hz['leaf_enclosed_mstruct'] + delta_leaf_enclosed_mstruct
+        leaf_enclosed_Nstruct = hz['leaf_enclosed_Nstruct'] + delta_leaf_enclosed_Nstruct
+        internode_enclosed_mstruct = hz['internode_enclosed_mstruct'] + delta_internode_enclosed_mstruct
+        internode_enclosed_Nstruct = hz['internode_enclosed_Nstruct'] + delta_internode_enclosed_Nstruct
+        hiddenzones_outputs = {'AA_consumption_mstruct': AA_consumption_mstruct,
+                              'sucrose_consumption_mstruct': sucrose_consumption_mstruct,
+                              'Respi_growth': Respi_growth,
+                              'leaf_enclosed_mstruct': leaf_enclosed_mstruct,
+                              'leaf_enclosed_Nstruct': leaf_enclosed_Nstruct,
+                              'internode_enclosed_mstruct': internode_enclosed_mstruct,
+                              'internode_enclosed_Nstruct': internode_enclosed_Nstruct,
+                              'mstruct': leaf_enclosed_mstruct + internode_enclosed_mstruct,
+                              'Nstruct': leaf_enclosed_Nstruct + internode_enclosed_Nstruct,
+                              'sucrose': hz['sucrose'] - (sucrose_consumption_mstruct + Respi_growth + leaf_exports['sucrose'] + internode_exports['sucrose']),
+                              'fructan': hz['fructan'] - (leaf_exports['fructan'] + internode_exports['fructan']),
+                              'amino_acids': hz['amino_acids'] - (AA_consumption_mstruct + leaf_exports['amino_acids'] + internode_exports['amino_acids']),
+                              'proteins': hz['proteins'] - (leaf_exports['proteins'] + internode_exports['proteins'])}
+        _set_outputs(all_hiddenzone_outputs, hiddenzones_ids, hiddenzones_outputs, hz)
+
+        # -- Remobilisation at the end of leaf and internode elongation
+        for hiddenzone_id, hiddenzone_inputs in zip(hiddenzones_ids, hiddenzones_inputs):
+            if hiddenzone_inputs['leaf_is_remobilizing']:
+                self._remobilize_leaf(hiddenzone_id, hiddenzone_inputs)
+            if hiddenzone_inputs['internode_is_remobilizing']:
+                self._remobilize_internode(hiddenzone_id)
+
+    def _grow_emerged_elements(self, hiddenzones_ids, hz, indexes, element_suffix, SW_name, metric_name, add_cytokinins=True):
+        """
+        Compute the growth of emerged elements of the same kind (e.g. the growing laminae), from the arrays of the inputs of their hidden zones,
+        update their outputs, and return the exports from the hidden zones.
+
+        :param list hiddenzones_ids: the ids of the hidden zones
+        :param dict hz: the inputs of the hidden zones: {input_name: numpy.ndarray, ...}
+        :param numpy.ndarray indexes: the indexes of the hidden zones whose element is growing
+        :param tuple element_suffix: (organ label, element label) of the elements
+        :param str SW_name: the name of the input of the hidden zones giving the structural weight of the element (specific for a lamina, lineic otherwise)
+        :param str metric_name: the name of the input of the elements giving their area (for a lamina) or their length (otherwise)
+        :param bool add_cytokinins: if True, cytokinins are allocated in the newly emerged mstruct
+
+        :return: the delta mstruct of the elements (g), and the exports of metabolites from the hidden zones: {metabolite: numpy.ndarray, ...}, with a value per hidden zone
+        :rtype: (numpy.ndarray, dict)
+        """
+        delta_mstruct = np.zeros(len(hiddenzones_ids))
+        exports = {metabolite: np.zeros(len(hiddenzones_ids)) for metabolite in ('sucrose', 'amino_acids', 'fructan', 'proteins')}
+        if not len(indexes):
+            return delta_mstruct, exports
+
+        elements_ids = [hiddenzones_ids[i] + element_suffix for i in indexes]
+        elements_inputs = _to_arrays([self.inputs['elements'][element_id] for element_id in elements_ids], EMERGED_ELEMENT_VECTORIZED_INPUTS)
+        hiddenzones_mstruct = hz['mstruct'][indexes]
+
+        # Delta mstruct and Nstruct of the emerged element
+        elements_delta_mstruct = model.calculate_delta_emerged_tissue_mstruct_vectorized(hz[SW_name][indexes], elements_inputs['mstruct'], elements_inputs[metric_name])
+        delta_mstruct[indexes] = elements_delta_mstruct
+        # Export of metabolites from hiddenzone towards the emerged element
+        for metabolite, metabolite_exports in exports.items():
+            metabolite_exports[indexes] = model.calculate_export_vectorized(elements_delta_mstruct, hz[metabolite][indexes], hiddenzones_mstruct)
+
+        # Update of the outputs of the elements
+        elements_mstruct = elements_inputs['mstruct'] + elements_delta_mstruct
+        elements_outputs = {'mstruct': elements_mstruct,
+                            'max_mstruct': elements_mstruct,
+                            'Nstruct': elements_inputs['Nstruct'] + model.calculate_delta_Nstruct(elements_delta_mstruct),
+                            'sucrose': elements_inputs['sucrose'] + (exports['sucrose'][indexes] + exports['fructan'][indexes]),
+                            'amino_acids': elements_inputs['amino_acids'] + exports['amino_acids'][indexes],
+                            'proteins': elements_inputs['proteins'] + exports['proteins'][indexes]}
+        if add_cytokinins:
+            elements_outputs['cytokinins'] = elements_inputs['cytokinins'] + model.calculate_init_cytokinins_emerged_tissue(elements_delta_mstruct)
+        _set_outputs(self.outputs['elements'], elements_ids, elements_outputs, elements_inputs)
+
+        return delta_mstruct, exports
+
+    def _remobilize_leaf(self, hiddenzone_id, hiddenzone_inputs):
+        """
+        Remobilisation from the hidden zone to the hidden parts of the sheath and of the lamina, at the end of leaf elongation.
 
-                    # Add to hidden part of the internode
-                    hidden_internode_id = hiddenzone_id + tuple(['internode', 'HiddenElement'])
-                    if hidden_internode_id not in self.outputs['elements'].keys():
-                        new_internode_outputs = parameters.OrganInit().__dict__
-                        self.outputs['elements'][hidden_internode_id] = new_internode_outputs
-                    curr_hidden_internode_outputs = self.outputs['elements'][hidden_internode_id]
-                    curr_hidden_internode_outputs['mstruct'] += curr_hiddenzone_outputs['internode_enclosed_mstruct']
-                    curr_hidden_internode_outputs['max_mstruct'] = curr_hidden_internode_outputs['mstruct']
-                    curr_hidden_internode_outputs['Nstruct'] += curr_hiddenzone_outputs['internode_enclosed_Nstruct']
-                    curr_hidden_internode_outputs['sucrose'] += curr_hiddenzone_outputs['sucrose']
-                    curr_hidden_internode_outputs['amino_acids'] += curr_hiddenzone_outputs['amino_acids']
-                    curr_hidden_internode_outputs['fructan'] += curr_hiddenzone_outputs['fructan']
-                    curr_hidden_internode_outputs['proteins'] += curr_hiddenzone_outputs['proteins']
-                    curr_hidden_internode_outputs['is_growing'] = False
-                    self.outputs['elements'][hidden_internode_id] = curr_hidden_internode_outputs
-
-                    # Turn remobilizing flag to False
-                    self.outputs['hiddenzone'][hiddenzone_id]['internode_is_remobilizing'] = False
-
-                    #: Turn the flag to true after remobilisation in order to Delete Hiddenzone in both MTG and shared_outputs
-                    self.outputs['hiddenzone'][hiddenzone_id]['is_over'] = True
+        :param tuple hiddenzone_id: the id of the hidden zone
+        :param dict hiddenzone_inputs: the inputs of the hidden zone
+        """
+        curr_hiddenzone_outputs = self.outputs['hiddenzone'][hiddenzone_id]
+        share_leaf = curr_hiddenzone_outputs['leaf_enclosed_mstruct'] / curr_hiddenzone_outputs['mstruct']
+
+        # Case when the hiddenzone contains a hidden part of lamina
+        if hiddenzone_inputs['leaf_pseudostem_length'] > hiddenzone_inputs['sheath_Lmax']:
+            hidden_sheath_mstruct = model.calculate_sheath_mstruct(hiddenzone_inputs['sheath_Lmax'], hiddenzone_inputs['LSSW'])
+            share_hidden_sheath = hidden_sheath_mstruct / curr_hiddenzone_outputs['leaf_enclosed_mstruct']
+        else:
+            share_hidden_sheath = 1
+
+        # Add to hidden part of the sheath
+        hidden_sheath_id = hiddenzone_id + tuple(['sheath', 'HiddenElement'])
+        if hidden_sheath_id not in self.outputs['elements'].keys():
+            new_sheath_outputs = parameters.OrganInit().__dict__
+            self.outputs['elements'][hidden_sheath_id] = new_sheath_outputs
+        curr_hidden_sheath_outputs = self.outputs['elements'][hidden_sheath_id]
+        curr_hidden_sheath_outputs['mstruct'] = curr_hiddenzone_outputs['leaf_enclosed_mstruct'] * share_hidden_sheath
+        curr_hidden_sheath_outputs['max_mstruct'] = curr_hiddenzone_outputs['leaf_enclosed_mstruct'] * share_hidden_sheath
+        curr_hidden_sheath_outputs['Nstruct'] = curr_hiddenzone_outputs['leaf_enclosed_Nstruct'] * share_hidden_sheath
+        curr_hidden_sheath_outputs['sucrose'] = curr_hiddenzone_outputs['sucrose'] * share_leaf * share_hidden_sheath
+        curr_hidden_sheath_outputs['amino_acids'] = curr_hiddenzone_outputs['amino_acids'] * share_leaf * share_hidden_sheath
+        curr_hidden_sheath_outputs['fructan'] = curr_hiddenzone_outputs['fructan'] * share_leaf * share_hidden_sheath
+        curr_hidden_sheath_outputs['proteins'] = curr_hiddenzone_outputs['proteins'] * share_leaf * share_hidden_sheath
+        self.outputs['elements'][hidden_sheath_id] = curr_hidden_sheath_outputs
+
+        # Add to hidden part of the lamina, if any
+        if share_hidden_sheath < 1:
+            hidden_lamina_id = hiddenzone_id + tuple(['blade', 'HiddenElement'])
+            curr_hidden_lamina_outputs = self.outputs['elements'][hidden_lamina_id]
+            curr_hidden_lamina_outputs['mstruct'] = curr_hiddenzone_outputs['leaf_enclosed_mstruct'] * (1 - share_hidden_sheath)
+            curr_hidden_lamina_outputs['max_mstruct'] = curr_hiddenzone_outputs['leaf_enclosed_mstruct'] * (1 - share_hidden_sheath)
+            curr_hidden_lamina_outputs['Nstruct'] = curr_hiddenzone_outputs['leaf_enclosed_Nstruct'] * (1 - share_hidden_sheath)
+            curr_hidden_lamina_outputs['sucrose'] = curr_hiddenzone_outputs['sucrose'] * share_leaf * (1 - share_hidden_sheath)
+            curr_hidden_lamina_outputs['amino_acids'] = curr_hiddenzone_outputs['amino_acids'] * share_leaf * (1 - share_hidden_sheath)
+            curr_hidden_lamina_outputs['fructan'] = curr_hiddenzone_outputs['fructan'] * share_leaf * (1 - share_hidden_sheath)
+            curr_hidden_lamina_outputs['proteins'] = curr_hiddenzone_outputs['proteins'] * share_leaf * (1 - share_hidden_sheath)
+            self.outputs['elements'][hidden_lamina_id] = curr_hidden_lamina_outputs
+
+        # Remove in hiddenzone
+        curr_hiddenzone_outputs = self.outputs['hiddenzone'][hiddenzone_id]
+        curr_hiddenzone_outputs['leaf_enclosed_mstruct'] = 0
+        curr_hiddenzone_outputs['leaf_enclosed_Nstruct'] = 0
+        curr_hiddenzone_outputs['mstruct'] = curr_hiddenzone_outputs['internode_enclosed_mstruct']
+        curr_hiddenzone_outputs['Nstruct'] = curr_hiddenzone_outputs['internode_enclosed_Nstruct']
+        curr_hiddenzone_outputs['sucrose'] -= curr_hiddenzone_outputs['sucrose'] * share_leaf
+        curr_hiddenzone_outputs['amino_acids'] -= curr_hiddenzone_outputs['amino_acids'] * share_leaf
+        curr_hiddenzone_outputs['fructan'] -= curr_hiddenzone_outputs['fructan'] * share_leaf
+        curr_hiddenzone_outputs['proteins'] -= curr_hiddenzone_outputs['proteins'] * share_leaf
+        self.outputs['hiddenzone'][hiddenzone_id] = curr_hiddenzone_outputs
+
+        # Turn remobilizing flag to False
+        self.outputs['hiddenzone'][hiddenzone_id]['leaf_is_remobilizing'] = False
+
+    def _remobilize_internode(self, hiddenzone_id):
+        """
+        Remobilisation from the hidden zone to the hidden part of the internode, at the end of internode elongation.
+
+        :param tuple hiddenzone_id: the id of the hidden zone
+        """
+        curr_hiddenzone_outputs = self.outputs['hiddenzone'][hiddenzone_id]
+
+        # Add to hidden part of the internode
+        hidden_internode_id = hiddenzone_id + tuple(['internode', 'HiddenElement'])
+        if hidden_internode_id not in self.outputs['elements'].keys():
+            new_internode_outputs = parameters.OrganInit().__dict__
+            self.outputs['elements'][hidden_internode_id] = new_internode_outputs
+        curr_hidden_internode_outputs = self.outputs['elements'][hidden_internode_id]
+        curr_hidden_internode_outputs['mstruct'] += curr_hiddenzone_outputs['internode_enclosed_mstruct']
+        curr_hidden_internode_outputs['max_mstruct'] = curr_hidden_internode_outputs['mstruct']
+        curr_hidden_internode_outputs['Nstruct'] += curr_hiddenzone_outputs['internode_enclosed_Nstruct']
+        curr_hidden_internode_outputs['sucrose'] += curr_hiddenzone_outputs['sucrose']
+        curr_hidden_internode_outputs['amino_acids'] += curr_hiddenzone_outputs['amino_acids']
+        curr_hidden_internode_outputs['fructan'] += curr_hiddenzone_outputs['fructan']
+        curr_hidden_internode_outputs['proteins'] += curr_hiddenzone_outputs['proteins']
+        curr_hidden_internode_outputs['is_growing'] = False
+        self.outputs['elements'][hidden_internode_id] = curr_hidden_internode_outputs
+
+        # Turn remobilizing flag to False
+        self.outputs['hiddenzone'][hiddenzone_id]['internode_is_remobilizing'] = False
+
+        #: Turn the flag to true after remobilisation in order to Delete Hiddenzone in both MTG and shared_outputs
+        self.outputs['hiddenzone'][hiddenzone_id]['is_over'] = True
+
+    def _run_roots(self, postflowering_stages):
+        """
+        Compute the growth of the roots.
+
+        :param bool postflowering_stages: if True the model will calculate root growth with the parameters calibrated for post flowering stages
+        """
+        all_roots_inputs = self.inputs['roots']
+        all_roots_outputs = self.outputs['roots']
+        all_axes_inputs = self.inputs['axes']
+        all_axes_outputs = self.outputs['axes']
 
         # --------------------------------
         # -------------- Roots -----------
@@ -2,6 +2,8 @@
 
 from __future__ import division  # use '//' to do integer division
 
+import numpy as np
+
 """
     respiwheat.model
     ~~~~~~~~~~~~~~~~~~~
@@ -22,6 +24,17 @@ from __future__ import division  # use '//' to do integer division
 """
 
 
+def _to_float_arrays(*values):
+    """Convert scalars, sequences or pandas Series to float arrays.
+
+    :param values: the values to convert
+
+    :return: the values as float arrays
+    :rtype: tuple [numpy.ndarray]
+    """
+    return tuple(np.asarray(value, dtype=float) for value in values)
+
+
 class RespirationModel(object):
     SECOND_TO_HOUR_RATE_CONVERSION = 3600
 
@@ -221,3 +234,157 @@ class RespirationModel(object):
             R_residual = 5.21E-4 * Q10 ** ((Tsoil - T_ref) / 10) * cls.SECOND_TO_HOUR_RATE_CONVERSION
 
         return R_residual
+
+    # Vectorized versions: the parameters are broadcast against each other and the results are arrays. The results are the same as the ones of the scalar functions.
+
+    @classmethod
+    def R_growth_vectorized(cls, mstruct_growth):
+        """Vectorized version of :meth:`R_growth`.
+
+        :param numpy.ndarray mstruct_growth: gross growth of mstruct (mol C added in mstruct)
+
+        :return: R_growth (mol C respired)
+        :rtype: numpy.ndarray
+        """
+        mstruct_growth, = _to_float_arrays(mstruct_growth)
+        return ((1 - cls.YG) / cls.YG) * mstruct_growth
+
+    @classmethod
+    def R_grain_growth_vectorized(cls, mstruct_growth, starch_filling, mstruct):
+        """Vectorized version of :meth:`R_grain_growth`.
+
+        :param numpy.ndarray mstruct_growth: gross growth of grain structure (mol C added in grain structure)
+        :param numpy.ndarray starch_filling: gross growth of grain starch (mol C added in grain starch g-1 mstruct)
+        :param numpy.ndarray mstruct: structural dry mass of organ (g)
+
+        :return: R_grain_growth_struct, R_grain_growth_starch (mol C respired)
+        :rtype: tuple [numpy.ndarray, numpy.ndarray]
+        """
+        mstruct_growth, starch_filling, mstruct = np.broadcast_arrays(*_to_float_arrays(mstruct_growth, starch_filling, mstruct))
+        R_grain_growth_struct = ((1 - cls.YG_GRAINS) / cls.YG_GRAINS) * mstruct_growth
+        R_grain_growth_starch = ((1 - cls.YG_GRAINS) / cls.YG_GRAINS) * (starch_filling * mstruct)
+        return R_grain_growth_struct, R_grain_growth_starch
+
+    @classmethod
+    def R_phloem_vectorized(cls, sucrose_loading, mstruct):
+        """Vectorized version of :meth:`R_phloem`.
+
+        :param numpy.ndarray sucrose_loading: Loading flux from the C substrate pool to phloem (mol C g-1 mstruct)
+        :param numpy.ndarray mstruct: structural dry mass of organ (g)
+
+        :return: R_phloem, sucrose_loading (mol C respired, mol C)
+        :rtype: tuple [numpy.ndarray, numpy.ndarray]
+        """
+        sucrose_loading, mstruct = np.broadcast_arrays(*_to_float_arrays(sucrose_loading, mstruct))
+        R_phloem = cls.CPHLOEM * sucrose_loading * mstruct
+        R_phloem = np.where(R_phloem > 0., R_phloem, 0.)  #: Do not count a respiratory cost for negative loading i.e. unloading (assumed to be passive)
+        return R_phloem, sucrose_loading.copy()
+
+    @classmethod
+    def R_Namm_upt_vectorized(cls, U_Namm):
+        """Vectorized version of :meth:`R_Namm_upt`.
+
+        :param numpy.ndarray U_Namm: uptake of N ammonium (mol N)
+
+        :return: R_Namm (mol C respired)
+        :rtype: numpy.ndarray
+        """
+        U_Namm, = _to_float_arrays(U_Namm)
+        return cls.C_AMM_UPT * U_Namm
+
+    @classmethod
+    def R_Nnit_upt_vectorized(cls, U_Nnit, sucrose):
+        """Vectorized version of :meth:`R_Nnit_upt`.
+
+        :param numpy.ndarray U_Nnit: uptake of N nitrates (mol N)
+        :param numpy.ndarray sucrose: amount of C sucrose in organ (mol C)
+
+        :return: R_Nnit_upt (mol C respired)
+        :rtype: numpy.ndarray
+        """
+        U_Nnit, sucrose = _to_float_arrays(U_Nnit, sucrose)
+        return np.where(sucrose > 0, cls.C_NIT_UPT * U_Nnit, 0.)
+
+    @classmethod
+    def R_Nnit_red_vectorized(cls, s_amino_acids, sucrose, mstruct, root=False):
+        """Vectorized version of :meth:`R_Nnit_red`.
+
+        :param numpy.ndarray s_amino_acids: consumption of N for the synthesis of amino acids (mol N g-1 mstruct)
+        :param numpy.ndarray sucrose: amount of C sucrose in organ (mol C)
+        :param numpy.ndarray mstruct: structural dry mass of organ (g)
+        :param bool root: specifies if the nitrate reduction-linked respiration is computed for shoot (False) or root (True) tissues.
+
+        :return: R_Nnit_upt, s_amino_acids (mol C respired, mol N g-1 mstruct)
+        :rtype: tuple [numpy.ndarray, numpy.ndarray]
+        """
+        s_amino_acids, sucrose, mstruct = np.broadcast_arrays(*_to_float_arrays(s_amino_acids, sucrose, mstruct))
+        if not root:
+            R_Nnit_red = cls.F_NIT_RED_SH_CS * cls.C_NIT_RED * s_amino_acids * mstruct  # Respiration in shoot tissues
+            return R_Nnit_red, s_amino_acids.copy()
+        R_Nnit_red = cls.C_NIT_RED * s_amino_acids * mstruct  # Respiration in root tissues
+        not_enough_sucrose = sucrose < R_Nnit_red
+        return np.where(not_enough_sucrose, 0., R_Nnit_red), np.where(not_enough_sucrose, 0., s_amino_acids)
+
+    @classmethod
+    def R_N2fix_vectorized(cls, I_Nfix):
+        """Vectorized version of :meth:`R_N2fix`.
+
+        :param numpy.ndarray I_Nfix: flux of fixed N into the root substrate N pool (kg fixed N)
+
+        :return: R_N2fix (mol C respired)
+        :rtype: numpy.ndarray
+        """
+        I_Nfix, = _to_float_arrays(I_Nfix)
+        return np.where(I_Nfix <= 0, 0., cls.C_NFIX * I_Nfix)
+
+    @classmethod
+    def R_min_upt_vectorized(cls, delta_mineral_plant):
+        """Vectorized version of :meth:`R_min_upt`.
+
+        :param numpy.ndarray delta_mineral_plant: Uptake of mineral by the plant (g)
+
+        :return: R_min_upt (mol C respired)
+        :rtype: numpy.ndarray
+        """
+        delta_mineral_plant, = _to_float_arrays(delta_mineral_plant)
+        R_min_upt = cls.CMIN_UPT * delta_mineral_plant
+        return np.where(R_min_upt > 0., R_min_upt, 0.)
+
+    @classmethod
+    def R_residual_vectorized(cls, sucrose, mstruct, Ntot, Ts):
+        """Vectorized version of :meth:`R_residual`.
+
+        :param numpy.ndarray sucrose: amount of C sucrose (mol C)
+        :param numpy.ndarray mstruct: structural dry mass of organ (g)
+        :param numpy.ndarray Ntot: total N in organ (mol N)
+        :param numpy.ndarray Ts : organ temperature ( C)
+
+        :return: R_residual (mol C respired h-1)
+        :rtype: numpy.ndarray
+        """
+        Q10 = 2.
+        T_ref = 20.
+
+        sucrose, mstruct, Ntot, Ts = _to_float_arrays(sucrose, mstruct, Ntot, Ts)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            conc_sucrose = sucrose / mstruct
+            R_residual = ((cls.KM_MAX * conc_sucrose) / (cls.KM + conc_sucrose)) * Ntot * Q10 ** ((Ts - T_ref) / 10) * cls.SECOND_TO_HOUR_RATE_CONVERSION
+        return np.where((sucrose <= 0.) | (mstruct <= 0.), 0., R_residual)
+
+    @classmethod
+    def R_endosperm_vectorized(cls, starch, mstruct, Tsoil):
+        """Vectorized version of :meth:`R_endosperm`.
+
+        :param numpy.ndarray starch: amount of C sucrose (mol C)
+        :param numpy.ndarray mstruct: structural dry mass of organ (g)
+        :param numpy.ndarray Tsoil : soil temperature ( C)
+
+        :return: R_residual (mol C respired h-1)
+        :rtype: numpy.ndarray
+        """
+        Q10 = 2.
+        T_ref = 20.
+
+        starch, mstruct, Tsoil = _to_float_arrays(starch, mstruct, Tsoil)
+        R_residual = 5.21E-4 * Q10 ** ((Tsoil - T_ref) / 10) * cls.SECOND_TO_HOUR_RATE_CONVERSION
+        return np.where((starch <= 0.) | (mstruct <= 0.), 0., R_residual)
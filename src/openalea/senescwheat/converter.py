@@ -69,19 +69,28 @@ def from_dataframes(roots_inputs, axes_inputs, elements_inputs):
        for the structure of Senesc-Wheat inputs/outputs.
 
     """
-    all_roots_dict = {}
-    all_axes_dict = {}
-    all_elements_dict = {}
-    for (all_current_dict, current_dataframe, current_topology_columns) in ((all_roots_dict, roots_inputs, ROOTS_TOPOLOGY_COLUMNS),
-                                                                            (all_axes_dict, axes_inputs, AXES_TOPOLOGY_COLUMNS),
-                                                                            (all_elements_dict, elements_inputs, ELEMENTS_TOPOLOGY_COLUMNS)):
-        current_columns = current_dataframe.columns.difference(current_topology_columns)
-        for current_id, current_group in current_dataframe.groupby(current_topology_columns):
-            current_series = current_group.loc[current_group.first_valid_index()]
-            current_dict = current_series[current_columns].to_dict()
-            all_current_dict[current_id] = current_dict
-
-    return {'roots': all_roots_dict, 'axes': all_axes_dict, 'elements': all_elements_dict}
+    return {'roots': _dataframe_to_dict(roots_inputs, ROOTS_TOPOLOGY_COLUMNS),
+            'axes': _dataframe_to_dict(axes_inputs, AXES_TOPOLOGY_COLUMNS),
+            'elements': _dataframe_to_dict(elements_inputs, ELEMENTS_TOPOLOGY_COLUMNS)}
+
+
+def _dataframe_to_dict(dataframe, topology_columns):
+    """
+    Convert a dataframe to a dictionary with the data of the first row of each topological element,
+    sorted by topological element, as done with :meth:`pandas.DataFrame.groupby` on `topology_columns`.
+
+    :param pandas.DataFrame dataframe: the dataframe to convert
+    :param list [str] topology_columns: the columns which define the topology in `dataframe`
+
+    :return: The data of the first row of each topological element, by id of topological element.
+    :rtype: dict [tuple, dict [str, object]]
+    """
+    data_columns = dataframe.columns.difference(topology_columns)
+    first_rows = dataframe.dropna(subset=topology_columns).drop_duplicates(subset=topology_columns).sort_values(topology_columns)
+    ids = zip(*[first_rows[column].to_numpy().tolist() for column in topology_columns])
+    data = [first_rows[column].to_numpy().tolist() for column in data_columns]
+    rows = zip(*data) if data else [()] * len(first_rows)
+    return {current_id: dict(zip(data_columns, row)) for current_id, row in zip(ids, rows)}
 
 
 def to_dataframes(data_dict):
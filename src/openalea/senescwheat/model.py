@@ -1,6 +1,9 @@
 # -*- coding: latin-1 -*-
 
 from __future__ import division  # use '//' to do integer division
+
+import numpy as np
+
 from openalea.senescwheat import parameters
 
 """
@@ -245,3 +248,110 @@ class SenescenceModel(object):
         delta_Nstruct = rate_Nstruct_death * delta_teq
 
         return delta_mstruct, delta_Nstruct
+
+    # -----------------------------------------------------------------------------------------------------------------
+    # --- Vectorized versions of the functions above, used to compute the outputs of all the elements at once.
+    # --- The parameters are numpy arrays with one value per element ; the branches of the scalar functions are masks.
+    # -----------------------------------------------------------------------------------------------------------------
+
+    @classmethod
+    def calculate_fraction_N_max_vectorized(cls, organs_names):
+        """Threshold of ([proteins]/[proteins]max) below which tissue death is triggered
+
+        :param numpy.ndarray organs_names: names of the organs to which belong the elements
+
+        :return: fraction_N_max of each element (dimensionless)
+        :rtype: numpy.ndarray
+        """
+        return np.where(organs_names == 'blade', parameters.FRACTION_N_MAX['blade'], parameters.FRACTION_N_MAX['stem'])
+
+    @classmethod
+    def calculate_relative_delta_green_area_vectorized(cls, organs_names, prev_green_area, proteins, max_proteins, delta_t, update_max_protein):
+        """Vectorized version of :meth:`calculate_relative_delta_green_area`.
+
+        :param numpy.ndarray organs_names: names of the organs to which belong the elements
+        :param numpy.ndarray prev_green_area: previous values of the green areas (m-2)
+        :param numpy.ndarray proteins: protein concentrations (mol N proteins g-1 mstruct)
+        :param numpy.ndarray max_proteins: maximal protein concentrations experienced by the elements (mol N proteins g-1 mstruct)
+        :param numpy.ndarray delta_t: values of the timestep (s)
+        :param numpy.ndarray update_max_protein: whether to update the max proteins or not.
+
+        :return: new_green_area (m-2), relative_delta_green_area (dimensionless), max_proteins (mol N proteins g-1 mstruct)
+        :rtype: tuple [numpy.ndarray, numpy.ndarray, numpy.ndarray]
+        """
+        fraction_N_max = cls.calculate_fraction_N_max_vectorized(organs_names)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Overwrite max proteins
+            overwrite_max_proteins = (max_proteins < proteins) & update_max_protein
+            # Senescence if (actual proteins/max_proteins) < fraction_N_max
+            is_senescent = ~overwrite_max_proteins & ((max_proteins == 0) | ((proteins / max_proteins) < fraction_N_max))
+            senesced_area = np.minimum(prev_green_area, parameters.SENESCENCE_MAX_RATE * delta_t)
+            new_green_area = np.where(is_senescent, np.maximum(0., prev_green_area - senesced_area), prev_green_area)
+            relative_delta_green_area = np.where(is_senescent, senesced_area / prev_green_area, 0.)
+        return new_green_area, relative_delta_green_area, np.where(overwrite_max_proteins, proteins, max_proteins)
+
+    @classmethod
+    def calculate_relative_delta_senesced_length_vectorized(cls, organs_names, prev_senesced_length, length, proteins, max_proteins, delta_t, update_max_protein):
+        """Vectorized version of :meth:`calculate_relative_delta_senesced_length`.
+
+        :param numpy.ndarray organs_names: names of the organs to which belong the elements
+        :param numpy.ndarray prev_senesced_length: previous senesced lengths of the elements (m)
+        :param numpy.ndarray length: lengths of the elements (m)
+        :param numpy.ndarray proteins: protein concentrations (mol N proteins g-1 mstruct)
+        :param numpy.ndarray max_proteins: maximal protein concentrations experienced by the elements (mol N proteins g-1 mstruct)
+        :param numpy.ndarray delta_t: values of the timestep (s)
+        :param numpy.ndarray update_max_protein: whether to update the max proteins or not.
+
+        :return: new_senesced_length (m), relative_delta_senesced_length (dimensionless), max_proteins (mol N proteins g-1 mstruct)
+        :rtype: tuple [numpy.ndarray, numpy.ndarray, numpy.ndarray]
+        """
+        fraction_N_max = cls.calculate_fraction_N_max_vectorized(organs_names)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Overwrite max proteins
+            overwrite_max_proteins = (max_proteins < proteins) & update_max_protein
+            # Senescence if (actual proteins/max_proteins) < fraction_N_max
+            is_senescent = ~overwrite_max_proteins & ((max_proteins == 0) | ((proteins / max_proteins) < fraction_N_max))
+            senesced_length = np.minimum(length, prev_senesced_length + parameters.SENESCENCE_LENGTH_MAX_RATE * delta_t)
+            relative_delta_senesced_length = np.where(length == senesced_length, 1., 1 - (length - senesced_length) / (length - prev_senesced_length))
+            new_senesced_length = np.where(is_senescent, senesced_length, prev_senesced_length)
+            relative_delta_senesced_length = np.where(is_senescent, relative_delta_senesced_length, 0.)
+        return new_senesced_length, relative_delta_senesced_length, np.where(overwrite_max_proteins, proteins, max_proteins)
+
+    @classmethod
+    def calculate_if_element_is_over_vectorized(cls, green_area, is_growing, mstruct):
+        """Vectorized version of :meth:`calculate_if_element_is_over`.
+
+        :param numpy.ndarray green_area: Green areas of the elements (m2)
+        :param numpy.ndarray is_growing: flags if the elements are still growing
+        :param numpy.ndarray mstruct: Strucural masses of the elements (g)
+
+        :return: is_over which indicates if the elements are fully senescent
+        :rtype: numpy.ndarray
+        """
+        return ((green_area < parameters.MIN_GREEN_AREA) | (mstruct == 0)) & ~is_growing
+
+    @classmethod
+    def calculate_remobilisation_proteins_vectorized(cls, organs, elements_indexes, proteins, relative_delta_green_area, ratio_N_mstruct_max, full_remob):
+        """Vectorized version of :meth:`calculate_remobilisation_proteins`.
+
+        :param numpy.ndarray organs: names of the organs
+        :param numpy.ndarray elements_indexes: phytomer ranks
+        :param numpy.ndarray proteins: amounts of proteins (mol N)
+        :param numpy.ndarray relative_delta_green_area: relative variations of the green areas
+        :param numpy.ndarray ratio_N_mstruct_max: N content in the whole elements (both green and senesced tissues).
+        :param bool full_remob: whether all proteins should be remobilised
+
+        :return: Quantity of proteins remobilised either in amino acids, either in residual N (mol),
+                 Quantity of proteins converted into amino_acids (mol N),
+                 Increment of Nresidual (g)
+        :rtype: tuple [numpy.ndarray, numpy.ndarray, numpy.ndarray]
+        """
+        if full_remob:
+            to_Nresidual = np.zeros(len(proteins), dtype=bool)
+        else:
+            ratio_N_mstruct = np.array([parameters.RATIO_N_MSTRUCT.get(element_index, parameters.DEFAULT_RATIO_N_MSTRUCT) for element_index in elements_indexes], dtype=float)
+            to_Nresidual = (organs == 'blade') & (ratio_N_mstruct_max <= ratio_N_mstruct)  # all the proteins are converted into Nresidual
+        remob_proteins = np.where(to_Nresidual, proteins, proteins * relative_delta_green_area)
+        delta_amino_acids = np.where(to_Nresidual, 0., remob_proteins)
+        delta_Nresidual = np.where(to_Nresidual, remob_proteins * 1E-6 * parameters.N_MOLAR_MASS, 0.)
+        return remob_proteins, delta_amino_acids, delta_Nresidual
@@ -2,6 +2,10 @@
 
 from __future__ import division  # use "//" to do integer division
 
+import operator
+
+import numpy as np
+
 from openalea.senescwheat import model
 from openalea.senescwheat import parameters
 
@@ -17,6 +21,42 @@ from openalea.senescwheat import parameters
 """
 
 
+def _to_arrays(all_inputs, inputs_names, defaults=None):
+    """
+    Gather the inputs of several roots or elements in one array per input.
+
+    :param list all_inputs: The inputs of the roots or elements: [{input_name: input_value, ...}, ...].
+    :param list inputs_names: The names of the inputs to gather.
+    :param dict defaults: The values to use for the missing inputs: {input_name: default_value, ...}. As in the scalar computation, a missing input which has no default value raises a KeyError.
+
+    :return: The values of each input: {input_name: numpy.ndarray, ...}.
+    :rtype: dict
+    """
+    try:
+        get_inputs_values = operator.itemgetter(*inputs_names)
+        inputs_values = np.array([get_inputs_values(inputs) for inputs in all_inputs], dtype=float)
+    except KeyError:
+        defaults = defaults or {}
+        inputs_values = np.array([[inputs.get(input_name, defaults[input_name]) if input_name in defaults else inputs[input_name] for input_name in inputs_names]
+                                  for inputs in all_inputs], dtype=float)
+    inputs_values = inputs_values.reshape(len(all_inputs), len(inputs_names)).T
+    return dict(zip(inputs_names, inputs_values))
+
+
+def _to_dicts(all_outputs):
+    """
+    Split the outputs of several roots or elements into one dictionary per root or element.
+
+    :param dict all_outputs: The outputs of the roots or elements: {output_name: numpy.ndarray, ...}.
+
+    :return: The outputs of each root or element: [{output_name: output_value, ...}, ...].
+    :rtype: list
+    """
+    outputs_names = list(all_outputs.keys())
+    outputs_values = [all_outputs[output_name].tolist() for output_name in outputs_names]
+    return [dict(zip(outputs_names, values)) for values in zip(*outputs_values)]
+
+
 class Simulation(object):
     """The Simulation class permits to initialize and run a simulation.
     """
@@ -53,13 +93,15 @@ class Simulation(object):
         self.inputs.clear()
         self.inputs.update(inputs)
 
-    def run(self, forced_max_protein_elements=None, opt_full_remob=False, postflowering_stages=False):
+    def run(self, forced_max_protein_elements=None, opt_full_remob=False, postflowering_stages=False, vectorized=False):
         """
         Compute Senesc-Wheat outputs from :attr:`inputs`, and update :attr:`outputs`.
 
         :param set forced_max_protein_elements: The elements ids with fixed max proteins.
         :param bool postflowering_stages: True to run a simulation with postflo parameter
         :param bool opt_full_remob: whether all proteins should be remobilised
+        :param bool vectorized: If True, the outputs of all the roots and all the elements are computed at once from arrays of inputs.
+                                Otherwise they are computed root by root and element by element. Both give the same outputs.
 
         .. todo:: remove forced_max_protein_elements
 
@@ -70,6 +112,19 @@ class Simulation(object):
 
         self.outputs.update({inputs_type: {} for inputs_type in self.inputs.keys()})
 
+        if vectorized:
+            self._run_roots_vectorized(postflowering_stages)
+            self._run_elements_vectorized(forced_max_protein_elements, opt_full_remob, postflowering_stages)
+        else:
+            self._run_roots(postflowering_stages)
+            self._run_elements(forced_max_protein_elements, opt_full_remob, postflowering_stages)
+
+    def _run_roots(self, postflowering_stages):
+        """
+        Compute the outputs of the roots, root by root.
+
+        :param bool postflowering_stages: True to run a simulation with postflo parameter
+        """
         # axes
         all_axes_inputs = self.inputs['axes']
 
@@ -93,6 +148,17 @@ class Simulation(object):
                                                   'Nstruct': roots_inputs_dict['Nstruct'] - delta_Nstruct,
                                                   'cytokinins': roots_inputs_dict['cytokinins'] - loss_cytokinins}
 
+    def _run_elements(self, forced_max_protein_elements, opt_full_remob, postflowering_stages):
+        """
+        Compute the outputs of the elements, element by element.
+
+        :param set forced_max_protein_elements: The elements ids with fixed max proteins.
+        :param bool opt_full_remob: whether all proteins should be remobilised
+        :param bool postflowering_stages: True to run a simulation with postflo parameter
+        """
+        # axes
+        all_axes_inputs = self.inputs['axes']
+
         # Elements
         all_elements_inputs = self.inputs['elements']
         all_elements_outputs = self.outputs['elements']
@@ -191,3 +257,169 @@ class Simulation(object):
                                         'is_over': is_over}
 
             all_elements_outputs[element_inputs_id] = element_outputs_dict
+
+    def _run_roots_vectorized(self, postflowering_stages):
+        """
+        Compute the outputs of all the roots at once. Same as :meth:`_run_roots`.
+
+        :param bool postflowering_stages: True to run a simulation with postflo parameter
+        """
+        all_axes_inputs = self.inputs['axes']
+        all_roots_inputs = self.inputs['roots']
+        all_roots_outputs = self.outputs['roots']
+
+        roots_ids = list(all_roots_inputs.keys())
+        roots_inputs = [all_roots_inputs[roots_id] for roots_id in roots_ids]
+        if not roots_ids:
+            return
+
+        # Temperature-compensated time (delta_teq)
+        delta_teq = np.array([all_axes_inputs[roots_id]['delta_teq_roots'] for roots_id in roots_ids], dtype=float)
+
+        roots_inputs_arrays = _to_arrays(roots_inputs, ['mstruct', 'senesced_mstruct', 'Nstruct', 'cytokinins'])
+        mstruct = roots_inputs_arrays['mstruct']
+        Nstruct = roots_inputs_arrays['Nstruct']
+        cytokinins = roots_inputs_arrays['cytokinins']
+
+        # loss of mstruct and Nstruct
+        rate_mstruct_death, rate_Nstruct_death = model.SenescenceModel.calculate_roots_senescence(mstruct, Nstruct, postflowering_stages)
+        relative_delta_mstruct = model.SenescenceModel.calculate_relative_delta_mstruct_roots(rate_mstruct_death, mstruct, delta_teq)
+        delta_mstruct, delta_Nstruct = model.SenescenceModel.calculate_delta_mstruct_root(rate_mstruct_death, rate_Nstruct_death, delta_teq)
+        # loss of cytokinins (losses of nitrates, amino acids and sucrose are neglected)
+        loss_cytokinins = model.SenescenceModel.calculate_remobilisation(cytokinins, relative_delta_mstruct)
+
+        # Update of root outputs
+        roots_outputs = _to_dicts({'mstruct': mstruct - delta_mstruct,
+                                   'senesced_mstruct': roots_inputs_arrays['senesced_mstruct'] + delta_mstruct,
+                                   'rate_mstruct_death': rate_mstruct_death,
+                                   'Nstruct': Nstruct - delta_Nstruct,
+                                   'cytokinins': cytokinins - loss_cytokinins})
+        all_roots_outputs.update(zip(roots_ids, roots_outputs))
+
+    def _run_elements_vectorized(self, forced_max_protein_elements, opt_full_remob, postflowering_stages):
+        """
+        Compute the outputs of all the elements at once. Same as :meth:`_run_elements`:
+        the elements which are over, growing or senescent are selected with masks, and the senescence of all the senescent elements is computed in one pass.
+
+        :param set forced_max_protein_elements: The elements ids with fixed max proteins.
+        :param bool opt_full_remob: whether all proteins should be remobilised
+        :param bool postflowering_stages: True to run a simulation with postflo parameter
+        """
+        all_axes_inputs = self.inputs['axes']
+        all_elements_inputs = self.inputs['elements']
+        all_elements_outputs = self.outputs['elements']
+
+        elements_ids = [element_id for element_id in all_elements_inputs.keys() if element_id[1] == 'MS']  # TODO: Calculation only for the main stem
+        elements_inputs = [all_elements_inputs[element_id] for element_id in elements_ids]
+        if not elements_ids:
+            return
+
+        elements_inputs_arrays = _to_arrays(elements_inputs, ['green_area', 'mstruct'])
+        is_growing = np.array([bool(element_inputs['is_growing']) for element_inputs in elements_inputs])
+        is_over = model.SenescenceModel.calculate_if_element_is_over_vectorized(elements_inputs_arrays['green_area'], is_growing, elements_inputs_arrays['mstruct'])
+
+        # Senescence of the elements which are neither over nor growing
+        senescent_indexes = np.flatnonzero(~is_over & ~is_growing)
+        senescent_outputs = {}
+        if len(senescent_indexes) > 0:
+            senescent_ids = [elements_ids[index] for index in senescent_indexes]
+            senescent_inputs = _to_arrays([elements_inputs[index] for index in senescent_indexes],
+                                          ['green_area', 'senesced_length_element', 'length', 'proteins', 'mstruct', 'senesced_mstruct', 'max_proteins', 'Nstruct',
+                                           'nitrates', 'amino_acids', 'starch', 'fructan', 'cytokinins', 'sucrose', 'max_mstruct', 'Nresidual', 'age'],
+                                          {'senesced_length_element': 0} if postflowering_stages else None)  # same defaults as in :meth:`_run_elements`
+            organs = np.array([element_id[3] for element_id in senescent_ids])
+            metamers = [element_id[2] for element_id in senescent_ids]
+
+            # Temperature-compensated time (delta_teq)
+            delta_teq = np.array([all_axes_inputs[element_id[:2]]['delta_teq'] for element_id in senescent_ids], dtype=float)
+
+            update_max_protein = np.array([forced_max_protein_elements is None or element_id not in forced_max_protein_elements for element_id in senescent_ids], dtype=bool)
+
+            green_area = senescent_inputs['green_area']
+            length = senescent_inputs['length']
+            proteins = senescent_inputs['proteins']
+            mstruct = senescent_inputs['mstruct']
+            Nstruct = senescent_inputs['Nstruct']
+            starch = senescent_inputs['starch']
+            fructan = senescent_inputs['fructan']
+            cytokinins = senescent_inputs['cytokinins']
+            nitrates = senescent_inputs['nitrates']
+            amino_acids = senescent_inputs['amino_acids']
+            Nresidual = senescent_inputs['Nresidual']
+
+            if postflowering_stages:
+                new_green_area, relative_delta_green_area, max_proteins = model.SenescenceModel.calculate_relative_delta_green_area_vectorized(organs, green_area, proteins / mstruct,
+                                                                                                                                              senescent_inputs['max_proteins'],
+                                                                                                                                              delta_teq, update_max_protein)
+                # Temporaire
+                new_senesced_length = relative_delta_green_area * (length - senescent_inputs['senesced_length_element'])
+
+            else:
+                # Temporaire
+                senesced_length = senescent_inputs['senesced_length_element']
+                new_senesced_length, relative_delta_senesced_length, max_proteins = model.SenescenceModel.calculate_relative_delta_senesced_length_vectorized(organs, senesced_length, length,
+                                                                                                                                                             proteins / mstruct,
+                                                                                                                                                             senescent_inputs['max_proteins'],
+                                                                                                                                                             delta_teq, update_max_protein)
+                # Senescence with element age
+                is_age_senescent = (organs != 'internode') & (relative_delta_senesced_length == 0) & (senescent_inputs['age'] > parameters.AGE_EFFECT_SENESCENCE)
+                if is_age_senescent.any():
+                    age_senescence = model.SenescenceModel.calculate_relative_delta_senesced_length_vectorized(organs, senesced_length, length, np.zeros(len(senescent_ids)), max_proteins,
+                                                                                                              delta_teq, update_max_protein)
+                    new_senesced_length, relative_delta_senesced_length, max_proteins = [np.where(is_age_senescent, age_senescence_output, output)
+                                                                                         for age_senescence_output, output in zip(age_senescence, (new_senesced_length,
+                                                                                                                                                   relative_delta_senesced_length,
+                                                                                                                                                   max_proteins))]
+                # Temporaire :
+                relative_delta_green_area = relative_delta_senesced_length
+                new_green_area = green_area * (1 - relative_delta_green_area)
+
+            # Remobilisation
+            N_content_total = model.SenescenceModel.calculate_N_content_total(proteins, amino_acids, nitrates, Nstruct, senescent_inputs['max_mstruct'], Nresidual)
+
+            remob_starch = model.SenescenceModel.calculate_remobilisation(starch, relative_delta_green_area)
+            remob_fructan = model.SenescenceModel.calculate_remobilisation(fructan, relative_delta_green_area)
+            remob_proteins, delta_aa, delta_Nresidual = model.SenescenceModel.calculate_remobilisation_proteins_vectorized(organs, metamers, proteins, relative_delta_green_area,
+                                                                                                                           N_content_total, opt_full_remob)
+            loss_cytokinins = model.SenescenceModel.calculate_remobilisation(cytokinins, relative_delta_green_area)
+            loss_nitrates = model.SenescenceModel.calculate_remobilisation(nitrates, relative_delta_green_area)
+
+            # Loss of mstruct and Nstruct
+            delta_mstruct, delta_Nstruct = model.SenescenceModel.calculate_delta_mstruct_shoot(relative_delta_green_area, mstruct, Nstruct)
+            new_mstruct = mstruct - delta_mstruct
+            new_Nstruct = Nstruct - delta_Nstruct
+
+            delta_Nresidual += Nstruct - new_Nstruct
+
+            # Turn 'is_over' to True when the element is fully senescent (to delete the element in the shared elements inputs/outputs)
+            senescent_outputs = dict(zip(senescent_indexes.tolist(),
+                                         _to_dicts({'green_area': new_green_area,
+                                                    'senesced_length_element': new_senesced_length,
+                                                    'mstruct': new_mstruct,
+                                                    'senesced_mstruct': senescent_inputs['senesced_mstruct'] + delta_mstruct,
+                                                    'Nstruct': new_Nstruct,
+                                                    'starch': starch - remob_starch,
+                                                    'sucrose': senescent_inputs['sucrose'] + remob_starch + remob_fructan,
+                                                    'fructan': fructan - remob_fructan,
+                                                    'proteins': proteins - remob_proteins,
+                                                    'amino_acids': amino_acids + delta_aa,
+                                                    'cytokinins': cytokinins - loss_cytokinins,
+                                                    'nitrates': nitrates - loss_nitrates,
+                                                    'max_proteins': max_proteins,
+                                                    'Nresidual': Nresidual + delta_Nresidual,
+                                                    'N_content_total': N_content_total,
+                                                    'is_over': new_mstruct == 0})))
+
+        for index, element_id in enumerate(elements_ids):
+            if index in senescent_outputs:
+                element_outputs_dict = senescent_outputs[index]
+            else:
+                element_inputs_dict = elements_inputs[index]
+                element_outputs_dict = element_inputs_dict.copy()
+                if is_over[index]:
+                    element_outputs_dict['green_area'] = 0.0
+                    element_outputs_dict['senesced_length_element'] = element_inputs_dict['length']
+                    element_outputs_dict['mstruct'] = 0
+                    element_outputs_dict['senesced_mstruct'] += element_inputs_dict['mstruct']
+                    element_outputs_dict['is_over'] = True
+            all_elements_outputs[element_id] = element_outputs_dict
@@ -0,0 +1,18 @@
+# -*- coding: latin-1 -*-
+"""
+    wheatfspm
+    ~~~~~~~~~
+
+    The utilities shared by the models of WheatFspm.
+
+    The models import these utilities from here rather than from each other, so that no model depends on another one
+    for code which is not part of its own equations. See:
+
+        * :mod:`wheatfspm.copy_on_write` for the outputs of the models initialized from their inputs without copying them,
+        * :mod:`wheatfspm.temperature` for the temperature responses shared by the models,
+        * :mod:`wheatfspm.watchdog` for the monitoring of the health of the solvers of the models.
+
+    :copyright: Copyright 2014-2015 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
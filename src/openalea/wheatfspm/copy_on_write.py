@@ -0,0 +1,132 @@
+# -*- coding: latin-1 -*-
+
+from collections.abc import MutableMapping
+
+"""
+    wheatfspm.copy_on_write
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`wheatfspm.copy_on_write` defines the outputs of a model as a view on its inputs, so that the
+    simulation does not copy all its inputs at each step and the facades only write back the variables actually
+    updated by the model.
+
+    It is used by :mod:`elongwheat.simulation` and :mod:`growthwheat.simulation`.
+
+    :copyright: Copyright 2014-2015 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+class CopyOnWriteError(Exception):
+    pass
+
+
+class CopyOnWriteRecord(MutableMapping):
+    """
+    The outputs of one record (e.g. a hiddenzone, an element or an axis), as a view on its inputs.
+
+    The inputs are never modified: the values set in the record are stored apart in :attr:`modified`,
+    which thus only contains the variables actually updated by the model.
+    """
+
+    def __init__(self, inputs):
+        """
+        :param dict inputs: The inputs of the record.
+        """
+        self._inputs = inputs  #: the inputs of the record, read only
+        self.modified = {}  #: the variables updated by the model: {variable_name: variable_value, ...}
+
+    def __getitem__(self, name):
+        if name in self.modified:
+            return self.modified[name]
+        return self._inputs[name]
+
+    def __setitem__(self, name, value):
+        if name not in self.modified and name in self._inputs:
+            input_value = self._inputs[name]
+            if input_value is value or input_value == value:
+                return
+        self.modified[name] = value
+
+    def __delitem__(self, name):
+        raise CopyOnWriteError('Cannot delete variable {} from the outputs'.format(name))
+
+    def __iter__(self):
+        for name in self._inputs:
+            yield name
+        for name in self.modified:
+            if name not in self._inputs:
+                yield name
+
+    def __len__(self):
+        return len(self._inputs) + len([name for name in self.modified if name not in self._inputs])
+
+
+class CopyOnWriteOutputs(dict):
+    """
+    The outputs of one type (e.g. 'hiddenzone'), initialized from the inputs of the same type without copying them.
+
+    The records are wrapped in a :class:`CopyOnWriteRecord` the first time they are accessed with `[]`, so the
+    simulation can update them in place as usual. :meth:`get_modified_data` gives the variables updated by the
+    model, and :attr:`removed_ids` the ids deleted from the outputs.
+    """
+
+    def __init__(self, inputs):
+        """
+        :param dict inputs: The inputs of one type, e.g. {(plant_index, axis_label, metamer_index): {hiddenzone_input_name: hiddenzone_input_value, ...}, ...}.
+        """
+        super(CopyOnWriteOutputs, self).__init__(inputs)
+        self._inputs = inputs  #: the inputs, read only
+        self._records = {}  #: the records wrapping the inputs: {id: CopyOnWriteRecord, ...}
+        self._new_ids = set()  #: the ids whose record was set by the model
+        self.removed_ids = set()  #: the ids of the inputs deleted by the model
+
+    def __reduce__(self):
+        # the items are restored without :meth:`__setitem__`, which would flag them as set by the model
+        return CopyOnWriteOutputs, (self._inputs,), (self.__dict__, dict(self))
+
+    def __setstate__(self, state):
+        attributes, items = state
+        self.__dict__.update(attributes)
+        dict.clear(self)
+        dict.update(self, items)
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if key not in self._records and key not in self._new_ids:
+            value = self._records[key] = CopyOnWriteRecord(value)
+            dict.__setitem__(self, key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        if self._records.get(key) is not value:
+            self._records.pop(key, None)
+            self._new_ids.add(key)
+            self.removed_ids.discard(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        if key in self._inputs:
+            self.removed_ids.add(key)
+        self._records.pop(key, None)
+        self._new_ids.discard(key)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def get_modified_data(self):
+        """
+        Get the variables updated by the model.
+
+        :return: The updated variables of each id: {id: {variable_name: variable_value, ...}, ...}. All the variables of the records set by the model are returned.
+        :rtype: dict
+        """
+        modified_data = {key: dict(dict.__getitem__(self, key)) for key in self._new_ids}
+        for key, record in self._records.items():
+            if record.modified:
+                modified_data[key] = dict(record.modified)
+        return modified_data
@@ -0,0 +1,125 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import division  # use "//" to do integer division
+
+"""
+    wheatfspm.temperature
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`wheatfspm.temperature` is a service of temperature responses shared by the models.
+
+    The temperature responses (e.g. :func:`elongwheat.model.modified_Arrhenius_equation`, the effects of the temperature in CN-Wheat)
+    are registered in :data:`RESPONSES` by the models when their parameters are loaded. Each response is evaluated either:
+
+        * through an exact cache keyed by the temperature (the default): the analytic function is computed once per distinct temperature,
+          and the values are identical to the analytic values,
+        * or through a lookup table built at the registration, with a linear interpolation between the tabulated temperatures
+          (see :meth:`TemperatureResponses.configure`). The temperatures outside the table are computed through the exact cache.
+          The table also serves the continuous temperatures, e.g. when CN-Wheat interpolates the forcings within a time step.
+
+    :copyright: Copyright 2014-2015 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the default bounds and step of the lookup tables (degree Celsius)
+TABLE_T_MIN = -20.
+TABLE_T_MAX = 50.
+TABLE_T_STEP = 0.01
+
+#: the maximum number of temperatures in the exact caches. A cache is emptied when it is full.
+MAX_CACHE_SIZE = 100000
+
+
+class TemperatureResponse(object):
+    """
+    A response function of the temperature, evaluated through an exact cache or a lookup table.
+    """
+
+    def __init__(self, function, tabulated=False, T_min=TABLE_T_MIN, T_max=TABLE_T_MAX, T_step=TABLE_T_STEP):
+        """
+        :param function function: The analytic response: function(temperature) -> value.
+        :param bool tabulated: If True, evaluate the response through a lookup table. Otherwise, through an exact cache.
+        :param float T_min: The lowest temperature of the table (degree Celsius).
+        :param float T_max: The highest temperature of the table (degree Celsius).
+        :param float T_step: The step between two temperatures of the table (degree Celsius).
+        """
+        self.function = function  #: the analytic response
+        self.tabulated = tabulated  #: True if the response is evaluated through a lookup table
+        self.T_min = T_min  #: the lowest temperature of the table
+        self.T_step = T_step  #: the step between two temperatures of the table
+        self._cache = {}  # the values of the response already computed: {temperature: value, ...}
+        self._nb_intervals = int(round((T_max - T_min) / T_step)) if tabulated else 0
+        # the values of the response at the temperatures of the table: T_min, T_min + T_step, ..., T_max
+        self._table = [function(T_min + i * T_step) for i in range(self._nb_intervals + 1)]
+
+    def __call__(self, temperature):
+        """
+        :param float temperature: The temperature (degree Celsius).
+
+        :return: The value of the response at `temperature`.
+        :rtype: float
+        """
+        if self._nb_intervals:
+            position = (temperature - self.T_min) / self.T_step
+            if 0 <= position < self._nb_intervals:
+                i = int(position)
+                lower_value = self._table[i]
+                return lower_value + (position - i) * (self._table[i + 1] - lower_value)
+        try:
+            return self._cache[temperature]
+        except KeyError:
+            if len(self._cache) >= MAX_CACHE_SIZE:
+                self._cache.clear()
+            value = self._cache[temperature] = self.function(temperature)
+            return value
+
+
+class TemperatureResponses(object):
+    """
+    The registry of the temperature responses shared by the models: {name: :class:`TemperatureResponse`, ...}.
+    """
+
+    def __init__(self):
+        self.tabulated = False  #: True if the responses are evaluated through lookup tables
+        self.table_bounds = (TABLE_T_MIN, TABLE_T_MAX, TABLE_T_STEP)  #: the lowest temperature, the highest temperature and the step of the tables
+        self._responses = {}
+
+    def register(self, name, function):
+        """
+        Register a response, replacing the response already registered under the same name, if any.
+        Must be called each time the parameters of the response change.
+
+        :param str name: The name of the response.
+        :param function function: The analytic response: function(temperature) -> value.
+
+        :return: The registered response.
+        :rtype: TemperatureResponse
+        """
+        T_min, T_max, T_step = self.table_bounds
+        response = self._responses[name] = TemperatureResponse(function, self.tabulated, T_min, T_max, T_step)
+        return response
+
+    def configure(self, tabulated, T_min=TABLE_T_MIN, T_max=TABLE_T_MAX, T_step=TABLE_T_STEP):
+        """
+        Set how the responses are evaluated, and rebuild the registered responses accordingly.
+
+        :param bool tabulated: If True, evaluate the responses through lookup tables. Otherwise, through exact caches.
+        :param float T_min: The lowest temperature of the tables (degree Celsius).
+        :param float T_max: The highest temperature of the tables (degree Celsius).
+        :param float T_step: The step between two temperatures of the tables (degree Celsius).
+        """
+        self.tabulated = tabulated
+        self.table_bounds = (T_min, T_max, T_step)
+        for name, response in list(self._responses.items()):
+            self.register(name, response.function)
+
+    def __getitem__(self, name):
+        return self._responses[name]
+
+    def __contains__(self, name):
+        return name in self._responses
+
+
+#: the temperature responses shared by all the models
+RESPONSES = TemperatureResponses()
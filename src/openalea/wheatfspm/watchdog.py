@@ -0,0 +1,208 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import division  # use "//" to do integer division
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+"""
+    wheatfspm.watchdog
+    ~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`wheatfspm.watchdog` monitors the health of the solvers during a simulation.
+
+    A :class:`SolverWatchdog` is attached to a :class:`cnwheat.simulation.Simulation` (see argument `watchdog` of the constructor),
+    which passes it the compartments at each evaluation of the derivatives. The watchdog checks the number of evaluations,
+    the progress of the solver in time, the wall-clock time elapsed by simulated hour, and the NaN and negative compartments.
+    When a threshold is exceeded, the watchdog writes a diagnostic snapshot (a JSON file) and raises a :class:`SolverHealthError`:
+    depending on :attr:`SolverWatchdog.action`, the run is either aborted, or run again with a more robust configuration of the solver.
+
+    The facades of fspmwheat attach the same watchdog to the other solvers of the simulation, e.g. the fixed-point iterations of Farquhar-Wheat
+    (see :meth:`SolverWatchdog.check_fixed_point`), and :func:`fspmwheat.batch.run_batch` records the jobs which raise
+    a :class:`SolverHealthError` with a distinct kind of failure. The watchdog does not depend on any model, so that each model can use it.
+
+    :copyright: Copyright 2014-2017 INRA-ECOSYS, see AUTHORS.
+    :license: CeCILL-C, see LICENSE for details.
+"""
+
+#: the actions of the watchdog when a threshold is exceeded
+ABORT = 'abort'  #: abort the run
+FALLBACK = 'fallback'  #: run the time step again with a more robust configuration of the solver, then abort if the threshold is still exceeded
+
+
+class SolverHealthError(Exception):
+    """
+    Raised by a :class:`SolverWatchdog` when the solver exceeds one of its thresholds.
+    """
+
+    def __init__(self, model_name, reason, snapshot_path=None, fallback=False):
+        super(SolverHealthError, self).__init__('Solver of {} aborted: {}{}'.format(model_name, reason,
+                                                                                    '' if snapshot_path is None else ' (see {})'.format(snapshot_path)))
+        self.model_name = model_name  #: the name of the model whose solver is unhealthy
+        self.reason = reason  #: the threshold which was exceeded
+        self.snapshot_path = snapshot_path  #: the path of the diagnostic snapshot, or None
+        self.fallback = fallback  #: True if the run must be run again with the fallback configuration of the solver, False if it must be aborted
+
+
+class SolverWatchdog(object):
+    """
+    Monitor the health of the solvers, and abort the runs or fall back to a more robust configuration of the solvers on configurable thresholds.
+
+    A threshold set to None is not checked.
+
+    :param float max_evaluations_per_hour: the maximum number of evaluations of the derivatives by simulated hour
+    :param float min_step: the minimum progress of the solver in time (hours) over `stall_evaluations` evaluations of the derivatives.
+           Below it, the step size of the solver is considered collapsed.
+    :param int stall_evaluations: the number of evaluations of the derivatives over which the progress of the solver is checked
+    :param float max_seconds_per_hour: the maximum wall-clock time of a run by simulated hour (s)
+    :param float negative_tolerance: the opposite of the minimum value of the compartments
+    :param int max_fixed_point_failures: the maximum number of elements whose fixed-point iterations did not converge at a run (see :meth:`check_fixed_point`)
+    :param str action: the action when a threshold is exceeded: :attr:`ABORT` or :attr:`FALLBACK`
+    :param dict fallback_solver_options: the options of :func:`scipy.integrate.solve_ivp` used by CN-Wheat when it falls back
+    :param dict fallback_fixed_point_parameters: the parameters of Farquhar-Wheat used when it falls back: {parameter_name: value, ...}
+    :param str snapshot_dirpath: the directory of the diagnostic snapshots, or None to not write them
+    """
+
+    #: the default options of :func:`scipy.integrate.solve_ivp` used by CN-Wheat when it falls back: the implicit Runge-Kutta method Radau,
+    #: of higher order and more stable than the default BDF method
+    FALLBACK_SOLVER_OPTIONS = {'method': 'Radau'}
+
+    #: the default parameters of Farquhar-Wheat used when it falls back: plain fixed-point iterations from the default initial values, with more iterations
+    FALLBACK_FIXED_POINT_PARAMETERS = {'ANDERSON_ACCELERATION': False, 'WARM_START': False, 'MAX_ITERATIONS': 100}
+
+    def __init__(self, max_evaluations_per_hour=20000, min_step=1E-6, stall_evaluations=5000, max_seconds_per_hour=600., negative_tolerance=1E-2,
+                 max_fixed_point_failures=None, action=ABORT, fallback_solver_options=None, fallback_fixed_point_parameters=None, snapshot_dirpath='.'):
+        if action not in (ABORT, FALLBACK):
+            raise ValueError('Unknown action of the watchdog: {}'.format(action))
+
+        self.max_evaluations_per_hour = max_evaluations_per_hour  #: the maximum number of evaluations of the derivatives by simulated hour
+        self.min_step = min_step  #: the minimum progress of the solver in time (hours) over :attr:`stall_evaluations` evaluations
+        self.stall_evaluations = stall_evaluations  #: the number of evaluations over which the progress of the solver is checked
+        self.max_seconds_per_hour = max_seconds_per_hour  #: the maximum wall-clock time of a run by simulated hour (s)
+        self.negative_tolerance = negative_tolerance  #: the opposite of the minimum value of the compartments
+        self.max_fixed_point_failures = max_fixed_point_failures  #: the maximum number of elements whose fixed-point iterations did not converge
+        self.action = action  #: the action when a threshold is exceeded
+        self.fallback_solver_options = dict(SolverWatchdog.FALLBACK_SOLVER_OPTIONS if fallback_solver_options is None else fallback_solver_options)
+        self.fallback_fixed_point_parameters = dict(SolverWatchdog.FALLBACK_FIXED_POINT_PARAMETERS if fallback_fixed_point_parameters is None
+                                                    else fallback_fixed_point_parameters)
+        self.snapshot_dirpath = snapshot_dirpath  #: the directory of the diagnostic snapshots
+
+        #: the thresholds exceeded since the creation of the watchdog: [(model_name, reason, snapshot_path, fallback), ...]
+        self.alerts = []
+
+        # the state of the current run
+        self._model_name = None
+        self._t_span = (0., 0.)
+        self._fallback = False
+        self._labels = None
+        self._nb_evaluations = 0
+        self._start_time = 0.
+        self._max_evaluations = None
+        self._max_seconds = None
+        self._t_max = 0.
+        self._t_max_at_last_check = 0.
+        self._last_evaluation = (None, None)  # the time and the compartments of the last evaluation of the derivatives
+
+    def start_run(self, model_name, t_span, labels=None, fallback=False):
+        """
+        Reset the monitoring before a run of a solver.
+
+        :param str model_name: the name of the model
+        :param tuple t_span: the interval of integration (hours)
+        :param callable labels: a function which returns the labels of the compartments, for the snapshots
+        :param bool fallback: True if the run is done with the fallback configuration of the solver
+        """
+        self._model_name = model_name
+        self._t_span = t_span
+        self._labels = labels
+        self._fallback = fallback
+        self._nb_evaluations = 0
+        self._start_time = time.time()
+        duration = t_span[1] - t_span[0]
+        self._max_evaluations = None if self.max_evaluations_per_hour is None else self.max_evaluations_per_hour * duration
+        self._max_seconds = None if self.max_seconds_per_hour is None else self.max_seconds_per_hour * duration
+        self._t_max = self._t_max_at_last_check = t_span[0]
+        self._last_evaluation = (None, None)
+
+    def check_evaluation(self, t, y):
+        """
+        Check the health of the solver at an evaluation of the derivatives.
+
+        :param float t: the time of the evaluation (hours)
+        :param numpy.ndarray y: the compartments
+
+        :raise SolverHealthError: if a threshold is exceeded
+        """
+        self._nb_evaluations += 1
+        self._last_evaluation = (t, y)
+        if t > self._t_max:
+            self._t_max = t
+
+        y_min = y.min()  # NaN if a compartment is NaN
+        if np.isnan(y_min):
+            self.report('NaN found in the compartments', t, y)
+        if self.negative_tolerance is not None and y_min < -self.negative_tolerance:
+            self.report('compartment at {} below the opposite of the tolerance {}'.format(y_min, self.negative_tolerance), t, y)
+        if self._max_evaluations is not None and self._nb_evaluations > self._max_evaluations:
+            self.report('more than {:.0f} evaluations of the derivatives'.format(self._max_evaluations), t, y)
+        if self.min_step is not None and self._nb_evaluations % self.stall_evaluations == 0:
+            if self._t_max - self._t_max_at_last_check < self.min_step:
+                self.report('step size collapsed: progress of {} h over the last {} evaluations'.format(self._t_max - self._t_max_at_last_check, self.stall_evaluations),
+                            t, y)
+            self._t_max_at_last_check = self._t_max
+        if self._max_seconds is not None and time.time() - self._start_time > self._max_seconds:
+            self.report('wall-clock time of the run above {} s'.format(self._max_seconds), t, y)
+
+    def check_fixed_point(self, model_name, statistics, fallback=False):
+        """
+        Check the fixed-point iterations of a run, e.g. of Farquhar-Wheat.
+
+        :param str model_name: the name of the model
+        :param statistics: the statistics of the iterations, with a list of the elements which did not converge in attribute `failures`
+               (see :class:`farquharwheat.model.SolverStatistics`)
+        :param bool fallback: True if the run was done with the fallback parameters
+
+        :raise SolverHealthError: if more than :attr:`max_fixed_point_failures` elements did not converge
+        """
+        if self.max_fixed_point_failures is None or len(statistics.failures) <= self.max_fixed_point_failures:
+            return
+        self._model_name = model_name
+        self._fallback = fallback
+        reason = '{} elements whose fixed-point iterations did not converge'.format(len(statistics.failures))
+        self._raise(reason, {'nb_resolutions': statistics.nb_resolutions, 'failures': [{'organ': organ_name, 'variable': variable, 'previous_value': previous_value, 'value': value}
+                                          for (organ_name, variable, previous_value, value) in statistics.failures]})
+
+    def report(self, reason, t=None, y=None):
+        """
+        Write a diagnostic snapshot of the current run of a solver, and raise a :class:`SolverHealthError`.
+
+        :param str reason: the threshold which was exceeded
+        :param float t: the time reached by the solver (hours). If None, the time of the last evaluation of the derivatives
+        :param numpy.ndarray y: the compartments. If None, the compartments at the last evaluation of the derivatives
+
+        :raise SolverHealthError: always
+        """
+        if t is None and y is None:
+            t, y = self._last_evaluation
+        snapshot = {'t': t, 't_span': list(self._t_span), 'evaluations': self._nb_evaluations, 't_max': self._t_max,
+                    'wall_clock': time.time() - self._start_time}
+        if y is not None:
+            labels = self._labels() if self._labels is not None else range(len(y))
+            snapshot['compartments'] = {str(label): float(value) for label, value in zip(labels, y)}
+        self._raise(reason, snapshot)
+
+    def _raise(self, reason, snapshot):
+        """Write `snapshot` if :attr:`snapshot_dirpath` is set, record the alert and raise a :class:`SolverHealthError`."""
+        fallback = self.action == FALLBACK and not self._fallback
+        snapshot_path = None
+        if self.snapshot_dirpath is not None:
+            snapshot_path = os.path.join(self.snapshot_dirpath, 'watchdog_{}_{}.json'.format(self._model_name, len(self.alerts) + 1))
+            snapshot = dict(snapshot, model=self._model_name, reason=reason, status=FALLBACK if fallback else ABORT, fallback_run=self._fallback)
+            with open(snapshot_path, 'w') as snapshot_file:
+                json.dump(snapshot, snapshot_file, indent=1)
+        self.alerts.append((self._model_name, reason, snapshot_path, fallback))
+        logging.getLogger(__name__).warning('Solver of %s: %s ; %s', self._model_name, reason, 'fall back' if fallback else 'abort')
+        raise SolverHealthError(self._model_name, reason, snapshot_path, fallback)
@@ -0,0 +1,73 @@
+# -*- coding: latin-1 -*-
+
+import os
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from openalea.cnwheat import simulation as cnwheat_simulation, converter as cnwheat_converter
+from openalea.respiwheat import model as respiwheat_model
+
+from test_cnwheat import force_senescence_and_photosynthesis
+
+"""
+    benchmark_derivatives
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Measure the duration of an evaluation of :meth:`cnwheat.simulation.Simulation._calculate_all_derivatives` on the inputs of `test_simulation_run`,
+    with the step invariants computed once per time step by :meth:`cnwheat.simulation.Simulation._calculate_step_invariants`,
+    and with the step invariants computed again at each evaluation, as previously done. Check that both give the same derivatives.
+
+    The solver evaluates the derivatives several tens of times per time step, so the duration of the computation of the step invariants
+    is saved at almost each evaluation.
+
+    :copyright: Copyright 2014-2017 INRA-ECOSYS, see AUTHORS.
+    :license: CeCILL-C, see LICENSE for details.
+
+"""
+
+NB_EVALUATIONS = 1000
+NB_REPEATS = 5  #: the number of measures of each duration, of which the minimum is kept
+
+INPUTS_DIRPATH = os.path.join('simulation_run', 'inputs')
+
+
+def create_simulation():
+    """Create and initialize a simulation from the inputs of `test_simulation_run`, forced at t=0."""
+    inputs_dataframes = [pd.read_csv(os.path.join(INPUTS_DIRPATH, inputs_filename))
+                         for inputs_filename in ('organs_initial_state.csv', 'hiddenzones_initial_state.csv', 'elements_initial_state.csv', 'soils_initial_state.csv')]
+    population, soils = cnwheat_converter.from_dataframes(*inputs_dataframes)
+    simulation_ = cnwheat_simulation.Simulation(respiration_model=respiwheat_model, delta_t=3600, culm_density={1: 410})
+    forcings_grouped = [pd.read_csv(os.path.join(INPUTS_DIRPATH, forcings_filename)).groupby(T_indexes)
+                        for forcings_filename, T_indexes in (('roots_senescence_forcings.csv', cnwheat_simulation.Simulation.AXES_T_INDEXES),
+                                                             ('elements_senescence_forcings.csv', cnwheat_simulation.Simulation.ELEMENTS_T_INDEXES),
+                                                             ('elements_photosynthesis_forcings.csv', cnwheat_simulation.Simulation.ELEMENTS_T_INDEXES))]
+    force_senescence_and_photosynthesis(0, population, *forcings_grouped)
+    simulation_.initialize(population, soils)
+    simulation_._update_initial_conditions()
+    return simulation_
+
+
+def measure(function):
+    """Return the duration of a call to `function`, as the minimum over :attr:`NB_REPEATS` measures."""
+    return min(timeit.repeat(function, number=NB_EVALUATIONS, repeat=NB_REPEATS)) / NB_EVALUATIONS
+
+
+if __name__ == '__main__':
+    simulation_ = create_simulation()
+    y = np.array(simulation_.initial_conditions)
+
+    # the derivatives with the step invariants computed once, then computed again before the evaluation
+    simulation_._calculate_step_invariants()
+    y_derivatives = simulation_._calculate_all_derivatives(0., y)
+    simulation_._calculate_step_invariants()
+    assert np.array_equal(simulation_._calculate_all_derivatives(0., y), y_derivatives)
+
+    invariants_duration = measure(simulation_._calculate_step_invariants)
+    duration = measure(lambda: simulation_._calculate_all_derivatives(0., y))
+    print('{} compartments'.format(len(y)))
+    print('step invariants{:>18.1f} \xb5s'.format(invariants_duration * 1e6))
+    print('invariants by evaluation{:>9.1f} \xb5s per evaluation'.format((duration + invariants_duration) * 1e6))
+    print('invariants by step{:>15.1f} \xb5s per evaluation'.format(duration * 1e6))
+    print('speed-up{:>25.2f}'.format((duration + invariants_duration) / duration))
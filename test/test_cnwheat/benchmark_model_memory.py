@@ -0,0 +1,58 @@
+# -*- coding: latin-1 -*-
+
+import time
+import tracemalloc
+
+from openalea.cnwheat import model, simulation
+
+"""
+    benchmark_model_memory
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Measure the memory used by the objects of :mod:`cnwheat.model` once all their run variables are set,
+    i.e. as in :meth:`cnwheat.simulation.Simulation._calculate_all_derivatives`, and the time needed to read and write these variables.
+
+    :copyright: Copyright 2014-2017 INRA-ECOSYS, see AUTHORS.
+    :license: CeCILL-C, see LICENSE for details.
+
+"""
+
+NB_OBJECTS = 10000
+
+#: the classes to measure, with the run variables set by the simulation
+MODEL_CLASSES = ((model.LaminaElement, simulation.Simulation.ELEMENTS_RUN_VARIABLES),
+                 (model.HiddenZone, simulation.Simulation.HIDDENZONE_RUN_VARIABLES),
+                 (model.Roots, simulation.Simulation.ORGANS_RUN_VARIABLES),
+                 (model.Phloem, simulation.Simulation.ORGANS_RUN_VARIABLES))
+
+
+def create_objects(model_class, run_variables):
+    model_objects = []
+    for i in range(NB_OBJECTS):
+        model_object = model_class()
+        for variable_name in run_variables:
+            if hasattr(model_object, variable_name) and variable_name != 'nb_replications':
+                setattr(model_object, variable_name, float(i))
+        model_objects.append(model_object)
+    return model_objects
+
+
+def access_variables(model_objects, variables_names):
+    for model_object in model_objects:
+        for variable_name in variables_names:
+            setattr(model_object, variable_name, getattr(model_object, variable_name) + 1.)
+
+
+if __name__ == '__main__':
+    print('{:<25}{:>20}{:>30}'.format('class', 'memory (B/object)', 'read + write (ns/variable)'))
+    for model_class, run_variables in MODEL_CLASSES:
+        tracemalloc.start()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        model_objects = create_objects(model_class, run_variables)
+        memory = (tracemalloc.get_traced_memory()[0] - start_memory) / NB_OBJECTS
+        tracemalloc.stop()
+        variables_names = [variable_name for variable_name in run_variables if hasattr(model_objects[0], variable_name) and variable_name != 'nb_replications']
+        start = time.time()
+        access_variables(model_objects, variables_names)
+        duration = (time.time() - start) / (NB_OBJECTS * len(variables_names))
+        print('{:<25}{:>20.0f}{:>30.0f}'.format(model_class.__name__, memory, duration * 1e9))
@@ -0,0 +1,30 @@
+# -*- coding: latin-1 -*-
+
+import time
+
+from test_cnwheat import run_stress_scenario
+
+"""
+    benchmark_positivity
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Compare the number of evaluations of the derivatives and the duration of the integration with and without
+    :attr:`cnwheat.simulation.Simulation.preserve_positivity`, on the inputs of `test_simulation_run` with the gross photosynthesis
+    of the elements multiplied by increasing factors (see :func:`test_cnwheat.run_stress_scenario`).
+
+    :copyright: Copyright 2014-2017 INRA-ECOSYS, see AUTHORS.
+    :license: CeCILL-C, see LICENSE for details.
+
+"""
+
+SIMULATION_LENGTH = 48
+AG_FACTORS = (1, 3, 10)
+
+
+if __name__ == '__main__':
+    print('{:>10}{:>20}{:>12}{:>10}{:>15}'.format('Ag factor', 'preserve positivity', 'nfev', 'events', 'duration (s)'))
+    for Ag_factor in AG_FACTORS:
+        for preserve_positivity in (False, True):
+            start = time.time()
+            simulation_ = run_stress_scenario(preserve_positivity, SIMULATION_LENGTH, Ag_factor)
+            print('{:>10}{:>20}{:>12}{:>10}{:>15.1f}'.format(Ag_factor, str(preserve_positivity), simulation_.nfev_total, simulation_.nb_events_total, time.time() - start))
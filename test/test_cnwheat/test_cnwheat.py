@@ -1,15 +1,20 @@
 # -*- coding: latin-1 -*-
 
 import glob
+import json
 import os
 import logging
+import tempfile
+import time
 import warnings
 
+import numpy as np
 import pandas as pd
 
 from openalea.cnwheat import simulation as cnwheat_simulation, converter as cnwheat_converter, \
-    tools as cnwheat_tools, postprocessing as cnwheat_postprocessing
+    tools as cnwheat_tools, postprocessing as cnwheat_postprocessing, model as cnwheat_model
 from openalea.respiwheat import model as respiwheat_model
+from openalea.wheatfspm import watchdog as wheatfspm_watchdog
 
 """
     test_cnwheat
@@ -59,7 +64,8 @@ def force_senescence_and_photosynthesis(t, population, senescence_roots_data_gro
             group = senescence_roots_data_grouped.get_group((t, plant.index, axis.label))
             senescence_data_to_use = group.loc[group.first_valid_index(), group.columns.intersection(
                 cnwheat_simulation.Simulation.ORGANS_STATE)].dropna().to_dict()
-            axis.roots.__dict__.update(senescence_data_to_use)
+            for data_name, data_value in senescence_data_to_use.items():
+                setattr(axis.roots, data_name, data_value)
             for phytomer in axis.phytomers:
                 for organ in (phytomer.chaff, phytomer.peduncle, phytomer.lamina, phytomer.internode, phytomer.sheath):
                     if organ is None:
@@ -73,14 +79,16 @@ def force_senescence_and_photosynthesis(t, population, senescence_roots_data_gro
                         senescence_data_to_use = group_senesc.loc[
                             group_senesc.first_valid_index(), group_senesc.columns.intersection(
                                 cnwheat_simulation.Simulation.ELEMENTS_STATE)].dropna().to_dict()
-                        element.__dict__.update(senescence_data_to_use)
+                        for data_name, data_value in senescence_data_to_use.items():
+                            setattr(element, data_name, data_value)
                         # Element photosynthesis
                         group_photo = photosynthesis_elements_data_grouped.get_group(
                             (t, plant.index, axis.label, phytomer.index, organ.label, element.label))
                         photosynthesis_elements_data_to_use = group_photo.loc[
                             group_photo.first_valid_index(), group_photo.columns.intersection(
                                 cnwheat_simulation.Simulation.ELEMENTS_STATE)].dropna().to_dict()
-                        element.__dict__.update(photosynthesis_elements_data_to_use)
+                        for data_name, data_value in photosynthesis_elements_data_to_use.items():
+                            setattr(element, data_name, data_value)
 
 
 def test_simulation_run(overwrite_desired_data=False):
@@ -631,6 +639,119 @@ def test_graphs_generation():
         return
 
 
+def load_simulation_run_inputs(Ag_factor=1):
+    """Load the initial states of `test_simulation_run`, with the gross photosynthesis of the elements multiplied by `Ag_factor`.
+    Return the population, the soils, and the senescence and photosynthesis forcings grouped as expected by `force_senescence_and_photosynthesis`."""
+    inputs_dirpath = os.path.join('simulation_run', 'inputs')
+    inputs_dataframes = [pd.read_csv(os.path.join(inputs_dirpath, inputs_filename))
+                         for inputs_filename in ('organs_initial_state.csv', 'hiddenzones_initial_state.csv', 'elements_initial_state.csv', 'soils_initial_state.csv')]
+    population, soils = cnwheat_converter.from_dataframes(*inputs_dataframes)
+    photosynthesis_elements_data_df = pd.read_csv(os.path.join(inputs_dirpath, 'elements_photosynthesis_forcings.csv'))
+    photosynthesis_elements_data_df['Ag'] *= Ag_factor
+    forcings_grouped = (pd.read_csv(os.path.join(inputs_dirpath, 'roots_senescence_forcings.csv')).groupby(cnwheat_simulation.Simulation.AXES_T_INDEXES),
+                        pd.read_csv(os.path.join(inputs_dirpath, 'elements_senescence_forcings.csv')).groupby(cnwheat_simulation.Simulation.ELEMENTS_T_INDEXES),
+                        photosynthesis_elements_data_df.groupby(cnwheat_simulation.Simulation.ELEMENTS_T_INDEXES))
+    return population, soils, forcings_grouped
+
+
+def run_stress_scenario(preserve_positivity, simulation_length=24, Ag_factor=10):
+    """Run a simulation on the inputs of `test_simulation_run`, with the gross photosynthesis of the elements multiplied by `Ag_factor`,
+    so that the pools of triose phosphates are high at the end of the days and get exhausted at the beginning of the nights.
+    Check that the compartments are non-negative after each run if `preserve_positivity`. Return the simulation."""
+    population, soils, forcings_grouped = load_simulation_run_inputs(Ag_factor)
+    simulation_ = cnwheat_simulation.Simulation(respiration_model=respiwheat_model, delta_t=HOUR_TO_SECOND_CONVERSION_FACTOR, culm_density={1: 410},
+                                                preserve_positivity=preserve_positivity)
+    for t in range(simulation_length):
+        force_senescence_and_photosynthesis(t, population, *forcings_grouped)
+        simulation_.initialize(population, soils)
+        simulation_.run()
+        if preserve_positivity:
+            simulation_._update_initial_conditions()
+            assert min(simulation_.initial_conditions) >= 0
+    return simulation_
+
+
+def test_positivity():
+    """Test the integration with non-negative compartments, with restarts on the exhaustion of the pools."""
+    reference_simulation = run_stress_scenario(False)
+    pools_exhaustion_tolerance = cnwheat_simulation.Simulation.POOLS_EXHAUSTION_TOLERANCE
+    cnwheat_simulation.Simulation.POOLS_EXHAUSTION_TOLERANCE = 1E-8  # restart the integration on the smallest overshoots of the solver
+    try:
+        simulation_ = run_stress_scenario(True)
+    finally:
+        cnwheat_simulation.Simulation.POOLS_EXHAUSTION_TOLERANCE = pools_exhaustion_tolerance
+
+    assert simulation_.nb_events_total > 0
+    # mass balance: the quantities added to the compartments at the last run are negligible
+    assert sum(simulation_.positivity_corrections.values()) <= cnwheat_simulation.Simulation.MASS_BALANCE_TOLERANCE * np.abs(simulation_.initial_conditions).sum()
+    # the compartments are close to the ones of the integration without correction, within the tolerance of the solver
+    reference_simulation._update_initial_conditions()
+    simulation_._update_initial_conditions()
+    np.testing.assert_allclose(simulation_.initial_conditions, reference_simulation.initial_conditions, rtol=1E-2, atol=1E-3)
+
+
+def create_stiff_simulation(watchdog):
+    """Create a simulation on the inputs of `test_simulation_run` at t=0, monitored by `watchdog`, to be integrated with the explicit method RK45.
+    The system of CN-Wheat is stiff: the step size of RK45 is limited by its stability, and RK45 needs about 150 times more evaluations
+    of the derivatives than the default method BDF."""
+    population, soils, forcings_grouped = load_simulation_run_inputs()
+    simulation_ = cnwheat_simulation.Simulation(respiration_model=respiwheat_model, delta_t=HOUR_TO_SECOND_CONVERSION_FACTOR, culm_density={1: 410}, watchdog=watchdog)
+    force_senescence_and_photosynthesis(0, population, *forcings_grouped)
+    simulation_.initialize(population, soils)
+    return simulation_
+
+
+def test_watchdog():
+    """Test that the watchdog aborts the integration of a stiff system by an explicit method within a bounded time, with a diagnostic snapshot,
+    and that it falls back to a method for stiff systems."""
+    solver_options = cnwheat_simulation.Simulation.SOLVER_OPTIONS
+    cnwheat_simulation.Simulation.SOLVER_OPTIONS = {'method': 'RK45'}
+    try:
+        with tempfile.TemporaryDirectory() as snapshot_dirpath:
+            # abort
+            watchdog = wheatfspm_watchdog.SolverWatchdog(max_evaluations_per_hour=2000, max_seconds_per_hour=10., snapshot_dirpath=snapshot_dirpath)
+            simulation_ = create_stiff_simulation(watchdog)
+            start = time.time()
+            try:
+                simulation_.run()
+            except wheatfspm_watchdog.SolverHealthError as error:
+                assert not error.fallback
+                assert error.reason.startswith('more than 2000 evaluations')
+                with open(error.snapshot_path) as snapshot_file:
+                    snapshot = json.load(snapshot_file)
+            else:
+                raise AssertionError('The watchdog did not abort the run')
+            assert time.time() - start < 10.
+            assert snapshot['model'] == 'cnwheat' and snapshot['status'] == wheatfspm_watchdog.ABORT and snapshot['evaluations'] == 2001
+            assert len(snapshot['compartments']) == len(simulation_.initial_conditions)
+            assert '1/MS/roots/sucrose' in snapshot['compartments']
+
+            # fall back to the default fallback method, Radau
+            watchdog = wheatfspm_watchdog.SolverWatchdog(max_evaluations_per_hour=2000, action=wheatfspm_watchdog.FALLBACK, snapshot_dirpath=snapshot_dirpath)
+            simulation_ = create_stiff_simulation(watchdog)
+            simulation_.run()
+            assert [alert[3] for alert in watchdog.alerts] == [True]
+            simulation_._update_initial_conditions()
+            assert np.isfinite(simulation_.initial_conditions).all() and min(simulation_.initial_conditions) >= 0
+    finally:
+        cnwheat_simulation.Simulation.SOLVER_OPTIONS = solver_options
+
+
+def test_model_slots():
+    """Test that the objects of the model store their variables in slots, i.e. without `__dict__`, and that all the variables computed by the simulation can be set."""
+    for model_class, run_variables in ((cnwheat_model.LaminaElement, cnwheat_simulation.Simulation.ELEMENTS_RUN_VARIABLES),
+                                       (cnwheat_model.HiddenZone, cnwheat_simulation.Simulation.HIDDENZONE_RUN_VARIABLES),
+                                       (cnwheat_model.Roots, cnwheat_simulation.Simulation.ORGANS_RUN_VARIABLES),
+                                       (cnwheat_model.Grains, cnwheat_simulation.Simulation.ORGANS_RUN_VARIABLES)):
+        model_object = model_class()
+        assert not hasattr(model_object, '__dict__')
+        for variable_name in run_variables:
+            if variable_name == 'nb_replications':  # property
+                continue
+            setattr(model_object, variable_name, 1.)
+            assert getattr(model_object, variable_name) == 1.
+
+
 if __name__ == '__main__':
     test_simulation_run(overwrite_desired_data=False)
     print('Simulation Run - OK')
@@ -646,3 +767,9 @@ if __name__ == '__main__':
 
     test_graphs_generation()
     print('Simulation Graphs - OK')
+
+    test_model_slots()
+
+    test_positivity()
+
+    test_watchdog()
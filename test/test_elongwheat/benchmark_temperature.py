@@ -0,0 +1,57 @@
+# -*- coding: latin-1 -*-
+
+import timeit
+
+import numpy as np
+
+from openalea.cnwheat import model as cnwheat_model
+from openalea.elongwheat import model as elongwheat_model
+from openalea.wheatfspm import temperature
+
+"""
+    benchmark_temperature
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Compare the duration and the accuracy of the evaluation of the temperature responses of Elong-Wheat and CN-Wheat
+    computed analytically, through the exact caches, and through the lookup tables of :mod:`wheatfspm.temperature`.
+
+    The temperatures are those of an hourly simulation: a few hundreds of distinct values, each one read by all the axes
+    at each time step, and a continuous range of values read when CN-Wheat interpolates the forcings.
+
+    :copyright: Copyright 2014-2015 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+NB_CALLS = 100000
+HOURLY_TEMPERATURES = np.round(np.random.RandomState(0).uniform(-5, 35, 500), 2).tolist()  #: the temperatures rounded as in the meteo files
+CONTINUOUS_TEMPERATURES = np.random.RandomState(1).uniform(-5, 35, NB_CALLS).tolist()  #: the temperatures interpolated within the time steps
+
+FUNCTIONS = {'elongwheat.modified_Arrhenius_equation': elongwheat_model.modified_Arrhenius_equation,
+             'cnwheat.plant.Vmax': cnwheat_model.Plant.calculate_temperature_effect_on_Vmax,
+             'cnwheat.grains.modified_Arrhenius_equation': cnwheat_model.Grains.modified_Arrhenius_equation}
+
+
+def time_calls(make_function, temperatures):
+    """Return the mean duration of a call over `temperatures` repeated up to :data:`NB_CALLS` calls (microseconds),
+    to a function made by `make_function` before each measure, so the caches are empty at the beginning of each measure."""
+    temperatures = (temperatures * (NB_CALLS // len(temperatures) + 1))[:NB_CALLS]
+    durations = []
+    for _ in range(3):
+        function = make_function()
+        durations.append(timeit.timeit(lambda: [function(T) for T in temperatures], number=1))
+    return min(durations) / NB_CALLS * 1E6
+
+
+if __name__ == '__main__':
+    print('{:>45}{:>12}{:>15}{:>15}{:>15}{:>20}'.format('response', 'forcings', 'analytic (us)', 'cached (us)', 'table (us)', 'max relative error'))
+    for name, function in FUNCTIONS.items():
+        tabulated = temperature.TemperatureResponse(function, tabulated=True)  # built once: the tables are built when the parameters are loaded
+        reference_value = function(20.)
+        for forcings, temperatures in (('hourly', HOURLY_TEMPERATURES), ('continuous', CONTINUOUS_TEMPERATURES)):
+            max_error = max(abs(tabulated(T) - function(T)) for T in temperatures) / reference_value
+            print('{:>45}{:>12}{:>15.3f}{:>15.3f}{:>15.3f}{:>20.2e}'.format(name, forcings,
+                                                                            time_calls(lambda: function, temperatures),
+                                                                            time_calls(lambda: temperature.TemperatureResponse(function), temperatures),
+                                                                            time_calls(lambda: tabulated, temperatures),
+                                                                            max_error))
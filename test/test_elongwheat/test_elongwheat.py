@@ -4,7 +4,8 @@ import os
 import numpy as np
 import pandas as pd
 
-from openalea.elongwheat import simulation, converter
+from openalea.elongwheat import simulation, converter, model
+from openalea.wheatfspm import temperature
 
 """
     test_elongwheat
@@ -135,5 +136,129 @@ def test_run(overwrite_desired_data=False):
         print('{} OK!'.format(actual_outputs_filename))
 
 
+def replicate_inputs(inputs_df, nb_plants):
+    """Replicate the inputs on `nb_plants` plants, with duplicated rows of other values in half of the plants, in random order."""
+    replicates = []
+    float_columns = inputs_df.select_dtypes(include='float').columns
+    for plant in range(1, nb_plants + 1):
+        replicate = inputs_df.assign(plant=plant)
+        replicates.append(replicate)
+        if plant % 2:
+            duplicate = replicate.copy()
+            duplicate[float_columns] *= 2
+            replicates.append(duplicate)
+    return pd.concat(replicates, ignore_index=True).sample(frac=1, random_state=0).reset_index(drop=True)
+
+
+def assert_same_inputs(actual_inputs, desired_inputs):
+    """Check that the inputs have the same ids, in the same order, with the same values and types."""
+    assert list(actual_inputs.keys()) == list(desired_inputs.keys())
+    for inputs_id, desired_inputs_values in desired_inputs.items():
+        assert repr(actual_inputs[inputs_id]) == repr(desired_inputs_values), inputs_id
+
+
+def groupby_from_dataframes(hiddenzone_inputs, element_inputs, axis_inputs):
+    """Convert the inputs with :meth:`pandas.DataFrame.groupby`, as in the previous versions of :func:`converter.from_dataframes`."""
+    all_hiddenzone_dict, all_element_dict, all_axis_dict, all_length_dict, cumulated_internode_length = {}, {}, {}, {}, {}
+    for axis_inputs_id, axis_inputs_group in axis_inputs.groupby(converter.AXIS_TOPOLOGY_COLUMNS):
+        axis_inputs_series = axis_inputs_group.loc[axis_inputs_group.first_valid_index()]
+        all_axis_dict[axis_inputs_id] = axis_inputs_series[axis_inputs.columns.difference(converter.AXIS_TOPOLOGY_COLUMNS)].to_dict()
+        all_length_dict[axis_inputs_id] = {i + 1: {'sheath': [], 'cumulated_internode': []} for i in range(all_axis_dict[axis_inputs_id]['nb_leaves'])}
+        cumulated_internode_length[axis_inputs_id] = []
+
+    for element_inputs_id, element_inputs_group in sorted(element_inputs.groupby(converter.ELEMENT_TOPOLOGY_COLUMNS)):
+        element_inputs_series = element_inputs_group.loc[element_inputs_group.first_valid_index()]
+        element_inputs_dict = element_inputs_series[element_inputs.columns.difference(converter.ELEMENT_TOPOLOGY_COLUMNS)].to_dict()
+        all_element_dict[element_inputs_id] = element_inputs_dict
+        axis_id, phytomer_id, organ = element_inputs_id[:2], element_inputs_id[2], element_inputs_id[3]
+        if organ == 'sheath' and not element_inputs_dict['is_growing']:
+            all_length_dict[axis_id][phytomer_id]['sheath'].append(element_inputs_dict['length'])
+        elif organ == 'internode' and not element_inputs_dict['is_growing']:
+            cumulated_internode_length[axis_id].append(element_inputs_dict['length'])
+            if not all_length_dict[axis_id][phytomer_id]['cumulated_internode']:
+                all_length_dict[axis_id][phytomer_id]['cumulated_internode'].extend(cumulated_internode_length[axis_id])
+            else:
+                all_length_dict[axis_id][phytomer_id]['cumulated_internode'].append(element_inputs_dict['length'])
+
+    for hiddenzone_inputs_id, hiddenzone_inputs_group in sorted(hiddenzone_inputs.groupby(converter.HIDDENZONE_TOPOLOGY_COLUMNS)):
+        hiddenzone_inputs_series = hiddenzone_inputs_group.loc[hiddenzone_inputs_group.first_valid_index()]
+        hiddenzone_inputs_dict = hiddenzone_inputs_series[hiddenzone_inputs.columns.difference(converter.HIDDENZONE_TOPOLOGY_COLUMNS)].to_dict()
+        all_hiddenzone_dict[hiddenzone_inputs_id] = hiddenzone_inputs_dict
+        axis_id, phytomer_id = hiddenzone_inputs_id[:2], hiddenzone_inputs_id[2]
+        if hiddenzone_inputs_dict['leaf_is_emerged'] and hiddenzone_inputs_dict['leaf_is_growing']:
+            all_length_dict[axis_id][phytomer_id]['sheath'].append(max(0, hiddenzone_inputs_dict['leaf_L'] - hiddenzone_inputs_dict['lamina_Lmax']))
+        if hiddenzone_inputs_dict['internode_is_growing']:
+            cumulated_internode_length[axis_id].append(hiddenzone_inputs_dict['internode_L'])
+            all_length_dict[axis_id][phytomer_id]['cumulated_internode'].extend(cumulated_internode_length[axis_id])
+        elif not hiddenzone_inputs_dict['internode_is_growing'] and \
+                hiddenzone_inputs_id + ('internode',) not in element_inputs.groupby(converter.ELEMENT_TOPOLOGY_COLUMNS[:-1]).groups.keys():
+            all_length_dict[axis_id][phytomer_id]['cumulated_internode'].extend(cumulated_internode_length[axis_id])
+
+    return {'hiddenzone': all_hiddenzone_dict, 'elements': all_element_dict, 'axes': all_axis_dict, 'sheath_internode_lengths': all_length_dict}
+
+
+def test_from_dataframes():
+    hiddenzone_inputs_df = pd.read_csv(os.path.join(INPUTS_DIRPATH, HIDDENZONES_INPUTS_FILENAME))
+    element_inputs_df = pd.read_csv(os.path.join(INPUTS_DIRPATH, ELEMENTS_INPUTS_FILENAME))
+    axis_inputs_df = pd.read_csv(os.path.join(INPUTS_DIRPATH, AXES_INPUTS_FILENAME))
+    # add mature internodes below the mature sheaths, and a hidden zone with a growing internode
+    mature_sheaths_df = element_inputs_df[(element_inputs_df['organ'] == 'sheath') & ~element_inputs_df['is_growing']]
+    internodes_df = mature_sheaths_df.assign(organ='internode', length=0.01 * mature_sheaths_df['metamer'])
+    element_inputs_df = pd.concat([element_inputs_df, internodes_df], ignore_index=True)
+    hiddenzone_inputs_df.loc[hiddenzone_inputs_df.index[-1], 'internode_is_growing'] = False
+
+    hiddenzone_inputs_df, element_inputs_df, axis_inputs_df = [replicate_inputs(inputs_df, 50).where(lambda df: df.notnull(), None)
+                                                               for inputs_df in (hiddenzone_inputs_df, element_inputs_df, axis_inputs_df)]
+    inputs = converter.from_dataframes(hiddenzone_inputs_df, element_inputs_df, axis_inputs_df)
+    desired_inputs = groupby_from_dataframes(hiddenzone_inputs_df, element_inputs_df, axis_inputs_df)
+    assert list(inputs.keys()) == list(desired_inputs.keys())
+    for inputs_type in desired_inputs:
+        assert_same_inputs(inputs[inputs_type], desired_inputs[inputs_type])
+    assert any(lengths['cumulated_internode'] for lengths in inputs['sheath_internode_lengths'][(1, 'MS')].values())
+
+
+def test_ligule_heights():
+    axis_id = (1, 'MS')
+    sheath_internode_lengths = {1: {'sheath': [0.02], 'cumulated_internode': []},
+                                2: {'sheath': [0.01], 'cumulated_internode': [0.005]},
+                                3: {'sheath': [0.04], 'cumulated_internode': [0.005, 0.01]},
+                                4: {'sheath': [0.05], 'cumulated_internode': []}}
+    all_element_inputs = {axis_id + (phytomer_id, 'blade', 'LeafElement1'): {'is_growing': phytomer_id == 4} for phytomer_id in sheath_internode_lengths}
+    ligule_heights = model.calculate_ligule_height(sheath_internode_lengths, all_element_inputs, axis_id)
+
+    np.testing.assert_array_equal(ligule_heights[0], [1, 2, 3])
+    np.testing.assert_allclose(ligule_heights[1], [0.02, 0.02, 0.055])
+
+    # the highest previous ligule is not necessarily the ligule of the previous phytomer
+    np.testing.assert_allclose(model.calculate_leaf_pseudostem_length(ligule_heights, 0.005, 3), 0.015)
+    np.testing.assert_allclose(model.calculate_internode_distance_to_emerge(ligule_heights, 0.015, 4, 0.01), 0.05)
+    np.testing.assert_raises(ValueError, model.calculate_top_ligule_height, ligule_heights, 1)
+
+
+def test_temperature_responses():
+    temperatures = np.arange(-10., 45., 0.037)
+    responses = temperature.TemperatureResponses()
+    response = responses.register('modified_Arrhenius_equation', model.modified_Arrhenius_equation)
+
+    # the exact cache gives the analytic values
+    for _ in range(2):
+        for T in temperatures:
+            assert response(T) == model.modified_Arrhenius_equation(T)
+
+    # the lookup table is accurate, including around the transitions at 0 and 9 degrees Celsius, and falls back to the analytic values out of its bounds
+    responses.configure(tabulated=True)
+    response = responses['modified_Arrhenius_equation']
+    reference_value = model.modified_Arrhenius_equation(model.parameters.Temp_Tref)
+    for T in np.concatenate((temperatures, [0., 9., -1E-9, 9 + 1E-9])):
+        np.testing.assert_allclose(response(T) / reference_value, model.modified_Arrhenius_equation(T) / reference_value, rtol=0, atol=1E-5)
+    assert response(temperature.TABLE_T_MAX + 1) == model.modified_Arrhenius_equation(temperature.TABLE_T_MAX + 1)
+
+    # the responses of the model are registered in the shared service
+    assert model.calculate_time_equivalent_Tref(15., 3600) == 3600 * model.modified_Arrhenius_equation(15.) / reference_value
+
+
 if __name__ == '__main__':
     test_run(overwrite_desired_data=False)
+    test_from_dataframes()
+    test_ligule_heights()
+    test_temperature_responses()
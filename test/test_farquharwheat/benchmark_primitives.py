@@ -0,0 +1,93 @@
+# -*- coding: latin-1 -*-
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from openalea.farquharwheat import converter, model, parameters, simulation
+
+"""
+    benchmark_primitives
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Compare the computation of the photosynthesis at primitive scale, with one call to :func:`farquharwheat.model.run` per primitive
+    as previously done in :meth:`farquharwheat.simulation.Simulation.run`, to the current computation vectorized across the primitives
+    of all the elements, and to the computation at element scale. The canopy has 50 plants of 300 primitives by element.
+    Check that both computations at primitive scale give the same outputs.
+
+    :copyright: Copyright 2014-2015 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+NB_PLANTS = 50
+NB_PRIMITIVES_BY_ELEMENT = 300
+
+METEO = {'Ta': 18.8, 'ambient_CO2': 360, 'RH': 0.53, 'Ur': 2.2}
+
+INPUTS_DIRPATH = os.path.dirname(__file__)
+
+
+def create_inputs():
+    """Replicate the inputs of the tests on `NB_PLANTS` plants, and add random primitives to the elements."""
+    elements_inputs_df = pd.read_csv(os.path.join(INPUTS_DIRPATH, 'elements_inputs.csv'))
+    axes_inputs_df = pd.read_csv(os.path.join(INPUTS_DIRPATH, 'axes_inputs.csv'))
+    inputs = converter.from_dataframe(pd.concat([elements_inputs_df.assign(plant=plant) for plant in range(1, NB_PLANTS + 1)], ignore_index=True),
+                                      pd.concat([axes_inputs_df.assign(plant=plant) for plant in range(1, NB_PLANTS + 1)], ignore_index=True))
+    random_state = np.random.RandomState(0)
+    for element_inputs in inputs['elements'].values():
+        element_inputs['PARa_prim'] = random_state.uniform(0, 600, NB_PRIMITIVES_BY_ELEMENT).tolist()
+        element_inputs['area_prim'] = random_state.uniform(0, 1E-4, NB_PRIMITIVES_BY_ELEMENT).tolist()
+        element_inputs['PARa'] = float(np.average(element_inputs['PARa_prim'], weights=element_inputs['area_prim']))
+    return inputs
+
+
+def run_primitives_scalar(inputs):
+    """Run the model for each primitive of each element, as in the previous versions of the simulation."""
+    outputs = {}
+    for element_id, element_inputs in inputs['elements'].items():
+        if element_id[1] != 'MS' or element_inputs['height'] is None:
+            continue
+        surfacic_nitrogen = simulation.Simulation._calculate_surfacic_nitrogen(element_inputs)
+        surfacic_NSC = model.calculate_surfacic_WSC(element_inputs['sucrose'], element_inputs['starch'], element_inputs['fructan'], element_inputs['green_area'])
+        Ag_prim_list = []
+        for PARa_prim in element_inputs['PARa_prim']:
+            Ag_prim, An, Rd, Tr, Ts, gs = model.run(surfacic_nitrogen, parameters.NSC_Retroinhibition, surfacic_NSC, element_inputs['width'], element_inputs['height'],
+                                                    PARa_prim, METEO['Ta'], METEO['ambient_CO2'], METEO['RH'], METEO['Ur'], element_id[3],
+                                                    inputs['axes'][element_id[:2]]['height_canopy'])
+            Ag_prim_list.append(Ag_prim)
+        Ag = sum([Ag_prim * area_prim for Ag_prim, area_prim in zip(Ag_prim_list, element_inputs['area_prim'])]) / sum(element_inputs['area_prim'])
+        outputs[element_id] = [Ag, An, Rd, Tr, Ts, gs]
+    return outputs
+
+
+def run_simulation(inputs, prim_scale):
+    """Run the simulation at primitive scale or at element scale."""
+    parameters.prim_scale = prim_scale
+    simulation_ = simulation.Simulation()
+    simulation_.initialize(inputs)
+    simulation_.run(**METEO)
+    return {element_id: [element_outputs[name] for name in ('Ag', 'An', 'Rd', 'Tr', 'Ts', 'gs')] for element_id, element_outputs in simulation_.outputs.items()}
+
+
+if __name__ == '__main__':
+    inputs = create_inputs()
+    nb_elements = len(inputs['elements'])
+    print('{} elements, {} primitives'.format(nb_elements, nb_elements * NB_PRIMITIVES_BY_ELEMENT))
+
+    results, durations = {}, {}
+    for name, run in (('primitives (scalar)', run_primitives_scalar),
+                      ('primitives', lambda inputs_: run_simulation(inputs_, True)),
+                      ('elements', lambda inputs_: run_simulation(inputs_, False))):
+        start = time.time()
+        results[name] = run(inputs)
+        durations[name] = time.time() - start
+        print('{:<22}{:>10.3f} s'.format(name, durations[name]))
+    parameters.prim_scale = False
+
+    print('speed-up at primitive scale: {:.1f}'.format(durations['primitives (scalar)'] / durations['primitives']))
+    print('primitive scale / element scale: {:.1f}'.format(durations['primitives'] / durations['elements']))
+    for element_id, desired_outputs in results['primitives (scalar)'].items():
+        np.testing.assert_allclose(results['primitives'][element_id], desired_outputs, rtol=1e-9, atol=1e-12, err_msg=str(element_id))
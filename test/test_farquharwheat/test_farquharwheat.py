@@ -5,7 +5,7 @@ import os
 import numpy as np
 import pandas as pd
 
-from openalea.farquharwheat import simulation, converter
+from openalea.farquharwheat import simulation, converter, model, parameters
 
 """
     test_farquhar_wheat
@@ -79,5 +79,196 @@ def test_run(overwrite_desired_data=False):
     compare_actual_to_desired('.', outputs_df, DESIRED_OUTPUTS_FILENAME, ACTUAL_OUTPUTS_FILENAME, overwrite_desired_data)
 
 
+def replicate_inputs(inputs_df, nb_plants):
+    """Replicate the inputs on `nb_plants` plants, with duplicated rows of other values in half of the plants, in random order."""
+    replicates = []
+    float_columns = inputs_df.select_dtypes(include='float').columns
+    for plant in range(1, nb_plants + 1):
+        replicate = inputs_df.assign(plant=plant)
+        replicates.append(replicate)
+        if plant % 2:
+            duplicate = replicate.copy()
+            duplicate[float_columns] *= 2
+            replicates.append(duplicate)
+    return pd.concat(replicates, ignore_index=True).sample(frac=1, random_state=0).reset_index(drop=True)
+
+
+def assert_same_inputs(actual_inputs, desired_inputs):
+    """Check that the inputs have the same ids, in the same order, with the same values and types."""
+    assert list(actual_inputs.keys()) == list(desired_inputs.keys())
+    for inputs_id, desired_inputs_values in desired_inputs.items():
+        assert repr(actual_inputs[inputs_id]) == repr(desired_inputs_values), inputs_id
+
+
+def groupby_from_dataframe(inputs_df, topology_columns):
+    """Convert the inputs with :meth:`pandas.DataFrame.groupby`, as in the previous versions of the converter."""
+    data_columns = inputs_df.columns.difference(topology_columns)
+    return {current_id: current_group.loc[current_group.first_valid_index()][data_columns].to_dict()
+            for current_id, current_group in inputs_df.groupby(topology_columns)}
+
+
+def test_dark_period():
+    # night: no absorbed PAR
+    elements_inputs_df = pd.read_csv(INPUTS_ELEMENT_FILENAME)
+    elements_inputs_df['PARa'] = 0.
+    axes_inputs_df = pd.read_csv(INPUTS_AXIS_FILENAME)
+
+    outputs_dfs = []
+    for dark_period in (False, True, None):
+        simulation_ = simulation.Simulation()
+        simulation_.initialize(converter.from_dataframe(elements_inputs_df, axes_inputs_df))
+        if dark_period is None:
+            assert simulation_.is_dark_period()
+        simulation_.run(Ta=12.5, ambient_CO2=360, RH=0.8, Ur=1.5, dark_period=dark_period)
+        outputs_dfs.append(converter.to_dataframe(simulation_.outputs))
+
+    full_outputs_df, dark_outputs_df, default_outputs_df = outputs_dfs
+    assert (dark_outputs_df['Ag'] == 0).all()
+    numerical_columns = full_outputs_df.columns.difference(['axis', 'organ', 'element'])
+    for outputs_df in (dark_outputs_df, default_outputs_df):
+        np.testing.assert_allclose(outputs_df[numerical_columns].values.astype(float), full_outputs_df[numerical_columns].values.astype(float),
+                                   RELATIVE_TOLERANCE, ABSOLUTE_TOLERANCE)
+
+
+def add_primitives(inputs, random_state):
+    """Add random primitives to the elements, with one element without primitive and some primitives without absorbed PAR."""
+    for i, element_inputs in enumerate(inputs['elements'].values()):
+        nb_primitives = 0 if i == 2 else random_state.randint(1, 40)
+        element_inputs['PARa_prim'] = (random_state.uniform(0, 600, nb_primitives) * (random_state.rand(nb_primitives) > 0.2)).tolist()
+        element_inputs['area_prim'] = random_state.uniform(0, 1E-4, nb_primitives).tolist() if nb_primitives else 0
+
+
+def run_primitives_scalar(inputs, Ta, ambient_CO2, RH, Ur):
+    """Run the model for each primitive of each element, as in the previous versions of the simulation. Skip the elements without primitive."""
+    outputs = {}
+    for element_id, element_inputs in inputs['elements'].items():
+        if element_id[1] != 'MS' or element_inputs['height'] is None or not element_inputs['PARa_prim']:
+            continue
+        surfacic_nitrogen = simulation.Simulation._calculate_surfacic_nitrogen(element_inputs)
+        surfacic_NSC = model.calculate_surfacic_WSC(element_inputs['sucrose'], element_inputs['starch'], element_inputs['fructan'], element_inputs['green_area'])
+        Ag_prim_list = []
+        for PARa_prim in element_inputs['PARa_prim']:
+            Ag_prim, An, Rd, Tr, Ts, gs = model.run(surfacic_nitrogen, parameters.NSC_Retroinhibition, surfacic_NSC, element_inputs['width'], element_inputs['height'],
+                                                    PARa_prim, Ta, ambient_CO2, RH, Ur, element_id[3], inputs['axes'][element_id[:2]]['height_canopy'])
+            Ag_prim_list.append(Ag_prim)
+        Ag = sum([Ag_prim * area_prim for Ag_prim, area_prim in zip(Ag_prim_list, element_inputs['area_prim'])]) / sum(element_inputs['area_prim'])
+        outputs[element_id] = [Ag, An, Rd, Tr, Ts, gs]
+    return outputs
+
+
+def test_run_primitives():
+    inputs = converter.from_dataframe(pd.read_csv(INPUTS_ELEMENT_FILENAME), pd.read_csv(INPUTS_AXIS_FILENAME))
+    add_primitives(inputs, np.random.RandomState(0))
+    desired_outputs = run_primitives_scalar(inputs, Ta=18.8, ambient_CO2=360, RH=0.53, Ur=2.2)
+
+    # the primitives of the elements from their inputs, then from a store filled with the primitives of all the elements
+    primitives = simulation.PrimitivesStore()
+    elements_with_primitives = [element_id for element_id, element_inputs in inputs['elements'].items() if element_inputs['PARa_prim']]
+    primitives.fill({i: [PARa_prim / 1000. for PARa_prim in inputs['elements'][element_id]['PARa_prim']] for i, element_id in enumerate(elements_with_primitives)},
+                    {i: inputs['elements'][element_id]['area_prim'] for i, element_id in enumerate(elements_with_primitives)}, energy=1000.)
+    primitives = primitives.select(range(len(elements_with_primitives)), elements_with_primitives)
+
+    try:
+        for current_primitives in (None, primitives):
+            simulation_ = simulation.Simulation(update_parameters={'prim_scale': True})
+            simulation_.initialize(inputs, current_primitives)
+            simulation_.run(Ta=18.8, ambient_CO2=360, RH=0.53, Ur=2.2)
+            for element_id, element_inputs in inputs['elements'].items():
+                element_outputs = simulation_.outputs[element_id]
+                if element_id in desired_outputs:
+                    actual_outputs = [element_outputs[name] for name in ('Ag', 'An', 'Rd', 'Tr', 'Ts', 'gs')]
+                    np.testing.assert_allclose(actual_outputs, desired_outputs[element_id], 1E-9, 1E-12, err_msg=str(element_id))
+                elif element_inputs['height'] is not None:  # element without primitive
+                    assert element_outputs['Ag'] == 0
+    finally:
+        parameters.prim_scale = False
+
+
+def run_day(elements_inputs_df, axes_inputs_df):
+    """Run a simulation on a full day of hourly forcings. Return the mean number of iterations of the solver and the outputs of the light hours."""
+    simulation_ = simulation.Simulation()
+    mean_iterations, outputs = [], []
+    for hour in range(24):
+        PARi = max(0., 1500. * np.sin((hour - 6) / 12. * np.pi))
+        elements_inputs_df = elements_inputs_df.assign(PARa=PARi * np.linspace(0.1, 0.8, len(elements_inputs_df)))
+        simulation_.initialize(converter.from_dataframe(elements_inputs_df, axes_inputs_df))
+        simulation_.run(Ta=15 + 6 * np.sin((hour - 9) / 12. * np.pi), ambient_CO2=360, RH=0.6 - 0.2 * np.sin((hour - 9) / 12. * np.pi), Ur=2.)
+        assert not simulation_.solver_statistics.failures
+        if PARi > 0:
+            mean_iterations.append(simulation_.solver_statistics.mean_iterations)
+            outputs.append(converter.to_dataframe(simulation_.outputs)[['Ag', 'An', 'Rd', 'Tr', 'Ts', 'gs']].values)
+    return np.mean(mean_iterations), np.array(outputs)
+
+
+def test_solver():
+    elements_inputs_df = pd.read_csv(INPUTS_ELEMENT_FILENAME)
+    axes_inputs_df = pd.read_csv(INPUTS_AXIS_FILENAME)
+    solver_parameters = {name: getattr(parameters, name) for name in ('DELTA_CONVERGENCE', 'WARM_START', 'ANDERSON_ACCELERATION')}
+    try:
+        # reference: cold-started plain fixed point, tightly converged
+        parameters.WARM_START, parameters.ANDERSON_ACCELERATION, parameters.DELTA_CONVERGENCE = False, False, 1E-10
+        _, converged_outputs = run_day(elements_inputs_df, axes_inputs_df)
+        parameters.DELTA_CONVERGENCE = solver_parameters['DELTA_CONVERGENCE']
+        cold_mean_iterations, _ = run_day(elements_inputs_df, axes_inputs_df)
+        # warm-started and accelerated fixed point, with the default tolerance
+        parameters.WARM_START, parameters.ANDERSON_ACCELERATION = True, True
+        warm_mean_iterations, warm_outputs = run_day(elements_inputs_df, axes_inputs_df)
+    finally:
+        for name, value in solver_parameters.items():
+            setattr(parameters, name, value)
+
+    assert warm_mean_iterations < cold_mean_iterations
+    # the errors are within the tolerance of the solver, relatively to the range of each output over the day
+    errors = np.abs(warm_outputs - converged_outputs).max(axis=(0, 1))
+    assert (errors <= 2 * solver_parameters['DELTA_CONVERGENCE'] * np.abs(converged_outputs).max(axis=(0, 1))).all(), errors
+
+
+def test_run_update_parameters():
+    # the parameters updated for a run are restored after the run
+    simulation_ = simulation.Simulation()
+    simulation_.initialize(converter.from_dataframe(pd.read_csv(INPUTS_ELEMENT_FILENAME), pd.read_csv(INPUTS_AXIS_FILENAME)))
+    MAX_ITERATIONS = parameters.MAX_ITERATIONS
+    simulation_.run(Ta=18.8, ambient_CO2=360, RH=0.53, Ur=2.2, update_parameters={'MAX_ITERATIONS': 1})
+    assert parameters.MAX_ITERATIONS == MAX_ITERATIONS
+    assert simulation_.solver_statistics.mean_iterations == 1
+    simulation_.run(Ta=18.8, ambient_CO2=360, RH=0.53, Ur=2.2)
+    assert simulation_.solver_statistics.mean_iterations > 1
+
+
+def test_warm_start_vectorized():
+    # the vectorized model starts from the same initial values as the scalar one, NaN for a cold start
+    organs_names = ['blade', 'sheath', 'internode', 'blade']
+    surfacic_nitrogen, surfacic_NSC = np.array([2.5, 1.5, 1., 2.]), np.array([3E5, 2E5, 1E5, 5E4])
+    width, height, height_canopy = np.array([0.01, 0.003, 0.004, 0.012]), np.array([0.3, 0.2, 0.1, 0.4]), np.full(4, 0.5)
+    PAR = np.array([800., 300., 50., 0.])
+    Ci_init, Ts_init = np.array([250., np.nan, 300., 360.]), np.array([19., 17., np.nan, 14.])
+    solver_parameters = {name: getattr(parameters, name) for name in ('WARM_START', 'ANDERSON_ACCELERATION')}
+    try:
+        for parameters.ANDERSON_ACCELERATION in (False, True):
+            vectorized_outputs = model.run_vectorized(surfacic_nitrogen, parameters.NSC_Retroinhibition, surfacic_NSC, width, height, PAR, 18., 360., 0.6, 2.,
+                                                      organs_names, height_canopy, Ci_init, Ts_init)
+            for i, organ_name in enumerate(organs_names):
+                scalar_outputs = model.run(surfacic_nitrogen[i], parameters.NSC_Retroinhibition, surfacic_NSC[i], width[i], height[i], PAR[i], 18., 360., 0.6, 2.,
+                                           organ_name, height_canopy[i], None if np.isnan(Ci_init[i]) else Ci_init[i], None if np.isnan(Ts_init[i]) else Ts_init[i])
+                np.testing.assert_allclose([outputs[i] for outputs in vectorized_outputs], scalar_outputs, 1E-9, 1E-12, err_msg=organ_name)
+    finally:
+        for name, value in solver_parameters.items():
+            setattr(parameters, name, value)
+
+
+def test_from_dataframe():
+    elements_inputs_df = replicate_inputs(pd.read_csv(INPUTS_ELEMENT_FILENAME), 50)
+    axes_inputs_df = replicate_inputs(pd.read_csv(INPUTS_AXIS_FILENAME), 50)
+    inputs = converter.from_dataframe(elements_inputs_df, axes_inputs_df)
+    assert_same_inputs(inputs['elements'], groupby_from_dataframe(elements_inputs_df, converter.ELEMENT_TOPOLOGY_COLUMNS))
+    assert_same_inputs(inputs['axes'], groupby_from_dataframe(axes_inputs_df, converter.AXIS_TOPOLOGY_COLUMNS))
+
+
 if __name__ == '__main__':
     test_run()
+    test_dark_period()
+    test_run_primitives()
+    test_solver()
+    test_run_update_parameters()
+    test_warm_start_vectorized()
+    test_from_dataframe()
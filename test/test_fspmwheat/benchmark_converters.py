@@ -0,0 +1,136 @@
+# -*- coding: latin-1 -*-
+
+import os
+import time
+
+import pandas as pd
+
+from openalea.elongwheat import converter as elongwheat_converter
+from openalea.farquharwheat import converter as farquharwheat_converter
+from openalea.growthwheat import converter as growthwheat_converter
+from openalea.senescwheat import converter as senescwheat_converter
+
+"""
+    benchmark_converters
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Compare the conversion of the inputs dataframes of Elong-Wheat, Senesc-Wheat, Growth-Wheat and Farquhar-Wheat
+    with :meth:`pandas.DataFrame.groupby`, as previously done in the converters, to the conversion of the current converters,
+    on inputs of 10000 rows by dataframe. Check that both conversions give the same dictionaries.
+
+    The previous conversion of Elong-Wheat grouped the elements again for each hidden zone, so its duration is quadratic in the
+    number of rows: it is measured on 1000 rows only.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+NB_ROWS = 10000
+#: the number of rows of the inputs of the previous conversion of Elong-Wheat
+ELONGWHEAT_GROUPBY_NB_ROWS = 1000
+
+TEST_DIRPATH = os.path.join(os.path.dirname(__file__), os.pardir)
+
+
+def read_inputs(package_dirname, inputs_filename, nb_rows=NB_ROWS):
+    """Read inputs of the tests of a package, and replicate them on as many plants as needed to get `nb_rows` rows."""
+    inputs_df = pd.read_csv(os.path.join(TEST_DIRPATH, package_dirname, inputs_filename))
+    nb_plants = -(-nb_rows // len(inputs_df))
+    replicated_inputs_df = pd.concat([inputs_df.assign(plant=plant) for plant in range(1, nb_plants + 1)], ignore_index=True)
+    return replicated_inputs_df.iloc[:nb_rows].where(lambda df: df.notnull(), None)
+
+
+def groupby_from_dataframe(inputs_df, topology_columns):
+    data_columns = inputs_df.columns.difference(topology_columns)
+    return {current_id: current_group.loc[current_group.first_valid_index()][data_columns].to_dict()
+            for current_id, current_group in inputs_df.groupby(topology_columns)}
+
+
+def elongwheat_groupby_from_dataframes(hiddenzone_inputs, element_inputs, axis_inputs):
+    all_length_dict, cumulated_internode_length = {}, {}
+    all_axis_dict = groupby_from_dataframe(axis_inputs, elongwheat_converter.AXIS_TOPOLOGY_COLUMNS)
+    for axis_id, axis_inputs_dict in all_axis_dict.items():
+        all_length_dict[axis_id] = {i + 1: {'sheath': [], 'cumulated_internode': []} for i in range(axis_inputs_dict['nb_leaves'])}
+        cumulated_internode_length[axis_id] = []
+
+    all_element_dict = groupby_from_dataframe(element_inputs, elongwheat_converter.ELEMENT_TOPOLOGY_COLUMNS)
+    for element_id, element_inputs_dict in all_element_dict.items():
+        axis_id, phytomer_id, organ = element_id[:2], element_id[2], element_id[3]
+        if organ == 'sheath' and not element_inputs_dict['is_growing']:
+            all_length_dict[axis_id][phytomer_id]['sheath'].append(element_inputs_dict['length'])
+        elif organ == 'internode' and not element_inputs_dict['is_growing']:
+            cumulated_internode_length[axis_id].append(element_inputs_dict['length'])
+            if not all_length_dict[axis_id][phytomer_id]['cumulated_internode']:
+                all_length_dict[axis_id][phytomer_id]['cumulated_internode'].extend(cumulated_internode_length[axis_id])
+            else:
+                all_length_dict[axis_id][phytomer_id]['cumulated_internode'].append(element_inputs_dict['length'])
+
+    all_hiddenzone_dict = groupby_from_dataframe(hiddenzone_inputs, elongwheat_converter.HIDDENZONE_TOPOLOGY_COLUMNS)
+    for hiddenzone_id, hiddenzone_inputs_dict in all_hiddenzone_dict.items():
+        axis_id, phytomer_id = hiddenzone_id[:2], hiddenzone_id[2]
+        if hiddenzone_inputs_dict['leaf_is_emerged'] and hiddenzone_inputs_dict['leaf_is_growing']:
+            all_length_dict[axis_id][phytomer_id]['sheath'].append(max(0, hiddenzone_inputs_dict['leaf_L'] - hiddenzone_inputs_dict['lamina_Lmax']))
+        if hiddenzone_inputs_dict['internode_is_growing']:
+            cumulated_internode_length[axis_id].append(hiddenzone_inputs_dict['internode_L'])
+            all_length_dict[axis_id][phytomer_id]['cumulated_internode'].extend(cumulated_internode_length[axis_id])
+        elif not hiddenzone_inputs_dict['internode_is_growing'] and \
+                hiddenzone_id + ('internode',) not in element_inputs.groupby(elongwheat_converter.ELEMENT_TOPOLOGY_COLUMNS[:-1]).groups.keys():
+            all_length_dict[axis_id][phytomer_id]['cumulated_internode'].extend(cumulated_internode_length[axis_id])
+
+    return {'hiddenzone': all_hiddenzone_dict, 'elements': all_element_dict, 'axes': all_axis_dict, 'sheath_internode_lengths': all_length_dict}
+
+
+def senescwheat_groupby_from_dataframes(roots_inputs, axes_inputs, elements_inputs):
+    return {'roots': groupby_from_dataframe(roots_inputs, senescwheat_converter.ROOTS_TOPOLOGY_COLUMNS),
+            'axes': groupby_from_dataframe(axes_inputs, senescwheat_converter.AXES_TOPOLOGY_COLUMNS),
+            'elements': groupby_from_dataframe(elements_inputs, senescwheat_converter.ELEMENTS_TOPOLOGY_COLUMNS)}
+
+
+def growthwheat_groupby_from_dataframes(hiddenzone_inputs, element_inputs, root_inputs, axis_inputs):
+    return {'hiddenzone': groupby_from_dataframe(hiddenzone_inputs, growthwheat_converter.HIDDENZONE_TOPOLOGY_COLUMNS),
+            'elements': groupby_from_dataframe(element_inputs, growthwheat_converter.ELEMENT_TOPOLOGY_COLUMNS),
+            'roots': groupby_from_dataframe(root_inputs, growthwheat_converter.ROOT_TOPOLOGY_COLUMNS),
+            'axes': groupby_from_dataframe(axis_inputs, growthwheat_converter.AXIS_TOPOLOGY_COLUMNS)}
+
+
+def farquharwheat_groupby_from_dataframe(element_inputs, axes_inputs):
+    return {'elements': groupby_from_dataframe(element_inputs, farquharwheat_converter.ELEMENT_TOPOLOGY_COLUMNS),
+            'axes': groupby_from_dataframe(axes_inputs, farquharwheat_converter.AXIS_TOPOLOGY_COLUMNS)}
+
+
+def run_benchmark(name, groupby_conversion, conversion, read_all_inputs, groupby_nb_rows=NB_ROWS):
+    """
+    Time the previous and the current conversions of the inputs of a model, and check that they give the same dictionaries.
+
+    :param str name: the name of the model
+    :param function groupby_conversion: the previous conversion, with :meth:`pandas.DataFrame.groupby`
+    :param function conversion: the current conversion
+    :param function read_all_inputs: read all the inputs dataframes of the model, with a given number of rows
+    :param int groupby_nb_rows: the number of rows of the inputs of the previous conversion
+    """
+    durations_per_row = []
+    for current_conversion, nb_rows in ((groupby_conversion, groupby_nb_rows), (conversion, NB_ROWS)):
+        inputs_dfs = read_all_inputs(nb_rows)
+        start = time.time()
+        current_conversion(*inputs_dfs)
+        durations_per_row.append((time.time() - start) / nb_rows)
+    inputs_dfs = read_all_inputs(groupby_nb_rows)
+    assert repr(groupby_conversion(*inputs_dfs)) == repr(conversion(*inputs_dfs))
+    print('{:<16}groupby{:>9.1f} \xb5s per row ({:>5} rows)    current{:>7.1f} \xb5s per row ({:>5} rows)    speed-up{:>7.1f}'.format(
+        name, durations_per_row[0] * 1e6, groupby_nb_rows, durations_per_row[1] * 1e6, NB_ROWS, durations_per_row[0] / durations_per_row[1]))
+
+
+if __name__ == '__main__':
+    run_benchmark('elongwheat', elongwheat_groupby_from_dataframes, elongwheat_converter.from_dataframes,
+                  lambda nb_rows: [read_inputs('test_elongwheat', os.path.join('inputs', inputs_filename), nb_rows)
+                                   for inputs_filename in ('hiddenzones_inputs.csv', 'elements_inputs.csv', 'axes_inputs.csv')],
+                  ELONGWHEAT_GROUPBY_NB_ROWS)
+    run_benchmark('senescwheat', senescwheat_groupby_from_dataframes, senescwheat_converter.from_dataframes,
+                  lambda nb_rows: [read_inputs('test_senescwheat', os.path.join('inputs', inputs_filename), nb_rows)
+                                   for inputs_filename in ('roots_inputs.csv', 'axes_inputs.csv', 'elements_inputs.csv')])
+    run_benchmark('growthwheat', growthwheat_groupby_from_dataframes, growthwheat_converter.from_dataframes,
+                  lambda nb_rows: [read_inputs('test_growthwheat', os.path.join('inputs', inputs_filename), nb_rows)
+                                   for inputs_filename in ('hiddenzones_inputs.csv', 'elements_inputs.csv', 'roots_inputs.csv', 'axes_inputs.csv')])
+    run_benchmark('farquharwheat', farquharwheat_groupby_from_dataframe, farquharwheat_converter.from_dataframe,
+                  lambda nb_rows: [read_inputs('test_farquharwheat', inputs_filename, nb_rows) for inputs_filename in ('elements_inputs.csv', 'axes_inputs.csv')])
@@ -0,0 +1,96 @@
+# -*- coding: latin-1 -*-
+
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from openalea.fspmwheat.meteo import Meteo
+
+"""
+    benchmark_meteo
+    ~~~~~~~~~~~~~~~
+
+    Compare the lookups of the meteo in a dataframe, as previously done in the example mains, to the lookups with
+    :class:`fspmwheat.meteo.Meteo`, read at once or streamed by chunks, on a run of 5000 hours with the time steps of
+    `example/Vegetative_stages/main.py`. Check that both lookups give the same forcings.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+SIMULATION_LENGTH = 5000
+
+CARIBU_TIMESTEP = 4
+SENESCWHEAT_TIMESTEP = 1
+FARQUHARWHEAT_TIMESTEP = 1
+ELONGWHEAT_TIMESTEP = 1
+
+METEO_FILEPATH = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, 'example', 'Vegetative_stages', 'inputs', 'meteo_Ljutovac2002.csv')
+
+
+def create_meteo_file(meteo_filepath):
+    """Repeat the example meteo to cover the whole run, and save it to `meteo_filepath`."""
+    example_meteo_df = pd.read_csv(METEO_FILEPATH)
+    nb_repeats = (SIMULATION_LENGTH + CARIBU_TIMESTEP) // len(example_meteo_df) + 1
+    meteo_df = pd.concat([example_meteo_df] * nb_repeats, ignore_index=True)
+    meteo_df['t'] = range(len(meteo_df))
+    meteo_df.to_csv(meteo_filepath, index=False)
+
+
+def run_dataframe_lookups(meteo_filepath):
+    meteo = pd.read_csv(meteo_filepath, index_col='t')
+    forcings = []
+    for t_caribu in range(0, SIMULATION_LENGTH, SENESCWHEAT_TIMESTEP):
+        PARi = meteo.loc[t_caribu, ['PARi']].iloc[0]
+        DOY = meteo.loc[t_caribu, ['DOY']].iloc[0]
+        hour = meteo.loc[t_caribu, ['hour']].iloc[0]
+        PARi_next_hours = meteo.loc[range(t_caribu, t_caribu + CARIBU_TIMESTEP), ['PARi']].sum().values[0]
+        forcings.append((PARi, DOY, hour, PARi_next_hours > 0))
+        for t_farquharwheat in range(t_caribu, t_caribu + SENESCWHEAT_TIMESTEP, FARQUHARWHEAT_TIMESTEP):
+            Ta, ambient_CO2, RH, Ur = meteo.loc[t_farquharwheat, ['air_temperature', 'ambient_CO2', 'humidity', 'Wind']]
+            forcings.append((Ta, ambient_CO2, RH, Ur))
+            for t_elongwheat in range(t_farquharwheat, t_farquharwheat + FARQUHARWHEAT_TIMESTEP, ELONGWHEAT_TIMESTEP):
+                Tair, Tsoil = meteo.loc[t_elongwheat, ['air_temperature', 'soil_temperature']]
+                forcings.append((Tair, Tsoil))
+                Tair = meteo.loc[t_elongwheat, 'air_temperature']
+                Tsoil = meteo.loc[t_elongwheat, 'soil_temperature']
+                forcings.append((Tair, Tsoil))
+    return forcings
+
+
+def run_meteo_lookups(meteo_filepath, chunksize=None):
+    meteo = Meteo.from_csv(meteo_filepath, chunksize=chunksize)
+    forcings = []
+    for t_caribu in range(0, SIMULATION_LENGTH, SENESCWHEAT_TIMESTEP):
+        PARi, DOY, hour = meteo.values(['PARi', 'DOY', 'hour'], t_caribu)
+        PARi_next_hours = meteo.rolling_sum('PARi', t_caribu, CARIBU_TIMESTEP)
+        forcings.append((PARi, DOY, hour, PARi_next_hours > 0))
+        for t_farquharwheat in range(t_caribu, t_caribu + SENESCWHEAT_TIMESTEP, FARQUHARWHEAT_TIMESTEP):
+            Ta, ambient_CO2, RH, Ur = meteo.values(['air_temperature', 'ambient_CO2', 'humidity', 'Wind'], t_farquharwheat)
+            forcings.append((Ta, ambient_CO2, RH, Ur))
+            for t_elongwheat in range(t_farquharwheat, t_farquharwheat + FARQUHARWHEAT_TIMESTEP, ELONGWHEAT_TIMESTEP):
+                Tair, Tsoil = meteo.values(['air_temperature', 'soil_temperature'], t_elongwheat)
+                forcings.append((Tair, Tsoil))
+                forcings.append((Tair, Tsoil))
+    return forcings
+
+
+if __name__ == '__main__':
+    meteo_filepath = os.path.join(tempfile.mkdtemp(), 'meteo_benchmark.csv')
+    create_meteo_file(meteo_filepath)
+
+    results = {}
+    for name, run_lookups, kwargs in (('dataframe', run_dataframe_lookups, {}),
+                                      ('Meteo', run_meteo_lookups, {}),
+                                      ('Meteo streamed', run_meteo_lookups, {'chunksize': 500})):
+        start = time.time()
+        results[name] = run_lookups(meteo_filepath, **kwargs)
+        duration = time.time() - start
+        print('{:<16}{:>10.3f} s{:>12.1f} \xb5s per simulated hour'.format(name, duration, duration / SIMULATION_LENGTH * 1e6))
+
+    assert results['Meteo'] == results['dataframe']
+    assert results['Meteo streamed'] == results['dataframe']
+    os.remove(meteo_filepath)
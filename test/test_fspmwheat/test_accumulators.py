@@ -0,0 +1,157 @@
+# -*- coding: latin-1 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from openalea.fspmwheat import fspmwheat_postprocessing
+from openalea.fspmwheat.accumulators import PostprocessingAccumulators
+from openalea.fspmwheat.meteo import Meteo
+
+"""
+    test_accumulators
+    ~~~~~~~~~~~~~~~~~
+
+    Test that the accumulators of the post-processing emit the same tables as the functions of
+    :mod:`fspmwheat.fspmwheat_postprocessing`, on a synthetic simulation of 10 days.
+
+    You must first install :mod:`fspmwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+"""
+
+SIMULATION_LENGTH = 240
+NB_METAMERS = 12
+PLANT_DENSITY = 250
+
+#: the basenames of the CSV files read by the post-processing functions, with their directory
+OUTPUTS_FILES = {'axes_outputs': 'outputs', 'hiddenzones_outputs': 'outputs',
+                 'axes_postprocessing': 'postprocessing', 'hiddenzones_postprocessing': 'postprocessing',
+                 'organs_postprocessing': 'postprocessing', 'elements_postprocessing': 'postprocessing'}
+
+
+def create_meteo():
+    t = np.arange(SIMULATION_LENGTH + 24)
+    PARi = np.maximum(0., 1500. * np.sin((t % 24 - 6) / 12. * np.pi))
+    return pd.DataFrame({'t': t, 'PARi': PARi, 'air_temperature': 12.})
+
+
+def create_step_dataframes(t, random_state):
+    """Create the outputs and the post-processing of a synthetic simulation at time step `t`."""
+    axis_id = {'t': t, 'plant': 1, 'axis': 'MS'}
+
+    axes_outputs = pd.DataFrame([dict(axis_id, sum_TT=0.5 * t + 0.01 * t ** 1.5, delta_teq=1. + 0.2 * np.sin(t / 5.))])
+    sum_dry_mass_roots = 0.1 + 0.001 * t + 0.0005 * random_state.rand()
+    sum_dry_mass_shoot = 0.3 + 0.004 * t + 0.001 * random_state.rand()
+    axes_postprocessing = pd.DataFrame([dict(axis_id, sum_dry_mass_roots=sum_dry_mass_roots, sum_dry_mass_shoot=sum_dry_mass_shoot,
+                                             sum_dry_mass=sum_dry_mass_roots + sum_dry_mass_shoot,
+                                             C_respired_roots=np.nan if t == 0 else random_state.rand(), C_respired_shoot=random_state.rand(),
+                                             C_exudated=np.nan if t % 7 == 0 else 0.1 * random_state.rand())])
+
+    organs_postprocessing = pd.DataFrame([dict(axis_id, organ='roots', sucrose=100 * random_state.rand(), amino_acids=10 * random_state.rand(),
+                                               sucrose_consumption_mstruct=random_state.rand(), AA_consumption_mstruct=0.1 * random_state.rand()),
+                                          dict(axis_id, organ='phloem', sucrose=200 * random_state.rand(), amino_acids=20 * random_state.rand(),
+                                               sucrose_consumption_mstruct=np.nan, AA_consumption_mstruct=np.nan)])
+
+    PARi = max(0., 1500. * np.sin((t % 24 - 6) / 12. * np.pi))
+    hiddenzones, elements = [], []
+    hiddenzones_columns = list(axis_id) + ['metamer', 'leaf_L', 'leaf_is_emerged', 'leaf_Lmax', 'leaf_Lmax_em', 'lamina_Lmax', 'sheath_Lmax', 'leaf_Wmax',
+                                           'internode_Lmax', 'SSLW', 'LSSW', 'sucrose', 'fructan', 'amino_acids', 'proteins', 'sucrose_consumption_mstruct',
+                                           'AA_consumption_mstruct', 'nb_replications']
+    for metamer in range(1, NB_METAMERS + 1):
+        t_init = 25 * (metamer - 3)
+        t_em, t_lig = t_init + 40, t_init + 70
+        t_senesc_onset, t_senesc_end = t_lig + 60, t_lig + 120
+        if t_init <= t < t_lig:
+            age = t - t_init
+            leaf_Lmax = 0.1 * metamer + 0.001 * age if age >= 20 else np.nan
+            hiddenzones.append(dict(axis_id, metamer=metamer, leaf_L=0.001 * np.exp(0.03 * age) * (1 + 0.01 * random_state.rand()),
+                                    leaf_is_emerged=t >= t_em, leaf_Lmax=leaf_Lmax, leaf_Lmax_em=0.08 * metamer, lamina_Lmax=0.6 * leaf_Lmax,
+                                    sheath_Lmax=0.4 * leaf_Lmax, leaf_Wmax=0.01 * metamer + 0.0001 * age if t >= t_em else np.nan,
+                                    internode_Lmax=0.02 * metamer + 0.0001 * age if metamer >= 5 and age >= 50 else np.nan,
+                                    SSLW=20 + random_state.rand(), LSSW=0.5 + random_state.rand(),
+                                    sucrose=random_state.rand(), fructan=random_state.rand(), amino_acids=random_state.rand(), proteins=random_state.rand(),
+                                    sucrose_consumption_mstruct=0.01 * random_state.rand(), AA_consumption_mstruct=np.nan if age % 5 == 0 else 0.001 * random_state.rand(),
+                                    nb_replications=1.5))
+        if t >= t_em:
+            is_growing = t < t_lig
+            green_area = 0.001 * metamer * min(1., (t - t_em + 1) / 30.)
+            if t >= t_senesc_onset:
+                green_area *= max(0., 1 - (t - t_senesc_onset) / float(t_senesc_end - t_senesc_onset))
+            mstruct = 0. if t >= t_senesc_end else 0.01 * metamer
+            for element, organ, area_ratio in (('LeafElement1', 'blade', 1.), ('StemElement', 'sheath', 0.3)):
+                elements.append(dict(axis_id, metamer=metamer, organ=organ, element=element, is_growing=is_growing, green_area=area_ratio * green_area,
+                                     mstruct=mstruct, senesced_mstruct=0.001 * (t - t_senesc_onset) if t > t_senesc_onset else 0.,
+                                     sum_dry_mass=1.2 * mstruct + 0.001 * random_state.rand(),
+                                     SLN=np.nan if is_growing else 1 + random_state.rand(), SLA=np.nan if is_growing else 20 + random_state.rand(),
+                                     PARa=0.8 * PARi * (1 - 0.05 * random_state.rand()), Ag=0.02 * PARi * random_state.rand(),
+                                     Photosynthesis=0.1 * PARi * green_area * random_state.rand(), nb_replications=np.nan if metamer == 1 else 1.2,
+                                     sucrose=random_state.rand(), fructan=random_state.rand(), starch=random_state.rand(),
+                                     amino_acids=random_state.rand(), proteins=random_state.rand()))
+    hiddenzones_df = pd.DataFrame(hiddenzones, columns=hiddenzones_columns)
+    return {'axes_outputs': axes_outputs,
+            'axes_postprocessing': axes_postprocessing,
+            'organs_postprocessing': organs_postprocessing,
+            'hiddenzones_outputs': hiddenzones_df,
+            'hiddenzones_postprocessing': hiddenzones_df,
+            'elements_postprocessing': pd.DataFrame(elements)}
+
+
+@pytest.fixture(scope='module')
+def simulation(tmp_path_factory):
+    """Run the accumulators along the synthetic simulation, and save the whole outputs for the post-processing functions."""
+    dirpath = tmp_path_factory.mktemp('accumulators')
+    for subdirectory in ('outputs', 'postprocessing', 'accumulators'):
+        (dirpath / subdirectory).mkdir()
+    meteo_filepath = str(dirpath / 'meteo.csv')
+    create_meteo().to_csv(meteo_filepath, index=False)
+
+    accumulators = PostprocessingAccumulators(Meteo.from_csv(meteo_filepath), PLANT_DENSITY)
+    random_state = np.random.RandomState(0)
+    all_step_dataframes = {name: [] for name in OUTPUTS_FILES}
+    for t in range(SIMULATION_LENGTH):
+        step_dataframes = create_step_dataframes(t, random_state)
+        accumulators.update(t, step_dataframes)
+        for name, step_df in step_dataframes.items():
+            all_step_dataframes[name].append(step_df)
+    accumulators.save(str(dirpath / 'accumulators'))
+
+    for name, step_dfs in all_step_dataframes.items():
+        pd.concat(step_dfs, ignore_index=True).to_csv(str(dirpath / OUTPUTS_FILES[name] / '{}.csv'.format(name)), index=False)
+    return dirpath, meteo_filepath
+
+
+def compare_tables(dirpath, filename):
+    desired_df = pd.read_csv(str(dirpath / 'postprocessing' / filename))
+    actual_df = pd.read_csv(str(dirpath / 'accumulators' / filename))
+    pd.testing.assert_frame_equal(actual_df, desired_df, check_dtype=False, rtol=1e-9, atol=1e-12)
+
+
+def test_C_usages(simulation):
+    dirpath, _ = simulation
+    fspmwheat_postprocessing.table_C_usages(str(dirpath / 'postprocessing'))
+    compare_tables(dirpath, 'C_usages.csv')
+
+
+def test_canopy_dynamics(simulation):
+    dirpath, meteo_filepath = simulation
+    fspmwheat_postprocessing.canopy_dynamics(str(dirpath / 'postprocessing'), meteo_filepath, PLANT_DENSITY)
+    compare_tables(dirpath, 'canopy_dynamics_daily.csv')
+
+
+def test_leaf_traits(simulation):
+    pytest.importorskip('statsmodels')
+    dirpath, _ = simulation
+    fspmwheat_postprocessing.leaf_traits(str(dirpath / 'outputs'), str(dirpath / 'postprocessing'))
+    compare_tables(dirpath, 'leaf_traits.csv')
+
+
+def test_performance_indices(simulation):
+    pytest.importorskip('statsmodels')
+    dirpath, meteo_filepath = simulation
+    fspmwheat_postprocessing.table_C_usages(str(dirpath / 'postprocessing'))
+    fspmwheat_postprocessing.calculate_performance_indices(str(dirpath / 'outputs'), str(dirpath / 'postprocessing'), meteo_filepath, PLANT_DENSITY)
+    compare_tables(dirpath, 'RUE.csv')
+    compare_tables(dirpath, 'performance_indices.csv')
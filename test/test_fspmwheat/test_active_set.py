@@ -0,0 +1,49 @@
+# -*- coding: latin-1 -*-
+
+from openalea.fspmwheat import active_set
+
+"""
+    test_active_set
+    ~~~~~~~~~~~~~~~
+
+    Test the active sets of the facades.
+
+    You must first install :mod:`fspmwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+"""
+
+
+def create_hiddenzone_inputs(internode_is_visible=False, leaf_is_emerged=False, leaf_is_growing=True):
+    return {'internode_is_visible': internode_is_visible, 'leaf_is_emerged': leaf_is_emerged, 'leaf_is_growing': leaf_is_growing}
+
+
+def create_over_element_properties(**properties):
+    element_properties = {'is_over': True, 'is_growing': False, 'green_area': 0., 'mstruct': 0., 'length': 0.1, 'senesced_length_element': 0.1, 'sucrose': 12.}
+    element_properties.update(properties)
+    return element_properties
+
+
+def test_growthwheat_active_elements():
+    assert active_set.growthwheat_active_elements(create_hiddenzone_inputs()) == set()
+    assert active_set.growthwheat_active_elements(create_hiddenzone_inputs(leaf_is_emerged=True)) == {('blade', 'LeafElement1'), ('sheath', 'StemElement')}
+    # mature leaf, visible internode
+    assert active_set.growthwheat_active_elements(create_hiddenzone_inputs(internode_is_visible=True, leaf_is_emerged=True, leaf_is_growing=False)) == {('internode', 'StemElement')}
+
+
+def test_is_senescwheat_element_inert():
+    assert active_set.is_senescwheat_element_inert(create_over_element_properties())
+    assert active_set.is_senescwheat_element_inert(create_over_element_properties(), organ_senesced_length=0.1)
+
+    # the organ is not updated yet
+    assert not active_set.is_senescwheat_element_inert(create_over_element_properties(), organ_senesced_length=0.05)
+    # the element is not updated as over yet
+    assert not active_set.is_senescwheat_element_inert(create_over_element_properties(is_over=False))
+    assert not active_set.is_senescwheat_element_inert(create_over_element_properties(senesced_length_element=0.05))
+    # the element is still senescing, or grows
+    assert not active_set.is_senescwheat_element_inert(create_over_element_properties(green_area=1E-4))
+    assert not active_set.is_senescwheat_element_inert(create_over_element_properties(mstruct=1E-3))
+    assert not active_set.is_senescwheat_element_inert(create_over_element_properties(is_growing=True))
+    assert not active_set.is_senescwheat_element_inert({'green_area': 0., 'mstruct': 0.})
@@ -0,0 +1,108 @@
+# -*- coding: latin-1 -*-
+
+import numpy as np
+
+from openalea.fspmwheat import archive, fspmwheat_facade
+from openalea.fspmwheat.topology import ELEMENT_SCALE, get_topology_index
+
+"""
+    test_archive
+    ~~~~~~~~~~~~
+
+    Test the archival of the dead organs out of the MTG shared between all models.
+
+    You must first install :mod:`fspmwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+"""
+
+
+class Tree(object):
+    """A tree of vertices with labels, indexes and properties, i.e. the part of the MTG used by the topology index and the archive."""
+
+    def __init__(self):
+        self.root = 0
+        self._components = {self.root: []}
+        self._labels = {}
+        self._indexes = {}
+        self._properties = {}
+
+    def add_component(self, complex_vid, label, index=None, **properties):
+        vid = len(self._components)
+        self._components[vid] = []
+        self._components[complex_vid].append(vid)
+        self._labels[vid] = label
+        self._indexes[vid] = index
+        for name, value in properties.items():
+            self.property(name)[vid] = value
+        return vid
+
+    def nb_vertices(self):
+        return len(self._components)
+
+    def components_iter(self, vid):
+        return iter(self._components[vid])
+
+    def label(self, vid):
+        return self._labels[vid]
+
+    def index(self, vid):
+        return self._indexes[vid]
+
+    def property(self, name):
+        return self._properties.setdefault(name, {})
+
+    def get_vertex_property(self, vid):
+        return {name: values[vid] for name, values in self._properties.items() if vid in values}
+
+
+def create_tree():
+    """A main stem with a dead internode and a dead lamina on the first metamer, and a living lamina on the second metamer."""
+    tree = Tree()
+    axis_vid = tree.add_component(tree.add_component(tree.root, 'plant', 1), 'MS', nb_leaves=2)
+    first_metamer_vid = tree.add_component(axis_vid, 'metamer', 1)
+    tree.add_component(tree.add_component(first_metamer_vid, 'internode'), 'StemElement', length=0.01, is_over=True, is_growing=False, mstruct=0.)
+    first_blade_vid = tree.add_component(first_metamer_vid, 'blade')
+    tree.add_component(first_blade_vid, 'LeafElement1', length=0.1, is_over=True, is_growing=False, mstruct=0., green_area=0., senesced_length_element=0.1)
+    tree.add_component(first_blade_vid, 'HiddenElement', length=0.)
+    second_metamer_vid = tree.add_component(axis_vid, 'metamer', 2)
+    tree.add_component(tree.add_component(second_metamer_vid, 'blade'), 'LeafElement1', length=0.15, is_over=False, is_growing=False, mstruct=2E-3, green_area=1E-3)
+    return tree
+
+
+def test_archive_dead_organs():
+    tree = create_tree()
+    organ_archive = archive.OrganArchive(tree)
+    dead_lamina_id = (1, 'MS', 1, 'blade', 'LeafElement1')
+
+    assert organ_archive.archive_dead_organs(t=10) == [(1, 'MS', 1, 'blade')]
+    assert organ_archive.organs == {(1, 'MS', 1, 'blade'): 10}
+    assert len(organ_archive) == 1 and dead_lamina_id in organ_archive
+    assert organ_archive.get(dead_lamina_id)['senesced_length_element'] == 0.1
+    assert np.isnan(organ_archive.get(dead_lamina_id)['Ag'])
+
+    # the traversals skip the archived organ and its elements, but its ids remain indexed
+    topology = get_topology_index(tree)
+    first_metamer_vid = topology.vid((1, 'MS', 1))
+    assert [topology.label(organ_vid) for organ_vid in topology.components(first_metamer_vid)] == ['internode']
+    assert [topology.topology_id(element_vid) for element_vid in topology.vertices(ELEMENT_SCALE)] == [(1, 'MS', 1, 'internode', 'StemElement'),
+                                                                                                       (1, 'MS', 2, 'blade', 'LeafElement1')]
+    assert topology.is_archived(topology.vid((1, 'MS', 1, 'blade')))
+    assert topology.topology_id(topology.vid(dead_lamina_id)) == dead_lamina_id
+
+    # the archival is kept when the topology changes
+    tree.add_component(topology.vid((1, 'MS')), 'metamer', 3)
+    assert get_topology_index(tree).vertices(ELEMENT_SCALE) == topology.vertices(ELEMENT_SCALE)
+    assert organ_archive.archive_dead_organs(t=11) == []
+
+    # the archived elements remain in the outputs
+    archive_df = organ_archive.to_dataframe()
+    assert archive_df[fspmwheat_facade.ELEMENTS_TOPOLOGY_COLUMNS].values.tolist() == [list(dead_lamina_id)]
+    _, elements_outputs_df, _, _, _ = fspmwheat_facade.FSPMWheatFacade(tree, organ_archive).build_outputs_df_from_MTG()
+    assert elements_outputs_df[fspmwheat_facade.ELEMENTS_TOPOLOGY_COLUMNS].values.tolist() == [list(dead_lamina_id),
+                                                                                              [1, 'MS', 1, 'internode', 'StemElement'],
+                                                                                              [1, 'MS', 2, 'blade', 'LeafElement1']]
+    _, elements_outputs_df, _, _, _ = fspmwheat_facade.FSPMWheatFacade(tree).build_outputs_df_from_MTG()
+    assert len(elements_outputs_df) == 2
@@ -0,0 +1,138 @@
+# -*- coding: latin-1 -*-
+
+import os
+import tempfile
+import time
+
+from openalea.fspmwheat import batch
+from openalea.wheatfspm.watchdog import SolverHealthError
+
+"""
+    test_batch
+    ~~~~~~~~~~
+
+    Test the queue of jobs and the pool of worker processes.
+
+    You must first install :mod:`fspmwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+"""
+
+
+def succeed(job_id):
+    pass
+
+
+def fail(job_id):
+    raise ValueError('wrong scenario {}'.format(job_id))
+
+
+def abort(job_id):
+    raise SolverHealthError('cnwheat', 'step size collapsed')
+
+
+def hang(job_id):
+    time.sleep(60)
+
+
+def crash(job_id):
+    os._exit(1)
+
+
+def exceed_memory(job_id):
+    bytearray(2 * 1024 ** 3)
+
+
+def fail_once(path):
+    # transient failure at the first attempt, then success
+    if not os.path.exists(path):
+        open(path, 'w').close()
+        raise OSError('file system not ready')
+
+
+def run_jobs(job_id):
+    {'ok': succeed, 'error': fail, 'abort': abort, 'hang': hang, 'crash': crash, 'memory': exceed_memory}[job_id.split('_')[0]](job_id)
+
+
+def print_exceptions(job_id):
+    # catch and print the exceptions of the job, as run_fspmwheat and the main scripts of the examples do
+    try:
+        run_jobs(job_id)
+    except Exception as ex:
+        print('An exception of type {0} occurred. Arguments:\n{1!r}'.format(type(ex).__name__, ex.args))
+        if batch.is_batch_job():
+            raise
+
+
+def test_queue_resume():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        queue_path = os.path.join(tmp_dir, 'queue.sqlite')
+        with batch.JobQueue(queue_path) as queue:
+            assert queue.submit([1, 2, 3]) == 3
+            assert queue.claim() == 1
+            queue.complete(1, 1.5)
+            assert queue.claim() == 2  # interrupted while running
+
+        with batch.JobQueue(queue_path) as queue:
+            assert queue.submit([1, 2, 3, 4]) == 1
+            assert queue.counts() == {batch.PENDING: 2, batch.RUNNING: 1, batch.DONE: 1, batch.FAILED: 0}
+            assert queue.requeue() == 1
+            assert [job['job_id'] for job in queue.jobs(batch.PENDING)] == [2, 3, 4]
+            assert queue.jobs(batch.DONE)[0]['duration'] == 1.5
+            assert queue.attempts(2) == 1
+
+
+def test_run_batch():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        queue_path = os.path.join(tmp_dir, 'queue.sqlite')
+        jobs_ids = ['ok_1', 'error_1', 'abort_1', 'hang_1', 'crash_1', 'memory_1', 'ok_2']
+        counts = batch.run_batch(queue_path, run_jobs, jobs_ids, nb_workers=3, timeout=2, memory_limit=1024 ** 3, max_attempts=2, poll_interval=0.1, verbose=False)
+        assert counts == {batch.PENDING: 0, batch.RUNNING: 0, batch.DONE: 2, batch.FAILED: 5}
+
+        with batch.JobQueue(queue_path) as queue:
+            jobs = {job['job_id']: job for job in queue.jobs()}
+        assert jobs['error_1']['failure'] == batch.ERROR and 'ValueError' in jobs['error_1']['error']
+        assert jobs['error_1']['attempts'] == 1  # not transient: not retried
+        assert jobs['abort_1']['failure'] == batch.ABORTED and 'step size collapsed' in jobs['abort_1']['error']
+        assert jobs['hang_1']['failure'] == batch.TIMEOUT and jobs['hang_1']['attempts'] == 1
+        assert jobs['crash_1']['failure'] == batch.CRASH and jobs['crash_1']['attempts'] == 2
+        assert 'MemoryError' in jobs['memory_1']['error']
+        assert jobs['ok_1']['duration'] < 2
+
+        # resume: the completed jobs are not run again
+        counts = batch.run_batch(queue_path, fail, jobs_ids, nb_workers=2, verbose=False)
+        assert counts[batch.DONE] == 2
+
+
+def test_run_batch_with_caught_exceptions():
+    assert not batch.is_batch_job()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        queue_path = os.path.join(tmp_dir, 'queue.sqlite')
+        counts = batch.run_batch(queue_path, print_exceptions, ['ok_1', 'error_1', 'abort_1'], nb_workers=3, poll_interval=0.1, verbose=False)
+        assert counts == {batch.PENDING: 0, batch.RUNNING: 0, batch.DONE: 1, batch.FAILED: 2}
+
+        with batch.JobQueue(queue_path) as queue:
+            jobs = {job['job_id']: job for job in queue.jobs()}
+        assert jobs['error_1']['failure'] == batch.ERROR and 'ValueError' in jobs['error_1']['error']
+        assert jobs['abort_1']['failure'] == batch.ABORTED
+
+
+def test_retry_transient_failures():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        queue_path = os.path.join(tmp_dir, 'queue.sqlite')
+        job_id = os.path.join(tmp_dir, 'flag')
+        counts = batch.run_batch(queue_path, fail_once, [job_id], nb_workers=1, poll_interval=0.1, verbose=False)
+        assert counts[batch.DONE] == 1
+        with batch.JobQueue(queue_path) as queue:
+            job = queue.jobs()[0]
+        assert job['attempts'] == 2
+        assert job['total_duration'] >= job['duration']
+
+
+if __name__ == '__main__':
+    test_queue_resume()
+    test_run_batch()
+    test_run_batch_with_caught_exceptions()
+    test_retry_transient_failures()
@@ -50,7 +50,7 @@ HOUR_TO_SECOND_CONVERSION_FACTOR = 3600
 PRECISION = 4
 
 
-def test_run(overwrite_desired_data=False):
+def test_run(overwrite_desired_data=False, lazy_geometry=False):
     # ---------------------------------------------
     # ----- CONFIGURATION OF THE SIMULATION -------
     # ---------------------------------------------
@@ -319,8 +319,9 @@ def test_run(overwrite_desired_data=False):
                     Tair, Tsoil = meteo.loc[t_elongwheat, ['air_temperature', 'soil_temperature']]
                     elongwheat_facade_.run(Tair, Tsoil, option_static=False)
 
-                    # Update geometry
-                    adel_wheat.update_geometry(g)
+                    # Update geometry. With lazy_geometry, the geometry is updated only when it is read by Caribu or FarquharWheat
+                    if not lazy_geometry:
+                        adel_wheat.update_geometry(g)
 
                     for t_growthwheat in range(t_elongwheat, t_elongwheat + ELONGWHEAT_TIMESTEP, GROWTHWHEAT_TIMESTEP):
                         # run GrowthWheat
@@ -369,5 +370,12 @@ def test_run(overwrite_desired_data=False):
                                                 actual_outputs_filename, precision=PRECISION, overwrite_desired_data=overwrite_desired_data)
 
 
+def test_run_lazy_geometry():
+    # the outputs (including the light interception) must be the same as with an update of the geometry after each run of ElongWheat,
+    # i.e. the desired outputs of test_run
+    test_run(lazy_geometry=True)
+
+
 if __name__ == '__main__':
     test_run(overwrite_desired_data=False)
+    test_run_lazy_geometry()
@@ -0,0 +1,109 @@
+# -*- coding: latin-1 -*-
+
+from openalea.fspmwheat import geometry
+
+"""
+    test_geometry
+    ~~~~~~~~~~~~~
+
+    Test the manager of the geometry of the MTG shared between all models.
+
+    You must first install :mod:`fspmwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+"""
+
+
+class PropertiesTree(object):
+    """A tree with only the properties of the vertices, i.e. the part of the MTG used by the geometry manager."""
+
+    def __init__(self):
+        self._properties = {}
+
+    def property(self, name):
+        return self._properties.setdefault(name, {})
+
+
+class GeometricalModel(object):
+    """A geometrical model whose geometry of a vertex is its visible area, and which counts the updates of the geometry."""
+
+    def __init__(self):
+        self.nb_updates = 0
+
+    def update_geometry(self, mtg):
+        self.nb_updates += 1
+        mtg.property('geometry').clear()
+        for vid, visible_length in mtg.property('visible_length').items():
+            mtg.property('geometry')[vid] = visible_length * mtg.property('width').get(vid, 0.)
+
+
+def test_dirty_vertices():
+    mtg = PropertiesTree()
+    geometrical_model = GeometricalModel()
+    geometry_manager = geometry.get_geometry_manager(mtg, geometrical_model)
+    assert geometry.get_geometry_manager(mtg) is geometry_manager
+
+    geometry_manager.set_property('visible_length', 1, 0.1)
+    geometry_manager.set_property('age', 2, 10)  # not a geometrical property
+    assert geometry_manager.dirty_vertices == {1}
+    assert geometry.update_geometry(mtg)
+    assert geometry.geometry_version(mtg) == 1
+
+    # same value : the geometry is not updated
+    geometry_manager.set_property('visible_length', 1, 0.1)
+    geometry.set_geometrical_property(mtg, 'age', 1, 11)
+    assert not geometry_manager.is_dirty()
+    assert not geometry.update_geometry(mtg)
+    assert geometrical_model.nb_updates == 1
+
+    # new value, or forced update
+    geometry.set_geometrical_property(mtg, 'width', 1, 0.01)
+    assert geometry.update_geometry(mtg)
+    assert geometry.update_geometry(mtg, force=True)
+    assert geometrical_model.nb_updates == 3
+    assert mtg.property('geometry') == {1: 0.1 * 0.01}
+
+    # NaN values are always considered as changed
+    geometry_manager.set_property('width', 1, float('nan'))
+    geometry_manager.set_property('width', 1, float('nan'))
+    assert geometry_manager.dirty_vertices == {1}
+
+
+def test_without_geometry_manager():
+    mtg = PropertiesTree()
+    geometry.set_geometrical_property(mtg, 'length', 1, 0.1)
+    geometry.mark_geometry_dirty(mtg, [1])
+    assert mtg.property('length') == {1: 0.1}
+    assert geometry.get_geometry_manager(mtg) is None
+    assert not geometry.update_geometry(mtg)
+    assert geometry.geometry_version(mtg) is None
+
+
+def test_lazy_update():
+    # grow two leaves for 48 steps, and read the geometry (i.e. run the light model) every 4 steps, as Caribu does
+    eager_mtg, lazy_mtg = PropertiesTree(), PropertiesTree()
+    eager_geometrical_model, lazy_geometrical_model = GeometricalModel(), GeometricalModel()
+    geometry.get_geometry_manager(eager_mtg, eager_geometrical_model)
+    geometry.get_geometry_manager(lazy_mtg, lazy_geometrical_model)
+    for step in range(48):
+        for mtg in (eager_mtg, lazy_mtg):
+            # the first leaf stops growing at step 20, the second one starts growing at step 30
+            geometry.set_geometrical_property(mtg, 'visible_length', 1, 0.01 * min(step, 20))
+            geometry.set_geometrical_property(mtg, 'width', 1, 0.01)
+            geometry.set_geometrical_property(mtg, 'visible_length', 2, 0.02 * max(step - 30, 0))
+            geometry.set_geometrical_property(mtg, 'width', 2, 0.015)
+        geometry.update_geometry(eager_mtg, force=True)
+        if step % 4 == 0:
+            geometry.update_geometry(lazy_mtg)
+            assert lazy_mtg.property('geometry') == eager_mtg.property('geometry')
+
+    assert eager_geometrical_model.nb_updates == 48
+    assert lazy_geometrical_model.nb_updates < 48 // 4
+
+
+if __name__ == '__main__':
+    test_dirty_vertices()
+    test_without_geometry_manager()
+    test_lazy_update()
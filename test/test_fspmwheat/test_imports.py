@@ -0,0 +1,91 @@
+# -*- coding: latin-1 -*-
+
+import json
+import subprocess
+import sys
+
+"""
+    test_imports
+    ~~~~~~~~~~~~
+
+    Test that the modules needed to run a simulation import fast and without any plotting or viewing dependency,
+    so that each worker process of a batch of scenarios (see :mod:`fspmwheat.batch`) starts quickly, even without display.
+
+    Run this script with the command `python` to print the import time of each module.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+"""
+
+#: the modules needed to run a simulation and post-process its outputs, without graphs
+SIMULATION_MODULES = ['openalea.respiwheat.model',
+                      'openalea.cnwheat.simulation', 'openalea.cnwheat.converter', 'openalea.cnwheat.postprocessing', 'openalea.cnwheat.tools',
+                      'openalea.elongwheat.simulation', 'openalea.elongwheat.converter',
+                      'openalea.growthwheat.simulation', 'openalea.growthwheat.converter',
+                      'openalea.senescwheat.simulation', 'openalea.senescwheat.converter',
+                      'openalea.farquharwheat.simulation', 'openalea.farquharwheat.converter',
+                      'openalea.fspmwheat.tools', 'openalea.fspmwheat.batch', 'openalea.fspmwheat.meteo', 'openalea.fspmwheat.accumulators',
+                      'openalea.fspmwheat.recorder',
+                      'openalea.fspmwheat.fspmwheat_postprocessing',
+                      'openalea.fspmwheat.caribu_facade', 'openalea.fspmwheat.cnwheat_facade', 'openalea.fspmwheat.elongwheat_facade',
+                      'openalea.fspmwheat.farquharwheat_facade', 'openalea.fspmwheat.growthwheat_facade', 'openalea.fspmwheat.senescwheat_facade',
+                      'openalea.fspmwheat.fspmwheat_facade']
+
+#: the packages which must not be imported by :attr:`SIMULATION_MODULES`
+FORBIDDEN_PACKAGES = ('matplotlib', 'statsmodels', 'PyQt4', 'PyQt5', 'PyQt6', 'PySide', 'PySide2', 'PySide6', 'qtpy', 'openalea.plantgl.gui', 'openalea.plantgl.all')
+
+#: the maximal time to import all :attr:`SIMULATION_MODULES` in a new interpreter (s)
+IMPORT_TIME_BUDGET = 3.
+
+#: the script run in a new interpreter to import the modules
+IMPORT_SCRIPT = '''
+import json
+import sys
+import time
+
+durations = {}
+missing_dependencies = {}
+start = time.time()
+for module_name in json.loads(sys.argv[1]):
+    module_start = time.time()
+    try:
+        __import__(module_name)
+    except ImportError as e:  # a dependency which is not installed, e.g. openalea.mtg
+        missing_dependencies[module_name] = e.name or str(e)
+    else:
+        durations[module_name] = time.time() - module_start
+print(json.dumps({'duration': time.time() - start, 'durations': durations, 'missing_dependencies': missing_dependencies, 'imported_modules': sorted(sys.modules)}))
+'''
+
+
+def import_simulation_modules():
+    """Import :attr:`SIMULATION_MODULES` in a new interpreter.
+
+    :return: the total duration of the imports (s), the duration of the import of each module (s),
+             the missing dependency of each module which could not be imported, and the names of all the imported modules
+    :rtype: dict
+    """
+    output = subprocess.check_output([sys.executable, '-c', IMPORT_SCRIPT, json.dumps(SIMULATION_MODULES)])
+    return json.loads(output.decode().splitlines()[-1])
+
+
+def test_imports():
+    imports = import_simulation_modules()
+    for module_name, missing_dependency in imports['missing_dependencies'].items():
+        # only third-party dependencies may be missing
+        assert not missing_dependency.startswith(('openalea.cnwheat', 'openalea.elongwheat', 'openalea.growthwheat', 'openalea.senescwheat',
+                                                  'openalea.farquharwheat', 'openalea.respiwheat', 'openalea.fspmwheat')), module_name
+    forbidden_modules = [module_name for module_name in imports['imported_modules']
+                         if any(module_name == package or module_name.startswith(package + '.') for package in FORBIDDEN_PACKAGES)]
+    assert not forbidden_modules
+    assert imports['duration'] < IMPORT_TIME_BUDGET, imports['durations']
+
+
+if __name__ == '__main__':
+    imports = import_simulation_modules()
+    for module_name in SIMULATION_MODULES:
+        if module_name in imports['durations']:
+            print('{:<50}{:>8.3f} s'.format(module_name, imports['durations'][module_name]))
+        else:
+            print('{:<50}{:>10}'.format(module_name, 'missing ' + imports['missing_dependencies'][module_name]))
+    print('{:<50}{:>8.3f} s (budget: {} s)'.format('total', imports['duration'], IMPORT_TIME_BUDGET))
@@ -0,0 +1,80 @@
+# -*- coding: latin-1 -*-
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from openalea.fspmwheat.meteo import Meteo, MeteoError
+
+"""
+    test_meteo
+    ~~~~~~~~~~
+
+    Test the meteo forcings provider against the lookups in the meteo dataframe.
+
+    You must first install :mod:`fspmwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+"""
+
+METEO_FILEPATH = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, 'example', 'Vegetative_stages', 'inputs', 'meteo_Ljutovac2002.csv')
+
+VARIABLES = ['DOY', 'hour', 'air_temperature', 'PARi', 'soil_temperature', 'humidity', 'ambient_CO2', 'Wind']
+
+CARIBU_TIMESTEP = 4
+
+
+def check_meteo(meteo, meteo_df, times):
+    for t in times:
+        values = meteo.values(VARIABLES, t)
+        assert values == tuple(meteo_df.loc[t, VARIABLES])
+        assert type(meteo.value('DOY', t)) is int
+        assert type(meteo.value('PARi', t)) is float
+        if t + CARIBU_TIMESTEP <= meteo_df.index[-1] + 1:
+            expected_PARi_next_hours = meteo_df.loc[range(t, t + CARIBU_TIMESTEP), ['PARi']].sum().values[0]
+            assert meteo.rolling_sum('PARi', t, CARIBU_TIMESTEP) == pytest.approx(expected_PARi_next_hours, rel=1e-12)
+            assert (meteo.rolling_sum('PARi', t, CARIBU_TIMESTEP) > 0) == (expected_PARi_next_hours > 0)
+
+
+def test_values():
+    meteo_df = pd.read_csv(METEO_FILEPATH, index_col='t')
+    meteo = Meteo.from_csv(METEO_FILEPATH)
+    assert 'Date' not in meteo.variables
+    check_meteo(meteo, meteo_df, meteo_df.index)
+    # the rows after the end of the meteo are ignored by the rolling sums
+    last_t = meteo_df.index[-1]
+    assert meteo.rolling_sum('PARi', last_t, CARIBU_TIMESTEP) == meteo_df.loc[last_t, 'PARi']
+
+    with pytest.raises(MeteoError):
+        meteo.value('PARi', last_t + 1)
+    with pytest.raises(MeteoError):
+        meteo.value('PARi', meteo_df.index[0] - 1)
+    with pytest.raises(MeteoError):
+        meteo.value('PARi', 10.5)
+    with pytest.raises(MeteoError):
+        meteo.value('unknown_variable', 10)
+
+
+def test_streaming():
+    meteo_df = pd.read_csv(METEO_FILEPATH, index_col='t')
+    meteo = Meteo.from_csv(METEO_FILEPATH, usecols=VARIABLES, chunksize=100)
+    check_meteo(meteo, meteo_df, meteo_df.index)
+    # the rows before the current time step are dropped
+    assert len(meteo._columns['PARi']) < len(meteo_df) / 2
+    with pytest.raises(MeteoError):
+        meteo.value('PARi', meteo_df.index[0])
+
+
+def test_interpolation():
+    meteo_df = pd.read_csv(METEO_FILEPATH, index_col='t')
+    meteo = Meteo.from_csv(METEO_FILEPATH, interpolate=True)
+    for t in np.arange(100, 124, 0.25):
+        expected_air_temperature = np.interp(t, meteo_df.index, meteo_df['air_temperature'])
+        assert meteo.value('air_temperature', t) == pytest.approx(expected_air_temperature, rel=1e-12)
+    assert meteo.value('PARi', 100) == meteo_df.loc[100, 'PARi']
+    with pytest.raises(MeteoError):
+        meteo.value('PARi', meteo_df.index[-1] + 0.5)
@@ -0,0 +1,151 @@
+# -*- coding: latin-1 -*-
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from openalea.cnwheat import converter as cnwheat_converter, simulation as cnwheat_simulation
+from openalea.elongwheat import converter as elongwheat_converter, parameters as elongwheat_parameters, simulation as elongwheat_simulation
+from openalea.farquharwheat import converter as farquharwheat_converter, simulation as farquharwheat_simulation
+from openalea.fspmwheat import recorder
+from openalea.growthwheat import converter as growthwheat_converter, simulation as growthwheat_simulation
+from openalea.respiwheat import model as respiwheat_model
+from openalea.senescwheat import converter as senescwheat_converter, simulation as senescwheat_simulation
+
+"""
+    test_recorder
+    ~~~~~~~~~~~~~
+
+    Test the record and the replay of the runs of the models.
+
+    You must first install :mod:`fspmwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+"""
+
+ELONGWHEAT_INPUTS_DIRPATH = os.path.join('..', 'test_elongwheat', 'inputs')
+FARQUHARWHEAT_INPUTS_DIRPATH = os.path.join('..', 'test_farquharwheat')
+GROWTHWHEAT_INPUTS_DIRPATH = os.path.join('..', 'test_growthwheat', 'inputs')
+SENESCWHEAT_INPUTS_DIRPATH = os.path.join('..', 'test_senescwheat', 'inputs')
+CNWHEAT_INPUTS_DIRPATH = os.path.join('..', 'test_cnwheat', 'simulation_run', 'inputs')
+
+#: the number of successive runs recorded for each model
+NB_STEPS = 3
+
+
+def create_elongwheat_simulation():
+    inputs_dfs = [pd.read_csv(os.path.join(ELONGWHEAT_INPUTS_DIRPATH, inputs_filename))
+                  for inputs_filename in ('hiddenzones_inputs.csv', 'elements_inputs.csv', 'axes_inputs.csv')]
+    simulation_ = elongwheat_simulation.Simulation(delta_t=3600)
+    simulation_.initialize(elongwheat_converter.from_dataframes(*[inputs_df.where(inputs_df.notnull(), None) for inputs_df in inputs_dfs]))
+    return simulation_
+
+
+def test_record_and_replay(tmp_path):
+    recorder_ = recorder.FacadeRecorder(str(tmp_path), models_names=['elongwheat', 'farquharwheat'])
+
+    # record successive runs of Elong-Wheat, each one from the outputs of the previous one
+    elongwheat_simulation_ = create_elongwheat_simulation()
+    for t in range(3):
+        recorder_.t = t
+        recorder.run_model(recorder_, 'elongwheat', elongwheat_simulation_, Tair=25, Tsoil=20, optimal_growth_option=True)
+    farquharwheat_simulation_ = farquharwheat_simulation.Simulation()
+    farquharwheat_simulation_.initialize(farquharwheat_converter.from_dataframe(pd.read_csv(os.path.join(FARQUHARWHEAT_INPUTS_DIRPATH, 'elements_inputs.csv')),
+                                                                                pd.read_csv(os.path.join(FARQUHARWHEAT_INPUTS_DIRPATH, 'axes_inputs.csv'))))
+    recorder.run_model(recorder_, 'farquharwheat', farquharwheat_simulation_, 18.8, 360, 0.53, 2.2)
+    # the models which are not recorded are only run
+    recorder.run_model(recorder_, 'growthwheat', farquharwheat_simulation_, 18.8, 360, 0.53, 2.2)
+    assert recorder_.nb_runs == {'elongwheat': 3, 'farquharwheat': 1}
+    assert not os.path.exists(recorder_.filepath('growthwheat'))
+
+    # the runs are replayed with the recorded parameters, even if the parameters changed since
+    Temp_Tref = elongwheat_parameters.Temp_Tref
+    elongwheat_parameters.Temp_Tref = 20
+    try:
+        report, differences = recorder.replay(recorder_.filepath('elongwheat'))
+    finally:
+        elongwheat_parameters.Temp_Tref = Temp_Tref
+    assert list(report.columns) == recorder.REPLAY_REPORT_COLUMNS
+    assert list(report['t']) == [0, 1, 2]
+    assert report['outputs_match'].all() and not differences
+    assert (report['duration'] > 0).all()
+
+    report, differences = recorder.replay(recorder_.filepath('farquharwheat'))
+    assert report['outputs_match'].all() and not differences
+
+    # a model loaded from a record runs from the recorded state
+    record = list(recorder.read_records(recorder_.filepath('elongwheat')))[2]
+    simulation_ = recorder.load_model(record)
+    simulation_.run(*record['args'], **record['kwargs'])
+    assert not recorder.compare_outputs(record['outputs'], elongwheat_converter.to_dataframes(simulation_.outputs))
+    # the differences with the recorded outputs are reported
+    record['outputs'][0].loc[0, 'leaf_L'] += 1
+    assert recorder.compare_outputs(record['outputs'], elongwheat_converter.to_dataframes(simulation_.outputs))
+
+
+def update_inputs(inputs, outputs):
+    """The inputs of the next run: the inputs updated by the outputs, as the facades do through the MTG."""
+    return {inputs_type: {id_: dict(inputs[inputs_type].get(id_, {}), **outputs[inputs_type][id_]) for id_ in outputs[inputs_type]} if outputs.get(inputs_type)
+            else inputs[inputs_type] for inputs_type in inputs}
+
+
+def record_and_replay(tmp_path, model_name, simulation_, next_inputs=None):
+    """Record :data:`NB_STEPS` successive runs of `simulation_`, then check that each replayed run gives the recorded outputs."""
+    recorder_ = recorder.FacadeRecorder(str(tmp_path), models_names=[model_name])
+    for t in range(NB_STEPS):
+        recorder_.t = t
+        recorder.run_model(recorder_, model_name, simulation_)
+        if next_inputs is not None:
+            simulation_.initialize(next_inputs(simulation_))
+
+    report, differences = recorder.replay(recorder_.filepath(model_name))
+    assert list(report['t']) == list(range(NB_STEPS))
+    assert report['outputs_match'].all() and not differences
+    return list(recorder.read_records(recorder_.filepath(model_name)))
+
+
+def test_record_and_replay_growthwheat(tmp_path):
+    inputs_dfs = [pd.read_csv(os.path.join(GROWTHWHEAT_INPUTS_DIRPATH, inputs_filename)).replace({np.nan: None})
+                  for inputs_filename in ('hiddenzones_inputs.csv', 'elements_inputs.csv', 'roots_inputs.csv', 'axes_inputs.csv')]
+    simulation_ = growthwheat_simulation.Simulation(delta_t=3600)
+    simulation_.initialize(growthwheat_converter.from_dataframes(*inputs_dfs))
+    # the state of the model at the second run holds the copy-on-write outputs of the first one
+    records = record_and_replay(tmp_path, 'growthwheat', simulation_, lambda simulation_: update_inputs(simulation_.inputs, simulation_.outputs))
+    assert recorder.compare_outputs(records[0]['outputs'], records[-1]['outputs'])
+
+
+def test_record_and_replay_senescwheat(tmp_path):
+    inputs_dfs = [pd.read_csv(os.path.join(SENESCWHEAT_INPUTS_DIRPATH, inputs_filename)) for inputs_filename in ('roots_inputs.csv', 'axes_inputs.csv', 'elements_inputs.csv')]
+    simulation_ = senescwheat_simulation.Simulation(delta_t=3600)
+    simulation_.initialize(senescwheat_converter.from_dataframes(*inputs_dfs))
+    record_and_replay(tmp_path, 'senescwheat', simulation_, lambda simulation_: update_inputs(simulation_.inputs, simulation_.outputs))
+
+
+def test_record_and_replay_cnwheat(tmp_path):
+    inputs_dfs = [pd.read_csv(os.path.join(CNWHEAT_INPUTS_DIRPATH, inputs_filename))
+                  for inputs_filename in ('organs_initial_state.csv', 'hiddenzones_initial_state.csv', 'elements_initial_state.csv', 'soils_initial_state.csv')]
+    simulation_ = cnwheat_simulation.Simulation(respiration_model=respiwheat_model, delta_t=3600, culm_density={1: 410})
+    simulation_.initialize(*cnwheat_converter.from_dataframes(*inputs_dfs))
+    # the population is updated by the model at each run
+    records = record_and_replay(tmp_path, 'cnwheat', simulation_)
+    assert recorder.compare_outputs(records[0]['outputs'], records[-1]['outputs'])
+
+
+def test_compare_outputs():
+    assert not recorder.compare_outputs({'par': {'Eabs': {1: 0.5, 2: float('nan')}}}, {'par': {'Eabs': {1: 0.5 + 1E-12, 2: float('nan')}}})
+    assert recorder.compare_outputs({'par': {'Eabs': {1: 0.5}}}, {'par': {'Eabs': {1: 0.6}}}) == ["outputs['par']['Eabs'][1]: 0.6 instead of 0.5"]
+    assert recorder.compare_outputs({'par': {'Eabs': {1: 0.5}}}, {'par': {'Eabs': {2: 0.5}}})
+    assert recorder.compare_outputs(('a', [1, 2]), ('b', [1, 2]))
+
+
+if __name__ == '__main__':
+    import tempfile
+    import pathlib
+    test_record_and_replay(pathlib.Path(tempfile.mkdtemp()))
+    test_record_and_replay_growthwheat(pathlib.Path(tempfile.mkdtemp()))
+    test_record_and_replay_senescwheat(pathlib.Path(tempfile.mkdtemp()))
+    test_record_and_replay_cnwheat(pathlib.Path(tempfile.mkdtemp()))
+    test_compare_outputs()
@@ -0,0 +1,135 @@
+# -*- coding: latin-1 -*-
+
+import numpy as np
+
+from openalea.farquharwheat import converter as farquharwheat_converter
+from openalea.senescwheat import converter as senescwheat_converter
+
+from openalea.fspmwheat import senescwheat_facade, state_store
+
+"""
+    test_state_store
+    ~~~~~~~~~~~~~~~~
+
+    Test the columnar store of the state shared between all models.
+
+    You must first install :mod:`fspmwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+"""
+
+ELEMENT_1 = (1, 'MS', 1, 'blade', 'LeafElement1')
+ELEMENT_2 = (1, 'MS', 2, 'blade', 'LeafElement1')
+ELEMENT_3 = (1, 'MS', 3, 'sheath', 'StemElement')
+
+
+def create_elements_table():
+    topology_columns, variables = state_store.TABLES_SCHEMAS['elements']
+    return state_store.StateTable(topology_columns, variables)
+
+
+def test_update_and_columns():
+    table = create_elements_table()
+    table.update({ELEMENT_1: {'Ag': 1.5, 'is_growing': False, 'not_a_variable': 0},
+                  ELEMENT_2: {'Ag': 2, 'is_growing': True}})
+
+    assert table.ids == [ELEMENT_1, ELEMENT_2]
+    np.testing.assert_array_equal(table.column('Ag'), [1.5, 2.])
+    assert table.column('Ag').dtype == np.float64
+    assert table.get(ELEMENT_2) == {'Ag': 2., 'is_growing': True}
+    assert not table.has_column('not_a_variable')
+
+    # a view on a column can be modified in place
+    table.column('Ag')[:] *= 2
+    assert table.get(ELEMENT_1)['Ag'] == 3.
+
+    # missing values
+    table.update({ELEMENT_3: {'is_growing': True}})
+    assert np.isnan(table.column('Ag')[table.row(ELEMENT_3)])
+    np.testing.assert_array_equal(table.written('Ag'), [True, True, False])
+
+
+def test_integer_columns():
+    topology_columns, variables = state_store.TABLES_SCHEMAS['axes']
+    table = state_store.StateTable(topology_columns, variables)
+    table.update({(1, 'MS'): {'nb_leaves': 4}, (1, 'T1'): {'nb_leaves': 2}})
+    assert table.column('nb_leaves').dtype == np.int64
+    table.update({(1, 'T1'): {'nb_leaves': 2.5}})
+    assert table.column('nb_leaves').dtype == np.float64
+    np.testing.assert_array_equal(table.column('nb_leaves'), [4., 2.5])
+
+
+def test_growth_and_removal():
+    table = create_elements_table()
+    ids = [(1, 'MS', metamer, 'blade', 'LeafElement1') for metamer in range(1, 4 * state_store.INITIAL_CAPACITY)]
+    table.update({element_id: {'Ag': float(element_id[2])} for element_id in ids}, mark_dirty=False)
+    assert len(table) == len(ids)
+    assert not table.is_dirty()
+
+    table.remove(ids[::2])
+    assert table.ids == ids[1::2]
+    np.testing.assert_array_equal(table.column('Ag'), [element_id[2] for element_id in ids[1::2]])
+    assert table.is_dirty()
+    dirty_data, removed_ids = table.pop_dirty()
+    assert dirty_data == {}
+    assert removed_ids == set(ids[::2])
+
+    # the rows added after a removal are missing
+    table.add([ids[0]])
+    assert np.isnan(table.column('Ag')[-1])
+    assert not table.written('Ag')[-1]
+
+
+def test_dirty_values():
+    table = create_elements_table()
+    table.update({ELEMENT_1: {'Ag': 1.}, ELEMENT_2: {'Ag': 2.}}, mark_dirty=False)
+    table.set_column('Ag', np.array([5.]), rows=table.rows([ELEMENT_2]))
+    table.column('Ts')[:] = 20.
+    table.mark_dirty('Ts', table.rows([ELEMENT_1]))
+
+    dirty_data, removed_ids = table.pop_dirty()
+    assert dirty_data == {ELEMENT_1: {'Ts': 20.}, ELEMENT_2: {'Ag': 5.}}
+    assert not removed_ids
+    assert not table.is_dirty()
+
+
+def test_to_dataframe():
+    table = create_elements_table()
+    table.update({ELEMENT_2: {'Ag': 2.}, ELEMENT_1: {'Ag': 1.}})
+    df = table.to_dataframe()
+    assert list(df.columns) == table.topology_columns + ['Ag']
+    np.testing.assert_array_equal(df['metamer'], [1, 2])
+    np.testing.assert_array_equal(df['Ag'], [1., 2.])
+
+
+def test_schemas_cover_the_models_written_in_the_store():
+    # the variables which are not in the schema of a table are not written in the store, and thus never reach the MTG
+    assert set(senescwheat_converter.SENESCWHEAT_ELEMENTS_INPUTS_OUTPUTS) <= state_store.TABLES_SCHEMAS['elements'][1]
+    assert set(senescwheat_converter.SENESCWHEAT_AXES_INPUTS_OUTPUTS) <= state_store.TABLES_SCHEMAS['axes'][1]
+    assert set(senescwheat_converter.SENESCWHEAT_ROOTS_INPUTS_OUTPUTS) <= state_store.TABLES_SCHEMAS['organs'][1]
+    assert set(farquharwheat_converter.FARQUHARWHEAT_ELEMENTS_INPUTS_OUTPUTS) <= state_store.TABLES_SCHEMAS['elements'][1]
+
+
+def test_read_columns():
+    table = create_elements_table()
+    table.update({ELEMENT_1: {'green_area': 1., 'mstruct': 2., 'is_over': False},
+                  ELEMENT_2: {'green_area': 3.},
+                  ELEMENT_3: {'green_area': 0., 'mstruct': 4.}})
+    rows = table.rows([ELEMENT_3, ELEMENT_2, ELEMENT_1])
+
+    assert senescwheat_facade._read_columns(table, rows, ['green_area', 'mstruct']) == [{'green_area': 0., 'mstruct': 4.}, None, {'green_area': 1., 'mstruct': 2.}]
+    assert senescwheat_facade._read_columns(table, rows, ['is_over', 'is_growing'], complete=False) == [{}, {}, {'is_over': False}]
+    # reading a variable never written does not allocate its column
+    assert not table.has_column('is_growing')
+
+
+if __name__ == '__main__':
+    test_update_and_columns()
+    test_integer_columns()
+    test_growth_and_removal()
+    test_dirty_values()
+    test_to_dataframe()
+    test_schemas_cover_the_models_written_in_the_store()
+    test_read_columns()
@@ -1,4 +1,5 @@
 # -*- coding: latin-1 -*-
+import copy
 import os
 
 import numpy as np
@@ -138,5 +139,112 @@ def test_run(overwrite_desired_data=False):
         print('{} OK!'.format(actual_outputs_filename))
 
 
+def replicate_inputs(inputs_df, nb_plants):
+    """Replicate the inputs on `nb_plants` plants, with duplicated rows of other values in half of the plants, in random order."""
+    replicates = []
+    float_columns = inputs_df.select_dtypes(include='float').columns
+    for plant in range(1, nb_plants + 1):
+        replicate = inputs_df.assign(plant=plant)
+        replicates.append(replicate)
+        if plant % 2:
+            duplicate = replicate.copy()
+            duplicate[float_columns] *= 2
+            replicates.append(duplicate)
+    return pd.concat(replicates, ignore_index=True).sample(frac=1, random_state=0).reset_index(drop=True)
+
+
+def assert_same_inputs(actual_inputs, desired_inputs):
+    """Check that the inputs have the same ids, in the same order, with the same values and types."""
+    assert list(actual_inputs.keys()) == list(desired_inputs.keys())
+    for inputs_id, desired_inputs_values in desired_inputs.items():
+        assert repr(actual_inputs[inputs_id]) == repr(desired_inputs_values), inputs_id
+
+
+def groupby_from_dataframe(inputs_df, topology_columns):
+    """Convert the inputs with :meth:`pandas.DataFrame.groupby`, as in the previous versions of the converter."""
+    data_columns = inputs_df.columns.difference(topology_columns)
+    return {current_id: current_group.loc[current_group.first_valid_index()][data_columns].to_dict()
+            for current_id, current_group in inputs_df.groupby(topology_columns)}
+
+
+def test_copy_on_write_outputs():
+    hiddenzones_inputs_df, elements_inputs_df, roots_inputs_df, axes_inputs_df = [pd.read_csv(os.path.join(INPUTS_DIRPATH, inputs_filename)).replace({np.nan: None})
+                                                                                  for inputs_filename in (HIDDENZONES_INPUTS_FILENAME, ELEMENTS_INPUTS_FILENAME,
+                                                                                                          ROOTS_INPUTS_FILENAME, AXES_INPUTS_FILENAME)]
+    inputs = converter.from_dataframes(hiddenzones_inputs_df, elements_inputs_df, roots_inputs_df, axes_inputs_df)
+    initial_inputs = copy.deepcopy(inputs)
+
+    simulation_ = simulation.Simulation(delta_t=3600)
+    simulation_.initialize(inputs)
+    simulation_.run()
+
+    # the inputs are not modified by the run
+    assert inputs == initial_inputs
+
+    # the modified data contain all the variables which differ from the inputs
+    for outputs_type, all_outputs in simulation_.outputs.items():
+        modified_data = all_outputs.get_modified_data()
+        for outputs_id, outputs in all_outputs.items():
+            outputs_inputs = initial_inputs[outputs_type].get(outputs_id, {})
+            for output_name, output_value in outputs.items():
+                if output_name not in outputs_inputs or outputs_inputs[output_name] != output_value:
+                    assert modified_data[outputs_id][output_name] == output_value
+
+
+def test_vectorized():
+    hiddenzones_inputs_df, elements_inputs_df, roots_inputs_df, axes_inputs_df = [pd.read_csv(os.path.join(INPUTS_DIRPATH, inputs_filename)).replace({np.nan: None})
+                                                                                  for inputs_filename in (HIDDENZONES_INPUTS_FILENAME, ELEMENTS_INPUTS_FILENAME,
+                                                                                                          ROOTS_INPUTS_FILENAME, AXES_INPUTS_FILENAME)]
+    inputs = converter.from_dataframes(hiddenzones_inputs_df, elements_inputs_df, roots_inputs_df, axes_inputs_df)
+    # add hidden zones in each branch of the model: emerged leaf with a mature lamina and a growing sheath, visible internode, remobilisations, tiller
+    hiddenzone_inputs = inputs['hiddenzone'][(1, 'MS', 3)]
+    inputs['hiddenzone'][(1, 'MS', 2)] = dict(hiddenzone_inputs, leaf_is_remobilizing=True, leaf_pseudostem_length=0.04)
+    inputs['hiddenzone'][(1, 'MS', 1)] = dict(hiddenzone_inputs, leaf_is_growing=False, internode_is_visible=True, internode_pseudo_age=100000,
+                                              internode_is_remobilizing=True, leaf_is_remobilizing=True, internode_Lmax=0.002)
+    inputs['elements'][(1, 'MS', 1, 'internode', 'StemElement')] = dict(inputs['elements'][(1, 'MS', 2, 'sheath', 'StemElement')], length=0.002)
+    inputs['elements'][(1, 'MS', 2, 'blade', 'HiddenElement')] = dict(inputs['elements'][(1, 'MS', 2, 'sheath', 'HiddenElement')])
+    inputs['hiddenzone'][(1, 'T1', 3)] = dict(hiddenzone_inputs)
+
+    # the vectorized and the scalar computations must give the same outputs
+    outputs = []
+    for vectorized in (False, True):
+        simulation_ = simulation.Simulation(delta_t=3600)
+        simulation_.initialize(inputs)
+        simulation_.run(vectorized=vectorized)
+        outputs.append(simulation_.outputs)
+    scalar_outputs, vectorized_outputs = outputs
+    for scalar_outputs_df, vectorized_outputs_df in zip(converter.to_dataframes(scalar_outputs), converter.to_dataframes(vectorized_outputs)):
+        pd.testing.assert_frame_equal(scalar_outputs_df, vectorized_outputs_df, check_dtype=False)
+    for outputs_type in ('hiddenzone', 'elements'):
+        assert scalar_outputs[outputs_type].get_modified_data() == vectorized_outputs[outputs_type].get_modified_data()
+
+    # a missing input raises an error in both computations
+    del inputs['hiddenzone'][(1, 'MS', 3)]['internode_pseudo_age']
+    for vectorized in (False, True):
+        simulation_ = simulation.Simulation(delta_t=3600)
+        simulation_.initialize(inputs)
+        try:
+            simulation_.run(vectorized=vectorized)
+        except KeyError as e:
+            assert e.args == ('internode_pseudo_age',)
+        else:
+            assert False, 'a missing input must raise a KeyError'
+
+
+def test_from_dataframes():
+    hiddenzones_inputs_df, elements_inputs_df, roots_inputs_df, axes_inputs_df = [replicate_inputs(pd.read_csv(os.path.join(INPUTS_DIRPATH, inputs_filename)), 50).replace({np.nan: None})
+                                                                                  for inputs_filename in (HIDDENZONES_INPUTS_FILENAME, ELEMENTS_INPUTS_FILENAME,
+                                                                                                          ROOTS_INPUTS_FILENAME, AXES_INPUTS_FILENAME)]
+    inputs = converter.from_dataframes(hiddenzones_inputs_df, elements_inputs_df, roots_inputs_df, axes_inputs_df)
+    for inputs_type, inputs_df, topology_columns in (('hiddenzone', hiddenzones_inputs_df, converter.HIDDENZONE_TOPOLOGY_COLUMNS),
+                                                     ('elements', elements_inputs_df, converter.ELEMENT_TOPOLOGY_COLUMNS),
+                                                     ('roots', roots_inputs_df, converter.ROOT_TOPOLOGY_COLUMNS),
+                                                     ('axes', axes_inputs_df, converter.AXIS_TOPOLOGY_COLUMNS)):
+        assert_same_inputs(inputs[inputs_type], groupby_from_dataframe(inputs_df, topology_columns))
+
+
 if __name__ == '__main__':
     test_run(overwrite_desired_data=False)
+    test_copy_on_write_outputs()
+    test_vectorized()
+    test_from_dataframes()
@@ -0,0 +1,57 @@
+# -*- coding: latin-1 -*-
+
+import time
+
+import numpy as np
+
+from openalea.respiwheat import model
+
+"""
+    benchmark_respiwheat
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Compare the scalar functions of :mod:`respiwheat.model` applied row by row to their vectorized versions on inputs of 1e5 rows.
+    Print the durations and the speed-ups, and check that the results are the same to machine precision.
+
+    :copyright: Copyright 2014-2017 INRA-ECOSYS, see AUTHORS.
+    :license: CeCILL-C, see LICENSE for details.
+
+"""
+
+NB_ROWS = int(1e5)
+
+RespirationModel = model.RespirationModel
+
+
+def run_scalar(function, *args, **kwargs):
+    return np.array([function(*values, **kwargs) for values in zip(*args)], dtype=float)
+
+
+if __name__ == '__main__':
+    random_state = np.random.RandomState(0)
+    sucrose = random_state.uniform(-100, 1000, NB_ROWS)
+    mstruct = random_state.uniform(-0.01, 0.1, NB_ROWS)
+    flux = random_state.uniform(-100, 100, NB_ROWS)
+    Ntot = random_state.uniform(0, 1000, NB_ROWS)
+    Ts = random_state.uniform(-5, 35, NB_ROWS)
+
+    print('{:<25}{:>15}{:>18}{:>10}'.format('function', 'scalar (ms)', 'vectorized (ms)', 'speed-up'))
+    for function_name, args, kwargs in (('R_phloem', (flux, mstruct), {}),
+                                        ('R_Nnit_upt', (flux, sucrose), {}),
+                                        ('R_Nnit_red (shoot)', (flux, sucrose, mstruct), {}),
+                                        ('R_Nnit_red (roots)', (flux, sucrose, mstruct), {'root': True}),
+                                        ('R_N2fix', (flux,), {}),
+                                        ('R_min_upt', (flux,), {}),
+                                        ('R_residual', (sucrose, mstruct, Ntot, Ts), {}),
+                                        ('R_endosperm', (sucrose, mstruct, Ts), {})):
+        function_name_ = function_name.split()[0]
+        start = time.time()
+        desired = run_scalar(getattr(RespirationModel, function_name_), *args, **kwargs)
+        scalar_duration = time.time() - start
+        start = time.time()
+        actual = getattr(RespirationModel, function_name_ + '_vectorized')(*args, **kwargs)
+        vectorized_duration = time.time() - start
+        if desired.ndim == 2:
+            actual = np.column_stack(actual)
+        np.testing.assert_allclose(actual, desired, rtol=1e-15, atol=0, err_msg=function_name)
+        print('{:<25}{:>15.1f}{:>18.2f}{:>10.0f}'.format(function_name, scalar_duration * 1e3, vectorized_duration * 1e3, scalar_duration / vectorized_duration))
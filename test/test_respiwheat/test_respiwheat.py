@@ -1,5 +1,7 @@
 # -*- coding: latin-1 -*-
 
+import numpy as np
+
 from openalea.respiwheat import model
 
 """
@@ -55,5 +57,51 @@ def test_calculate_respiwheat():
         assert_close(actual_respirations[R], desired_R, tolerance=1e-3)
 
 
+def test_vectorized():
+    """Check that the vectorized functions give the same results as the scalar ones, including for null, negative and missing values."""
+    random_state = np.random.RandomState(0)
+    nb_rows = 1000
+
+    def random_values(low, high):
+        values = random_state.uniform(low, high, nb_rows)
+        values[:10] = 0.
+        values[10:20] = np.nan
+        return values
+
+    sucrose = random_values(-100, 1000)
+    mstruct = random_values(-0.01, 0.1)
+    flux = random_values(-100, 100)
+    Ntot = random_values(0, 1000)
+    Ts = random_values(-5, 35)
+
+    def scalar(function, *args, **kwargs):
+        results = [function(*values, **kwargs) for values in zip(*args)]
+        return np.array(results, dtype=float)
+
+    RespirationModel = model.RespirationModel
+    for function_name, args, kwargs in (('R_growth', (flux,), {}),
+                                        ('R_grain_growth', (flux, flux, mstruct), {}),
+                                        ('R_phloem', (flux, mstruct), {}),
+                                        ('R_Namm_upt', (flux,), {}),
+                                        ('R_Nnit_upt', (flux, sucrose), {}),
+                                        ('R_Nnit_red', (flux, sucrose, mstruct), {}),
+                                        ('R_Nnit_red', (flux, sucrose, mstruct), {'root': True}),
+                                        ('R_N2fix', (flux,), {}),
+                                        ('R_min_upt', (flux,), {}),
+                                        ('R_residual', (sucrose, mstruct, Ntot, Ts), {}),
+                                        ('R_endosperm', (sucrose, mstruct, Ts), {})):
+        desired = scalar(getattr(RespirationModel, function_name), *args, **kwargs)
+        actual = getattr(RespirationModel, function_name + '_vectorized')(*args, **kwargs)
+        if desired.ndim == 2:  # functions returning tuples
+            actual = np.column_stack(actual)
+        # machine precision: numpy may compute the powers with SIMD instructions, which can differ from the scalar ones on the last bit
+        np.testing.assert_allclose(actual, desired, rtol=1e-15, atol=0, err_msg=function_name)
+
+    # the parameters are broadcast against each other
+    R_residual = RespirationModel.R_residual_vectorized(sucrose, 0.05, Ntot, 20.)
+    np.testing.assert_allclose(R_residual, scalar(RespirationModel.R_residual, sucrose, [0.05] * nb_rows, Ntot, [20.] * nb_rows), rtol=1e-15, atol=0)
+
+
 if __name__ == '__main__':
     test_calculate_respiwheat()
+    test_vectorized()
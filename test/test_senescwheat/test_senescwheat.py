@@ -118,5 +118,89 @@ def test_run(overwrite_desired_data=False):
         print('{} OK!'.format(actual_outputs_filename))
 
 
+def replicate_inputs(inputs_df, nb_plants):
+    """Replicate the inputs on `nb_plants` plants, with duplicated rows of other values in half of the plants, in random order."""
+    replicates = []
+    float_columns = inputs_df.select_dtypes(include='float').columns
+    for plant in range(1, nb_plants + 1):
+        replicate = inputs_df.assign(plant=plant)
+        replicates.append(replicate)
+        if plant % 2:
+            duplicate = replicate.copy()
+            duplicate[float_columns] *= 2
+            replicates.append(duplicate)
+    return pd.concat(replicates, ignore_index=True).sample(frac=1, random_state=0).reset_index(drop=True)
+
+
+def assert_same_inputs(actual_inputs, desired_inputs):
+    """Check that the inputs have the same ids, in the same order, with the same values and types."""
+    assert list(actual_inputs.keys()) == list(desired_inputs.keys())
+    for inputs_id, desired_inputs_values in desired_inputs.items():
+        assert repr(actual_inputs[inputs_id]) == repr(desired_inputs_values), inputs_id
+
+
+def groupby_from_dataframe(inputs_df, topology_columns):
+    """Convert the inputs with :meth:`pandas.DataFrame.groupby`, as in the previous versions of the converter."""
+    data_columns = inputs_df.columns.difference(topology_columns)
+    return {current_id: current_group.loc[current_group.first_valid_index()][data_columns].to_dict()
+            for current_id, current_group in inputs_df.groupby(topology_columns)}
+
+
+def test_vectorized():
+    # read inputs from Pandas dataframe
+    roots_inputs_df = pd.read_csv(os.path.join(INPUTS_DIRPATH, ROOTS_INPUTS_FILENAME))
+    elements_inputs_df = pd.read_csv(os.path.join(INPUTS_DIRPATH, ELEMENTS_INPUTS_FILENAME))
+    axes_inputs_df = pd.read_csv(os.path.join(INPUTS_DIRPATH, AXES_INPUTS_FILENAME))
+    inputs = converter.from_dataframes(roots_inputs_df, axes_inputs_df, elements_inputs_df)
+    # add senescent and over elements to the growing one
+    (element_id, element_inputs), = inputs['elements'].items()
+    for metamer, organ, green_area_factor, age in ((11, 'blade', 1, 0), (12, 'sheath', 0.5, 1E6), (13, 'internode', 1, 1E6), (14, 'blade', 0, 0)):
+        inputs['elements'][element_id[:2] + (metamer, organ) + element_id[4:]] = dict(element_inputs, is_growing=False, senesced_length_element=0, age=age,
+                                                                                                       green_area=element_inputs['green_area'] * green_area_factor)
+
+    # the vectorized and the scalar computations must give the same outputs
+    for postflowering_stages in (False, True):
+        for opt_full_remob in (False, True):
+            outputs_dfs = []
+            for vectorized in (False, True):
+                simulation_ = simulation.Simulation(delta_t=3600)
+                simulation_.initialize(inputs)
+                simulation_.run(opt_full_remob=opt_full_remob, postflowering_stages=postflowering_stages, vectorized=vectorized)
+                outputs_dfs.append(converter.to_dataframes(simulation_.outputs))
+            for scalar_outputs_df, vectorized_outputs_df in zip(*outputs_dfs):
+                pd.testing.assert_frame_equal(scalar_outputs_df, vectorized_outputs_df, check_dtype=False)
+
+    # a missing senesced length is handled the same way: set to 0 after flowering, an error before
+    del inputs['elements'][element_id[:2] + (11, 'blade') + element_id[4:]]['senesced_length_element']
+    for postflowering_stages in (False, True):
+        outputs_dfs = []
+        for vectorized in (False, True):
+            simulation_ = simulation.Simulation(delta_t=3600)
+            simulation_.initialize(inputs)
+            try:
+                simulation_.run(postflowering_stages=postflowering_stages, vectorized=vectorized)
+            except KeyError as e:
+                outputs_dfs.append(e.args)
+            else:
+                outputs_dfs.append(converter.to_dataframes(simulation_.outputs))
+        if postflowering_stages:
+            for scalar_outputs_df, vectorized_outputs_df in zip(*outputs_dfs):
+                pd.testing.assert_frame_equal(scalar_outputs_df, vectorized_outputs_df, check_dtype=False)
+        else:
+            assert outputs_dfs == [('senesced_length_element',)] * 2
+
+
+def test_from_dataframes():
+    roots_inputs_df, axes_inputs_df, elements_inputs_df = [replicate_inputs(pd.read_csv(os.path.join(INPUTS_DIRPATH, inputs_filename)), 50)
+                                                           for inputs_filename in (ROOTS_INPUTS_FILENAME, AXES_INPUTS_FILENAME, ELEMENTS_INPUTS_FILENAME)]
+    inputs = converter.from_dataframes(roots_inputs_df, axes_inputs_df, elements_inputs_df)
+    for inputs_type, inputs_df, topology_columns in (('roots', roots_inputs_df, converter.ROOTS_TOPOLOGY_COLUMNS),
+                                                     ('axes', axes_inputs_df, converter.AXES_TOPOLOGY_COLUMNS),
+                                                     ('elements', elements_inputs_df, converter.ELEMENTS_TOPOLOGY_COLUMNS)):
+        assert_same_inputs(inputs[inputs_type], groupby_from_dataframe(inputs_df, topology_columns))
+
+
 if __name__ == '__main__':
     test_run(overwrite_desired_data=False)
+    test_vectorized()
+    test_from_dataframes()